@@ -34,10 +34,10 @@ AMI_ID = CONFIG.get('linux', 'ami')
 INSTANCE_TYPE = CONFIG.get('linux', 'instance_type')
 
 ENTER_STANDBY_SSM_DOC_NAME = PREFIX + 'automation-asg-enter-standby-with-approval'
-ENTER_STANDBY_CFN_STACK_NAME = PREFIX + 'automation-asg-enter-standby-with-approval'
 
 EXIT_STANDBY_SSM_DOC_NAME = PREFIX + 'automation-asg-exit-standby-with-approval'
-EXIT_STANDBY_CFN_STACK_NAME = PREFIX + 'automation-asg-exit-standby-with-approval'
+STACK_POOL_PREFIX = CONFIG.get('general', 'stack_pool_prefix')
+STACK_POOL_TTL = CONFIG.getint('general', 'stack_pool_ttl')
 
 logging.basicConfig(level=CONFIG.get('general', 'log_level').upper())
 LOGGER = logging.getLogger(__name__)
@@ -71,99 +71,94 @@ class TestCase(unittest.TestCase):
             doc_type='Automation'
         )
 
-        test_cf_stack = ssm_testing.CFNTester(
-            cfn_client=cfn_client,
-            template_filename=os.path.abspath(os.path.join(
-                DOC_DIR,
-                'Tests/CloudFormationTemplates/ASG.yml')),
-            stack_name=ENTER_STANDBY_CFN_STACK_NAME
-        )
-
         automation_role = ssm_doc.get_automation_role(sts_client, iam_client, SERVICE_ROLE_NAME)
 
-        LOGGER.info('Creating AutoScaling Group for testing')
+        LOGGER.info('Leasing AutoScaling Group for testing')
         stack_param = {
             'AMI': AMI_ID,
             'Subnets': available_subnets[0].id,
             'InstanceType': INSTANCE_TYPE
         }
-        test_cf_stack.create_stack([
-            {'ParameterKey': key, 'ParameterValue': value} for key, value in stack_param.iteritems()])
-
-        asg_name = test_cf_stack.stack_outputs["ASGName"]
-
-        LOGGER.info("Waiting for an instance to become ready...")
-        working_instance = asg_wait_for_running_instance(
-            asg_name=asg_name,
-            number_of_instance=1,
-            max_wait_sec=300)[0]
-
-        try:
+        stack_pool = ssm_testing.StackPool(cfn_client, STACK_POOL_PREFIX, STACK_POOL_TTL)
+        with stack_pool.lease(
+                os.path.abspath(os.path.join(DOC_DIR, 'Tests/CloudFormationTemplates/ASG.yml')),
+                [{'ParameterKey': key, 'ParameterValue': value} for key, value in stack_param.iteritems()],
+                reset=ssm_testing.StackPool.instances_in_service(as_client, 'ASGName')
+        ) as test_cf_stack:
+            asg_name = test_cf_stack.stack_outputs["ASGName"]
+
+            LOGGER.info("Waiting for an instance to become ready...")
+            working_instance = asg_wait_for_running_instance(
+                asg_name=asg_name,
+                number_of_instance=1,
+                max_wait_sec=300)[0]
 
-            LOGGER.info("Creating automation document")
-            assert ssm_doc.create_document() == 'Active', 'Document not created successfully'
+            try:
 
-            user_arn = sts_client.get_caller_identity().get('Arn')
-            sns_topic_arn = test_cf_stack.stack_outputs['SNSTopicArn']
+                LOGGER.info("Creating automation document")
+                assert ssm_doc.create_document() == 'Active', 'Document not created successfully'
 
-            LOGGER.info("User ARN for approval: " + user_arn)
-            LOGGER.info("SNS Topic ARN for approval: " + sns_topic_arn)
+                user_arn = sts_client.get_caller_identity().get('Arn')
+                sns_topic_arn = test_cf_stack.stack_outputs['SNSTopicArn']
 
-            LOGGER.info(
-                "Executing SSM automation document to set instance to standby mode on {}".format(working_instance))
-            execution = ssm_doc.execute_automation(
-                params={'InstanceId': [working_instance],
-                        'LambdaRoleArn': [automation_role],
-                        'AutomationAssumeRole': [automation_role],
-                        'Approvers': [user_arn],
-                        'SNSTopicArn': [sns_topic_arn]})
+                LOGGER.info("User ARN for approval: " + user_arn)
+                LOGGER.info("SNS Topic ARN for approval: " + sns_topic_arn)
 
-            # Send approval signal
+                LOGGER.info(
+                    "Executing SSM automation document to set instance to standby mode on {}".format(working_instance))
+                execution = ssm_doc.execute_automation(
+                    params={'InstanceId': [working_instance],
+                            'LambdaRoleArn': [automation_role],
+                            'AutomationAssumeRole': [automation_role],
+                            'Approvers': [user_arn],
+                            'SNSTopicArn': [sns_topic_arn]})
 
-            # Since this automation requires approval to continue, the correct status at this point should be 'Waiting'
-            assert ssm_doc.automation_execution_status(ssm_client, execution, False) == 'Waiting', \
-                'Automation not waiting for approval'
+                # Send approval signal
 
-            LOGGER.info('Approving continuation of execution')
-            ssm_client.send_automation_signal(
-                AutomationExecutionId=execution,
-                SignalType='Approve'
-            )
+                # Since this automation requires approval to continue, the correct status at this point should be
+                # 'Waiting'
+                assert ssm_doc.automation_execution_status(ssm_client, execution, False) == 'Waiting', \
+                    'Automation not waiting for approval'
 
-            # Collect asg instance lifecycle change.
+                LOGGER.info('Approving continuation of execution')
+                ssm_client.send_automation_signal(
+                    AutomationExecutionId=execution,
+                    SignalType='Approve'
+                )
 
-            asg_status_changes = []
-            asg_status_ignores = ["EnteringStandby", "Pending"]
+                # Collect asg instance lifecycle change.
 
-            # Status callback to collect any necessary data
-            def status_callback(_):
-                collect_asg_status_change(asg_name, working_instance, asg_status_ignores, asg_status_changes)
+                asg_status_changes = []
+                asg_status_ignores = ["EnteringStandby", "Pending"]
 
-            # Wait for SSM to finish while collecting value change (callback).
-            result = ssm_doc.automation_execution_status(ssm_client, execution, status_callback=status_callback)
+                # Status callback to collect any necessary data
+                def status_callback(_):
+                    collect_asg_status_change(asg_name, working_instance, asg_status_ignores, asg_status_changes)
 
-            # Verify instance status change.
-            LOGGER.info("ASG status change sequence: " + str(asg_status_changes))
-            expected_status_change_sequence = [
-                "InService",
-                "Standby"
-            ]
-            is_status_change_expected = asg_status_changes == expected_status_change_sequence
-            assert is_status_change_expected, 'ASG instant lifecycle did not match expected.'
+                # Wait for SSM to finish while collecting value change (callback).
+                result = ssm_doc.automation_execution_status(ssm_client, execution, status_callback=status_callback)
 
-            LOGGER.info('Verifying automation executions have concluded successfully')
-            assert result == 'Success', 'Document did not complete'
+                # Verify instance status change.
+                LOGGER.info("ASG status change sequence: " + str(asg_status_changes))
+                expected_status_change_sequence = [
+                    "InService",
+                    "Standby"
+                ]
+                is_status_change_expected = asg_status_changes == expected_status_change_sequence
+                assert is_status_change_expected, 'ASG instant lifecycle did not match expected.'
 
-        finally:
-            try:
-                LOGGER.info('Taking instance out of standby (required for CF stack teardown)')
-                as_client.exit_standby(
-                    InstanceIds=[working_instance],
-                    AutoScalingGroupName=asg_name)
+                LOGGER.info('Verifying automation executions have concluded successfully')
+                assert result == 'Success', 'Document did not complete'
 
             finally:
-                test_cf_stack.delete_stack()
-                ssm_doc.destroy()
+                try:
+                    LOGGER.info('Taking instance out of standby')
+                    as_client.exit_standby(
+                        InstanceIds=[working_instance],
+                        AutoScalingGroupName=asg_name)
+
+                finally:
+                    ssm_doc.destroy()
 
     def test_exit_standby_document(self):
 
@@ -181,100 +176,95 @@ class TestCase(unittest.TestCase):
             doc_type='Automation'
         )
 
-        test_cf_stack = ssm_testing.CFNTester(
-            cfn_client=cfn_client,
-            template_filename=os.path.abspath(os.path.join(
-                DOC_DIR,
-                'Tests/CloudFormationTemplates/ASG.yml')),
-            stack_name=EXIT_STANDBY_CFN_STACK_NAME
-        )
-
         automation_role = ssm_doc.get_automation_role(sts_client, iam_client, SERVICE_ROLE_NAME)
 
-        LOGGER.info('Creating AutoScaling Group for testing')
+        LOGGER.info('Leasing AutoScaling Group for testing')
         stack_param = {
             'AMI': AMI_ID,
             'Subnets': available_subnets[0].id,
             'InstanceType': INSTANCE_TYPE
         }
-        test_cf_stack.create_stack([
-            {'ParameterKey': key, 'ParameterValue': value} for key, value in stack_param.iteritems()])
-
-        asg_name = test_cf_stack.stack_outputs["ASGName"]
-
-        LOGGER.info("Waiting for an instance to become ready...")
-        working_instance = asg_wait_for_running_instance(
-            asg_name=asg_name,
-            number_of_instance=1,
-            max_wait_sec=300)[0]
-
-        LOGGER.info("Setting instance to enter standby mode")
-        as_client.enter_standby(
-            InstanceIds=[working_instance],
-            AutoScalingGroupName=asg_name,
-            ShouldDecrementDesiredCapacity=True)
+        stack_pool = ssm_testing.StackPool(cfn_client, STACK_POOL_PREFIX, STACK_POOL_TTL)
+        with stack_pool.lease(
+                os.path.abspath(os.path.join(DOC_DIR, 'Tests/CloudFormationTemplates/ASG.yml')),
+                [{'ParameterKey': key, 'ParameterValue': value} for key, value in stack_param.iteritems()],
+                reset=ssm_testing.StackPool.instances_in_service(as_client, 'ASGName')
+        ) as test_cf_stack:
+            asg_name = test_cf_stack.stack_outputs["ASGName"]
+
+            LOGGER.info("Waiting for an instance to become ready...")
+            working_instance = asg_wait_for_running_instance(
+                asg_name=asg_name,
+                number_of_instance=1,
+                max_wait_sec=300)[0]
+
+            LOGGER.info("Setting instance to enter standby mode")
+            as_client.enter_standby(
+                InstanceIds=[working_instance],
+                AutoScalingGroupName=asg_name,
+                ShouldDecrementDesiredCapacity=True)
+
+            # poll the instance until it reaches the standby state
+            asg_wait_for_instance_in_state(working_instance, 'Standby')
 
-        # poll the instance until it reaches the standby state
-        asg_wait_for_instance_in_state(working_instance, 'Standby')
-
-        try:
+            try:
 
-            LOGGER.info("Creating automation document")
-            assert ssm_doc.create_document() == 'Active', 'Document not created successfully'
+                LOGGER.info("Creating automation document")
+                assert ssm_doc.create_document() == 'Active', 'Document not created successfully'
 
-            LOGGER.info(
-                "Executing SSM automation document to remove instance from standby mode on {}".format(working_instance))
+                LOGGER.info("Executing SSM automation document to remove instance from standby mode on {}".format(
+                    working_instance))
 
-            user_arn = sts_client.get_caller_identity()['Arn']
-            sns_topic_arn = test_cf_stack.stack_outputs['SNSTopicArn']
+                user_arn = sts_client.get_caller_identity()['Arn']
+                sns_topic_arn = test_cf_stack.stack_outputs['SNSTopicArn']
 
-            LOGGER.info("User ARN for approval: " + user_arn)
-            LOGGER.info("SNS Topic ARN for approval: " + sns_topic_arn)
+                LOGGER.info("User ARN for approval: " + user_arn)
+                LOGGER.info("SNS Topic ARN for approval: " + sns_topic_arn)
 
-            execution = ssm_doc.execute_automation(
-                params={'InstanceId': [working_instance],
-                        'LambdaRoleArn': [automation_role],
-                        'AutomationAssumeRole': [automation_role],
-                        'Approvers': [user_arn],
-                        'SNSTopicArn': [sns_topic_arn]})
+                execution = ssm_doc.execute_automation(
+                    params={'InstanceId': [working_instance],
+                            'LambdaRoleArn': [automation_role],
+                            'AutomationAssumeRole': [automation_role],
+                            'Approvers': [user_arn],
+                            'SNSTopicArn': [sns_topic_arn]})
 
-            # since this automation requires approval to continue, the correct status at this point should be 'Waiting'
-            assert ssm_doc.automation_execution_status(ssm_client, execution, False) == 'Waiting', \
-                'Automation not waiting for approval'
+                # since this automation requires approval to continue, the correct status at this point should be
+                # 'Waiting'
+                assert ssm_doc.automation_execution_status(ssm_client, execution, False) == 'Waiting', \
+                    'Automation not waiting for approval'
 
-            LOGGER.info('Approving continuation of execution')
-            ssm_client.send_automation_signal(
-                AutomationExecutionId=execution,
-                SignalType='Approve'
-            )
+                LOGGER.info('Approving continuation of execution')
+                ssm_client.send_automation_signal(
+                    AutomationExecutionId=execution,
+                    SignalType='Approve'
+                )
 
-            # Collect asg instance lifecycle change.
+                # Collect asg instance lifecycle change.
 
-            asg_status_changes = []
-            asg_status_ignores = ["Pending"]
+                asg_status_changes = []
+                asg_status_ignores = ["Pending"]
 
-            # Status callback to collect any necessary data
-            def status_callback(_):
-                collect_asg_status_change(asg_name, working_instance, asg_status_ignores, asg_status_changes)
+                # Status callback to collect any necessary data
+                def status_callback(_):
+                    collect_asg_status_change(asg_name, working_instance, asg_status_ignores, asg_status_changes)
 
-            # Wait for SSM to finish while collecting value change (callback).
-            result = ssm_doc.automation_execution_status(ssm_client, execution, status_callback=status_callback)
+                # Wait for SSM to finish while collecting value change (callback).
+                result = ssm_doc.automation_execution_status(ssm_client, execution, status_callback=status_callback)
 
-            # Verify instance status change.
-            LOGGER.info("ASG status change sequence: " + str(asg_status_changes))
-            expected_status_change_sequence = [
-                "Standby",
-                "InService"
-            ]
-            is_status_change_expected = asg_status_changes == expected_status_change_sequence
-            assert is_status_change_expected, 'ASG instant lifecycle did not match expected.'
+                # Verify instance status change.
+                LOGGER.info("ASG status change sequence: " + str(asg_status_changes))
+                expected_status_change_sequence = [
+                    "Standby",
+                    "InService"
+                ]
+                is_status_change_expected = asg_status_changes == expected_status_change_sequence
+                assert is_status_change_expected, 'ASG instant lifecycle did not match expected.'
 
-            LOGGER.info('Verifying automation executions have concluded successfully')
-            assert result == 'Success', 'Document did not complete'
+                LOGGER.info('Verifying automation executions have concluded successfully')
+                assert result == 'Success', 'Document did not complete'
 
-        finally:
-            test_cf_stack.delete_stack()
-            ssm_doc.destroy()
+            finally:
+                ssm_doc.destroy()
 
 
 def asg_wait_for_instance_in_state(instance_id, desired_state, max_wait_sec=60):
@@ -0,0 +1,115 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import copy
+import os
+import sys
+import unittest
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(ANALYSIS_DIR)
+import call_optimizer  # noqa pylint: disable=import-error,wrong-import-position
+import document_validator  # noqa pylint: disable=import-error,wrong-import-position
+
+
+def describe(name, instance, *outputs):
+    return {"name": name, "action": "aws:executeAwsApi",
+            "inputs": {"Service": "ec2", "Api": "DescribeInstances", "InstanceIds": [instance]},
+            "outputs": [{"Name": output, "Selector": "$.Reservations[0].Instances[0]." + selector, "Type": "String"}
+                        for output, selector in outputs]}
+
+
+DOCUMENT = {
+    "schemaVersion": "0.3",
+    "parameters": {"InstanceId": {"type": "String"}},
+    "mainSteps": [
+        describe("describe", "{{InstanceId}}", ("Zone", "Placement.AvailabilityZone")),
+        {"name": "stop", "action": "aws:changeInstanceState",
+         "inputs": {"InstanceIds": ["{{InstanceId}}"], "DesiredState": "stopped"}},
+        describe("describeAgain", "{{ InstanceId }}", ("Zone", "Placement.AvailabilityZone"),
+                 ("Root", "RootDeviceName")),
+        describe("echo", "{{InstanceId}}", ("Id", "InstanceId")),
+        {"name": "wait", "action": "aws:sleep", "inputs": {"Duration": "PT30S"}},
+        {"name": "check", "action": "aws:executeAwsApi",
+         "inputs": {"Service": "ec2", "Api": "DescribeSnapshots", "SnapshotIds": ["snap-1"]},
+         "outputs": [{"Name": "State", "Selector": "$.Snapshots[0].State", "Type": "String"}]},
+        {"name": "loop", "action": "aws:branch",
+         "inputs": {"Choices": [{"NextStep": "tag", "Variable": "{{check.State}}", "StringEquals": "completed"}],
+                    "Default": "wait"}},
+        {"name": "tag", "action": "aws:createTags", "isEnd": True,
+         "inputs": {"ResourceIds": ["{{echo.Id}}"],
+                    "Tags": [{"Key": "Zone", "Value": "{{describeAgain.Zone}}-{{describeAgain.Root}}"}]}}
+    ],
+    "outputs": ["describeAgain.Zone"]
+}
+
+
+class CallOptimizerTest(unittest.TestCase):
+    def setUp(self):
+        self.document = copy.deepcopy(DOCUMENT)
+        self.optimizer = call_optimizer.CallOptimizer()
+
+    def step(self, name):
+        return [step for step in self.document['mainSteps'] if step['name'] == name][0]
+
+    def test_findings(self):
+        findings = self.optimizer.find(self.document)
+        self.assertEqual([(finding.kind, finding.step, finding.source, finding.rewritable) for finding in findings], [
+            ('repeated-read', 'describeAgain', 'describe', True),
+            ('repeated-read', 'echo', 'describe', True),
+            ('polling-loop', 'wait', 'check', True)])
+        self.step('echo')['inputs']['InstanceIds'] = ['{{describe.Zone}}']
+        echo = self.optimizer.find(self.document)[1]
+        self.assertEqual((echo.kind, echo.replacements), ('echo-read', {'Id': (None, 'describe.Zone')}))
+        self.step('echo')['inputs']['InstanceIds'] = '{{describe.Zone}}'
+        self.assertFalse(self.optimizer.find(self.document)[1].rewritable)
+
+    def test_optimize(self):
+        self.step('echo')['inputs']['InstanceIds'] = ['{{describeAgain.Root}}']
+        report = self.optimizer.optimize(self.document)
+        self.assertEqual((report.calls_saved, report.seconds_saved), (2, 17))
+        optimized = report.document
+        self.assertEqual(document_validator.validate_document(optimized), [])
+        self.assertEqual([step['name'] for step in optimized['mainSteps']], ['describe', 'stop', 'wait', 'tag'])
+        self.assertEqual([output['Name'] for output in optimized['mainSteps'][0]['outputs']], ['Zone', 'Root'])
+        wait = optimized['mainSteps'][2]
+        self.assertEqual((wait['action'], wait['nextStep'], wait['inputs']['DesiredValues']),
+                         ('aws:waitForAwsResourceProperty', 'tag', ['completed']))
+        self.assertEqual(optimized['mainSteps'][3]['inputs']['ResourceIds'], ['{{describe.Root}}'])
+        self.assertEqual(optimized['mainSteps'][3]['inputs']['Tags'][0]['Value'], '{{describe.Zone}}-{{describe.Root}}')
+        self.assertEqual(optimized['outputs'], ['describe.Zone'])
+        # the source document is left unchanged
+        self.assertEqual(len(self.document['mainSteps']), 8)
+
+    def test_changes_in_between(self):
+        self.step('describeAgain')['outputs'][0]['Selector'] = '$.Reservations[0].Instances[0].State.Name'
+        finding = self.optimizer.find(self.document)[0]
+        self.assertFalse(finding.rewritable)
+        self.assertIn('stop may have changed Zone since', finding.message)
+
+    def test_loops_waiting_for_any_other_value(self):
+        self.step('loop')['inputs'] = {
+            "Choices": [{"NextStep": "wait", "Variable": "{{check.State}}", "StringEquals": "pending"}],
+            "Default": "tag"}
+        finding = self.optimizer.find(self.document)[-1]
+        self.assertEqual((finding.kind, finding.rewritable), ('polling-loop', False))
+
+    def test_repository_documents(self):
+        for path in document_validator.find_documents():
+            report = call_optimizer.load_report(path, self.optimizer)
+            if report is not None and report.document is not None:
+                self.assertEqual(document_validator.validate_document(report.document), [], path)
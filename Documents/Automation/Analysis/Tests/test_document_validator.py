@@ -0,0 +1,213 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(ANALYSIS_DIR)
+import document_validator  # noqa pylint: disable=import-error,wrong-import-position
+
+DOCUMENT = {
+    "schemaVersion": "0.3",
+    "description": "Test document",
+    "assumeRole": "{{AutomationAssumeRole}}",
+    "parameters": {
+        "InstanceId": {"type": "String"},
+        "AutomationAssumeRole": {"type": "String", "default": ""}
+    },
+    "mainSteps": [
+        {
+            "name": "createStack",
+            "action": "aws:createStack",
+            "onFailure": "step:deleteStack",
+            "inputs": {
+                "StackName": "stack-{{automation:EXECUTION_ID}}",
+                "TemplateBody": "Resources: {}",
+                "Capabilities": ["CAPABILITY_IAM"]
+            }
+        },
+        {
+            "name": "stopInstance",
+            "action": "aws:changeInstanceState",
+            "inputs": {"InstanceIds": "{{InstanceId}}", "DesiredState": "stopped"}
+        },
+        {
+            "name": "describe",
+            "action": "aws:executeAwsApi",
+            "inputs": {"Service": "ec2", "Api": "DescribeInstances", "InstanceIds": ["{{InstanceId}}"]},
+            "outputs": [{"Name": "State", "Selector": "$.Reservations[0].Instances[0].State.Name", "Type": "String"}]
+        },
+        {
+            "name": "choose",
+            "action": "aws:branch",
+            "inputs": {
+                "Choices": [{"NextStep": "deleteStack", "Variable": "{{describe.State}}", "StringEquals": "stopped"}],
+                "Default": "deleteStack"
+            }
+        },
+        {
+            "name": "deleteStack",
+            "action": "aws:deleteStack",
+            "inputs": {"StackName": "stack-{{automation:EXECUTION_ID}}"}
+        }
+    ],
+    "outputs": ["createStack.StackId", "describe.State"]
+}
+
+
+def messages(document):
+    return [message for _, message in document_validator.validate_document(document)]
+
+
+class DocumentValidatorTest(unittest.TestCase):
+    def setUp(self):
+        self.document = copy.deepcopy(DOCUMENT)
+
+    def step(self, name):
+        return [step for step in self.document['mainSteps'] if step['name'] == name][0]
+
+    def test_valid_document(self):
+        self.assertEqual(document_validator.validate_document(self.document), [])
+
+    def test_document_shape(self):
+        self.document['schemaVersion'] = '0.2'
+        self.assertEqual(messages(self.document), ['unsupported schemaVersion "0.2"'])
+        self.document['schemaVersion'] = '0.3'
+        self.document['mainStep'] = []
+        self.step('createStack')['maxAttempts'] = 0
+        self.assertEqual(sorted(document_validator.validate_document(self.document)), [
+            ('mainStep', 'unexpected property'),
+            ('mainSteps[0].maxAttempts', '0 is less than 1')])
+
+    def test_action_inputs(self):
+        self.step('createStack')['inputs']['TimeoutInMinutes'] = '10'
+        self.step('createStack')['inputs']['Capabilities'] = ['CAPABILITY_ALL']
+        self.step('stopInstance')['inputs']['DesiredState'] = 'paused'
+        del self.step('deleteStack')['inputs']['StackName']
+        self.step('describe')['action'] = 'aws:describeInstances'
+        self.assertEqual(sorted(document_validator.validate_document(self.document)), [
+            ('mainSteps[0].inputs.Capabilities[0]',
+             '"CAPABILITY_ALL" is not one of CAPABILITY_IAM, CAPABILITY_NAMED_IAM, CAPABILITY_AUTO_EXPAND'),
+            ('mainSteps[0].inputs.TimeoutInMinutes', 'expected integer, got "10"'),
+            ('mainSteps[1].inputs.DesiredState', '"paused" is not one of running, stopped, terminated'),
+            ('mainSteps[2].action', 'unknown Automation action "aws:describeInstances"'),
+            ('mainSteps[4].inputs', 'missing required property StackName')])
+
+    def test_whole_references_replace_any_type(self):
+        self.step('stopInstance')['inputs']['Force'] = '{{InstanceId}}'
+        self.assertEqual(messages(self.document), [])
+        self.step('stopInstance')['inputs']['Force'] = 'yes {{InstanceId}}'
+        self.assertEqual(messages(self.document), ['expected boolean, got "yes {{InstanceId}}"'])
+
+    def test_step_targets(self):
+        self.step('createStack')['nextStep'] = 'stopInstanse'
+        self.step('createStack')['onFailure'] = 'step:deleteStacks'
+        self.step('choose')['inputs']['Default'] = 'end'
+        self.step('deleteStack')['name'] = 'describe'
+        self.assertEqual(sorted(document_validator.validate_document(self.document)), [
+            ('mainSteps[0].nextStep', 'unknown step "stopInstanse"'),
+            ('mainSteps[0].onFailure', 'unknown step "deleteStacks"'),
+            ('mainSteps[3].inputs.Choices[0].NextStep', 'unknown step "deleteStack"'),
+            ('mainSteps[3].inputs.Default', 'unknown step "end"'),
+            ('mainSteps[4].name', 'duplicate step name describe')])
+
+    def test_references(self):
+        self.document['assumeRole'] = '{{ AssumeRole }}'
+        self.step('createStack')['inputs']['StackName'] = '{{automation:EXECUTION}}-{{global:REGION}}'
+        self.step('describe')['inputs']['Filters'] = [{'Values': ['{{ createStack.StackStatus }}', '{{ssm:/a/b}}']}]
+        self.step('choose')['inputs']['Choices'][0]['Variable'] = '{{describe.Status}}'
+        self.document['outputs'].append('stopInstance.State')
+        self.assertEqual(document_validator.validate_document(self.document), [
+            ('assumeRole', 'unresolved reference {{AssumeRole}}'),
+            ('mainSteps[0].inputs.StackName', 'unresolved reference {{automation:EXECUTION}}'),
+            ('mainSteps[3].inputs.Choices[0].Variable', 'unresolved reference {{describe.Status}}'),
+            ('outputs[2]', 'unknown step output stopInstance.State')])
+
+    def test_selectors(self):
+        self.step('describe')['outputs'].append({'Name': 'Ids', 'Selector': '$.Reservations[*].Instances[x]',
+                                                 'Type': 'StringList'})
+        self.assertEqual(document_validator.validate_document(self.document), [
+            ('mainSteps[2].outputs[1].Selector',
+             'Invalid selector $.Reservations[*].Instances[x]: unexpected "[x]" at position 27')])
+
+    def test_command_document(self):
+        document = {
+            "schemaVersion": "2.2",
+            "parameters": {"Message": {"type": "String"}},
+            "mainSteps": [{
+                "action": "aws:runShellScript",
+                "name": "echo",
+                "precondition": {"StringEquals": ["platformType", "Linux"]},
+                "inputs": {"runCommand": ["echo {{ Message }}", "echo {{ echo.Output }}"]}
+            }]
+        }
+        self.assertEqual(document_validator.validate_document(document), [
+            ('mainSteps[0].inputs.runCommand[1]', 'unresolved reference {{echo.Output}}')])
+        document['mainSteps'][0]['action'] = 'aws:createStack'
+        self.assertIn('unknown Command action "aws:createStack"', messages(document))
+
+
+class DocumentFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'Project', 'Documents'))
+        os.makedirs(os.path.join(self.root, 'Project', 'Output'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, relative_path, content):
+        path = os.path.join(self.root, relative_path)
+        with open(path, 'w') as fp:
+            fp.write(content if isinstance(content, str) else json.dumps(content))
+        return path
+
+    def test_find_and_validate_files(self):
+        valid = self.write('Project/Documents/aws-Valid.yml', 'schemaVersion: "0.3"\nmainSteps:\n'
+                                                             '- {name: wait, action: "aws:sleep", '
+                                                             'inputs: {Duration: PT1M}}\n')
+        fragment = self.write('Project/Documents/aws-Fragment.json', {"parameters": {}})
+        output = self.write('Project/Output/aws-Output.json', dict(DOCUMENT, mainSteps=[]))
+        broken = self.write('Project/Output/aws-Broken.json', '{"schemaVersion": ')
+        self.write('Project/Output/.build-cache.json', {})
+        self.write('Project/Documents/notes.json', {})
+
+        paths = document_validator.find_documents(self.root)
+        self.assertEqual(paths, [fragment, valid, broken, output])
+
+        for jobs in (1, 2):
+            results = dict(document_validator.validate_files(paths, jobs=jobs))
+            self.assertEqual(results[valid], [])
+            self.assertIsNone(results[fragment])
+            self.assertEqual([(p.location, p.message) for p in results[output]],
+                             [('mainSteps', 'expected at least 1 items'),
+                              ('outputs[0]', 'unknown step output createStack.StackId'),
+                              ('outputs[1]', 'unknown step output describe.State')])
+            self.assertEqual(len(results[broken]), 1)
+            self.assertIn('unable to parse document', results[broken][0].message)
+
+    def test_repository_documents(self):
+        results = document_validator.validate_files(document_validator.find_documents(), jobs=1)
+        self.assertTrue(results)
+        for path, problems in results:
+            self.assertFalse(problems, "{}: {}".format(path, problems))
@@ -0,0 +1,136 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(ANALYSIS_DIR)
+import document_validator  # noqa pylint: disable=import-error,wrong-import-position
+import duration_analyzer  # noqa pylint: disable=import-error,wrong-import-position
+
+NESTED = {
+    "schemaVersion": "0.3",
+    "mainSteps": [
+        {"name": "wait", "action": "aws:sleep", "inputs": {"Duration": "PT10M"}},
+        {"name": "stop", "action": "aws:changeInstanceState", "timeoutSeconds": 300,
+         "inputs": {"InstanceIds": ["i-1"], "DesiredState": "stopped"}}
+    ]
+}
+
+DOCUMENT = {
+    "schemaVersion": "0.3",
+    "parameters": {"WaitForReboot": {"type": "String", "default": "PT5M"}},
+    "mainSteps": [
+        {"name": "choose", "action": "aws:branch",
+         "inputs": {"Choices": [{"NextStep": "nested", "Variable": "a", "StringEquals": "a"}], "Default": "reboot"}},
+        {"name": "nested", "action": "aws:executeAutomation", "timeoutSeconds": 900, "maxAttempts": 2,
+         "onFailure": "step:cleanup", "nextStep": "done", "inputs": {"DocumentName": "AWS-Nested"}},
+        {"name": "reboot", "action": "aws:sleep", "inputs": {"Duration": "{{ WaitForReboot }}"}, "nextStep": "done"},
+        {"name": "cleanup", "action": "aws:invokeLambdaFunction", "inputs": {"FunctionName": "f"}},
+        {"name": "done", "action": "aws:executeAwsApi", "isEnd": True,
+         "inputs": {"Service": "ec2", "Api": "DescribeInstances"}}
+    ]
+}
+
+
+class DurationTest(unittest.TestCase):
+    def test_parse_duration(self):
+        self.assertEqual(duration_analyzer.parse_duration('PT5M'), 300)
+        self.assertEqual(duration_analyzer.parse_duration('P1DT1H1M1S'), 90061)
+        self.assertIsNone(duration_analyzer.parse_duration('PT'))
+        self.assertIsNone(duration_analyzer.parse_duration('5 minutes'))
+        self.assertIsNone(duration_analyzer.parse_duration(None))
+
+    def test_format_duration(self):
+        self.assertEqual(duration_analyzer.format_duration(0), '0s')
+        self.assertEqual(duration_analyzer.format_duration(59.6), '1m00s')
+        self.assertEqual(duration_analyzer.format_duration(3601), '1h00m01s')
+        self.assertEqual(duration_analyzer.format_duration(7 * 86400 + 120), '7d00h02m00s')
+
+    def test_nested_document_key(self):
+        self.assertEqual(duration_analyzer.nested_document_key('AWS-CreateSnapshot'), 'createsnapshot')
+        self.assertEqual(duration_analyzer.nested_document_key('/a/Output/aws-CreateSnapshot.json'), 'createsnapshot')
+
+
+class DurationAnalyzerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.nested_path = os.path.join(self.root, 'aws-Nested.json')
+        self.path = os.path.join(self.root, 'aws-Document.json')
+        for path, document in ((self.nested_path, NESTED), (self.path, DOCUMENT)):
+            with open(path, 'w') as fp:
+                json.dump(document, fp)
+        self.analyzer = duration_analyzer.DurationAnalyzer([self.nested_path, self.path])
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_step_timing(self):
+        timing = self.analyzer.step_timing
+        self.assertEqual(timing({"action": "aws:executeAwsApi", "timeoutSeconds": 60, "maxAttempts": 3}, {}),
+                         (1, 1, 180, True))
+        self.assertEqual(timing({"action": "aws:executeAwsApi"}, {}),
+                         (1, 1, duration_analyzer.ASSUMED_TIMEOUT, False))
+        self.assertEqual(timing({"action": "aws:invokeLambdaFunction"}, {}), (1, 5, 900, True))
+        self.assertEqual(timing({"action": "aws:createStack", "inputs": {"TimeoutInMinutes": 20}}, {}),
+                         (30, 120, 1200, True))
+        self.assertEqual(timing({"action": "aws:sleep", "inputs": {"Duration": "{{Wait}}"}},
+                                {"Wait": {"default": "PT2M"}}), (120, 120, 120, True))
+
+    def test_nested_document(self):
+        nested = self.analyzer.analyze_file(self.nested_path)
+        self.assertEqual((nested.best, nested.expected, nested.worst), (615, 660, 900))
+        self.assertEqual(self.analyzer.step_timing(DOCUMENT['mainSteps'][1], {}), (615, 660, 1800, True))
+
+    def test_document(self):
+        estimate = self.analyzer.analyze_file(self.path)
+        # best: choose -> reboot (300s) -> done (1s)
+        self.assertEqual(estimate.best, 301)
+        # expected: the average of the nested (660s) and reboot (300s) branches, then done.
+        self.assertEqual(estimate.expected, 481)
+        # worst: the nested document fails after both attempts and cleanup runs to its Lambda timeout.
+        self.assertEqual(estimate.worst, 1800 + 900 + 3600)
+        self.assertEqual(estimate.critical_path, [('choose', 0, None), ('nested', 1800, 'branch'),
+                                                  ('cleanup', 900, 'onFailure'), ('done', 3600, 'next')])
+        self.assertEqual(estimate.unbounded, ['done'])
+        self.assertEqual(estimate.loops, [])
+        lines = duration_analyzer.format_estimate(estimate)
+        self.assertEqual(lines[0], '  best 5m01s, expected 8m01s, worst 1h45m00s')
+        self.assertIn('[onFailure] cleanup (15m00s)', lines[1])
+
+    def test_loops_are_followed_once(self):
+        document = {"schemaVersion": "0.3", "mainSteps": [
+            {"name": "wait", "action": "aws:sleep", "inputs": {"Duration": "PT1M"}},
+            {"name": "check", "action": "aws:branch",
+             "inputs": {"Choices": [{"NextStep": "wait", "Variable": "a", "StringEquals": "b"}], "Default": "end"}},
+            {"name": "end", "action": "aws:sleep", "inputs": {"Duration": "PT2M"}}]}
+        estimate = self.analyzer.analyze(document)
+        self.assertEqual((estimate.best, estimate.worst), (180, 180))
+        self.assertEqual(estimate.loops, [('check', 'wait')])
+
+    def test_repository_documents(self):
+        analyzer = duration_analyzer.DurationAnalyzer()
+        for path in document_validator.find_documents():
+            estimate = analyzer.analyze_file(path)
+            if estimate is not None:
+                self.assertLessEqual(estimate.best, estimate.expected, path)
+                self.assertLessEqual(estimate.expected, estimate.worst, path)
@@ -0,0 +1,88 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import json
+import os
+import sys
+import unittest
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(ANALYSIS_DIR)
+import interpolation  # noqa pylint: disable=import-error,wrong-import-position
+
+DOCUMENT = {
+    "schemaVersion": "0.3",
+    "assumeRole": "{{ AutomationAssumeRole }}",
+    "parameters": {
+        "InstanceId": {"type": "String", "default": "{{TARGET_ID}}"},
+        "Commands": {"type": "StringList"},
+        "AutomationAssumeRole": {"type": "String", "default": ""},
+        "Unused": {"type": "String", "default": "x"}
+    },
+    "mainSteps": [
+        {"name": "describe", "action": "aws:executeAwsApi",
+         "inputs": {"Service": "ec2", "Api": "DescribeInstances", "InstanceIds": ["{{InstanceId}}"]},
+         "outputs": [{"Name": "State", "Selector": "$.Reservations[0].Instances[0].State.Name", "Type": "String"}]},
+        {"name": "invoke", "action": "aws:invokeLambdaFunction",
+         "inputs": {"FunctionName": "f-{{automation:EXECUTION_ID}}",
+                    "Payload": "{\"InstanceId\": \"{{InstanceId}}\", \"State\": \"{{ describe.State }}\"}"}},
+        {"name": "run", "action": "aws:runCommand",
+         "inputs": {"DocumentName": "AWS-RunPowerShellScript", "InstanceIds": ["{{InstanceId}}"],
+                    "Parameters": {"commands": "{{Commands}}"}}}
+    ]
+}
+
+
+class TemplateTest(unittest.TestCase):
+    def test_strings(self):
+        self.assertEqual(interpolation.compile_template('{{ A }}').fill({'A': [1, 2]}), [1, 2])
+        self.assertEqual(interpolation.compile_template('a-{{A}}-{{ B }}').fill({'A': True, 'B': {'c': 1}}),
+                         'a-true-{"c": 1}')
+        self.assertEqual(interpolation.compile_template('a-{{A}}-{{ B }}').fill({'A': 1}), 'a-1-{{ B }}')
+        self.assertEqual(interpolation.compile_template('{{ B }}').fill({}), '{{ B }}')
+        self.assertEqual(interpolation.compile_template(5).fill({}), 5)
+
+    def test_resolve(self):
+        def resolve(name):
+            if name == 'missing':
+                raise KeyError(name)
+            return name.upper()
+        template = interpolation.compile_template({'a': ['{{x}}', '{{y}}-{{z}}'], 'b': 'b'})
+        self.assertEqual(template.fill({'x': 1}, resolve), {'a': [1, 'Y-Z'], 'b': 'b'})
+        self.assertEqual(sorted(template.references), ['x', 'y', 'z'])
+        self.assertRaises(KeyError, interpolation.compile_template(['{{missing}}']).fill, {}, resolve)
+
+    def test_document(self):
+        template = interpolation.DocumentTemplate(DOCUMENT)
+        values = {'InstanceId': 'i-1', 'Commands': ['Write-Host 1', 'Write-Host 2'], 'AutomationAssumeRole': 'arn'}
+        filled = template.fill(values)
+        self.assertEqual(filled['assumeRole'], 'arn')
+        self.assertEqual(filled['mainSteps'][0]['inputs']['InstanceIds'], ['i-1'])
+        self.assertEqual(json.loads(filled['mainSteps'][1]['inputs']['Payload']),
+                         {'InstanceId': 'i-1', 'State': '{{ describe.State }}'})
+        self.assertEqual(filled['mainSteps'][1]['inputs']['FunctionName'], 'f-{{automation:EXECUTION_ID}}')
+        self.assertEqual(filled['mainSteps'][2]['inputs']['Parameters']['commands'], values['Commands'])
+        # the parts without references are shared, and the source is left unchanged
+        self.assertIs(filled['mainSteps'][0]['outputs'], DOCUMENT['mainSteps'][0]['outputs'])
+        self.assertEqual(DOCUMENT['mainSteps'][0]['inputs']['InstanceIds'], ['{{InstanceId}}'])
+        filled['mainSteps'][2]['inputs']['Parameters']['commands'].append('exit')
+        self.assertEqual(len(values['Commands']), 2)
+
+    def test_report(self):
+        template = interpolation.DocumentTemplate(DOCUMENT)
+        self.assertEqual(template.report(), (['Commands', 'TARGET_ID'], ['Unused']))
+        self.assertEqual(template.report({'Commands': [], 'TARGET_ID': 'i-1', 'Extra': 1}), ([], ['Extra', 'Unused']))
@@ -0,0 +1,124 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import os
+import random
+import sys
+import unittest
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(ANALYSIS_DIR)
+import document_validator  # noqa pylint: disable=import-error,wrong-import-position
+import rollout_simulator  # noqa pylint: disable=import-error,wrong-import-position
+
+DOCUMENT = {
+    "schemaVersion": "0.3",
+    "parameters": {"WaitForReboot": {"type": "String", "default": "PT5M"}},
+    "mainSteps": [
+        {"name": "enter", "action": "aws:runCommand", "timeoutSeconds": 60,
+         "inputs": {"DocumentName": "AWS-RunPowerShellScript", "Parameters": {"commands": ["Enter-ASStandby"]}}},
+        {"name": "reboot", "action": "aws:sleep", "inputs": {"Duration": "{{ WaitForReboot }}"}},
+        {"name": "exit", "action": "aws:runCommand", "timeoutSeconds": 60,
+         "inputs": {"DocumentName": "AWS-RunPowerShellScript", "Parameters": {"commands": ["Exit-ASStandby"]}}},
+        {"name": "wait", "action": "aws:sleep", "inputs": {"Duration": "PT1M"}}
+    ]
+}
+
+
+class LimitTest(unittest.TestCase):
+    def test_parse_limit(self):
+        self.assertEqual(rollout_simulator.parse_limit('10', 50), 10)
+        self.assertEqual(rollout_simulator.parse_limit('25%', 10), 2)
+        self.assertEqual(rollout_simulator.parse_limit('30%', 10), 3)
+        self.assertEqual(rollout_simulator.parse_limit('5%', 10), 0)
+        self.assertEqual(rollout_simulator.parse_limit('5%', 10, minimum=1), 1)
+        for value in ('-1', '101%', 'ten'):
+            with self.assertRaises(ValueError):
+                rollout_simulator.parse_limit(value, 10)
+
+    def test_percentile(self):
+        self.assertEqual(rollout_simulator.percentile([3, 1, 2, 4], 0.5), 2)
+        self.assertEqual(rollout_simulator.percentile([3, 1, 2, 4], 0.9), 4)
+        self.assertEqual(rollout_simulator.percentile([], 0.5), 0)
+
+
+class RolloutSimulatorTest(unittest.TestCase):
+    def test_standby_steps(self):
+        self.assertEqual(rollout_simulator.standby_steps(DOCUMENT['mainSteps']), ('enter', 'exit'))
+        self.assertEqual(rollout_simulator.standby_steps(DOCUMENT['mainSteps'][1:]), (None, None))
+
+    def test_target(self):
+        simulator = rollout_simulator.RolloutSimulator(DOCUMENT, parameters={'WaitForReboot': 'PT10M'})
+        run = simulator.run_target(random.Random(1))
+        self.assertFalse(run.failed)
+        start, end = run.out_of_service
+        # out of service during the reboot and until Exit-ASStandby returns
+        self.assertGreaterEqual(end - start, 600)
+        self.assertAlmostEqual(run.duration - end, 60)
+
+    def test_rollout(self):
+        simulator = rollout_simulator.RolloutSimulator(DOCUMENT)
+        rollout = simulator.simulate(10, '20%', 0)
+        self.assertEqual((rollout.concurrency, rollout.started, rollout.errors, rollout.stopped), (2, 10, 0, False))
+        # five waves of two targets taking a little over six minutes each
+        self.assertGreater(rollout.duration, 5 * 360)
+        self.assertLess(rollout.duration, 5 * 480)
+        self.assertEqual(rollout.peak_out_of_service, 2)
+        self.assertEqual(rollout.left_out_of_service, 0)
+
+    def test_max_errors_stops_the_rollout(self):
+        simulator = rollout_simulator.RolloutSimulator(DOCUMENT, failure_rate=1.0)
+        rollout = simulator.simulate(10, 2, 1)
+        # the first failure frees a slot for a third target; the second failure exceeds MaxErrors
+        self.assertEqual((rollout.started, rollout.errors, rollout.stopped), (3, 3, True))
+        # nothing enters Standby when Enter-ASStandby fails
+        self.assertEqual(rollout.peak_out_of_service, 0)
+
+    def test_failed_executions_stay_in_standby(self):
+        document = dict(DOCUMENT, mainSteps=[dict(step) for step in DOCUMENT['mainSteps']])
+        document['mainSteps'][0]['isCritical'] = False
+        document['mainSteps'][0]['onFailure'] = 'Continue'
+        simulator = rollout_simulator.RolloutSimulator(document, standby=('reboot', 'exit'), failure_rate=1.0)
+        rollout = simulator.simulate(4, 4, 4)
+        # the failure of enter is not critical; exit fails and aborts the executions after the reboot
+        self.assertEqual((rollout.errors, rollout.peak_out_of_service, rollout.left_out_of_service), (4, 4, 4))
+        with self.assertRaises(ValueError):
+            rollout_simulator.RolloutSimulator(document, standby=('reboot', 'missing'))
+
+    def test_summary(self):
+        simulator = rollout_simulator.RolloutSimulator(DOCUMENT, failure_rate=0.1)
+        summary = simulator.summarize(20, '25%', '10%', runs=20, seed=3)
+        self.assertEqual(summary, simulator.summarize(20, '25%', '10%', runs=20, seed=3))
+        self.assertLessEqual(summary.duration_p50, summary.duration_p90)
+        self.assertLessEqual(summary.duration_p90, summary.duration_max)
+        # at most five targets at a time, and the ones failed executions left in Standby
+        self.assertLessEqual(summary.peak_out_of_service, 5 + summary.left_out_of_service_max)
+        lines = rollout_simulator.format_summary(summary)
+        self.assertTrue(lines[0].startswith('  20 targets, 5 at a time, max errors 2: p50 '))
+
+    def test_repository_documents(self):
+        for path in document_validator.find_documents():
+            simulator = rollout_simulator.load_simulator(path, failure_rate=0.05)
+            if simulator is not None:
+                rollout = simulator.simulate(5, 2, 1)
+                self.assertLessEqual(rollout.errors, rollout.started, path)
+                if simulator.exit_standby is None:
+                    # a document without a step returning its targets to service leaves them out of service
+                    self.assertEqual(rollout.peak_out_of_service, rollout.left_out_of_service, path)
+                else:
+                    # two targets at a time, and the ones failed executions left out of service
+                    self.assertLessEqual(rollout.peak_out_of_service, 2 + rollout.left_out_of_service, path)
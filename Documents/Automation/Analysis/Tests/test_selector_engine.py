@@ -0,0 +1,84 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import os
+import sys
+import unittest
+from collections import OrderedDict
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(ANALYSIS_DIR)
+import benchmark_selectors  # noqa pylint: disable=import-error,wrong-import-position
+import selector_engine  # noqa pylint: disable=import-error,wrong-import-position
+
+DATA = {'A': [{'B': 1, 'C': {'D': True}}, {'B': 2}], 'E F': 'x', 'G': OrderedDict([('H', {'B': 3}), ('I', 4)])}
+
+
+class SelectorTest(unittest.TestCase):
+    def test_paths(self):
+        select = selector_engine.select
+        self.assertEqual(select(DATA, '$'), DATA)
+        self.assertEqual(select(DATA, '$.A[1].B'), 2)
+        self.assertEqual(select(DATA, '$.A[-2].C.D'), True)
+        self.assertEqual(select(DATA, "$['E F']"), 'x')
+        self.assertEqual(select(DATA, '$["G"].H.B'), 3)
+        for selector in ('$.A[2]', '$.A[-3]', '$.A.B', '$.E F', '$.G[0]', "$['E F'].length"):
+            self.assertRaises(selector_engine.SelectorError, select, DATA, selector)
+
+    def test_wildcards(self):
+        select = selector_engine.select
+        self.assertEqual(select(DATA, '$.A[*].B'), [1, 2])
+        self.assertEqual(select(DATA, '$.G.*'), [{'B': 3}, 4])
+        self.assertEqual(select(DATA, '$.A[*].C.D'), [True])
+        self.assertEqual(select(DATA, '$.X[*]'), [])
+        self.assertEqual(select(DATA, '$..B'), [1, 2, 3])
+        self.assertEqual(select(DATA, '$.G..*'), [{'B': 3}, 3, 4])
+
+    def test_invalid_selectors(self):
+        for selector in (None, 'A.B', '$.', '$.A[x]', '$..', '$[*' + ']' * 2, '$' + '[*]' * 16):
+            self.assertRaises(selector_engine.SelectorError, selector_engine.compile_selector, selector)
+
+    def test_compiled_once(self):
+        selector_engine.clear_cache()
+        compiled = selector_engine.compile_selector('$.A[0].B')
+        self.assertIs(selector_engine.compile_selector('$.A[0].B'), compiled)
+        self.assertFalse(compiled.multiple)
+        self.assertTrue(selector_engine.compile_selector('$.A[*].B').multiple)
+
+    def test_coerce(self):
+        coerce = selector_engine.coerce
+        self.assertEqual(coerce(True, 'String'), 'true')
+        self.assertEqual(coerce({'a': 1}, 'String'), '{"a": 1}')
+        self.assertEqual(coerce('i-1', 'StringList'), ['i-1'])
+        self.assertEqual(coerce([1, 'a'], 'StringList'), ['1', 'a'])
+        self.assertEqual(coerce('42', 'Integer'), 42)
+        self.assertEqual(coerce(8.0, 'Integer'), 8)
+        self.assertEqual(coerce('False', 'Boolean'), False)
+        self.assertEqual(coerce({'a': 1}, 'MapList'), [{'a': 1}])
+        self.assertEqual(coerce({'a': 1}, 'StringMap'), {'a': 1})
+        for value, output_type in ((True, 'Integer'), ('8.5', 'Integer'), ('yes', 'Boolean'), ([1], 'MapList'),
+                                   ('a', 'StringMap'), ('a', 'Map')):
+            self.assertRaises(selector_engine.SelectorError, coerce, value, output_type)
+        self.assertEqual(selector_engine.select(DATA, '$.A[*].B', 'StringList'), ['1', '2'])
+
+    def test_large_payloads(self):
+        payloads = {'ec2': benchmark_selectors.describe_instances(2000),
+                    'volumes': benchmark_selectors.describe_volumes(2000)}
+        for payload, selector in benchmark_selectors.SELECTORS:
+            self.assertEqual(selector_engine.select(payloads[payload], selector),
+                             benchmark_selectors.naive_select(payloads[payload], selector), selector)
+        self.assertEqual(len(selector_engine.select(payloads['ec2'], '$..VolumeId')), 2000)
@@ -0,0 +1,63 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Report the best-case, expected and worst-case duration of Automation documents.
+
+    python Analysis/analyze_durations.py                    # every Automation document
+    python Analysis/analyze_durations.py EncryptRootVolume  # the documents under the given paths
+    python Analysis/analyze_durations.py --sort             # longest worst case first
+
+For each document the critical path lists the steps of its worst case, with
+the worst-case duration of each step; "[onFailure]" marks a step reached after
+the previous one failed. Nested aws:executeAutomation documents found in the
+repository are included in the estimates, using the built Output documents.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+
+import document_validator
+import duration_analyzer
+import validate_documents
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='documents or directories to analyze (default: all documents)')
+    parser.add_argument('--sort', action='store_true', help='list the documents by decreasing worst case')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    paths = validate_documents.collect(args.paths) if args.paths else document_validator.find_documents()
+
+    analyzer = duration_analyzer.DurationAnalyzer()
+    estimates = [(path, analyzer.analyze_file(os.path.realpath(path))) for path in paths]
+    estimates = [(path, estimate) for path, estimate in estimates if estimate is not None]
+    if args.sort:
+        estimates.sort(key=lambda item: -item[1].worst)
+    for path, estimate in estimates:
+        print(os.path.relpath(path))
+        for line in duration_analyzer.format_estimate(estimate):
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
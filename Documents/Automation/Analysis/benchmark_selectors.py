@@ -0,0 +1,146 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Compare naive and compiled evaluation of Selectors on large API responses.
+
+    python Analysis/benchmark_selectors.py [--reservations N] [--volumes N] [--repeat N]
+
+The responses are DescribeInstances and DescribeVolumes payloads with
+thousands of reservations and volumes. Each Selector is evaluated by the
+regex walker the runtime used before selector_engine, which parses the
+Selector and builds a list of candidates at every step of every call, by
+compiling it on every call, and by the cached CompiledSelector. The best of
+N runs of 1000 evaluations is reported per evaluator, in milliseconds.
+"""
+from __future__ import print_function
+
+import argparse
+import re
+import sys
+import timeit
+
+import selector_engine
+
+NAIVE_PART = re.compile(r'\.([A-Za-z0-9_-]+)|\[(\d+)\]|\[\'([^\']*)\'\]|\[\*\]|\.\*')
+
+SELECTORS = [
+    ('ec2', '$.Reservations[0].Instances[0].Placement.AvailabilityZone'),
+    ('ec2', '$.Reservations[0].Instances[0].State.Name'),
+    ('ec2', '$.Reservations[*].Instances[*].InstanceId'),
+    ('ec2', '$.Reservations[*].Instances[*].BlockDeviceMappings[*].Ebs.VolumeId'),
+    ('volumes', '$.Volumes[0].Attachments[0].VolumeId'),
+    ('volumes', '$.Volumes[*].Attachments[*].InstanceId'),
+    ('volumes', '$.Volumes[*].VolumeType'),
+]
+
+
+def naive_select(data, selector):
+    """Evaluate a Selector by parsing it and keeping a list of candidates at each step."""
+    values = [data]
+    wildcard = False
+    position = 1
+    while position < len(selector):
+        match = NAIVE_PART.match(selector, position)
+        position = match.end()
+        name, index, quoted = match.group(1), match.group(2), match.group(3)
+        selected = []
+        for value in values:
+            if name is not None or quoted is not None:
+                key = name if name is not None else quoted
+                if isinstance(value, dict) and key in value:
+                    selected.append(value[key])
+            elif index is not None:
+                if isinstance(value, list) and int(index) < len(value):
+                    selected.append(value[int(index)])
+            else:
+                wildcard = True
+                selected.extend(value.values() if isinstance(value, dict) else value if isinstance(value, list) else [])
+        values = selected
+    return values if wildcard else values[0]
+
+
+def describe_instances(reservations):
+    return {'Reservations': [{
+        'ReservationId': 'r-{:017x}'.format(number),
+        'OwnerId': '123456789012',
+        'Instances': [{
+            'InstanceId': 'i-{:017x}'.format(number),
+            'InstanceType': 't2.micro',
+            'ImageId': 'ami-12345678',
+            'State': {'Code': 16, 'Name': 'running'},
+            'Placement': {'AvailabilityZone': 'us-east-1{}'.format('abcdef'[number % 6]), 'Tenancy': 'default'},
+            'RootDeviceName': '/dev/xvda',
+            'BlockDeviceMappings': [{'DeviceName': '/dev/xvda', 'Ebs': {
+                'VolumeId': 'vol-{:017x}'.format(number), 'Status': 'attached', 'DeleteOnTermination': True}}],
+            'Tags': [{'Key': 'Name', 'Value': 'instance-{}'.format(number)}],
+        }],
+    } for number in range(reservations)]}
+
+
+def describe_volumes(volumes):
+    return {'Volumes': [{
+        'VolumeId': 'vol-{:017x}'.format(number),
+        'Size': 8,
+        'VolumeType': 'gp2',
+        'State': 'in-use',
+        'AvailabilityZone': 'us-east-1a',
+        'Attachments': [{'VolumeId': 'vol-{:017x}'.format(number), 'InstanceId': 'i-{:017x}'.format(number),
+                         'Device': '/dev/xvda', 'State': 'attached', 'DeleteOnTermination': True}],
+    } for number in range(volumes)]}
+
+
+def best_time(function, repeat, number):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) * 1000
+
+
+def benchmark(payloads, repeat):
+    """Return [(payload name, selector, {evaluator: milliseconds per 1000 evaluations})]."""
+    results = []
+    for payload_name, selector in SELECTORS:
+        data = payloads[payload_name]
+        expected = naive_select(data, selector)
+        compiled = selector_engine.compile_selector(selector)
+        if compiled(data) != expected:
+            raise AssertionError('{} selects a different value when compiled'.format(selector))
+        # wildcard selectors visit the whole payload on every call; fewer calls keep the run short.
+        number = 50 if compiled.multiple else 1000
+        scale = 1000.0 / number
+        results.append((payload_name, selector, {
+            'naive': best_time(lambda: naive_select(data, selector), repeat, number) * scale,
+            'compile each': best_time(lambda: selector_engine.CompiledSelector(selector)(data), repeat,
+                                      number) * scale,
+            'cached': best_time(lambda: selector_engine.select(data, selector), repeat, number) * scale,
+        }))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reservations', type=int, default=5000, help='reservations of DescribeInstances')
+    parser.add_argument('--volumes', type=int, default=5000, help='volumes of DescribeVolumes')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per selector and evaluator (default: 5)')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    payloads = {'ec2': describe_instances(args.reservations), 'volumes': describe_volumes(args.volumes)}
+    columns = ['naive', 'compile each', 'cached']
+    print("{:<74}".format("selector (ms per 1000 evaluations)") + "".join("{:>14}".format(c) for c in columns))
+    for _, selector, times in benchmark(payloads, args.repeat):
+        print("{:<74}".format(selector[-74:]) + "".join("{:>14.3f}".format(times[c]) for c in columns))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,481 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Find redundant API calls in Automation documents and remove the ones that can be.
+
+Three patterns are reported:
+
+  * repeated-read: an aws:executeAwsApi step repeats a read call (Describe,
+    Get, List) that a step running before it on every path already made with
+    the same parameters. Its outputs can be read from the earlier response,
+    unless a step that may change the resource runs in between and the output
+    is not one of IMMUTABLE_FIELDS,
+  * echo-read: a read call identifies resources by the output of an earlier
+    step and only selects their identifiers back, like DescribeSnapshots on
+    {{createSnapshot.Output}} selecting $.Snapshots[0].SnapshotId. The earlier
+    output can be used instead, when it has the type of the selected value,
+  * polling-loop: an aws:branch loops back over a read call, and usually an
+    aws:sleep, until a property of the response has a value. A single
+    aws:waitForAwsResourceProperty step waits for it without a step execution
+    per poll, and notices the change without waiting for the sleep to end.
+
+overlapping-read findings are also reported for a read whose outputs are
+partly in the response of an earlier, different read (OVERLAPPING_READS).
+
+optimize returns a copy of the document where every rewritable finding is
+applied: the outputs of a removed step are declared on the step whose
+response holds them, or replaced by the echoed output, every reference is
+updated, and the steps going to a removed step go to the one after it. The
+report estimates, per execution, the API calls and seconds saved, using the
+expected step durations of duration_analyzer.
+"""
+from __future__ import print_function
+
+import copy
+import json
+import re
+from collections import namedtuple
+
+import document_validator
+import duration_analyzer
+import interpolation
+
+READ_PREFIXES = ('Describe', 'Get', 'List')
+READ_ACTIONS = ('aws:executeAwsApi', 'aws:assertAwsResourceProperty', 'aws:waitForAwsResourceProperty')
+# actions that never change a resource.
+PASSIVE_ACTIONS = ('aws:sleep', 'aws:branch', 'aws:approve', 'aws:pause')
+# inputs that are not parameters of the API call.
+STEP_INPUTS = ('Service', 'Api', 'PropertySelector', 'DesiredValues')
+# fields that stay the same for the life of a resource, so a read can be reused across changes.
+IMMUTABLE_FIELDS = frozenset([
+    'InstanceId', 'VolumeId', 'SnapshotId', 'ImageId', 'AvailabilityZone', 'RootDeviceName', 'RootDeviceType',
+    'VpcId', 'SubnetId', 'OwnerId', 'Architecture', 'Platform', 'Encrypted', 'KmsKeyId', 'CreateTime',
+    'StartTime', 'LaunchTime', 'Arn', 'DBInstanceIdentifier', 'StackId'])
+
+# (service, later read, filter or parameter naming the earlier read's resources, earlier read, its parameter,
+# fields of the later response that the earlier one also holds).
+Overlap = namedtuple('Overlap', ['service', 'api', 'link', 'earlier_api', 'earlier_link', 'fields'])
+OVERLAPPING_READS = [
+    Overlap('ec2', 'DescribeVolumes', 'attachment.instance-id', 'DescribeInstances', 'InstanceIds',
+            frozenset(['VolumeId', 'DeleteOnTermination', 'Device', 'AttachTime'])),
+]
+
+# kind is repeated-read, echo-read, polling-loop or overlapping-read; source is the step whose response or
+# output is reused; replacements maps the removed step's outputs to the references that replace them.
+Finding = namedtuple('Finding', ['kind', 'step', 'source', 'message', 'calls_saved', 'seconds_saved',
+                                 'rewritable', 'replacements'])
+Report = namedtuple('Report', ['findings', 'calls_saved', 'seconds_saved', 'document'])
+
+
+def is_read(step):
+    inputs = step.get('inputs')
+    return (step.get('action') in READ_ACTIONS and isinstance(inputs, dict) and
+            isinstance(inputs.get('Api'), document_validator.STRING_TYPES) and
+            inputs['Api'].startswith(READ_PREFIXES))
+
+
+def normalized(value):
+    """Return value with the spacing of its {{ }} references removed."""
+    if isinstance(value, document_validator.STRING_TYPES):
+        return interpolation.REFERENCE.sub(lambda match: '{{' + match.group(1) + '}}', value)
+    if isinstance(value, dict):
+        return dict((key, normalized(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [normalized(item) for item in value]
+    return value
+
+
+def call_key(step):
+    """Return the (service, API, parameters) of a read step, comparable between steps."""
+    inputs = step['inputs']
+    params = dict((key, value) for key, value in inputs.items() if key not in STEP_INPUTS)
+    return inputs['Service'].lower(), inputs['Api'], json.dumps(normalized(params), sort_keys=True)
+
+
+def last_field(selector):
+    """Return the last member name of a Selector, or None."""
+    names = re.findall(r"\.([A-Za-z0-9_:-]+)|\['([^']*)'\]", selector or '')
+    if not names:
+        return None
+    name, quoted = names[-1]
+    return name or quoted
+
+
+def whole_reference(value):
+    """Return (reference, True) for "{{x}}", (reference, False) for ["{{x}}"], or None."""
+    if isinstance(value, list) and len(value) == 1:
+        found = whole_reference(value[0])
+        return (found[0], False) if found and found[1] else None
+    if isinstance(value, document_validator.STRING_TYPES):
+        match = interpolation.WHOLE_REFERENCE.match(value)
+        if match is not None:
+            return match.group(1), True
+    return None
+
+
+class DocumentGraph(object):
+    """The steps of a document and the transitions between them."""
+
+    def __init__(self, document):
+        self.steps = [step for step in document.get('mainSteps') or [] if isinstance(step, dict)]
+        self.names = dict((step.get('name'), index) for index, step in reversed(list(enumerate(self.steps))))
+        self.edges = []
+        for index in range(len(self.steps)):
+            following = [target for target, _ in duration_analyzer.successors(self.steps, index, self.names)]
+            failed = duration_analyzer.failure_successor(self.steps, index, self.names)
+            if failed is not None:
+                following.append(failed[0])
+            self.edges.append(sorted(set(following)))
+        self.dominators = self._dominators()
+
+    def _dominators(self):
+        count = len(self.steps)
+        if not count:
+            return []
+        predecessors = [[] for _ in range(count)]
+        for index, following in enumerate(self.edges):
+            for target in following:
+                predecessors[target].append(index)
+        everything = set(range(count))
+        dominators = [set([0])] + [set(everything) for _ in range(count - 1)]
+        changed = True
+        while changed:
+            changed = False
+            for index in range(1, count):
+                incoming = [dominators[predecessor] for predecessor in predecessors[index]]
+                updated = set([index]) | (set.intersection(*incoming) if incoming else set())
+                if updated != dominators[index]:
+                    dominators[index] = updated
+                    changed = True
+        return dominators
+
+    def reachable(self, start, through=None):
+        """Return the indexes reachable from start, not walking past the through index."""
+        seen = set()
+        pending = list(self.edges[start])
+        while pending:
+            index = pending.pop()
+            if index in seen:
+                continue
+            seen.add(index)
+            if index != through:
+                pending.extend(self.edges[index])
+        return seen
+
+    def between(self, first, second):
+        """Return the indexes of the steps that can run after first and before second."""
+        after = self.reachable(first, through=second)
+        return set(index for index in after if index != second and second in self.reachable(index, through=second))
+
+    def following(self, index):
+        """Return the name of the step running after a step that succeeds, or None when it ends the execution."""
+        step = self.steps[index]
+        if step.get('isEnd') is True:
+            return None
+        if 'nextStep' in step:
+            return step['nextStep']
+        return self.steps[index + 1].get('name') if index + 1 < len(self.steps) else None
+
+
+class CallOptimizer(object):
+    """Find the redundant calls of Automation documents and write variants without them."""
+
+    def __init__(self, analyzer=None):
+        self.analyzer = analyzer or duration_analyzer.DurationAnalyzer()
+
+    def step_seconds(self, step, parameters):
+        return self.analyzer.step_timing(step, parameters).expected
+
+    def find(self, document):
+        """Return the Findings of a loaded Automation document, in step order."""
+        graph = DocumentGraph(document)
+        parameters = document.get('parameters') or {}
+        findings = []
+        for index, step in enumerate(graph.steps):
+            if not is_read(step):
+                continue
+            finding = (self._repeated_read(graph, index, parameters) or self._echo_read(graph, index, parameters) or
+                       self._overlapping_read(graph, index))
+            if finding is not None:
+                findings.append(finding)
+        findings.extend(self._polling_loops(graph, parameters))
+        order = dict((step.get('name'), index) for index, step in enumerate(graph.steps))
+        return sorted(findings, key=lambda finding: order.get(finding.step, 0))
+
+    def _repeated_read(self, graph, index, parameters):
+        step = graph.steps[index]
+        key = call_key(step)
+        for earlier in sorted(graph.dominators[index] - set([index])):
+            source = graph.steps[earlier]
+            if not is_read(source) or call_key(source) != key:
+                continue
+            changing = sorted(graph.steps[between].get('name') for between in graph.between(earlier, index)
+                              if not self._is_passive(graph.steps[between]))
+            stale = [output.get('Name') for output in step.get('outputs') or []
+                     if changing and last_field(output.get('Selector')) not in IMMUTABLE_FIELDS]
+            rewritable = (step.get('action') == 'aws:executeAwsApi' and source.get('action') == 'aws:executeAwsApi'
+                          and not stale and graph.following(index) is not None)
+            message = '{} {} repeats the call of {}'.format(key[0], key[1], source.get('name'))
+            if stale:
+                message += '; {} may have changed {} since'.format(', '.join(changing), ', '.join(stale))
+            elif not rewritable:
+                message += '; only the outputs of aws:executeAwsApi steps can be reused'
+            replacements = {}
+            if rewritable:
+                for output in step.get('outputs') or []:
+                    replacements[output.get('Name')] = (source.get('name'), output)
+            return Finding('repeated-read', step.get('name'), source.get('name'), message, 1,
+                           self.step_seconds(step, parameters), rewritable, replacements)
+        return None
+
+    @staticmethod
+    def _is_passive(step):
+        return step.get('action') in PASSIVE_ACTIONS or is_read(step)
+
+    def _echo_read(self, graph, index, parameters):
+        step = graph.steps[index]
+        outputs = step.get('outputs') or []
+        if step.get('action') != 'aws:executeAwsApi' or not outputs:
+            return None
+        for name, value in step['inputs'].items():
+            if name in STEP_INPUTS or not name.endswith('Ids'):
+                continue
+            found = whole_reference(value)
+            if found is None or '.' not in found[0] or ':' in found[0]:
+                continue
+            reference, is_list = found
+            identifier = name[:-1]
+            if any(last_field(output.get('Selector')) != identifier for output in outputs):
+                continue
+            # "{{x}}" passes a list, so only a StringList output can be replaced by it; ["{{x}}"] passes one value.
+            compatible = [output for output in outputs
+                          if (output.get('Type') == 'StringList') == is_list]
+            rewritable = len(compatible) == len(outputs) and graph.following(index) is not None
+            message = '{} {} selects back the {} it was given by {{{{{}}}}}'.format(
+                step['inputs']['Service'].lower(), step['inputs']['Api'], identifier, reference)
+            if not rewritable:
+                message += ', but {} is a {}'.format(reference, 'list' if is_list else 'single value')
+            replacements = dict((output.get('Name'), (None, reference)) for output in outputs) if rewritable else {}
+            return Finding('echo-read', step.get('name'), reference.split('.')[0], message, 1,
+                           self.step_seconds(step, parameters), rewritable, replacements)
+        return None
+
+    @staticmethod
+    def _overlapping_read(graph, index):
+        step = graph.steps[index]
+        inputs = step['inputs']
+        for overlap in OVERLAPPING_READS:
+            if inputs['Service'].lower() != overlap.service or inputs['Api'] != overlap.api:
+                continue
+            linked = [normalized(item.get('Values')) for item in inputs.get('Filters') or []
+                      if isinstance(item, dict) and item.get('Name') == overlap.link]
+            linked.extend([normalized(inputs[overlap.link])] if overlap.link in inputs else [])
+            for earlier in sorted(graph.dominators[index] - set([index]), reverse=True):
+                source = graph.steps[earlier]
+                if (not is_read(source) or source['inputs']['Service'].lower() != overlap.service or
+                        source['inputs']['Api'] != overlap.earlier_api or
+                        normalized(source['inputs'].get(overlap.earlier_link)) not in linked):
+                    continue
+                covered = [output.get('Name') for output in step.get('outputs') or []
+                           if last_field(output.get('Selector')) in overlap.fields]
+                if not covered:
+                    continue
+                return Finding('overlapping-read', step.get('name'), source.get('name'),
+                               '{} of {} {} are also in the {} response of {}'.format(
+                                   ', '.join(covered), overlap.service, overlap.api, overlap.earlier_api,
+                                   source.get('name')), 0, 0, False, {})
+        return None
+
+    def _polling_loops(self, graph, parameters):
+        findings = []
+        for index, step in enumerate(graph.steps):
+            if step.get('action') != 'aws:branch' or not isinstance(step.get('inputs'), dict):
+                continue
+            for target in sorted(set(graph.edges[index])):
+                if target > index or index not in graph.reachable(target, through=index):
+                    continue
+                loop = sorted(set([target, index]) | graph.between(target, index))
+                finding = self._polling_loop(graph, loop, index, target, parameters)
+                if finding is not None:
+                    findings.append(finding)
+        return findings
+
+    def _polling_loop(self, graph, loop, branch_index, start, parameters):
+        branch = graph.steps[branch_index]
+        reads = [index for index in loop if is_read(graph.steps[index])]
+        others = [index for index in loop if index not in reads and index != branch_index]
+        if len(reads) != 1 or any(graph.steps[index].get('action') != 'aws:sleep' for index in others):
+            return None
+        read = graph.steps[reads[0]]
+        start_name = graph.steps[start].get('name')
+        choices = branch['inputs'].get('Choices') or []
+        continuing = [choice for choice in choices if choice.get('NextStep') == start_name]
+        leaving = [choice for choice in choices if choice.get('NextStep') != start_name]
+        desired = [choice['StringEquals'] for choice in leaving if 'StringEquals' in choice]
+        exits = set(choice.get('NextStep') for choice in leaving)
+        if branch['inputs'].get('Default') != start_name:
+            exits.add(branch['inputs'].get('Default'))
+        variable = (whole_reference((continuing or leaving or [{}])[0].get('Variable')) or (None,))[0]
+        output = None
+        if variable and variable.partition('.')[0] == read.get('name'):
+            output = ([item for item in read.get('outputs') or [] if item.get('Name') == variable.partition('.')[2]]
+                      or [None])[0]
+        sleep = sum(self.step_seconds(graph.steps[index], parameters) for index in others)
+        inside = set(graph.steps[index].get('name') for index in loop)
+        outside = [step for step in graph.steps if step.get('name') not in inside]
+        used_outside = any('{{' + read.get('name') + '.' in json.dumps(normalized(step)) for step in outside)
+        rewritable = (output is not None and len(exits) == 1 and bool(desired) and len(desired) == len(leaving) and
+                      branch['inputs'].get('Default') == start_name and not used_outside and
+                      all(choice.get('Variable') == leaving[0].get('Variable') for choice in leaving))
+        message = 'steps {} poll {} {} until {} changes'.format(
+            ', '.join(graph.steps[index].get('name') for index in loop), read['inputs']['Service'].lower(),
+            read['inputs']['Api'], variable)
+        if rewritable:
+            message += '; one aws:waitForAwsResourceProperty step can wait for {}'.format(' or '.join(desired))
+        elif used_outside:
+            message += '; steps after the loop use the outputs of {}'.format(read.get('name'))
+        else:
+            message += '; the values it waits for are not all listed as StringEquals choices leaving the loop'
+        replacements = {}
+        if rewritable:
+            replacements = {'wait': (read, output.get('Selector'), desired, exits.pop(),
+                                     [graph.steps[index].get('name') for index in loop])}
+        # per poll: the step executions of the loop, and on average half a sleep before the change is noticed
+        return Finding('polling-loop', graph.steps[start].get('name'), read.get('name'), message, 0,
+                       sleep / 2.0, rewritable, replacements)
+
+    def optimize(self, document):
+        """Return the Report of a loaded Automation document, with its optimized copy or None."""
+        findings = self.find(document)
+        applied = [finding for finding in findings if finding.rewritable]
+        if not applied:
+            return Report(findings, 0, 0, None)
+        optimized = copy.deepcopy(document)
+        # old reference -> new one, for the findings reusing the outputs of a step removed before
+        rewritten = {}
+        for finding in applied:
+            if finding.kind == 'polling-loop':
+                _replace_loop(optimized, finding)
+            else:
+                _remove_read(optimized, finding, rewritten)
+        return Report(findings, sum(finding.calls_saved for finding in applied),
+                      sum(finding.seconds_saved for finding in applied), optimized)
+
+
+def _rewrite_references(document, mapping):
+    """Replace the references of mapping (old -> new) in the steps and the outputs of document."""
+    def rewrite(value):
+        if isinstance(value, document_validator.STRING_TYPES):
+            return interpolation.REFERENCE.sub(
+                lambda match: '{{' + mapping[match.group(1)] + '}}' if match.group(1) in mapping
+                else match.group(0), value)
+        if isinstance(value, dict):
+            for key in list(value):
+                value[key] = rewrite(value[key])
+        elif isinstance(value, list):
+            value[:] = [rewrite(item) for item in value]
+        return value
+    rewrite(document.get('mainSteps'))
+    if isinstance(document.get('outputs'), list):
+        document['outputs'] = [mapping.get(output, output) for output in document['outputs']]
+
+
+def _retarget(document, old, new, removed):
+    """Make the steps going to old go to new, and keep the steps before the removed ones flowing to them."""
+    steps = document['mainSteps']
+    for step in steps:
+        if step.get('nextStep') == old:
+            step['nextStep'] = new
+        if step.get('onFailure') == 'step:' + old:
+            step['onFailure'] = 'step:' + new
+        if step.get('action') == 'aws:branch':
+            inputs = step.get('inputs') or {}
+            for choice in inputs.get('Choices') or []:
+                if choice.get('NextStep') == old:
+                    choice['NextStep'] = new
+            if inputs.get('Default') == old:
+                inputs['Default'] = new
+    index = [step.get('name') for step in steps].index(old)
+    previous = steps[index - 1] if index else None
+    if (previous is not None and previous.get('name') not in removed and 'nextStep' not in previous and
+            previous.get('isEnd') is not True and previous.get('action') != 'aws:branch'):
+        following = index + 1
+        while following < len(steps) and steps[following].get('name') in removed:
+            following += 1
+        if following >= len(steps) or steps[following].get('name') != new:
+            previous['nextStep'] = new
+
+
+def _remove_read(document, finding, applied):
+    steps = document['mainSteps']
+    graph = DocumentGraph(document)
+    step = steps[graph.names[finding.step]]
+    mapping = {}
+    for name, (source_name, replacement) in finding.replacements.items():
+        if source_name is None:
+            mapping['{}.{}'.format(finding.step, name)] = applied.get(replacement, replacement)
+            continue
+        source = steps[graph.names[source_name]]
+        outputs = source.setdefault('outputs', [])
+        same = [output for output in outputs if output.get('Selector') == replacement.get('Selector') and
+                output.get('Type') == replacement.get('Type')]
+        if same:
+            new_name = same[0]['Name']
+        else:
+            new_name = replacement.get('Name')
+            taken = set(output.get('Name') for output in outputs)
+            if new_name in taken:
+                new_name = finding.step + new_name
+            outputs.append(dict(replacement, Name=new_name))
+        mapping['{}.{}'.format(finding.step, name)] = '{}.{}'.format(source_name, new_name)
+    _retarget(document, finding.step, graph.following(graph.names[finding.step]), set([finding.step]))
+    steps.remove(step)
+    _rewrite_references(document, mapping)
+    applied.update(mapping)
+
+
+def _replace_loop(document, finding):
+    read, selector, desired, exit_step, loop_names = finding.replacements['wait']
+    inputs = dict((key, value) for key, value in read['inputs'].items()
+                  if key not in ('PropertySelector', 'DesiredValues'))
+    inputs.update(PropertySelector=selector, DesiredValues=list(desired))
+    wait = dict((key, value) for key, value in read.items() if key not in ('name', 'action', 'inputs', 'outputs',
+                                                                           'isEnd', 'nextStep'))
+    wait.update(name=finding.step, action='aws:waitForAwsResourceProperty', inputs=inputs, nextStep=exit_step)
+    steps = document['mainSteps']
+    first = min(index for index, step in enumerate(steps) if step.get('name') in loop_names)
+    document['mainSteps'] = steps[:first] + [wait] + [step for step in steps[first:]
+                                                      if step.get('name') not in loop_names]
+
+
+def format_report(report):
+    """Return the lines describing a Report."""
+    lines = []
+    for finding in report.findings:
+        lines.append('  {} {}: {}{}'.format(finding.kind, finding.step, finding.message,
+                                            '' if finding.rewritable else ' (reported only)'))
+    if report.document is not None:
+        lines.append('  optimized: {} API calls and {} saved per execution'.format(
+            report.calls_saved, duration_analyzer.format_duration(report.seconds_saved)))
+    return lines
+
+
+def load_report(path, optimizer=None):
+    """Return the Report of the document at path, or None if it is not an Automation document."""
+    document = document_validator.load_document(path)
+    if not isinstance(document, dict) or document.get('schemaVersion') != '0.3':
+        return None
+    return (optimizer or CallOptimizer()).optimize(document)
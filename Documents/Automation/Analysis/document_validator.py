@@ -0,0 +1,447 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Offline validation of SSM documents.
+
+Every document is checked against the schema of its schemaVersion, found in
+SCHEMA_DIR: the shape of the document, its parameters and steps, and the inputs
+of each step's action. The schemas use a subset of JSON Schema (type, enum,
+pattern, required, properties, additionalProperties, items, minItems, maxItems,
+minimum and local $refs) and are compiled once per process into plain
+functions. A string made of a single {{ }} reference is accepted wherever a
+value of another type is expected, since it is only substituted at run time.
+
+The schema also lists the built-in outputs of every action and the variables
+of the automation: and global: namespaces, which are used to check that
+
+  * step names are unique,
+  * nextStep, onFailure/onCancel "step:" targets and aws:branch choices name
+    an existing step,
+  * every {{ }} reference names a parameter, a known variable or an output of
+    an existing step, and the document outputs name step outputs,
+  * output Selectors and PropertySelectors compile (see selector_engine).
+
+Files without a schemaVersion are fragments merged into a document by the
+build, and are skipped.
+"""
+from __future__ import print_function
+
+import json
+import multiprocessing
+import os
+import re
+from collections import OrderedDict, namedtuple
+
+import yaml
+
+import selector_engine
+
+ANALYSIS_DIR = os.path.dirname(os.path.realpath(__file__))
+AUTOMATION_DIR = os.path.dirname(ANALYSIS_DIR)
+DOCUMENTS_DIR = os.path.dirname(AUTOMATION_DIR)
+SCHEMA_DIR = os.path.join(ANALYSIS_DIR, 'schemas')
+
+DOCUMENT_EXTENSIONS = ('.json', '.yml', '.yaml')
+
+REFERENCE = re.compile(r'\{\{\s*([^{}\s]+)\s*\}\}')
+WHOLE_REFERENCE = re.compile(r'^\s*\{\{\s*[^{}\s]+\s*\}\}\s*$')
+
+try:
+    STRING_TYPES = (str, unicode)  # noqa pylint: disable=undefined-variable
+except NameError:
+    STRING_TYPES = (str,)
+
+Problem = namedtuple('Problem', ['path', 'location', 'message'])
+
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# schemaVersion -> Schema, compiled once per process.
+_SCHEMAS = {}
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+TYPE_CHECKS = {
+    'string': lambda value: isinstance(value, STRING_TYPES),
+    'integer': _is_integer,
+    'number': _is_number,
+    'boolean': lambda value: isinstance(value, bool),
+    'array': lambda value: isinstance(value, list),
+    'object': lambda value: isinstance(value, dict),
+}
+
+
+def is_reference(value):
+    """Return True if value is a string holding nothing but one {{ }} reference."""
+    return isinstance(value, STRING_TYPES) and WHOLE_REFERENCE.match(value) is not None
+
+
+def _child(location, key):
+    if isinstance(key, int):
+        return '{}[{}]'.format(location, key)
+    return '{}.{}'.format(location, key) if location else key
+
+
+class SchemaCompiler(object):
+    """Compile JSON Schema fragments into check(value, location, problems) functions."""
+
+    def __init__(self, definitions):
+        self._definitions = definitions
+        self._compiled = {}
+
+    def definition(self, name):
+        if name not in self._compiled:
+            # registered before compiling so that recursive definitions resolve.
+            self._compiled[name] = None
+            self._compiled[name] = self.compile(self._definitions[name])
+        return self._compiled[name]
+
+    def compile(self, schema):
+        if '$ref' in schema:
+            name = schema['$ref'].split('/')[-1]
+            if name not in self._definitions:
+                raise ValueError("Unknown schema definition {}".format(schema['$ref']))
+            self.definition(name)
+            compiled = self._compiled
+            return lambda value, location, problems: compiled[name](value, location, problems)
+
+        checks = []
+        types = schema.get('type')
+        if types is not None:
+            checks.append(self._type_check([types] if isinstance(types, STRING_TYPES) else types))
+        if 'enum' in schema:
+            checks.append(self._enum_check(schema['enum']))
+        if 'pattern' in schema:
+            checks.append(self._pattern_check(re.compile(schema['pattern'])))
+        if 'minimum' in schema:
+            checks.append(self._minimum_check(schema['minimum']))
+        if 'minItems' in schema or 'maxItems' in schema:
+            checks.append(self._length_check(schema.get('minItems'), schema.get('maxItems')))
+        if 'items' in schema:
+            checks.append(self._items_check(self.compile(schema['items'])))
+        if 'required' in schema or 'properties' in schema or 'additionalProperties' in schema:
+            checks.append(self._object_check(schema))
+
+        def check(value, location, problems):
+            for value_check in checks:
+                if value_check(value, location, problems) is False:
+                    return
+        return check
+
+    @staticmethod
+    def _type_check(types):
+        type_checks = [TYPE_CHECKS[name] for name in types]
+        message = "expected {}".format(" or ".join(types))
+
+        def check(value, location, problems):
+            if any(type_check(value) for type_check in type_checks):
+                return True
+            if 'string' not in types and is_reference(value):
+                # substituted at run time; nothing else can be checked.
+                return False
+            problems.append((location, "{}, got {}".format(message, json.dumps(value)[:60])))
+            return False
+        return check
+
+    @staticmethod
+    def _enum_check(values):
+        def check(value, location, problems):
+            if value not in values and not is_reference(value):
+                problems.append((location, "{} is not one of {}".format(json.dumps(value), ", ".join(values))))
+        return check
+
+    @staticmethod
+    def _pattern_check(pattern):
+        def check(value, location, problems):
+            if isinstance(value, STRING_TYPES) and not pattern.search(value) and not is_reference(value):
+                problems.append((location, "{} does not match {}".format(json.dumps(value), pattern.pattern)))
+        return check
+
+    @staticmethod
+    def _minimum_check(minimum):
+        def check(value, location, problems):
+            if _is_number(value) and value < minimum:
+                problems.append((location, "{} is less than {}".format(value, minimum)))
+        return check
+
+    @staticmethod
+    def _length_check(min_items, max_items):
+        def check(value, location, problems):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                problems.append((location, "expected at least {} items".format(min_items)))
+            if max_items is not None and len(value) > max_items:
+                problems.append((location, "expected at most {} items".format(max_items)))
+        return check
+
+    @staticmethod
+    def _items_check(item_check):
+        def check(value, location, problems):
+            if isinstance(value, list):
+                for index, item in enumerate(value):
+                    item_check(item, _child(location, index), problems)
+        return check
+
+    def _object_check(self, schema):
+        required = schema.get('required', [])
+        properties = dict((name, self.compile(sub_schema))
+                          for name, sub_schema in schema.get('properties', {}).items())
+        additional = schema.get('additionalProperties', True)
+        additional_check = self.compile(additional) if isinstance(additional, dict) else None
+
+        def check(value, location, problems):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    problems.append((location, "missing required property {}".format(name)))
+            for name, item in value.items():
+                if name in properties:
+                    properties[name](item, _child(location, name), problems)
+                elif additional_check is not None:
+                    additional_check(item, _child(location, name), problems)
+                elif additional is False:
+                    problems.append((_child(location, name), "unexpected property"))
+        return check
+
+
+class Schema(object):
+    """The compiled rules of one schemaVersion."""
+
+    def __init__(self, spec):
+        compiler = SchemaCompiler(spec.get('definitions', {}))
+        self.version = spec['schemaVersion']
+        self.document_type = spec['documentType']
+        self.check_document = compiler.compile(spec['document'])
+        self.check_inputs = dict((action, compiler.compile(rules['inputs']))
+                                 for action, rules in spec['actions'].items())
+        self.action_outputs = dict((action, set(rules.get('outputs', [])))
+                                   for action, rules in spec['actions'].items())
+        self.variables = dict((namespace, set(names)) for namespace, names in spec.get('variables', {}).items())
+        self.prefixes = set(spec.get('prefixes', []))
+        self.step_outputs = spec.get('stepOutputs', False)
+
+
+def schema_files():
+    return sorted(os.path.join(SCHEMA_DIR, name) for name in os.listdir(SCHEMA_DIR) if name.endswith('.json'))
+
+
+def load_schemas():
+    """Compile the schema of every schemaVersion, once per process."""
+    if not _SCHEMAS:
+        for path in schema_files():
+            with open(path) as fp:
+                spec = json.load(fp)
+            _SCHEMAS[spec['schemaVersion']] = Schema(spec)
+    return _SCHEMAS
+
+
+def load_document(path):
+    with open(path) as fp:
+        if path.endswith('.json'):
+            return json.load(fp, object_pairs_hook=OrderedDict)
+        return yaml.load(fp, Loader=_YAML_LOADER)
+
+
+def find_documents(root=DOCUMENTS_DIR):
+    """Return the documents under root: every aws-* document, every built Output
+    document and every Command document."""
+    paths = []
+    for directory, directories, files in os.walk(root):
+        directories[:] = sorted(d for d in directories if not d.startswith('.'))
+        in_output = os.path.basename(directory) == 'Output'
+        in_command = os.sep + 'Command' + os.sep in directory + os.sep
+        for name in sorted(files):
+            extension = os.path.splitext(name)[1]
+            if extension not in DOCUMENT_EXTENSIONS or name.startswith('.'):
+                continue
+            if name.startswith('aws-') or ((in_output or in_command) and extension == '.json'):
+                paths.append(os.path.join(directory, name))
+    return paths
+
+
+def _strings(value, location):
+    """Yield (location, string) for every string nested in value."""
+    if isinstance(value, STRING_TYPES):
+        yield location, value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            for found in _strings(item, _child(location, key)):
+                yield found
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            for found in _strings(item, _child(location, index)):
+                yield found
+
+
+def _branch_targets(inputs):
+    if not isinstance(inputs, dict):
+        return
+    for index, choice in enumerate(inputs.get('Choices') or []):
+        if isinstance(choice, dict) and 'NextStep' in choice:
+            yield 'inputs.Choices[{}].NextStep'.format(index), choice['NextStep']
+    if 'Default' in inputs:
+        yield 'inputs.Default', inputs['Default']
+
+
+class DocumentChecker(object):
+    """Check the references between the parts of one document."""
+
+    def __init__(self, schema, document, problems):
+        self.schema = schema
+        self.document = document
+        self.problems = problems
+        parameters = document.get('parameters')
+        self.parameters = set(parameters) if isinstance(parameters, dict) else set()
+        self.steps = OrderedDict()
+        self.outputs = {}
+
+    def run(self):
+        steps = self.document.get('mainSteps')
+        if not isinstance(steps, list):
+            return
+        for index, step in enumerate(steps):
+            if not isinstance(step, dict) or not isinstance(step.get('name'), STRING_TYPES):
+                continue
+            if step['name'] in self.steps:
+                self.problems.append(('mainSteps[{}].name'.format(index),
+                                      "duplicate step name {}".format(step['name'])))
+                continue
+            self.steps[step['name']] = step
+            declared = set(output.get('Name') for output in step.get('outputs') or [] if isinstance(output, dict))
+            self.outputs[step['name']] = declared | self.schema.action_outputs.get(step.get('action'), set())
+
+        if 'assumeRole' in self.document:
+            self.check_references(self.document['assumeRole'], 'assumeRole')
+        for index, step in enumerate(steps):
+            if isinstance(step, dict):
+                self.check_step(step, 'mainSteps[{}]'.format(index))
+        for index, output in enumerate(self.document.get('outputs') or []):
+            if isinstance(output, STRING_TYPES) and not self.is_step_output(output):
+                self.problems.append(('outputs[{}]'.format(index), "unknown step output {}".format(output)))
+
+    def check_step(self, step, location):
+        action = step.get('action')
+        if action not in self.schema.check_inputs:
+            self.problems.append((_child(location, 'action'), "unknown {} action {}".format(
+                self.schema.document_type, json.dumps(action))))
+        else:
+            self.schema.check_inputs[action](step.get('inputs', {}), _child(location, 'inputs'), self.problems)
+
+        targets = []
+        if 'nextStep' in step:
+            targets.append(('nextStep', step['nextStep']))
+        for key in ('onFailure', 'onCancel'):
+            value = step.get(key)
+            if isinstance(value, STRING_TYPES) and value.startswith('step:'):
+                targets.append((key, value[len('step:'):]))
+        if action == 'aws:branch':
+            targets.extend(_branch_targets(step.get('inputs')))
+        for key, target in targets:
+            if target not in self.steps and not is_reference(target):
+                self.problems.append((_child(location, key), "unknown step {}".format(json.dumps(target))))
+
+        self.check_selectors(step, location)
+        self.check_references(step.get('inputs'), _child(location, 'inputs'))
+
+    def check_selectors(self, step, location):
+        selectors = []
+        for index, output in enumerate(step.get('outputs') or []):
+            if isinstance(output, dict):
+                selectors.append(('outputs[{}].Selector'.format(index), output.get('Selector')))
+        inputs = step.get('inputs')
+        if isinstance(inputs, dict) and 'PropertySelector' in inputs:
+            selectors.append(('inputs.PropertySelector', inputs['PropertySelector']))
+        for key, selector in selectors:
+            if not isinstance(selector, STRING_TYPES) or is_reference(selector):
+                continue
+            try:
+                selector_engine.compile_selector(selector)
+            except selector_engine.SelectorError as e:
+                self.problems.append((_child(location, key), str(e)))
+
+    def check_references(self, value, location):
+        for string_location, string in _strings(value, location):
+            if '{{' not in string:
+                continue
+            for reference in REFERENCE.findall(string):
+                if not self.is_known(reference):
+                    self.problems.append((string_location, "unresolved reference {{{{{}}}}}".format(reference)))
+
+    def is_step_output(self, reference):
+        step, _, output = reference.partition('.')
+        return step in self.outputs and output in self.outputs[step]
+
+    def is_known(self, reference):
+        if reference in self.parameters:
+            return True
+        namespace, separator, name = reference.partition(':')
+        if separator:
+            if namespace in self.schema.prefixes:
+                return True
+            return name in self.schema.variables.get(namespace, ())
+        return self.schema.step_outputs and self.is_step_output(reference)
+
+
+def validate_document(document, schemas=None):
+    """Return the (location, message) problems of a loaded document."""
+    schemas = load_schemas() if schemas is None else schemas
+    if not isinstance(document, dict):
+        return [('', "expected a document object")]
+    version = document.get('schemaVersion')
+    if version not in schemas:
+        return [('schemaVersion', "unsupported schemaVersion {}".format(json.dumps(version)))]
+    schema = schemas[version]
+    problems = []
+    schema.check_document(document, '', problems)
+    DocumentChecker(schema, document, problems).run()
+    return problems
+
+
+def validate_file(path):
+    """Return (path, problems) for the document at path, with problems None for a fragment."""
+    try:
+        document = load_document(path)
+    except (ValueError, yaml.YAMLError) as e:
+        return path, [Problem(path, '', "unable to parse document: {}".format(e))]
+    if isinstance(document, dict) and 'schemaVersion' not in document:
+        return path, None
+    return path, [Problem(path, location, message) for location, message in validate_document(document)]
+
+
+def validate_files(paths, jobs=None):
+    """Validate the documents at paths, in parallel unless jobs is 1.
+
+    Returns [(path, problems)] in the order of paths.
+    """
+    # compiled before forking, so that the workers inherit the compiled schemas.
+    load_schemas()
+    if jobs == 1 or len(paths) < 2:
+        return [validate_file(path) for path in paths]
+    workers = jobs or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(validate_file, paths, chunksize=max(1, len(paths) // (4 * workers)))
+    finally:
+        pool.close()
+        pool.join()
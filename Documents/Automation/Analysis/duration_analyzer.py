@@ -0,0 +1,277 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Static estimate of how long an Automation document can run.
+
+Every step gets a best-case, expected and worst-case duration:
+
+  * aws:sleep steps take their Duration, resolved from the parameter default
+    when it is a {{ }} reference,
+  * aws:executeAutomation steps take the estimate of the nested document when
+    it is one of the repository's documents (AWS-Name is aws-Name.json),
+  * other steps take the best and expected durations of their action from
+    ACTION_ESTIMATES, and at worst run every one of their maxAttempts until
+    timeoutSeconds. A step without timeoutSeconds is assumed to be bounded by
+    its action's documented limit, or by ASSUMED_TIMEOUT, and is reported.
+
+The steps form a graph: a step goes on to its nextStep, to the following step
+or, for aws:branch, to any of its choices; isEnd ends the execution. A step
+whose onFailure is "step:X" can also go on to X after failing. The best case is
+the shortest successful path, the expected case averages the branches of the
+successful paths, and the worst case is the longest path, failure paths
+included, which is reported as the critical path. A step that loops back to a
+step being walked is reported and the loop is followed once.
+"""
+from __future__ import print_function
+
+import os
+import re
+from collections import namedtuple
+
+import document_validator
+
+# action -> (best, expected, worst) seconds of one attempt; a worst of None is
+# only bounded by the step's timeoutSeconds.
+ACTION_ESTIMATES = {
+    'aws:approve': (60, 3600, 7 * 24 * 3600),
+    'aws:assertAwsResourceProperty': (1, 1, None),
+    'aws:branch': (0, 0, 0),
+    'aws:changeInstanceState': (15, 60, None),
+    'aws:copyImage': (300, 900, None),
+    'aws:createImage': (120, 600, None),
+    'aws:createStack': (30, 120, None),
+    'aws:createTags': (1, 1, None),
+    'aws:deleteImage': (1, 5, None),
+    'aws:deleteStack': (30, 90, None),
+    'aws:executeAutomation': (30, 120, None),
+    'aws:executeAwsApi': (1, 1, None),
+    'aws:executeScript': (1, 5, 600),
+    'aws:invokeLambdaFunction': (1, 5, 900),
+    'aws:pause': (60, 3600, 7 * 24 * 3600),
+    'aws:runCommand': (10, 60, None),
+    'aws:runInstances': (30, 90, None),
+    'aws:waitForAwsResourceProperty': (10, 120, None),
+}
+UNKNOWN_ACTION = (1, 1, None)
+
+# worst case of one attempt of a step bounded by neither timeoutSeconds nor its action.
+ASSUMED_TIMEOUT = 3600
+
+ISO_DURATION = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+StepTiming = namedtuple('StepTiming', ['best', 'expected', 'worst', 'bounded'])
+# critical_path is a list of (step name, worst seconds, transition that reached the step or None).
+Estimate = namedtuple('Estimate', ['best', 'expected', 'worst', 'critical_path', 'unbounded', 'loops'])
+
+EMPTY_ESTIMATE = Estimate(0, 0, 0, [], [], [])
+
+
+def parse_duration(value):
+    """Return the seconds of an ISO 8601 duration like PT5M, or None."""
+    match = ISO_DURATION.match(value) if isinstance(value, document_validator.STRING_TYPES) else None
+    if match is None or value in ('P', 'PT') or value.endswith('T'):
+        return None
+    days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def format_duration(seconds):
+    """Return seconds as 1d02h03m04s, leaving out the leading zero units."""
+    seconds = int(round(seconds))
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    text = ''
+    for value, unit in ((days, 'd'), (hours, 'h'), (minutes, 'm')):
+        if text:
+            text += '{:02d}{}'.format(value, unit)
+        elif value:
+            text += '{}{}'.format(value, unit)
+    return text + ('{:02d}s'.format(seconds) if text else '{}s'.format(seconds))
+
+
+def nested_document_key(name):
+    """Return the key of a document name, AWS-CreateSnapshot or aws-CreateSnapshot.json alike."""
+    stem, extension = os.path.splitext(os.path.basename(name))
+    key = (stem if extension in document_validator.DOCUMENT_EXTENSIONS else os.path.basename(name)).lower()
+    return key[len('aws-'):] if key.startswith('aws-') else key
+
+
+def successors(steps, index, names):
+    """Return [(step index, transition)] of the steps that can follow steps[index]."""
+    step = steps[index]
+    following = []
+    if step.get('action') == 'aws:branch':
+        inputs = step.get('inputs') or {}
+        targets = [choice.get('NextStep') for choice in inputs.get('Choices') or []]
+        if 'Default' in inputs:
+            targets.append(inputs['Default'])
+        seen = set()
+        for target in targets:
+            if target in names and target not in seen:
+                seen.add(target)
+                following.append((names[target], 'branch'))
+    elif step.get('isEnd') is True:
+        pass
+    elif 'nextStep' in step:
+        if step['nextStep'] in names:
+            following.append((names[step['nextStep']], 'nextStep'))
+    elif index + 1 < len(steps):
+        following.append((index + 1, 'next'))
+    return following
+
+
+def failure_successor(steps, index, names):
+    on_failure = steps[index].get('onFailure')
+    if isinstance(on_failure, document_validator.STRING_TYPES) and on_failure.startswith('step:'):
+        target = on_failure[len('step:'):]
+        if target in names:
+            return names[target], 'onFailure'
+    return None
+
+
+class DurationAnalyzer(object):
+    """Estimate the durations of documents, following nested repository documents."""
+
+    def __init__(self, paths=None):
+        self._paths = {}
+        for path in document_validator.find_documents() if paths is None else paths:
+            key = nested_document_key(path)
+            # a built Output document is preferred to its source.
+            if key not in self._paths or os.path.basename(os.path.dirname(path)) == 'Output':
+                self._paths[key] = path
+        self._estimates = {}
+        self._analyzing = set()
+
+    def document_path(self, document_name):
+        return self._paths.get(nested_document_key(document_name))
+
+    def analyze_file(self, path):
+        """Return the Estimate of the document at path, or None if it is not an Automation document."""
+        if path not in self._estimates:
+            document = document_validator.load_document(path)
+            if not isinstance(document, dict) or document.get('schemaVersion') != '0.3':
+                self._estimates[path] = None
+            else:
+                self._analyzing.add(path)
+                try:
+                    self._estimates[path] = self.analyze(document)
+                finally:
+                    self._analyzing.discard(path)
+        return self._estimates[path]
+
+    def nested_estimate(self, step):
+        path = self.document_path((step.get('inputs') or {}).get('DocumentName') or '')
+        if path is None or path in self._analyzing:
+            return None
+        return self.analyze_file(path)
+
+    def step_timing(self, step, parameters):
+        """Return the StepTiming of one step."""
+        action = step.get('action')
+        attempts = step.get('maxAttempts') or 1
+        timeout = step.get('timeoutSeconds')
+        inputs = step.get('inputs') or {}
+
+        if action == 'aws:sleep':
+            duration = inputs.get('Duration')
+            if document_validator.is_reference(duration):
+                duration = (parameters.get(duration.strip()[2:-2].strip()) or {}).get('default')
+            seconds = parse_duration(duration)
+            if seconds is not None:
+                return StepTiming(seconds, seconds, seconds, True)
+
+        best, expected, worst = ACTION_ESTIMATES.get(action, UNKNOWN_ACTION)
+        if action == 'aws:executeAutomation':
+            nested = self.nested_estimate(step)
+            if nested is not None:
+                best, expected, worst = nested.best, nested.expected, nested.worst
+        if action == 'aws:createStack' and isinstance(inputs.get('TimeoutInMinutes'), int):
+            worst = inputs['TimeoutInMinutes'] * 60
+
+        bounded = timeout is not None or worst is not None
+        if timeout is not None:
+            worst = timeout if worst is None else min(worst, timeout)
+            best, expected = min(best, timeout), min(expected, timeout)
+        elif worst is None:
+            worst = ASSUMED_TIMEOUT
+        return StepTiming(best, expected, worst * attempts, bounded)
+
+    def analyze(self, document):
+        """Return the Estimate of a loaded Automation document."""
+        steps = [step for step in document.get('mainSteps') or [] if isinstance(step, dict)]
+        if not steps:
+            return EMPTY_ESTIMATE
+        names = dict((step.get('name'), index) for index, step in reversed(list(enumerate(steps))))
+        parameters = document.get('parameters') or {}
+        timings = [self.step_timing(step, parameters) for step in steps]
+        unbounded = [step.get('name') for step, timing in zip(steps, timings) if not timing.bounded]
+
+        loops = []
+        walking = set()
+        memo = {}
+
+        def walk(index):
+            # returns (best, expected, worst, worst path) of the executions starting at index
+            if index in memo:
+                return memo[index]
+            walking.add(index)
+            timing = timings[index]
+            success = []
+            failure = []
+            failed = failure_successor(steps, index, names)
+            for following, transition in successors(steps, index, names) + ([failed] if failed else []):
+                if following in walking:
+                    loops.append((steps[index].get('name'), steps[following].get('name')))
+                elif transition == 'onFailure':
+                    failure.append((following, transition))
+                else:
+                    success.append((following, transition))
+
+            results = [(walk(following), transition) for following, transition in success]
+            failures = [(walk(following), transition) for following, transition in failure]
+            best = timing.best + (min(result[0] for result, _ in results) if results else 0)
+            expected = timing.expected + (sum(result[1] for result, _ in results) / float(len(results))
+                                          if results else 0)
+            worst_path = []
+            worst = timing.worst
+            for (_, _, following_worst, path), transition in results + failures:
+                if timing.worst + following_worst > worst:
+                    worst = timing.worst + following_worst
+                    worst_path = [(path[0][0], path[0][1], transition)] + path[1:]
+            walking.discard(index)
+            memo[index] = (best, expected, worst, [(steps[index].get('name'), timing.worst, None)] + worst_path)
+            return memo[index]
+
+        best, expected, worst, critical_path = walk(0)
+        return Estimate(best, expected, worst, critical_path, unbounded, loops)
+
+
+def format_estimate(estimate):
+    """Return the lines describing an Estimate."""
+    lines = ["  best {}, expected {}, worst {}".format(
+        format_duration(estimate.best), format_duration(estimate.expected), format_duration(estimate.worst))]
+    path = []
+    for name, seconds, transition in estimate.critical_path:
+        step = "{} ({})".format(name, format_duration(seconds))
+        path.append(step if transition != 'onFailure' else "[onFailure] " + step)
+    lines.append("  critical path: " + " -> ".join(path))
+    if estimate.unbounded:
+        lines.append("  no timeoutSeconds, assumed {} per attempt: {}".format(
+            format_duration(ASSUMED_TIMEOUT), ", ".join(estimate.unbounded)))
+    for source, target in estimate.loops:
+        lines.append("  loop: {} -> {} is followed once".format(source, target))
+    return lines
@@ -0,0 +1,192 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Precompiled {{ }} interpolation of documents.
+
+A document references its parameters, the automation: and global: variables
+and step outputs with {{ }}, in inputs, in the JSON Payload strings of
+aws:invokeLambdaFunction steps and in the lines of aws:runCommand scripts.
+compile_template parses a value once into a Template that knows where its
+references are:
+
+  * a string that is a single reference, like "{{ InstanceIds }}", takes the
+    value of the reference, of any type,
+  * any other string is split into its literal text and its references, and
+    the text of each value is joined in place of its reference,
+  * a dict or list is shallow-copied with only its entries that hold a
+    reference filled; the parts without any are shared with the source.
+
+Filling a Template, for example once per target of a fleet, only visits the
+references and the containers holding them. A reference without a value is
+kept as written, so a document can be filled with its parameters and its
+step outputs left for run time. Filled values share the parts of the source
+without references and must be treated as read-only.
+"""
+from __future__ import print_function
+
+import copy
+import json
+import re
+from collections import namedtuple
+
+try:
+    STRING_TYPES = (str, unicode)  # noqa pylint: disable=undefined-variable
+except NameError:
+    STRING_TYPES = (str,)
+
+REFERENCE = re.compile(r'\{\{\s*([^{}\s]+)\s*\}\}')
+WHOLE_REFERENCE = re.compile(r'^\s*\{\{\s*([^{}\s]+)\s*\}\}\s*$')
+
+# unresolved: parameter references without a value or default; unused: parameters and values never referenced.
+Report = namedtuple('Report', ['unresolved', 'unused'])
+
+_KEEP = object()
+
+
+def text(value):
+    """Return the text substituted for a reference to value inside a longer string."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, STRING_TYPES):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _whole(source, name):
+    def fill(lookup):
+        value = lookup(name)
+        if value is _KEEP:
+            return source
+        return copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+    return fill
+
+
+def _joined(source, matches):
+    pieces = []
+    slots = []
+    position = 0
+    for match in matches:
+        pieces.append(source[position:match.start()])
+        slots.append((len(pieces), match.group(1), match.group(0)))
+        pieces.append(match.group(0))
+        position = match.end()
+    pieces.append(source[position:])
+
+    def fill(lookup):
+        filled = list(pieces)
+        for index, name, written in slots:
+            value = lookup(name)
+            filled[index] = written if value is _KEEP else text(value)
+        return ''.join(filled)
+    return fill
+
+
+def _entries(source, fills):
+    shallow_copy = source.copy if isinstance(source, dict) else lambda: list(source)
+
+    def fill(lookup):
+        filled = shallow_copy()
+        for key, fill_entry in fills:
+            filled[key] = fill_entry(lookup)
+        return filled
+    return fill
+
+
+def _compile(value, references):
+    """Return the function filling value, or None when value holds no reference; add its references."""
+    if isinstance(value, STRING_TYPES):
+        if '{{' not in value:
+            return None
+        whole = WHOLE_REFERENCE.match(value)
+        if whole is not None:
+            references.add(whole.group(1))
+            return _whole(value, whole.group(1))
+        matches = list(REFERENCE.finditer(value))
+        if not matches:
+            return None
+        references.update(match.group(1) for match in matches)
+        return _joined(value, matches)
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return None
+    fills = []
+    for key, item in items:
+        fill = _compile(item, references)
+        if fill is not None:
+            fills.append((key, fill))
+    return _entries(value, fills) if fills else None
+
+
+class Template(object):
+    """A value compiled for repeated {{ }} substitution."""
+
+    def __init__(self, source):
+        self.source = source
+        references = set()
+        self._fill = _compile(source, references)
+        self.references = frozenset(references)
+
+    def fill(self, values, resolve=None):
+        """Return the source with the references in values substituted.
+
+        A reference missing from values is passed to resolve, which returns its
+        value or raises, or is kept as written when resolve is None.
+        """
+        if self._fill is None:
+            return self.source
+
+        def lookup(name):
+            if name in values:
+                return values[name]
+            return _KEEP if resolve is None else resolve(name)
+        return self._fill(lookup)
+
+
+def compile_template(value):
+    """Return the Template of a value: a document, the inputs of a step or a single string."""
+    return Template(value)
+
+
+class DocumentTemplate(Template):
+    """The Template of a whole document, which can also tell its unresolved and unused parameters."""
+
+    def __init__(self, document):
+        super(DocumentTemplate, self).__init__(document)
+        parameters = document.get('parameters')
+        self.parameters = parameters if isinstance(parameters, dict) else {}
+        steps = document.get('mainSteps')
+        self.steps = set(step.get('name') for step in steps if isinstance(step, dict)) \
+            if isinstance(steps, list) else set()
+
+    def is_parameter_reference(self, reference):
+        """Return True unless reference names a variable (automation:, global:, ssm:...) or a step output."""
+        if ':' in reference:
+            return False
+        step, separator, _ = reference.partition('.')
+        return not (separator and step in self.steps)
+
+    def report(self, values=None):
+        """Return the Report of filling the document with a set of parameter values."""
+        values = values or {}
+        unresolved = sorted(reference for reference in self.references if self.is_parameter_reference(reference) and
+                            reference not in values and 'default' not in (self.parameters.get(reference) or {}))
+        unused = sorted((set(self.parameters) | set(values)) - self.references)
+        return Report(unresolved, unused)
@@ -0,0 +1,71 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Report redundant API calls of Automation documents and write optimized variants.
+
+    python Analysis/optimize_calls.py                        # every Automation document
+    python Analysis/optimize_calls.py EncryptRootVolume      # the documents under the given paths
+    python Analysis/optimize_calls.py --output-dir /tmp/opt  # also write the optimized documents
+
+For each document with findings, lists the repeated, echoed and overlapping
+read calls and the polling loops, marking the ones that are reported only,
+and the API calls and seconds the optimized variant saves per execution. The
+variant of aws-Name.json is written as aws-Name.optimized.json; it should be
+validated and tested like any other document before it replaces the source.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+
+import call_optimizer
+import document_validator
+import validate_documents
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='documents or directories to analyze (default: all documents)')
+    parser.add_argument('--output-dir', help='directory receiving the optimized documents')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    paths = validate_documents.collect(args.paths) if args.paths else document_validator.find_documents()
+
+    optimizer = call_optimizer.CallOptimizer()
+    for path in paths:
+        report = call_optimizer.load_report(os.path.realpath(path), optimizer)
+        if report is None or not report.findings:
+            continue
+        print(os.path.relpath(path))
+        for line in call_optimizer.format_report(report):
+            print(line)
+        if report.document is not None and args.output_dir:
+            if not os.path.isdir(args.output_dir):
+                os.makedirs(args.output_dir)
+            name = os.path.splitext(os.path.basename(path))[0] + '.optimized.json'
+            with open(os.path.join(args.output_dir, name), 'w') as fp:
+                json.dump(report.document, fp, indent=2)
+                fp.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
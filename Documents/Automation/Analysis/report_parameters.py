@@ -0,0 +1,68 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Report the unused parameters of documents and the references that would stay unresolved.
+
+    python Analysis/report_parameters.py                       # every document
+    python Analysis/report_parameters.py PatchWindowsInASG     # the documents under the given paths
+    python Analysis/report_parameters.py RestartInstance --parameter InstanceId=i-1234
+
+A parameter is unused when no {{ }} reference names it. A reference to a
+parameter is unresolved when the parameter has no default and no value is
+given with --parameter; references to step outputs and to the automation:,
+global: and ssm: variables are resolved at run time and not reported.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+
+import document_validator
+import interpolation
+import simulate_rollout
+import validate_documents
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='documents or directories to check (default: all documents)')
+    parser.add_argument('--parameter', action='append', type=simulate_rollout.parse_parameter, default=[],
+                        metavar='NAME=VALUE', help='value of a document parameter')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    paths = validate_documents.collect(args.paths) if args.paths else document_validator.find_documents()
+    values = dict(args.parameter)
+
+    for path in paths:
+        document = document_validator.load_document(path)
+        if not isinstance(document, dict) or 'schemaVersion' not in document:
+            continue
+        report = interpolation.DocumentTemplate(document).report(values)
+        if report.unresolved or report.unused:
+            print(os.path.relpath(path))
+        if report.unresolved:
+            print('  without a value: {}'.format(', '.join(report.unresolved)))
+        if report.unused:
+            print('  unused: {}'.format(', '.join(report.unused)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
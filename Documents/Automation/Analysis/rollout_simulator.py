@@ -0,0 +1,255 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Simulate a rate-controlled rollout of an Automation document over a fleet.
+
+Systems Manager runs a document on N targets with at most MaxConcurrency
+executions at a time, and starts no new execution once more than MaxErrors
+executions failed; the executions already running finish. Both limits are a
+count or a percentage of the targets; a percentage is rounded down, and the
+concurrency is at least 1.
+
+Each target walks the document's steps like duration_analyzer does:
+
+  * a step takes a duration drawn from a triangular distribution around its
+    expected duration, between its best case and, at most, its worst case;
+    aws:sleep steps take their Duration,
+  * a step fails with the given failure rate (aws:sleep and aws:branch never
+    fail) after using all of its attempts up to its worst case; onFailure then
+    decides where the target goes, and a failed step that is not marked
+    isCritical: false makes the execution count as an error,
+  * aws:branch goes to one of its choices at random.
+
+A target is out of service from the end of the step that puts it in Standby
+until the end of the step that takes it out, by default the steps whose
+inputs call EnterStandby and ExitStandby (Enter-ASStandby, enter-standby...).
+A target whose execution ends in between stays in Standby until the rollout
+ends.
+"""
+from __future__ import print_function
+
+import heapq
+import json
+import math
+import random
+import re
+from collections import namedtuple
+
+import document_validator
+import duration_analyzer
+
+ENTER_STANDBY = re.compile(r'enter-?(as-?)?standby', re.IGNORECASE)
+EXIT_STANDBY = re.compile(r'exit-?(as-?)?standby', re.IGNORECASE)
+# actions whose inputs are searched for the Standby calls; the template of a
+# aws:createStack step only defines a function that may call them later.
+STANDBY_ACTIONS = ('aws:executeAwsApi', 'aws:invokeLambdaFunction', 'aws:runCommand', 'aws:executeScript')
+NEVER_FAIL = ('aws:sleep', 'aws:branch')
+# like Automation, a target running more steps than this is stopped, as when looping.
+MAX_STEP_EXECUTIONS = 1000
+
+# out_of_service is (start, end) from the start of the execution, end None when it stays in Standby.
+TargetRun = namedtuple('TargetRun', ['duration', 'failed', 'out_of_service'])
+Rollout = namedtuple('Rollout', ['targets', 'concurrency', 'max_errors', 'duration', 'errors', 'started',
+                                 'stopped', 'peak_out_of_service', 'left_out_of_service'])
+Summary = namedtuple('Summary', ['runs', 'targets', 'concurrency', 'max_errors', 'duration_p50', 'duration_p90',
+                                 'duration_max', 'peak_out_of_service', 'errors_mean', 'errors_max', 'stopped_runs',
+                                 'left_out_of_service_max'])
+
+
+def parse_limit(value, targets, minimum=0):
+    """Return the count of a MaxConcurrency or MaxErrors value like 10 or "25%" for a number of targets."""
+    text = str(value).strip()
+    if text.endswith('%'):
+        percent = float(text[:-1])
+        if not 0 <= percent <= 100:
+            raise ValueError('{} is not a percentage between 0% and 100%'.format(value))
+        count = int(math.floor(targets * percent / 100.0 + 1e-9))
+    else:
+        count = int(text)
+        if count < 0:
+            raise ValueError('{} is negative'.format(value))
+    return max(minimum, count)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)] if fraction else ordered[0]
+
+
+def standby_steps(steps):
+    """Return the names of the steps that put a target in Standby and take it out, or None for either."""
+    enter = leave = None
+    for step in steps:
+        if step.get('action') not in STANDBY_ACTIONS:
+            continue
+        text = json.dumps(step.get('inputs') or {})
+        if enter is None and ENTER_STANDBY.search(text):
+            enter = step.get('name')
+        elif enter is not None and leave is None and EXIT_STANDBY.search(text):
+            leave = step.get('name')
+    return enter, leave
+
+
+class RolloutSimulator(object):
+    """Simulate rollouts of one Automation document."""
+
+    def __init__(self, document, analyzer=None, failure_rate=0.0, parameters=None, standby=None):
+        """parameters overrides parameter defaults, like {'WaitForReboot': 'PT10M'}; standby is the
+        (enter step, exit step) pair of names, either None, to use instead of the detected steps."""
+        analyzer = analyzer or duration_analyzer.DurationAnalyzer()
+        self.steps = [step for step in document.get('mainSteps') or [] if isinstance(step, dict)]
+        self.names = dict((step.get('name'), index) for index, step in reversed(list(enumerate(self.steps))))
+        declared = dict(document.get('parameters') or {})
+        for name, value in (parameters or {}).items():
+            declared[name] = dict(declared.get(name) or {}, default=value)
+        self.timings = [analyzer.step_timing(step, declared) for step in self.steps]
+        self.failure_rate = failure_rate
+        enter, leave = standby if standby is not None else standby_steps(self.steps)
+        for name in (enter, leave):
+            if name is not None and name not in self.names:
+                raise ValueError('no step named {}'.format(name))
+        self.enter_standby = self.names.get(enter)
+        self.exit_standby = self.names.get(leave)
+
+    def sample(self, index, rng):
+        """Return the seconds one successful execution of a step takes."""
+        timing = self.timings[index]
+        if timing.best >= timing.worst:
+            return timing.worst
+        # symmetric around the expected duration, so the mean is the analyzer's expected case
+        high = min(timing.worst, max(timing.expected, 2 * timing.expected - timing.best))
+        if high <= timing.best:
+            return timing.best
+        return rng.triangular(timing.best, high, min(max(timing.expected, timing.best), high))
+
+    def run_target(self, rng):
+        """Return the TargetRun of one execution."""
+        elapsed = 0.0
+        failed = False
+        out_start = out_end = None
+        index = 0 if self.steps else None
+        executed = 0
+        while index is not None:
+            executed += 1
+            if executed > MAX_STEP_EXECUTIONS:
+                failed = True
+                break
+            step = self.steps[index]
+            step_failed = step.get('action') not in NEVER_FAIL and rng.random() < self.failure_rate
+            elapsed += self.timings[index].worst if step_failed else self.sample(index, rng)
+            if not step_failed:
+                if index == self.enter_standby and out_start is None:
+                    out_start = elapsed
+                elif index == self.exit_standby and out_start is not None and out_end is None:
+                    out_end = elapsed
+                following = duration_analyzer.successors(self.steps, index, self.names)
+                index = rng.choice(following)[0] if following else None
+                continue
+            if step.get('isCritical') is not False:
+                failed = True
+            on_failure = step.get('onFailure', 'Abort')
+            if on_failure == 'Continue':
+                following = duration_analyzer.successors(self.steps, index, self.names)
+                index = rng.choice(following)[0] if following else None
+            else:
+                target = duration_analyzer.failure_successor(self.steps, index, self.names)
+                index = target[0] if target else None
+        out_of_service = None if out_start is None else (out_start, out_end)
+        return TargetRun(elapsed, failed, out_of_service)
+
+    def simulate(self, targets, max_concurrency, max_errors, rng=None):
+        """Return the Rollout of the document over a number of targets."""
+        rng = rng or random.Random(0)
+        concurrency = parse_limit(max_concurrency, targets, minimum=1)
+        allowed_errors = parse_limit(max_errors, targets)
+        running = []
+        now = 0.0
+        started = errors = 0
+        stopped = False
+        out_of_service = []
+        while True:
+            while started < targets and len(running) < concurrency and not stopped:
+                run = self.run_target(rng)
+                heapq.heappush(running, (now + run.duration, started, run))
+                if run.out_of_service is not None:
+                    start, end = run.out_of_service
+                    out_of_service.append((now + start, None if end is None else now + end))
+                started += 1
+            if not running:
+                break
+            now, _, run = heapq.heappop(running)
+            if run.failed:
+                errors += 1
+                # like Systems Manager, no new target once the errors exceed MaxErrors
+                stopped = stopped or errors > allowed_errors
+        left = sum(1 for _, end in out_of_service if end is None)
+        return Rollout(targets, concurrency, allowed_errors, now, errors, started, stopped,
+                       self._peak(out_of_service, now), left)
+
+    @staticmethod
+    def _peak(intervals, end_of_rollout):
+        events = []
+        for start, end in intervals:
+            events.append((start, 1))
+            events.append((end_of_rollout if end is None else end, -1))
+        # at equal times, a target leaving Standby is counted before one entering it
+        events.sort()
+        peak = current = 0
+        for _, change in events:
+            current += change
+            peak = max(peak, current)
+        return peak
+
+    def summarize(self, targets, max_concurrency, max_errors, runs=100, seed=0):
+        """Return the Summary of a number of simulated rollouts."""
+        rng = random.Random(seed)
+        rollouts = [self.simulate(targets, max_concurrency, max_errors, rng) for _ in range(runs)]
+        durations = [rollout.duration for rollout in rollouts]
+        return Summary(runs, targets, rollouts[0].concurrency, rollouts[0].max_errors,
+                       percentile(durations, 0.5), percentile(durations, 0.9), max(durations),
+                       max(rollout.peak_out_of_service for rollout in rollouts),
+                       sum(rollout.errors for rollout in rollouts) / float(runs),
+                       max(rollout.errors for rollout in rollouts),
+                       sum(1 for rollout in rollouts if rollout.stopped),
+                       max(rollout.left_out_of_service for rollout in rollouts))
+
+
+def format_summary(summary):
+    """Return the lines describing a Summary."""
+    duration = duration_analyzer.format_duration
+    lines = ['  {} targets, {} at a time, max errors {}: p50 {}, p90 {}, max {} over {} runs'.format(
+        summary.targets, summary.concurrency, summary.max_errors, duration(summary.duration_p50),
+        duration(summary.duration_p90), duration(summary.duration_max), summary.runs)]
+    lines.append('  peak capacity reduction: {} targets ({:.0f}%) in Standby at once'.format(
+        summary.peak_out_of_service, 100.0 * summary.peak_out_of_service / max(1, summary.targets)))
+    lines.append('  error budget: {:.1f} errors on average, {} at most, of {} allowed'.format(
+        summary.errors_mean, summary.errors_max, summary.max_errors))
+    if summary.stopped_runs:
+        lines.append('  stopped on MaxErrors in {} of {} runs'.format(summary.stopped_runs, summary.runs))
+    if summary.left_out_of_service_max:
+        lines.append('  up to {} targets left in Standby by failed executions'.format(
+            summary.left_out_of_service_max))
+    return lines
+
+
+def load_simulator(path, **options):
+    """Return the RolloutSimulator of the document at path, or None if it is not an Automation document."""
+    document = document_validator.load_document(path)
+    if not isinstance(document, dict) or document.get('schemaVersion') != '0.3':
+        return None
+    return RolloutSimulator(document, **options)
@@ -0,0 +1,243 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Compile the JSONPath Selectors of Automation step outputs into accessors.
+
+Steps read their outputs from the API response with a Selector and convert
+them to the declared Type:
+
+    outputs:
+      - Name: AvailabilityZone
+        Selector: $.Reservations[0].Instances[0].Placement.AvailabilityZone
+        Type: String
+
+compile_selector parses a Selector once per process into a CompiledSelector,
+which holds a Python function generated for it: each name or index is an
+inline type check and lookup, and each wildcard ([*], .*) or recursive descent
+(..Name) a nested loop, so evaluating $.Reservations[*].Instances[*].InstanceId
+builds no list but its result. The supported syntax is:
+
+    $              the whole response
+    .Name ['Name'] a member of an object
+    [0] [-1]       an element of an array, negative from the end
+    [*] .*         every element of an array or member of an object
+    ..Name ..*     every matching member at any depth
+
+A Selector with a wildcard or recursive descent selects a list, possibly
+empty; any other Selector selects one value and fails if it matches nothing.
+coerce converts a selected value to an output Type (String, StringList,
+Integer, Boolean, StringMap or MapList) and raises SelectorError when it
+cannot.
+"""
+from __future__ import print_function
+
+import json
+import re
+
+try:
+    STRING_TYPES = (str, unicode)  # noqa pylint: disable=undefined-variable
+except NameError:
+    STRING_TYPES = (str,)
+
+TOKEN = re.compile(r"""
+    \.\.(?:(?P<deep_name>[A-Za-z0-9_:-]+)|\[(?P<deep_quote>['"])(?P<deep_quoted>.*?)(?P=deep_quote)\]|(?P<deep_all>\*))
+  | \.(?P<name>[A-Za-z0-9_:-]+)
+  | \[(?P<quote>['"])(?P<quoted>.*?)(?P=quote)\]
+  | \[(?P<index>-?\d+)\]
+  | (?P<all>\.\*|\[\*\])
+""", re.VERBOSE)
+
+OUTPUT_TYPES = ('String', 'StringList', 'Integer', 'Boolean', 'StringMap', 'MapList')
+
+# each wildcard is a nested loop of the generated function, and Python limits their depth.
+MAX_WILDCARDS = 15
+
+_MISSING = object()
+_COMPILED = {}
+
+
+class SelectorError(ValueError):
+    """A Selector is invalid, matched nothing or selected a value of the wrong Type."""
+
+
+def _descendants(value):
+    """Return value and every value nested in it, in document order."""
+    found = []
+    pending = [value]
+    while pending:
+        current = pending.pop()
+        found.append(current)
+        if isinstance(current, dict):
+            pending.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            pending.extend(reversed(current))
+    return found
+
+
+def _deep(value, name):
+    """Return the members called name of value and of every value nested in it, or every nested value."""
+    if name is None:
+        return _descendants(value)[1:]
+    return [nested[name] for nested in _descendants(value) if isinstance(nested, dict) and name in nested]
+
+
+def parse(selector):
+    """Return the list of tokens of a Selector: ('key', name or index), ('all', None) or ('deep', name or None)."""
+    if not isinstance(selector, STRING_TYPES) or not selector.startswith('$'):
+        raise SelectorError("Invalid selector {}".format(json.dumps(selector)))
+    tokens = []
+    position = 1
+    while position < len(selector):
+        match = TOKEN.match(selector, position)
+        if match is None:
+            raise SelectorError("Invalid selector {}: unexpected {} at position {}".format(
+                selector, json.dumps(selector[position:]), position))
+        position = match.end()
+        groups = match.groupdict()
+        if groups['deep_all'] is not None:
+            tokens.append(('deep', None))
+        elif groups['deep_name'] is not None or groups['deep_quoted'] is not None:
+            tokens.append(('deep', groups['deep_name'] if groups['deep_name'] is not None else groups['deep_quoted']))
+        elif groups['name'] is not None:
+            tokens.append(('key', groups['name']))
+        elif groups['quoted'] is not None:
+            tokens.append(('key', groups['quoted']))
+        elif groups['index'] is not None:
+            tokens.append(('key', int(groups['index'])))
+        else:
+            tokens.append(('all', None))
+    return tokens
+
+
+def _generate(tokens, multiple):
+    """Return the source of a function evaluating tokens, and the constants it uses."""
+    lines = ['def evaluate(data):']
+    if multiple:
+        lines.extend(['    selected = []', '    append = selected.append'])
+    constants = {}
+    indent = '    '
+    value = 'data'
+    for number, (kind, argument) in enumerate(tokens):
+        constant = 'K{}'.format(number)
+        constants[constant] = argument
+        child = 'v{}'.format(number)
+        if kind == 'key' and isinstance(argument, int):
+            lines.append('{}if isinstance({}, list) and -len({}) <= {} < len({}):'.format(
+                indent, value, value, constant, value))
+            lines.append('{}    {} = {}[{}]'.format(indent, child, value, constant))
+        elif kind == 'key':
+            lines.append('{}if isinstance({}, dict) and {} in {}:'.format(indent, value, constant, value))
+            lines.append('{}    {} = {}[{}]'.format(indent, child, value, constant))
+        elif kind == 'all':
+            lines.append('{}for {} in ({} if isinstance({}, list) else {}.values() if isinstance({}, dict) '
+                         'else ()):'.format(indent, child, value, value, value, value))
+        else:
+            lines.append('{}for {} in _deep({}, {}):'.format(indent, child, value, constant))
+        indent += '    '
+        value = child
+    if multiple:
+        lines.append('{}append({})'.format(indent, value))
+        lines.append('    return selected')
+    else:
+        lines.append('{}return {}'.format(indent, value))
+        lines.append('    return _MISSING')
+    return '\n'.join(lines) + '\n', constants
+
+
+class CompiledSelector(object):
+    """The accessor of one Selector; call it with a response to get the selected value."""
+
+    def __init__(self, selector):
+        self.selector = selector
+        tokens = parse(selector)
+        self.multiple = any(kind != 'key' for kind, _ in tokens)
+        if sum(1 for kind, _ in tokens if kind != 'key') > MAX_WILDCARDS:
+            raise SelectorError("Invalid selector {}: more than {} wildcards".format(selector, MAX_WILDCARDS))
+        self.source, constants = _generate(tokens, self.multiple)
+        namespace = dict(constants, _deep=_deep, _MISSING=_MISSING)
+        exec(compile(self.source, '<selector {}>'.format(selector), 'exec'), namespace)  # pylint: disable=exec-used
+        self._evaluate = namespace['evaluate']
+
+    def __call__(self, data):
+        value = self._evaluate(data)
+        if value is _MISSING:
+            raise SelectorError("Selector {} matched nothing".format(self.selector))
+        return value
+
+    def __repr__(self):
+        return 'CompiledSelector({!r})'.format(self.selector)
+
+    def select(self, data, output_type=None):
+        """Return the selected value, converted to output_type when given."""
+        value = self(data)
+        return value if output_type is None else coerce(value, output_type, self.selector)
+
+
+def compile_selector(selector):
+    """Return the CompiledSelector of a Selector, compiled once per process."""
+    compiled = _COMPILED.get(selector) if isinstance(selector, STRING_TYPES) else None
+    if compiled is None:
+        compiled = CompiledSelector(selector)
+        _COMPILED[selector] = compiled
+    return compiled
+
+
+def clear_cache():
+    """Forget every compiled Selector."""
+    _COMPILED.clear()
+
+
+def select(data, selector, output_type=None):
+    """Return the value a Selector selects in data, converted to output_type when given."""
+    return compile_selector(selector).select(data, output_type)
+
+
+def _string(value):
+    if isinstance(value, STRING_TYPES):
+        return value
+    return json.dumps(value)
+
+
+def coerce(value, output_type, selector='value'):
+    """Return value converted to an output Type, like the Automation service does."""
+    if output_type == 'String':
+        return _string(value)
+    if output_type == 'StringList':
+        return [_string(item) for item in (value if isinstance(value, list) else [value])]
+    if output_type == 'Integer':
+        if isinstance(value, bool):
+            pass
+        elif isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+            return int(value)
+        elif isinstance(value, STRING_TYPES) and re.match(r'^\s*-?\d+\s*$', value):
+            return int(value)
+    elif output_type == 'Boolean':
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, STRING_TYPES) and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+    elif output_type == 'StringMap':
+        if isinstance(value, dict):
+            return value
+    elif output_type == 'MapList':
+        if isinstance(value, dict):
+            return [value]
+        if isinstance(value, list) and all(isinstance(item, dict) for item in value):
+            return value
+    else:
+        raise SelectorError("Unknown output type {}".format(json.dumps(output_type)))
+    raise SelectorError("{} selected {}, which is not a{} {}".format(
+        selector, json.dumps(value)[:100], 'n' if output_type == 'Integer' else '', output_type))
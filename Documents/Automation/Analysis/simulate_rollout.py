@@ -0,0 +1,91 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Simulate a rate-controlled rollout of Automation documents across a fleet.
+
+    python Analysis/simulate_rollout.py PatchWindowsInASG --targets 40 --concurrency 10%
+    python Analysis/simulate_rollout.py PatchWindowsInASG --targets 40 --concurrency 4 --errors 2 \\
+        --failure-rate 0.02 --parameter WaitForReboot=PT10M
+
+For each document, reports the rollout time (median, 90th percentile and
+maximum over the runs), the most targets in Standby at once, and how much of
+the MaxErrors budget the failed executions used. The Standby steps are found
+from their EnterStandby and ExitStandby calls unless given with --standby.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+
+import document_validator
+import rollout_simulator
+import validate_documents
+
+
+def parse_parameter(text):
+    name, separator, value = text.partition('=')
+    if not separator or not name:
+        raise argparse.ArgumentTypeError('{} is not NAME=VALUE'.format(text))
+    return name, value
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='documents or directories to simulate (default: all documents)')
+    parser.add_argument('--targets', type=int, default=10, help='number of targets (default: 10)')
+    parser.add_argument('--concurrency', default='1', help='MaxConcurrency, a count or a percentage (default: 1)')
+    parser.add_argument('--errors', default='0', help='MaxErrors, a count or a percentage (default: 0)')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='probability that a step fails (default: 0)')
+    parser.add_argument('--parameter', action='append', type=parse_parameter, default=[], metavar='NAME=VALUE',
+                        help='value of a document parameter, instead of its default')
+    parser.add_argument('--standby', nargs=2, metavar=('ENTER_STEP', 'EXIT_STEP'),
+                        help='steps putting a target in Standby and taking it out')
+    parser.add_argument('--runs', type=int, default=100, help='number of simulated rollouts (default: 100)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the simulation (default: 0)')
+    args = parser.parse_args(argv)
+    if args.targets < 1 or args.runs < 1:
+        parser.error('--targets and --runs must be at least 1')
+    if not 0 <= args.failure_rate <= 1:
+        parser.error('--failure-rate must be between 0 and 1')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    paths = validate_documents.collect(args.paths) if args.paths else document_validator.find_documents()
+
+    status = 0
+    for path in paths:
+        try:
+            simulator = rollout_simulator.load_simulator(os.path.realpath(path), failure_rate=args.failure_rate,
+                                                         parameters=dict(args.parameter), standby=args.standby)
+            if simulator is None:
+                continue
+            summary = simulator.summarize(args.targets, args.concurrency, args.errors, args.runs, args.seed)
+        except ValueError as error:
+            print('{}: {}'.format(os.path.relpath(path), error), file=sys.stderr)
+            status = 1
+            continue
+        print(os.path.relpath(path))
+        for line in rollout_simulator.format_summary(summary):
+            print(line)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
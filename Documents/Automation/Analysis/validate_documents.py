@@ -0,0 +1,71 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Validate SSM documents offline, before they are deployed.
+
+    python Analysis/validate_documents.py                  # every document of the repository
+    python Analysis/validate_documents.py RebootRds        # the documents under the given paths
+    python Analysis/validate_documents.py --jobs 1 a.json  # validate serially in this process
+
+Source documents, built Output documents and Command documents are checked
+against the rules of their schemaVersion; fragments without a schemaVersion
+are skipped. Exits with status 1 if any document has a problem.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+import document_validator
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='documents or directories to validate (default: all documents)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    return parser.parse_args(argv)
+
+
+def collect(paths):
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            documents.extend(document_validator.find_documents(path))
+        else:
+            documents.append(path)
+    return documents
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    start = time.time()
+    paths = collect(args.paths) if args.paths else document_validator.find_documents()
+
+    results = document_validator.validate_files(paths, jobs=args.jobs)
+    problems = [problem for _, found in results if found for problem in found]
+    for problem in problems:
+        print("{}: {}: {}".format(os.path.relpath(problem.path), problem.location or '(document)', problem.message))
+    skipped = len([path for path, found in results if found is None])
+    print("{} documents validated, {} fragments skipped, {} problems in {:.3f}s".format(
+        len(results) - skipped, skipped, len(problems), time.time() - start))
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
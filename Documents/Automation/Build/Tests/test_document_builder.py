@@ -0,0 +1,353 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import OrderedDict
+
+BUILD_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(BUILD_DIR)
+import document_builder  # noqa pylint: disable=import-error,wrong-import-position
+import lambda_store  # noqa pylint: disable=import-error,wrong-import-position
+
+TEMPLATE = """---
+AWSTemplateFormatVersion: "2010-09-09"
+Parameters:
+  FunctionName:
+    Type: String
+Resources:
+  TestLambda:
+    Type: AWS::Lambda::Function
+    Properties:
+      FunctionName: !Ref FunctionName
+      Role: !GetAtt LambdaRole.Arn
+      Code:
+        ZipFile: "{}"
+"""
+
+LAMBDA = """def handler(event, context):
+    return event
+"""
+
+DOCUMENT = {
+    "schemaVersion": "0.3",
+    "description": "Test document",
+    "parameters": {
+        "InstanceId": {"type": "String"},
+        "AutomationAssumeRole": {"type": "String", "default": ""}
+    },
+    "mainSteps": [
+        {"name": "createDocumentStack", "action": "aws:createStack", "inputs": {"TemplateBody": "{0}"}},
+        {"name": "runLambda", "action": "aws:invokeLambdaFunction", "inputs": {"Payload": {}}}
+    ]
+}
+
+
+def write_file(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as fp:
+        fp.write(content)
+
+
+class DocumentBuilderTest(unittest.TestCase):
+    def setUp(self):
+        self.project_dir = tempfile.mkdtemp()
+        # keep the Lambda artifacts and parsed templates out of the real stores.
+        self.store_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.manifest = {
+            "document": "aws-Test.json",
+            "template": "Test.yml",
+            "stack_step": "createDocumentStack",
+            "lambdas": [{"resource": "TestLambda", "file": "test_lambda.py"}],
+            "targets": [
+                {"output": "aws-Test.json", "payloads": {"runLambda": {"InstanceId": "{{InstanceId}}"}}}
+            ]
+        }
+        self.write_manifest()
+        write_file(os.path.join(self.project_dir, 'Documents', 'aws-Test.json'), json.dumps(DOCUMENT))
+        write_file(os.path.join(self.project_dir, 'Documents', 'CloudFormationTemplates', 'Test.yml'), TEMPLATE)
+        write_file(os.path.join(self.project_dir, 'Documents', 'Lambdas', 'test_lambda.py'), LAMBDA)
+
+    def tearDown(self):
+        for directory in (self.project_dir, self.store_dir, self.cache_dir):
+            shutil.rmtree(directory)
+
+    def write_manifest(self):
+        write_file(os.path.join(self.project_dir, 'Setup', 'manifest.json'), json.dumps(self.manifest))
+
+    def build(self, force=False):
+        project = document_builder.DocumentProject(self.project_dir, store=lambda_store.LambdaStore(self.store_dir),
+                                                   cache_dir=self.cache_dir)
+        return project.build(force=force)
+
+    def build_projects(self, project_dirs, **kwargs):
+        return document_builder.build_projects(project_dirs, store=lambda_store.LambdaStore(self.store_dir),
+                                               cache_dir=self.cache_dir, **kwargs)
+
+    def read_output(self, name='aws-Test.json'):
+        with open(os.path.join(self.project_dir, 'Output', name)) as fp:
+            return json.load(fp, object_pairs_hook=OrderedDict)
+
+    def test_build_inlines_template_lambda_and_payload(self):
+        results = self.build()
+        self.assertEqual([r.built for r in results], [True])
+
+        document = self.read_output()
+        template_body = document["mainSteps"][0]["inputs"]["TemplateBody"]
+        template = document_builder.open_cloud_formation_template(
+            os.path.join(self.project_dir, 'Documents', 'CloudFormationTemplates', 'Test.yml'), self.cache_dir)
+        self.assertEqual(template["Resources"]["TestLambda"]["Properties"]["Role"], {"Fn::GetAtt": ["LambdaRole", "Arn"]})
+        self.assertIn("def handler(event,context):\\n return event", template_body)
+        self.assertEqual(json.loads(document["mainSteps"][1]["inputs"]["Payload"]), {"InstanceId": "{{InstanceId}}"})
+
+        sizes = results[0].sizes
+        self.assertEqual(sizes["lambdas"], {"TestLambda": len("def handler(event,context):\n return event\n")})
+        self.assertEqual(sizes["template"], len(template_body))
+        self.assertLess(sizes["template_skeleton"], sizes["template"])
+        self.assertEqual(sizes["parameters"], len(document_builder.dump_document(document["parameters"])))
+        self.assertEqual(sizes["document"], os.path.getsize(os.path.join(self.project_dir, 'Output', 'aws-Test.json')))
+        # an up to date target reports the sizes recorded when it was built.
+        self.assertEqual(self.build()[0].sizes, sizes)
+
+    def test_json_template_format(self):
+        self.build()
+        yaml_body = self.read_output()["mainSteps"][0]["inputs"]["TemplateBody"]
+        self.manifest["template_format"] = "json"
+        self.write_manifest()
+        self.assertEqual([r.built for r in self.build()], [True])
+
+        json_body = self.read_output()["mainSteps"][0]["inputs"]["TemplateBody"]
+        template = json.loads(json_body)
+        properties = template["Resources"]["TestLambda"]["Properties"]
+        self.assertEqual(properties["FunctionName"], {"Ref": "FunctionName"})
+        self.assertEqual(properties["Role"], {"Fn::GetAtt": ["LambdaRole", "Arn"]})
+        self.assertEqual(properties["Code"]["ZipFile"], "def handler(event,context):\n return event\n")
+        self.assertNotIn(" ", json_body.split('"ZipFile"')[0])
+        self.assertLess(len(json_body), len(yaml_body))
+
+        # the command line override applies to every project and is part of the cache key.
+        results = self.build_projects([self.project_dir], jobs=1, template_format="yaml")
+        self.assertEqual([r.built for r in results], [True])
+        self.assertEqual(self.read_output()["mainSteps"][0]["inputs"]["TemplateBody"], yaml_body)
+
+    def test_native_actions(self):
+        document = json.loads(json.dumps(DOCUMENT))
+        document["mainSteps"][0]["inputs"]["Parameters"] = [{"ParameterKey": "FunctionName",
+                                                             "ParameterValue": "Test{{automation:EXECUTION_ID}}"}]
+        document["mainSteps"][1]["inputs"]["FunctionName"] = "Test{{automation:EXECUTION_ID}}"
+        write_file(os.path.join(self.project_dir, 'Documents', 'aws-Test.json'), json.dumps(document))
+        write_file(os.path.join(self.project_dir, 'Documents', 'Lambdas', 'test_lambda.py'),
+                   "import boto3\n\n\ndef handler(event, context):\n"
+                   "    boto3.client('ec2').reboot_instances(InstanceIds=[event['InstanceId']])\n")
+        self.build()
+
+        # the command line option is part of the cache key.
+        results = self.build_projects([self.project_dir], jobs=1, native=True)
+        self.assertEqual([r.built for r in results], [True])
+        self.assertNotIn("template", results[0].sizes)
+        step, = self.read_output()["mainSteps"]
+        self.assertEqual(step, {"name": "runLambda", "action": "aws:executeAwsApi", "inputs": {
+            "Service": "ec2", "Api": "RebootInstances", "InstanceIds": ["{{InstanceId}}"]}})
+        self.assertEqual([r.built for r in self.build()], [True])
+        self.assertEqual(self.read_output()["mainSteps"][0]["action"], "aws:createStack")
+
+    def test_unchanged_target_is_skipped(self):
+        self.build()
+        self.assertEqual([r.built for r in self.build()], [False])
+        self.assertEqual([r.built for r in self.build(force=True)], [True])
+
+    def test_unchanged_output_is_not_rewritten(self):
+        self.build()
+        output = os.path.join(self.project_dir, 'Output', 'aws-Test.json')
+        os.utime(output, (0, 0))
+        results = self.build(force=True)
+        self.assertEqual([(r.built, r.written) for r in results], [(True, False)])
+        self.assertEqual(os.path.getmtime(output), 0)
+
+        write_file(os.path.join(self.project_dir, 'Documents', 'Lambdas', 'test_lambda.py'), LAMBDA + "\n# comment\n")
+        self.assertEqual([(r.built, r.written) for r in self.build()], [(True, False)])
+        write_file(os.path.join(self.project_dir, 'Documents', 'Lambdas', 'test_lambda.py'), LAMBDA + "x = 1\n")
+        self.assertEqual([(r.built, r.written) for r in self.build()], [(True, True)])
+        self.assertNotEqual(os.path.getmtime(output), 0)
+        self.assertEqual([name for name in os.listdir(os.path.dirname(output)) if name.endswith('.tmp')], [])
+
+    def test_output_is_deterministic(self):
+        source = OrderedDict([("schemaVersion", "0.3"), ("mainSteps", DOCUMENT["mainSteps"]),
+                              ("parameters", OrderedDict([("Zone", {"type": "String"}), ("Action", {"type": "String"})])),
+                              ("description", "Test document")])
+        write_file(os.path.join(self.project_dir, 'Documents', 'aws-Test.json'), json.dumps(source))
+        self.manifest["targets"][0]["payloads"]["runLambda"] = dict((key, key) for key in "zyxabc")
+        self.write_manifest()
+        self.build()
+
+        with open(os.path.join(self.project_dir, 'Output', 'aws-Test.json')) as fp:
+            content = fp.read()
+        document = json.loads(content, object_pairs_hook=OrderedDict)
+        self.assertEqual(list(document), ["schemaVersion", "mainSteps", "parameters", "description"])
+        self.assertEqual(list(document["parameters"]), ["Zone", "Action"])
+        self.assertEqual(document["mainSteps"][1]["inputs"]["Payload"], json.dumps(
+            OrderedDict((key, key) for key in "abcxyz")))
+        self.assertNotIn(" \n", content)
+        self.assertTrue(content.endswith("}\n"))
+
+    def test_changed_lambda_triggers_rebuild(self):
+        self.build()
+        write_file(os.path.join(self.project_dir, 'Documents', 'Lambdas', 'test_lambda.py'),
+                   LAMBDA + "\n\ndef other(event, context):\n    pass\n")
+        self.assertEqual([r.built for r in self.build()], [True])
+        self.assertIn("def other", self.read_output()["mainSteps"][0]["inputs"]["TemplateBody"])
+
+    def test_modified_or_missing_output_triggers_rebuild(self):
+        self.build()
+        output = os.path.join(self.project_dir, 'Output', 'aws-Test.json')
+        write_file(output, "{}")
+        self.assertEqual([r.built for r in self.build()], [True])
+        os.remove(output)
+        self.assertEqual([r.built for r in self.build()], [True])
+        self.assertTrue(os.path.isfile(output))
+
+    def test_changed_target_parameters_trigger_rebuild(self):
+        self.build()
+        self.manifest["targets"][0]["payloads"]["runLambda"]["State"] = "EnterStandby"
+        self.write_manifest()
+        self.assertEqual([r.built for r in self.build()], [True])
+        payload = json.loads(self.read_output()["mainSteps"][1]["inputs"]["Payload"])
+        self.assertEqual(payload["State"], "EnterStandby")
+
+    def test_overlays_approval_and_parameter_order(self):
+        write_file(os.path.join(self.project_dir, 'Documents', 'aws-Overlay.json'), json.dumps({
+            "description": "Overlay document",
+            "parameters": {"InstanceId": {"default": "i-123"}}
+        }))
+        write_file(os.path.join(self.project_dir, 'Documents', 'aws-Approval.json'), json.dumps({
+            "parameters": {"Approvers": {"type": "StringList"}, "SNSTopicArn": {"type": "String"}}
+        }))
+        self.manifest["parameter_order"] = ["InstanceId", "Approvers", "SNSTopicArn", "AutomationAssumeRole"]
+        self.manifest["targets"] = [{
+            "output": "aws-TestWithApproval.json",
+            "overlays": ["aws-Overlay.json"],
+            "approval": {
+                "description_suffix": " with approval",
+                "overlay": "aws-Approval.json",
+                "message": "Approve me",
+                "before": "runLambda"
+            }
+        }]
+        self.write_manifest()
+        self.build()
+
+        document = self.read_output('aws-TestWithApproval.json')
+        self.assertEqual(document["description"], "Overlay document with approval")
+        self.assertEqual(document["parameters"]["InstanceId"], {"type": "String", "default": "i-123"})
+        self.assertEqual(list(document["parameters"]), ["InstanceId", "Approvers", "SNSTopicArn", "AutomationAssumeRole"])
+        self.assertEqual([s["name"] for s in document["mainSteps"]], ["createDocumentStack", "approve", "runLambda"])
+        self.assertEqual(document["mainSteps"][1]["inputs"]["Message"], "Approve me")
+
+    def test_variant_matrix(self):
+        write_file(os.path.join(self.project_dir, 'Documents', 'aws-Linux.json'),
+                   json.dumps({"parameters": {"InstanceId": {"default": "linux"}}}))
+        write_file(os.path.join(self.project_dir, 'Documents', 'aws-Windows.json'),
+                   json.dumps({"parameters": {"InstanceId": {"default": "windows"}}}))
+        del self.manifest["targets"]
+        self.manifest["matrix"] = {
+            "output": "aws-Test{platform}{approval}.json",
+            "axes": [
+                {"name": "platform", "variants": [
+                    {"value": "Linux", "overlays": ["aws-Linux.json"], "payloads": {"runLambda": {"Os": "linux"}}},
+                    {"value": "Windows", "overlays": ["aws-Windows.json"], "payloads": {"runLambda": {"Os": "win"}}}
+                ]},
+                {"name": "approval", "variants": [
+                    {"value": ""},
+                    {"value": "WithApproval", "approval": {"message": "Approve me"},
+                     "payloads": {"runLambda": {"Approved": True}}}
+                ]}
+            ]
+        }
+        self.write_manifest()
+        self.assertEqual(document_builder.expand_matrix(self.manifest["matrix"])[3], {
+            "output": "aws-TestWindowsWithApproval.json",
+            "overlays": ["aws-Windows.json"],
+            "payloads": {"runLambda": {"Os": "win", "Approved": True}},
+            "approval": {"message": "Approve me"}
+        })
+
+        loads = []
+        open_template = document_builder.open_cloud_formation_template
+        document_builder.open_cloud_formation_template = lambda path, *args: loads.append(path) or open_template(path, *args)
+        try:
+            results = self.build()
+        finally:
+            document_builder.open_cloud_formation_template = open_template
+        self.assertEqual([r.output for r in results], ["aws-TestLinux.json", "aws-TestLinuxWithApproval.json",
+                                                       "aws-TestWindows.json", "aws-TestWindowsWithApproval.json"])
+        # the base document and its template are rendered once for every variant.
+        self.assertEqual(len(loads), 1)
+
+        linux, windows = self.read_output("aws-TestLinux.json"), self.read_output("aws-TestWindowsWithApproval.json")
+        self.assertEqual(linux["parameters"]["InstanceId"]["default"], "linux")
+        self.assertEqual(windows["parameters"]["InstanceId"]["default"], "windows")
+        self.assertEqual(json.loads(windows["mainSteps"][2]["inputs"]["Payload"]), {"Os": "win", "Approved": True})
+        self.assertEqual([s["name"] for s in windows["mainSteps"]], ["approve", "createDocumentStack", "runLambda"])
+        self.assertEqual([s["name"] for s in linux["mainSteps"]], ["createDocumentStack", "runLambda"])
+        # variants built after an approval variant do not see its changes.
+        self.assertEqual(len(self.read_output("aws-TestWindows.json")["mainSteps"]), 2)
+        self.assertEqual(linux["mainSteps"][0], windows["mainSteps"][1])
+
+    def test_oversized_lambda_is_rejected(self):
+        write_file(os.path.join(self.project_dir, 'Documents', 'Lambdas', 'test_lambda.py'),
+                   LAMBDA + "PADDING = '" + "x" * document_builder.LAMBDA_MAX_SIZE + "'\n")
+        self.assertRaises(AssertionError, self.build)
+
+    def test_build_projects_in_parallel(self):
+        other_dir = tempfile.mkdtemp()
+        try:
+            shutil.rmtree(other_dir)
+            shutil.copytree(self.project_dir, other_dir)
+            project_dirs = [self.project_dir, other_dir]
+
+            reported, pools = [], []
+            pool = document_builder.multiprocessing.Pool
+            document_builder.multiprocessing.Pool = lambda processes: pools.append(processes) or pool(processes)
+            try:
+                results = self.build_projects(project_dirs, jobs=2, callback=reported.append)
+            finally:
+                document_builder.multiprocessing.Pool = pool
+            self.assertEqual(pools, [2])
+            self.assertEqual(sorted(r.project for r in results),
+                             sorted(os.path.basename(d) for d in project_dirs))
+            self.assertEqual(sorted(reported), sorted(results))
+            self.assertTrue(all(r.built and r.seconds >= 0 for r in results))
+            with open(os.path.join(other_dir, 'Output', 'aws-Test.json')) as fp:
+                self.assertEqual(self.read_output(), json.load(fp, object_pairs_hook=OrderedDict))
+
+            # the parent process records every worker's cache entry.
+            results = self.build_projects(project_dirs, jobs=2)
+            self.assertEqual([r.built for r in results], [False, False])
+        finally:
+            shutil.rmtree(other_dir)
+
+    def test_find_projects(self):
+        projects = [os.path.basename(p) for p in document_builder.find_projects()]
+        self.assertIn("ASGChangeStandbyState", projects)
+        self.assertIn("ManagedInstance", projects)
+        self.assertNotIn("RestartInstance", projects)
@@ -0,0 +1,112 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+BUILD_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(BUILD_DIR)
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import document_watcher  # noqa pylint: disable=import-error,wrong-import-position
+import lambda_store  # noqa pylint: disable=import-error,wrong-import-position
+from test_document_builder import DOCUMENT, LAMBDA, TEMPLATE, write_file  # noqa pylint: disable=import-error,wrong-import-position
+
+
+class DocumentWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.project_dir = tempfile.mkdtemp()
+        self.writes = 0
+        self.manifest = {
+            "document": "aws-Test.json",
+            "template": "Test.yml",
+            "stack_step": "createDocumentStack",
+            "lambdas": [{"resource": "TestLambda", "file": "test_lambda.py"}],
+            "targets": [
+                {"output": "aws-Test.json"},
+                {"output": "aws-TestOverlay.json", "overlays": ["aws-Overlay.json"]}
+            ]
+        }
+        self.write('Setup/manifest.json', json.dumps(self.manifest))
+        self.write('Documents/aws-Test.json', json.dumps(DOCUMENT))
+        self.write('Documents/aws-Overlay.json', json.dumps({"description": "Overlay"}))
+        self.write('Documents/CloudFormationTemplates/Test.yml', TEMPLATE)
+        self.write('Documents/Lambdas/test_lambda.py', LAMBDA)
+
+        self.built = []
+        self.watcher = document_watcher.DocumentWatcher(
+            [self.project_dir], store=lambda_store.LambdaStore(None), callback=self.built.append)
+        self.watcher.rebuild(self.watcher.targets())
+        del self.built[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.project_dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.project_dir, name)
+        write_file(path, content)
+        # make sure the change is visible even on file systems with a coarse mtime.
+        self.writes += 1
+        modified = time.time() + self.writes
+        os.utime(path, (modified, modified))
+        return path
+
+    def poll(self):
+        return sorted(r.output for r in self.watcher.poll() if r.built)
+
+    def test_dependency_graph(self):
+        overlay = os.path.join(self.project_dir, 'Documents', 'aws-Overlay.json')
+        lambda_file = os.path.join(self.project_dir, 'Documents', 'Lambdas', 'test_lambda.py')
+        self.assertEqual([t[1] for t in self.watcher.dependents(overlay)], ["aws-TestOverlay.json"])
+        self.assertEqual([t[1] for t in self.watcher.dependents(lambda_file)],
+                         ["aws-Test.json", "aws-TestOverlay.json"])
+
+    def test_unchanged_files_rebuild_nothing(self):
+        self.assertEqual(self.poll(), [])
+        self.assertEqual(self.built, [])
+
+    def test_change_rebuilds_only_affected_targets(self):
+        self.write('Documents/aws-Overlay.json', json.dumps({"description": "Changed overlay"}))
+        self.assertEqual(self.poll(), ["aws-TestOverlay.json"])
+        self.assertEqual([r.output for r in self.built], ["aws-TestOverlay.json"])
+        self.assertEqual(self.poll(), [])
+
+        self.write('Documents/Lambdas/test_lambda.py', LAMBDA.replace("event\n", "context\n"))
+        self.assertEqual(self.poll(), ["aws-Test.json", "aws-TestOverlay.json"])
+
+    def test_manifest_change_reloads_the_project(self):
+        self.manifest["targets"].append({"output": "aws-TestCopy.json"})
+        self.write('Setup/manifest.json', json.dumps(self.manifest))
+        # the unchanged targets are up to date apart from the manifest itself.
+        self.assertEqual(self.poll(), ["aws-Test.json", "aws-TestCopy.json", "aws-TestOverlay.json"])
+        self.assertTrue(os.path.isfile(os.path.join(self.project_dir, 'Output', 'aws-TestCopy.json')))
+
+        self.manifest["targets"] = self.manifest["targets"][:1]
+        self.write('Setup/manifest.json', json.dumps(self.manifest))
+        self.assertEqual(self.poll(), ["aws-Test.json"])
+        self.write('Documents/aws-Overlay.json', json.dumps({"description": "Changed overlay"}))
+        self.assertEqual(self.poll(), [])
+
+    def test_failed_build_keeps_watching(self):
+        self.write('Documents/Lambdas/test_lambda.py', "def handler(:\n")
+        self.assertEqual(self.poll(), [])
+        self.write('Documents/Lambdas/test_lambda.py', LAMBDA.replace("event\n", "context\n"))
+        self.assertEqual(self.poll(), ["aws-Test.json", "aws-TestOverlay.json"])
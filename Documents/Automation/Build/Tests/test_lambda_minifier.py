@@ -0,0 +1,120 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import glob
+import os
+import sys
+import unittest
+
+BUILD_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+AUTOMATION_DIR = os.path.dirname(BUILD_DIR)
+
+sys.path.append(BUILD_DIR)
+import lambda_minifier  # noqa pylint: disable=import-error,wrong-import-position
+
+SOURCE = '''#
+# License header
+#
+"""Module docstring."""
+import os, sys
+import json as unused_json
+from collections import OrderedDict, namedtuple
+
+
+def only_docstring():
+    """Nothing else in here."""
+
+
+def handler(event, context):
+    """
+    Long docstring describing the IAM policy.
+    """
+    # a comment
+    # old_code = event.get('Old')
+    values = [1,
+              2]  # trailing comment
+    if event.get('Empty'):
+        import traceback
+    text = r"a\\b" 'c' \\
+        "d"
+    return values, sys.argv[0] if event else -1, 1 .real, OrderedDict(), text
+'''
+
+
+def run(source):
+    namespace = {}
+    exec(compile(source, '<lambda>', 'exec'), namespace)
+    return namespace
+
+
+class LambdaMinifierTest(unittest.TestCase):
+    def test_strips_comments_docstrings_and_unused_imports(self):
+        minified = lambda_minifier.minify(SOURCE)
+        self.assertNotIn('#', minified)
+        self.assertNotIn('Module docstring', minified)
+        self.assertNotIn('Nothing else', minified)
+        self.assertNotIn('IAM policy', minified)
+        self.assertNotIn('old_code', minified)
+        self.assertNotIn('json', minified)
+        self.assertNotIn('namedtuple', minified)
+        self.assertNotIn('traceback', minified)
+        self.assertIn('import sys\n', minified)
+        self.assertIn('from collections import OrderedDict\n', minified)
+        self.assertNotIn('\n\n', minified)
+
+    def test_shortens_whitespace(self):
+        minified = lambda_minifier.minify(SOURCE)
+        self.assertIn('def handler(event,context):\n values=[1,2]\n', minified)
+        self.assertIn(' text=r"a\\b"\'c\'"d"\n', minified)
+        self.assertIn('1 .real', minified)
+
+    def test_empty_blocks_keep_a_statement(self):
+        minified = lambda_minifier.minify(SOURCE)
+        self.assertIn('def only_docstring():\n pass\n', minified)
+        self.assertIn(" if event.get('Empty'):\n  pass\n", minified)
+
+    def test_behavior_is_preserved(self):
+        original = run(SOURCE)
+        minified = run(lambda_minifier.minify(SOURCE))
+        for event in ({}, {'Empty': True}):
+            self.assertEqual(original['handler'](event, None), minified['handler'](event, None))
+        self.assertIsNone(minified['only_docstring']())
+
+    def test_last_line_without_line_break(self):
+        minified = lambda_minifier.minify('def handler(event, context):\n    if event:\n        pass')
+        self.assertEqual(minified, 'def handler(event,context):\n if event:\n  pass\n')
+
+    def test_last_statement_stays_in_its_block(self):
+        source = 'def handler(event, context):\n    try:\n        wait(event)\n    except Exception as e:\n        pass'
+        self.assertEqual(lambda_minifier.minify(source),
+                         'def handler(event,context):\n try:\n  wait(event)\n except Exception as e:\n  pass\n')
+
+    def test_unparseable_source_is_rejected(self):
+        self.assertRaises(ValueError, lambda_minifier.minify, 'def handler(:\n    pass\n')
+
+    def test_repository_lambdas(self):
+        for lambda_file in glob.glob(os.path.join(AUTOMATION_DIR, '*', 'Documents', 'Lambdas', '*.py')):
+            with open(lambda_file) as fp:
+                source = fp.read()
+            if not source.strip():
+                continue
+            try:
+                compile(source, lambda_file, 'exec')
+            except SyntaxError:
+                # the Lambdas target python2.7 and may not parse with this interpreter.
+                continue
+            minified = lambda_minifier.minify(source)
+            self.assertLess(len(minified), len(source), lambda_file)
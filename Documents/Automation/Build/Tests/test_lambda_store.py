@@ -0,0 +1,121 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+BUILD_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(BUILD_DIR)
+import document_builder  # noqa pylint: disable=import-error,wrong-import-position
+import lambda_store  # noqa pylint: disable=import-error,wrong-import-position
+
+LAMBDA = """def handler(event, context):
+    return event
+"""
+
+
+class LambdaStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.temp_dir, 'store')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_lambda(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as fp:
+            fp.write(content)
+        return path
+
+    def test_copies_resolve_to_one_artifact(self):
+        store = lambda_store.LambdaStore(self.store_dir)
+        first = store.resolve(self.write_lambda('first.py', LAMBDA))
+        second = store.resolve(self.write_lambda('second.py', "# a copy\n" + LAMBDA + "\n"))
+        self.assertEqual(first, second)
+        self.assertEqual(first.code, "def handler(event,context):\n return event\n")
+        self.assertEqual(first.name, 'first.py')
+        self.assertEqual(store.artifacts(), [first])
+
+    def test_each_source_is_minified_once(self):
+        path = self.write_lambda('handler.py', LAMBDA)
+        store = lambda_store.LambdaStore(self.store_dir)
+        artifact = store.resolve(path)
+        store.resolve(path)
+        self.assertEqual(store.minified, 1)
+
+        # another store, e.g. in a build worker, reuses the stored artifact.
+        other = lambda_store.LambdaStore(self.store_dir)
+        self.assertEqual(other.resolve(path), artifact)
+        self.assertEqual(other.minified, 0)
+
+        # an in-memory store minifies again.
+        memory_only = lambda_store.LambdaStore(None)
+        self.assertEqual(memory_only.resolve(path), artifact)
+        self.assertEqual(memory_only.minified, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, '.lambda-store')))
+
+    def test_artifacts_are_kept_per_python_version(self):
+        path = self.write_lambda('handler.py', LAMBDA)
+        lambda_store.LambdaStore(self.store_dir).resolve(path)
+        version = lambda_store.PYTHON_VERSION
+        lambda_store.PYTHON_VERSION = '0.0'
+        try:
+            other = lambda_store.LambdaStore(self.store_dir)
+            other.resolve(path)
+        finally:
+            lambda_store.PYTHON_VERSION = version
+        self.assertEqual(other.minified, 1)
+
+    def test_size_is_checked_for_stored_artifacts(self):
+        path = self.write_lambda('handler.py', LAMBDA)
+        lambda_store.LambdaStore(self.store_dir).resolve(path)
+        small = lambda_store.LambdaStore(self.store_dir, max_size=10)
+        self.assertRaises(AssertionError, small.resolve, path)
+
+    def test_report_lists_shared_artifacts(self):
+        store = lambda_store.LambdaStore(None)
+        shared = store.resolve(self.write_lambda('shared.py', LAMBDA))
+        single = store.resolve(self.write_lambda('single.py', LAMBDA.replace('event\n', 'None\n')))
+        store.add_user(shared, "B/aws-B.json")
+        store.add_user(shared, "A/aws-A.json")
+        store.add_user(single, "A/aws-A.json")
+        self.assertEqual(store.shared(), [(shared, ["A/aws-A.json", "B/aws-B.json"])])
+        self.assertEqual(store.report()[1:], ["    A/aws-A.json", "    B/aws-B.json"])
+        self.assertIn("shared.py", store.report()[0])
+
+    def test_repository_shared_lambdas(self):
+        if sys.version_info[0] > 2:
+            self.skipTest("the repository Lambdas target python2.7")
+        store = lambda_store.LambdaStore(None)
+        for project_dir in document_builder.find_projects():
+            project = document_builder.DocumentProject(project_dir, store=store)
+            for target in project.targets():
+                project.resolve_lambdas(target)
+        shared = dict((artifact.name, documents) for artifact, documents in store.shared())
+        self.assertEqual(shared["wait_rds_instance.py"], [
+            "RebootRds/aws-RebootRdsInstance.json",
+            "StartRdsInstance/aws-StartRdsInstance.json",
+            "StopRdsInstance/aws-StopRdsInstance.json"
+        ])
+        self.assertEqual(shared["update_cf_template.py"], [
+            "UpdateCloudFormationTemplate/aws-UpdateCloudFormationTemplate.json",
+            "UpdateCloudFormationWithApproval/aws-UpdateCloudFormationWithApproval.json"
+        ])
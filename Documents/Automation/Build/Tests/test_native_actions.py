@@ -0,0 +1,193 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import json
+import os
+import sys
+import unittest
+from collections import OrderedDict
+
+BUILD_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+AUTOMATION_DIR = os.path.dirname(BUILD_DIR)
+
+sys.path.append(BUILD_DIR)
+import document_builder  # noqa pylint: disable=import-error,wrong-import-position
+import native_actions  # noqa pylint: disable=import-error,wrong-import-position
+import document_validator  # noqa pylint: disable=import-error,wrong-import-position
+
+TEMPLATE = {"Resources": {
+    "Role": {"Type": "AWS::IAM::Role"},
+    "TestLambda": {"Type": "AWS::Lambda::Function", "Properties": {"FunctionName": {"Ref": "LambdaName"}}}}}
+
+SINGLE_CALL = """import boto3
+
+ec2 = boto3.client('ec2')
+
+
+def handler(event, context):
+    response = ec2.create_image(InstanceId=event["InstanceId"], Name="copy", NoReboot=True)
+    return {"ImageId": response["ImageId"]}
+"""
+
+
+def read(*path):
+    with open(os.path.join(AUTOMATION_DIR, *path)) as fp:
+        return fp.read()
+
+
+def document(steps, outputs=None):
+    stack = OrderedDict([("name", "createStack"), ("action", "aws:createStack"), ("inputs", {
+        "StackName": "Stack{{automation:EXECUTION_ID}}", "TemplateBody": "...",
+        "Parameters": [{"ParameterKey": "LambdaName", "ParameterValue": "Test-{{automation:EXECUTION_ID}}"}]})])
+    delete = OrderedDict([("name", "deleteStack"), ("action", "aws:deleteStack"),
+                          ("inputs", {"StackName": "Stack{{automation:EXECUTION_ID}}"})])
+    result = OrderedDict([("schemaVersion", "0.3"), ("description", "Test"),
+                          ("parameters", {"InstanceId": {"type": "String"}}),
+                          ("mainSteps", [stack] + steps + [delete])])
+    if outputs is not None:
+        result["outputs"] = outputs
+    return result
+
+
+def invoke(name, payload, **attributes):
+    step = OrderedDict([("name", name), ("action", "aws:invokeLambdaFunction"), ("inputs", {
+        "FunctionName": "Test-{{automation:EXECUTION_ID}}", "Payload": json.dumps(payload)})])
+    step.update(attributes)
+    return step
+
+
+class ReadHandlerTest(unittest.TestCase):
+    def test_single_call(self):
+        handler = native_actions.read_handler(read('CopySnapshot', 'Documents', 'Lambdas', 'copy_snapshot.py'))
+        self.assertEqual(handler.kind, 'call')
+        call, = handler.calls
+        self.assertEqual((call.service, call.api), ('ec2', 'CopySnapshot'))
+        self.assertEqual(dict(call.arguments), {'Description': ('event', 'Description'),
+                                                'SourceRegion': ('event', 'SourceRegion'),
+                                                'SourceSnapshotId': ('event', 'SnapshotId')})
+        self.assertEqual(handler.outputs, [('SnapshotId', '$.SnapshotId')])
+
+    def test_wait_loop_with_python2_prints(self):
+        handler = native_actions.read_handler(read('Lambdas', 'wait_rds_instance.py'))
+        self.assertEqual(handler.kind, 'wait')
+        self.assertEqual(handler.calls[0].api, 'DescribeDBInstances')
+        self.assertEqual((handler.selector, handler.event_key), ('$.DBInstances[0].DBInstanceStatus', 'States'))
+
+    def test_switch_and_guarded_calls(self):
+        switch = native_actions.read_handler(read('ConfigureCloudWatchOnEC2Instance', 'Documents', 'Lambdas',
+                                                  'configure_cloudwatch_on_ec2_instance.py'))
+        self.assertEqual((switch.kind, switch.event_key, switch.default, switch.values),
+                         ('switch', 'status', 'Enabled', ['Enabled', 'Disabled']))
+        self.assertEqual([call.api for call in switch.calls], ['MonitorInstances', 'UnmonitorInstances'])
+        self.assertEqual(switch.calls[0].arguments['InstanceIds'], ('list', [('event', 'InstanceId')]))
+
+        guarded = native_actions.read_handler(read('RebootRds', 'Documents', 'Lambdas', 'reboot_rds_instance.py'))
+        self.assertEqual((guarded.kind, guarded.values), ('guarded', ['rebooting']))
+        self.assertEqual([call.api for call in guarded.calls], ['DescribeDBInstances', 'RebootDBInstance'])
+        self.assertEqual(guarded.outputs, [('InstanceStatus', '$.DBInstances[0].DBInstanceStatus')])
+
+    def test_unsupported_handlers(self):
+        for path in (('CreateSnapshot', 'Documents', 'Lambdas', 'create_snapshot.py'),
+                     ('DetachEBSVolumes', 'Documents', 'Lambdas', 'detach_volume.py')):
+            with self.assertRaises(native_actions.NotNative):
+                native_actions.read_handler(read(*path))
+        with self.assertRaises(native_actions.NotNative):
+            native_actions.read_handler("import boto3\n\ndef handler(event, context):\n"
+                                        "    boto3.client('ec2').stop_instances(InstanceIds=event['Ids'][:1])\n")
+
+
+class ReplaceLambdasTest(unittest.TestCase):
+    def replace(self, doc, source=SINGLE_CALL, template=None):
+        report = native_actions.replace_lambdas(doc, 'createStack', template or TEMPLATE, {'TestLambda': source})
+        if report.kept is None:
+            self.assertEqual(document_validator.validate_document(json.loads(json.dumps(doc))), [])
+        return report
+
+    def test_stack_is_removed(self):
+        doc = document([invoke('createImage', {"InstanceId": "{{InstanceId}}"})], ['createImage.Payload'])
+        report = self.replace(doc)
+        self.assertIsNone(report.kept)
+        self.assertEqual(report.replaced, [('createImage', 'call')])
+        self.assertEqual(report.removed, ['createStack', 'deleteStack'])
+        # createStack (120s) + invoke (5s) + deleteStack (90s) - executeAwsApi (1s)
+        self.assertEqual(report.seconds_saved, 214)
+        step, = doc['mainSteps']
+        self.assertEqual(step['action'], 'aws:executeAwsApi')
+        self.assertEqual(dict(step['inputs']), {'Service': 'ec2', 'Api': 'CreateImage', 'InstanceId': '{{InstanceId}}',
+                                                'Name': 'copy', 'NoReboot': True})
+        self.assertEqual([dict(output) for output in step['outputs']],
+                         [{'Name': 'ImageId', 'Selector': '$.ImageId', 'Type': 'String'}])
+        self.assertEqual(doc['outputs'], ['createImage.ImageId'])
+
+    def test_transitions_to_removed_steps(self):
+        sleep = OrderedDict([("name", "sleep"), ("action", "aws:sleep"), ("inputs", {"Duration": "PT1S"}),
+                             ("onFailure", "step:deleteStack")])
+        doc = document([sleep, invoke('createImage', {"InstanceId": "{{InstanceId}}"}, nextStep='deleteStack',
+                                      onFailure='step:deleteStack')])
+        doc['mainSteps'].append(OrderedDict([("name", "notify"), ("action", "aws:sleep"),
+                                             ("inputs", {"Duration": "PT1S"})]))
+        self.assertIsNone(self.replace(doc).kept)
+        steps = doc['mainSteps']
+        self.assertEqual([step['name'] for step in steps], ['sleep', 'createImage', 'notify'])
+        self.assertEqual(steps[0]['onFailure'], 'step:notify')
+        self.assertEqual((steps[1]['nextStep'], steps[1]['onFailure']), ('notify', 'step:notify'))
+
+    def test_rds_document(self):
+        doc = document_builder.open_document(os.path.join(AUTOMATION_DIR, 'RebootRds', 'Documents',
+                                                          'aws-RebootRdsInstance.json'))
+        sources = {'RebootRdsInstanceLambda': read('RebootRds', 'Documents', 'Lambdas', 'reboot_rds_instance.py'),
+                   'WaitRdsInstanceLambda': read('Lambdas', 'wait_rds_instance.py')}
+        template = document_builder.open_cloud_formation_template(os.path.join(
+            AUTOMATION_DIR, 'RebootRds', 'Documents', 'CloudFormationTemplates', 'RebootRdsInstanceCFTemplate.yml'))
+        report = native_actions.replace_lambdas(doc, 'createDocumentStack', template, sources)
+        self.assertEqual(report.replaced, [('reboot', 'guarded'), ('wait_for_state', 'wait')])
+        self.assertEqual(document_validator.validate_document(json.loads(json.dumps(doc))), [])
+        steps = doc['mainSteps']
+        self.assertEqual([step['action'] for step in steps], ['aws:executeAwsApi', 'aws:branch', 'aws:executeAwsApi',
+                                                              'aws:waitForAwsResourceProperty'])
+        self.assertEqual(dict(steps[1]['inputs']['Choices'][0]), {
+            'Variable': '{{reboot.InstanceStatus}}', 'StringEquals': 'rebooting', 'NextStep': 'wait_for_state'})
+        self.assertEqual(steps[1]['inputs']['Default'], 'rebootRebootDBInstance')
+        self.assertEqual(steps[3]['inputs']['DesiredValues'], ['available'])
+        self.assertEqual((steps[3]['maxAttempts'], steps[3]['timeoutSeconds']), (10, 600))
+
+    def test_switch_needs_a_known_value(self):
+        source = read('ConfigureCloudWatchOnEC2Instance', 'Documents', 'Lambdas',
+                      'configure_cloudwatch_on_ec2_instance.py')
+        doc = document([invoke('configure', {"InstanceId": "{{InstanceId}}", "status": "{{status}}"})])
+        doc['parameters']['status'] = {"type": "String", "default": "Enabled"}
+        self.assertIn('may be empty', self.replace(doc, source).kept)
+
+        doc['parameters']['status']['allowedValues'] = ['Enabled', 'Disabled']
+        self.assertIsNone(self.replace(doc, source).kept)
+        branch = doc['mainSteps'][0]
+        self.assertEqual([choice['StringEquals'] for choice in branch['inputs']['Choices']], ['Enabled'])
+        self.assertEqual(branch['inputs']['Default'], 'configureUnmonitorInstances')
+        self.assertTrue(doc['mainSteps'][1]['isEnd'])
+
+    def test_document_is_kept(self):
+        doc = document([invoke('createImage', {"InstanceId": "{{InstanceId}}"})],
+                       ['createImage.LogResult'])
+        original = json.dumps(doc)
+        self.assertIn('createImage.LogResult', self.replace(doc).kept)
+        template = {"Resources": dict(TEMPLATE["Resources"], Volume={"Type": "AWS::EC2::Volume"})}
+        self.assertIn('Volume', self.replace(document([invoke('createImage', {})]), template=template).kept)
+        self.assertIn('payload has no InstanceId', self.replace(document([invoke('createImage', {})])).kept)
+        self.assertEqual(json.dumps(doc), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
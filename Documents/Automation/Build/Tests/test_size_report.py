@@ -0,0 +1,101 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+BUILD_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(BUILD_DIR)
+import document_builder  # noqa pylint: disable=import-error,wrong-import-position
+import size_report  # noqa pylint: disable=import-error,wrong-import-position
+
+SIZES = {
+    "document": 5364, "parameters": 462, "mainSteps": 4616, "template": 2991, "template_skeleton": 2090,
+    "lambdas": {"RebootRdsInstanceLambda": 364, "WaitRdsInstanceLambda": 395}
+}
+
+
+def result(project, output, sizes):
+    return document_builder.BuildResult(project, output, True, 0.0, sizes, True)
+
+
+def grown(sizes, component, size):
+    sizes = dict(sizes, lambdas=dict(sizes["lambdas"]))
+    if component in sizes["lambdas"]:
+        sizes["lambdas"][component] = size
+    else:
+        sizes[component] = size
+    return sizes
+
+
+class SizeReportTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_report_keeps_documents_of_previous_builds(self):
+        previous = size_report.make_report([result("A", "aws-A.json", SIZES), result("B", "aws-B.json", SIZES)])
+        smaller = dict(SIZES, document=100)
+        report = size_report.make_report([result("A", "aws-A.json", smaller)], previous)
+        self.assertEqual(report["documents"], {"A/aws-A.json": smaller, "B/aws-B.json": SIZES})
+        self.assertEqual(report["limits"], {"lambda": 4096, "template": 51200})
+
+        path = os.path.join(self.temp_dir, 'size-report.json')
+        self.assertIsNone(size_report.load_report(path))
+        self.assertTrue(size_report.save_report(report, path))
+        self.assertEqual(size_report.load_report(path), report)
+        self.assertFalse(size_report.save_report(report, path))
+
+    def test_components_are_flattened(self):
+        flat = size_report.components(SIZES)
+        self.assertEqual(flat["lambda:WaitRdsInstanceLambda"], 395)
+        self.assertEqual(flat["template_skeleton"], 2090)
+        self.assertNotIn("lambdas", flat)
+
+    def test_growth_beyond_both_thresholds_is_a_regression(self):
+        previous = size_report.make_report([result("A", "aws-A.json", SIZES)])
+        self.assertEqual(size_report.find_regressions(None, previous), [])
+
+        # 4616 -> 4816 is 4.3%, 364 -> 480 is 32% but only 116 bytes.
+        current = size_report.make_report([result("A", "aws-A.json", grown(SIZES, "mainSteps", 4816))])
+        self.assertEqual(size_report.find_regressions(previous, current), [])
+        current = size_report.make_report([result("A", "aws-A.json", grown(SIZES, "RebootRdsInstanceLambda", 480))])
+        self.assertEqual(size_report.find_regressions(previous, current, min_growth=100), [
+            size_report.Regression("A/aws-A.json", "lambda:RebootRdsInstanceLambda", 364, 480)
+        ])
+        self.assertEqual(size_report.find_regressions(previous, current, min_growth=200), [])
+        self.assertEqual(size_report.find_regressions(previous, current, max_growth=0.5), [])
+
+        # new documents and new components have nothing to compare with.
+        current = size_report.make_report([result("B", "aws-B.json", SIZES)])
+        self.assertEqual(size_report.find_regressions(previous, current), [])
+
+    def test_format(self):
+        report = size_report.make_report([result("A", "aws-A.json", SIZES),
+                                          result("B", "aws-B.json", {"document": 10, "parameters": 2, "mainSteps": 5})])
+        table = size_report.format_table(report)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table[1].split(), ["A/aws-A.json", "462", "4616", "2991", "2090", "759", "5364", "10%", "6%"])
+        self.assertEqual(table[2].split(), ["B/aws-B.json", "2", "5", "0", "0", "0", "10", "-", "-"])
+        self.assertEqual(
+            size_report.format_regression(size_report.Regression("A/aws-A.json", "template", 2000, 2500)),
+            "A/aws-A.json template grew from 2000 to 2500 bytes (+25.0%)")
@@ -0,0 +1,115 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+BUILD_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(BUILD_DIR)
+import benchmark_template_loader  # noqa pylint: disable=import-error,wrong-import-position
+import template_loader  # noqa pylint: disable=import-error,wrong-import-position
+
+TEMPLATE = """---
+AWSTemplateFormatVersion: "2010-09-09"
+Conditions:
+  HasName: !Not [!Equals [!Ref FunctionName, ""]]
+Resources:
+  TestLambda:
+    Type: AWS::Lambda::Function
+    Condition: HasName
+    Properties:
+      FunctionName: !Ref FunctionName
+      Role: !GetAtt LambdaRole.Arn
+      Description: !Sub
+        - "${Name} function"
+        - Name: !Ref FunctionName
+"""
+
+
+class TemplateLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.path = os.path.join(self.temp_dir, 'Test.yml')
+        self.write(TEMPLATE)
+        template_loader.clear_memory_cache()
+
+    def tearDown(self):
+        template_loader.clear_memory_cache()
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, content):
+        with open(self.path, 'w') as fp:
+            fp.write(content)
+
+    def cache_files(self):
+        return os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else []
+
+    def test_intrinsic_tags_are_expanded(self):
+        template = template_loader.load_template(self.path, self.cache_dir)
+        self.assertEqual(template["Conditions"]["HasName"],
+                         {"Fn::Not": [{"Fn::Equals": [{"Ref": "FunctionName"}, ""]}]})
+        properties = template["Resources"]["TestLambda"]["Properties"]
+        self.assertEqual(properties["Role"], {"Fn::GetAtt": ["LambdaRole", "Arn"]})
+        self.assertEqual(properties["Description"],
+                         {"Fn::Sub": ["${Name} function", {"Name": {"Ref": "FunctionName"}}]})
+
+    def test_parsed_template_is_cached_on_disk_by_content(self):
+        template = template_loader.load_template(self.path, self.cache_dir)
+        self.assertEqual(len(self.cache_files()), 1)
+
+        # a fresh process reads the disk cache instead of parsing the template.
+        cache_file = os.path.join(self.cache_dir, self.cache_files()[0])
+        with open(cache_file, 'w') as fp:
+            json.dump({"cached": True}, fp)
+        template_loader.clear_memory_cache()
+        self.assertEqual(template_loader.load_template(self.path, self.cache_dir), {"cached": True})
+
+        # a changed template gets its own entry.
+        self.write(TEMPLATE.replace("FunctionName: !Ref", "Handler: index.handler\n      FunctionName: !Ref"))
+        changed = template_loader.load_template(self.path, self.cache_dir)
+        self.assertEqual(changed["Resources"]["TestLambda"]["Properties"]["Handler"], "index.handler")
+        self.assertEqual(len(self.cache_files()), 2)
+        self.assertNotEqual(changed, template)
+
+    def test_loaded_templates_are_independent_copies(self):
+        first = template_loader.load_template(self.path, self.cache_dir)
+        first["Resources"].clear()
+        self.assertIn("TestLambda", template_loader.load_template(self.path, self.cache_dir)["Resources"])
+
+    def test_templates_without_a_json_form_are_not_cached(self):
+        self.write("Created: 2018-01-01\nPorts:\n  80: http\n")
+        template = template_loader.load_template(self.path, self.cache_dir)
+        self.assertEqual(template["Ports"], {80: "http"})
+        self.assertEqual(self.cache_files(), [])
+
+    def test_disabled_cache(self):
+        template_loader.load_template(self.path, None)
+        self.assertEqual(self.cache_files(), [])
+
+    def test_repository_templates_match_the_pure_python_loader(self):
+        import yaml
+
+        loader = benchmark_template_loader.pure_python_loader()
+        for path in benchmark_template_loader.find_templates():
+            with open(path) as fp:
+                expected = yaml.load(fp.read(), Loader=loader)
+            self.assertEqual(template_loader.load_template(path, self.cache_dir), expected, path)
@@ -0,0 +1,121 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Compare cold and warm load times of every CloudFormation template in the repository.
+
+    python Build/benchmark_template_loader.py [--repeat N]
+
+Each template is loaded with the pure-Python yaml.Loader the build used to
+call, with the libyaml loader and no cache (cold), from the on-disk cache of a
+fresh process (warm disk) and from the in-process cache (warm memory). The
+best of N runs is reported per loader, in milliseconds.
+"""
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import template_loader
+
+
+def find_templates(root=template_loader.AUTOMATION_DIR):
+    """Return every .yml/.yaml file under root."""
+    templates = []
+    for pattern in ('*.yml', '*.yaml'):
+        for dir_path, _, _ in os.walk(root):
+            templates.extend(glob.glob(os.path.join(dir_path, pattern)))
+    return sorted(templates)
+
+
+def pure_python_loader():
+    import yaml
+
+    class PurePythonLoader(yaml.Loader):  # pylint: disable=too-many-ancestors
+        pass
+
+    PurePythonLoader.add_multi_constructor("!", template_loader.aws_tag_multi_constructor)
+    return PurePythonLoader
+
+
+def read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def best_time(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+
+def benchmark(templates, repeat):
+    """Return [(template, {loader name: milliseconds})] for every template."""
+    import yaml
+
+    loader = pure_python_loader()
+    cache_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for path in templates:
+            def pure_python():
+                yaml.load(read(path), Loader=loader)
+
+            def cold():
+                template_loader.parse_template(read(path))
+
+            def warm_disk():
+                template_loader.clear_memory_cache()
+                template_loader.load_template(path, cache_dir)
+
+            def warm_memory():
+                template_loader.load_template(path, cache_dir)
+
+            template_loader.load_template(path, cache_dir)
+            results.append((path, {
+                "yaml.Loader": best_time(pure_python, repeat),
+                "libyaml cold": best_time(cold, repeat),
+                "warm disk": best_time(warm_disk, repeat),
+                "warm memory": best_time(warm_memory, repeat),
+            }))
+    finally:
+        template_loader.clear_memory_cache()
+        shutil.rmtree(cache_dir)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per template and loader (default: 5)')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    columns = ["yaml.Loader", "libyaml cold", "warm disk", "warm memory"]
+    print("libyaml available: {}".format(template_loader.using_libyaml()))
+    print("{:<70}".format("template (ms)") + "".join("{:>14}".format(c) for c in columns))
+    totals = dict((c, 0.0) for c in columns)
+    for path, times in benchmark(find_templates(), args.repeat):
+        print("{:<70}".format(os.path.relpath(path, template_loader.AUTOMATION_DIR)[-70:]) +
+              "".join("{:>14.3f}".format(times[c]) for c in columns))
+        for column in columns:
+            totals[column] += times[column]
+    print("{:<70}".format("total") + "".join("{:>14.3f}".format(totals[c]) for c in columns))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Build the Output documents of one or more document projects.
+
+    python2 Build/build_documents.py                 # every project with a manifest
+    python2 Build/build_documents.py RebootRds       # only the given project(s)
+    python2 Build/build_documents.py --force .       # rebuild even if up to date
+    python2 Build/build_documents.py --jobs 1        # build serially in this process
+    python2 Build/build_documents.py --template-format json  # embed templates as minified JSON
+    python2 Build/build_documents.py --native-actions  # replace simple Lambdas by native actions
+    python2 Build/build_documents.py --max-growth 10 # allow components to grow by 10%
+    python2 Build/build_documents.py --watch DetachEBSVolumes  # rebuild on every change
+
+The Lambdas target the python2.7 runtime and are checked by parsing them, so
+the build runs under python2.
+
+After the build, the size of every component of every document is printed and
+saved to the size report, and the build fails if a component grew by more than
+--max-growth percent and --min-growth bytes since the previous report. The
+report is then left unchanged until the growth is accepted with --accept-growth.
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+import document_builder
+import document_watcher
+import lambda_store
+import size_report
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('projects', nargs='*', help='document project directories (default: all)')
+    parser.add_argument('-f', '--force', action='store_true', help='rebuild targets even if they are up to date')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--template-format', choices=document_builder.TEMPLATE_FORMATS, default=None,
+                        help='format of embedded CloudFormation templates (default: per project manifest)')
+    parser.add_argument('--native-actions', action='store_true',
+                        help='replace the Lambdas making a single API call or waiting for a state by native '
+                             'actions, and report the time saved per document')
+    parser.add_argument('--size-report', default=size_report.REPORT_FILE,
+                        help='size report to compare with and update (default: %(default)s)')
+    parser.add_argument('--max-growth', type=float, default=size_report.MAX_GROWTH * 100,
+                        help='allowed growth of a component, in percent (default: %(default)s)')
+    parser.add_argument('--min-growth', type=int, default=size_report.MIN_GROWTH,
+                        help='growth in bytes always allowed for a component (default: %(default)s)')
+    parser.add_argument('--accept-growth', action='store_true',
+                        help='save the size report even if components grew more than allowed')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='after building, keep rebuilding the targets affected by each source file change')
+    parser.add_argument('--interval', type=float, default=0.2,
+                        help='seconds between two checks for changes in watch mode (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def print_result(result):
+    if result.built:
+        status = "built" if result.written else "built, unchanged"
+    else:
+        status = "up to date"
+    print("{}/{}: {} ({:.3f}s)".format(result.project, result.output, status, result.seconds))
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if sys.version_info[0] != 2:
+        print("The build must run under python2, the runtime of the Lambdas it minifies and checks "
+              "(this is python {}.{})".format(*sys.version_info[:2]), file=sys.stderr)
+        return 2
+    projects = args.projects or document_builder.find_projects()
+
+    start = time.time()
+    store = lambda_store.LambdaStore()
+    results = document_builder.build_projects(projects, jobs=args.jobs, force=args.force, callback=print_result,
+                                              template_format=args.template_format, store=store,
+                                              native=args.native_actions)
+    for line in store.report():
+        print(line)
+    print("{} of {} targets built in {:.3f}s wall time ({:.3f}s of target time)".format(
+        len([r for r in results if r.built]), len(results), time.time() - start, sum(r.seconds for r in results)))
+    status = check_sizes(results, args)
+    if args.watch:
+        document_watcher.DocumentWatcher(projects, args.template_format, store, print_result,
+                                         args.native_actions).run(args.interval)
+    return status
+
+
+def check_sizes(results, args):
+    previous = size_report.load_report(args.size_report)
+    report = size_report.make_report(results, previous)
+    for line in size_report.format_table(report):
+        print(line)
+
+    regressions = size_report.find_regressions(previous, report, args.max_growth / 100, args.min_growth)
+    for regression in regressions:
+        print("Size regression: " + size_report.format_regression(regression), file=sys.stderr)
+    if regressions and not args.accept_growth:
+        print("Size report {} not updated; rerun with --accept-growth to accept the new sizes".format(
+            args.size_report), file=sys.stderr)
+        return 1
+    size_report.save_report(report, args.size_report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
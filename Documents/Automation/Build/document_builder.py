@@ -0,0 +1,596 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Shared build engine for SSM Automation documents.
+
+Every document project describes its build in Setup/manifest.json:
+
+    {
+      "document": "aws-RebootRdsInstance.json",
+      "template": "RebootRdsInstanceCFTemplate.yml",
+      "stack_step": "createDocumentStack",
+      "lambdas": [
+        {"resource": "RebootRdsInstanceLambda", "file": "reboot_rds_instance.py"},
+        {"resource": "WaitRdsInstanceLambda", "shared": "wait_rds_instance.py"}
+      ],
+      "targets": [
+        {"output": "aws-RebootRdsInstance.json"}
+      ]
+    }
+
+Each target may also carry "payloads" (step name -> Lambda payload), "overlays"
+(documents deep-merged into the base document) and an "approval" step, and
+variants of one base can be declared as a "matrix" (see expand_matrix). The
+base document and its template are rendered once per project and shared by
+every target. Lambdas are read from the project's Lambdas folder ("file") or
+the shared Lambdas folder ("shared") and inlined through a
+lambda_store.LambdaStore, templates are parsed through the template_loader
+cache, and a project may set "template_format" to "json" to embed its template
+as minified JSON instead of indented YAML, or set "native_actions" to replace
+its Lambdas by native actions where it can (see native_actions). Targets are
+keyed on a digest of every input they read, so an unchanged target is skipped
+without loading PyYAML or re-inlining any Lambda.
+
+Outputs are deterministic: documents keep the key order of their sources (and
+"parameter_order", if given, reorders the parameters), payloads and templates
+are serialized with sorted keys, and an output is only replaced, atomically,
+when its bytes change. Each target's cache entry records the sha256 of its
+output, so deploy and test tooling can skip uploading unchanged documents.
+"""
+from __future__ import print_function
+
+import copy
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict, namedtuple
+
+import lambda_store
+import template_loader
+
+AUTOMATION_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+MANIFEST_FILE = os.path.join('Setup', 'manifest.json')
+DOCUMENT_DIR = 'Documents'
+LAMBDA_DIR = os.path.join('Documents', 'Lambdas')
+CFT_DIR = os.path.join('Documents', 'CloudFormationTemplates')
+OUTPUT_DIR = 'Output'
+CACHE_FILE = '.build-cache.json'
+
+TEMPLATE_FORMATS = ('yaml', 'json')
+
+LAMBDA_MAX_SIZE = lambda_store.LAMBDA_MAX_SIZE
+TEMPLATE_MAX_SIZE = 51200
+
+# sizes holds the byte size of each component of the output, see DocumentProject.render;
+# written is False when the output already held the rendered bytes and was left untouched.
+BuildResult = namedtuple('BuildResult', ['project', 'output', 'built', 'seconds', 'sizes', 'written'])
+
+
+def file_digest(path):
+    """Return the sha256 hex digest of a file's content."""
+    with open(path, 'rb') as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def open_cloud_formation_template(path, cache_dir=template_loader.CACHE_DIR):
+    return template_loader.load_template(path, cache_dir)
+
+
+def dump_cloud_formation_template(template, template_format='yaml'):
+    """Serialize a template for a TemplateBody input, as indented YAML or minified JSON."""
+    if template_format == 'json':
+        return json.dumps(template, separators=(',', ':'), sort_keys=True)
+    # PyYAML is only imported once a target actually needs rebuilding; a no-op
+    # build never pays for it.
+    import yaml
+
+    return yaml.safe_dump(template, indent=2)
+
+
+def open_document(path):
+    with open(path) as fp:
+        # documents keep the key order of their source so outputs are the same
+        # with any interpreter, and the parameter order can be preserved.
+        return json.load(fp, object_pairs_hook=OrderedDict)
+
+
+def dump_document(document):
+    # explicit separators: python2 would otherwise leave a space after commas at line ends.
+    return json.dumps(document, indent=2, separators=(',', ': '))
+
+
+def write_if_changed(path, content):
+    """Atomically replace the file at path with content, unless it already holds it.
+
+    Returns True if the file was written. An unchanged file keeps its mtime, so
+    nothing downstream sees a change.
+    """
+    data = content if isinstance(content, bytes) else content.encode('utf-8')
+    try:
+        with open(path, 'rb') as fp:
+            if fp.read() == data:
+                return False
+        mode = os.stat(path).st_mode & 0o777
+    except (IOError, OSError):
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+
+    # write a temporary file next to path and rename it over path, so readers
+    # never see a partial file.
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.chmod(temp_path, mode)
+        os.rename(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return True
+
+
+def insert_lambda_in_cft(template, resource_name, code):
+    template["Resources"][resource_name]["Properties"]["Code"]["ZipFile"] = code
+
+
+def insert_cft_in_document(document, step_name, cft_template):
+    print("Cloud Formation Template is " + str(len(cft_template)) + "/" + str(TEMPLATE_MAX_SIZE) + " of max size",
+          file=sys.stderr)
+    assert len(cft_template) < TEMPLATE_MAX_SIZE, "CloudFormation template too long, must be less then 50000"
+    for step in document["mainSteps"]:
+        if step["name"] == step_name:
+            step["inputs"]["TemplateBody"] = cft_template
+            break
+
+
+# params should be a string holding the JSON encoded parameters to the lambda function
+def insert_params_to_lambda_in_document(document, step_name, params):
+    for step in document["mainSteps"]:
+        if step["name"] == step_name:
+            step["inputs"]["Payload"] = params
+            break
+
+
+def update_document(main_document, subset_document):
+    """Deep-merge subset_document into main_document."""
+    processed = set([])
+    for item, value in main_document.items():
+        if item in subset_document:
+            if isinstance(subset_document[item], dict):
+                update_document(value, subset_document[item])
+                processed.add(item)
+        else:
+            main_document[item] = value
+
+    for item, value in subset_document.items():
+        if item not in processed:
+            main_document[item] = value
+
+
+def insert_approval_step(document, message, before=None):
+    index = 0
+    if before is not None:
+        for step in document["mainSteps"]:
+            if step["name"] == before:
+                break
+            index += 1
+
+    document["mainSteps"].insert(index, OrderedDict([
+        ("name", "approve"),
+        ("action", "aws:approve"),
+        ("onFailure", "Abort"),
+        ("inputs", OrderedDict([
+            ("NotificationArn", "{{SNSTopicArn}}"),
+            ("Message", message),
+            ("MinRequiredApprovals", 1),
+            ("Approvers", "{{Approvers}}")
+        ]))
+    ]))
+
+
+def sort_param(document, sort_list):
+    document["parameters"] = OrderedDict(
+        sorted(
+            document["parameters"].items(),
+            key=lambda t: sort_list.index(t[0])
+        ))
+
+
+_BUILDER_DIGEST = []
+
+
+def _builder_digest():
+    # changes to the build engine itself invalidate every target.
+    if not _BUILDER_DIGEST:
+        build_dir = os.path.dirname(os.path.realpath(__file__))
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(build_dir)):
+            if name.endswith('.py'):
+                digest.update(file_digest(os.path.join(build_dir, name)).encode('utf-8'))
+        _BUILDER_DIGEST.append(digest.hexdigest())
+    return _BUILDER_DIGEST[0]
+
+
+def _merge_variant(target, variant):
+    # lists (overlays) are concatenated, mappings (payloads, approval) merged.
+    for key, value in variant.items():
+        if isinstance(value, list):
+            target[key] = target.get(key, []) + value
+        elif isinstance(value, dict):
+            target[key] = _merge_variant(dict(target.get(key, {})), value)
+        else:
+            target[key] = value
+    return target
+
+
+def expand_matrix(matrix):
+    """Return the targets of a variant matrix, one per combination of a variant of each axis.
+
+    A matrix names its output after the "value" of the variant picked on each
+    axis, and each variant carries the "overlays", "payloads" or "approval" it
+    adds to the target:
+
+        {
+          "output": "aws-CreateManaged{platform}Instance{approval}.json",
+          "axes": [
+            {"name": "platform", "variants": [
+              {"value": "Linux", "overlays": ["aws-CreateManagedLinuxInstance.json"]}, ...]},
+            {"name": "approval", "variants": [
+              {"value": ""}, {"value": "WithApproval", "approval": {...}}]}
+          ]
+        }
+    """
+    targets = []
+    axes = matrix["axes"]
+    for variants in itertools.product(*[axis["variants"] for axis in axes]):
+        values = dict((axis["name"], variant.get("value", "")) for axis, variant in zip(axes, variants))
+        target = {"output": matrix["output"].format(**values)}
+        for variant in variants:
+            _merge_variant(target, dict((k, v) for k, v in variant.items() if k != "value"))
+        targets.append(target)
+    return targets
+
+
+def find_projects(root=AUTOMATION_DIR):
+    """Return every document project directory under root that has a build manifest."""
+    projects = []
+    for name in sorted(os.listdir(root)):
+        if os.path.isfile(os.path.join(root, name, MANIFEST_FILE)):
+            projects.append(os.path.join(root, name))
+    return projects
+
+
+class DocumentProject(object):
+    """A document project directory and the targets declared in its manifest."""
+
+    def __init__(self, project_dir, template_format=None, store=None, native=False,
+                 cache_dir=template_loader.CACHE_DIR):
+        """Load the project manifest.
+
+        template_format overrides the manifest's "template_format" and native,
+        if True, the manifest's "native_actions"; store is the LambdaStore to
+        resolve Lambdas through, which may be shared by projects, and cache_dir
+        the template_loader cache the templates are parsed through.
+        """
+        self.project_dir = os.path.abspath(project_dir)
+        self.name = os.path.basename(self.project_dir)
+        with open(os.path.join(self.project_dir, MANIFEST_FILE)) as fp:
+            self.manifest = json.load(fp)
+        self.output_dir = os.path.join(self.project_dir, OUTPUT_DIR)
+        self.template_format = template_format or self.manifest.get("template_format", "yaml")
+        assert self.template_format in TEMPLATE_FORMATS, "Unsupported template format " + self.template_format
+        self.native = native or self.manifest.get("native_actions", False)
+        self.lambda_store = store if store is not None else lambda_store.LambdaStore()
+        self.cache_dir = cache_dir
+        self._targets = self.manifest.get("targets", [])
+        if "matrix" in self.manifest:
+            self._targets = self._targets + expand_matrix(self.manifest["matrix"])
+        # (digest of the base inputs, base document, base sizes, Lambda artifacts)
+        self._base = None
+
+    def targets(self):
+        """Return the targets listed in the manifest followed by those of its "matrix"."""
+        return self._targets
+
+    def output_path(self, target):
+        return os.path.join(self.output_dir, target["output"])
+
+    def document_path(self, file_name):
+        return os.path.join(self.project_dir, DOCUMENT_DIR, file_name)
+
+    def template_path(self, file_name):
+        return os.path.join(self.project_dir, CFT_DIR, file_name)
+
+    def lambda_path(self, item):
+        if "shared" in item:
+            return os.path.join(lambda_store.SHARED_LAMBDA_DIR, item["shared"])
+        return os.path.normpath(os.path.join(self.project_dir, LAMBDA_DIR, item["file"]))
+
+    def document_name(self, target):
+        return "{}/{}".format(self.name, target["output"])
+
+    def base_files(self):
+        """Return the source files of the base document shared by every target."""
+        files = [self.document_path(self.manifest["document"])]
+        if "template" in self.manifest:
+            files.append(self.template_path(self.manifest["template"]))
+        for item in self.manifest.get("lambdas", []):
+            files.append(self.lambda_path(item))
+        return files
+
+    def input_files(self, target):
+        """Return every source file the target is built from."""
+        files = [os.path.join(self.project_dir, MANIFEST_FILE)] + self.base_files()
+        for overlay in target.get("overlays", []):
+            files.append(self.document_path(overlay))
+        if "approval" in target and "overlay" in target["approval"]:
+            files.append(self.document_path(target["approval"]["overlay"]))
+        return files
+
+    def input_digest(self, target):
+        """Return a digest covering the builder, the target definition and every input file."""
+        digest = hashlib.sha256()
+        digest.update(_builder_digest().encode('utf-8'))
+        digest.update(json.dumps(target, sort_keys=True).encode('utf-8'))
+        digest.update(self.template_format.encode('utf-8'))
+        if self.native:
+            digest.update(b'native_actions')
+        for path in self.input_files(target):
+            digest.update(os.path.relpath(path, self.project_dir).encode('utf-8'))
+            digest.update(file_digest(path).encode('utf-8'))
+        return digest.hexdigest()
+
+    def resolve_lambdas(self, target=None):
+        """Return {resource name: LambdaArtifact} for the Lambdas embedded in the target."""
+        artifacts = {}
+        for item in self.manifest.get("lambdas", []):
+            artifacts[item["resource"]] = self.lambda_store.resolve(self.lambda_path(item))
+            if target is not None:
+                self.lambda_store.add_user(artifacts[item["resource"]], self.document_name(target))
+        return artifacts
+
+    def render_template(self, artifacts, sizes=None):
+        """Return the CloudFormation template with the given Lambdas inlined, serialized for the document."""
+        template = open_cloud_formation_template(self.template_path(self.manifest["template"]), self.cache_dir)
+        for resource_name, artifact in sorted(artifacts.items()):
+            insert_lambda_in_cft(template, resource_name, artifact.code)
+
+        body = dump_cloud_formation_template(template, self.template_format)
+        if self.template_format != 'yaml':
+            yaml_size = len(dump_cloud_formation_template(template, 'yaml'))
+            print("{}: embedding the template as {} saves {} bytes ({} -> {})".format(
+                self.name, self.template_format, yaml_size - len(body), yaml_size, len(body)), file=sys.stderr)
+
+        if sizes is not None:
+            sizes["template"] = len(body)
+            sizes["lambdas"] = dict((name, len(artifact.code)) for name, artifact in artifacts.items())
+            for resource_name in artifacts:
+                insert_lambda_in_cft(template, resource_name, "")
+            sizes["template_skeleton"] = len(dump_cloud_formation_template(template, self.template_format))
+        return body
+
+    def render_base(self):
+        """Return the base document with its template inlined, its sizes and its Lambda artifacts.
+
+        The base is rendered once and shared by every target of the project
+        until one of its source files changes. Callers must not modify it.
+        """
+        digest = hashlib.sha256(self.template_format.encode('utf-8'))
+        for path in self.base_files():
+            digest.update(file_digest(path).encode('utf-8'))
+        if self._base is None or self._base[0] != digest.hexdigest():
+            document = open_document(self.document_path(self.manifest["document"]))
+            sizes = {}
+            artifacts = self.resolve_lambdas()
+            if "template" in self.manifest:
+                insert_cft_in_document(document, self.manifest["stack_step"], self.render_template(artifacts, sizes))
+            self._base = (digest.hexdigest(), document, sizes, artifacts)
+        return self._base[1:]
+
+    def render(self, target, sizes=None):
+        """Return the content of the target's Output document.
+
+        If sizes is a dict, the byte size of each component is recorded in it:
+        "document", "parameters", "mainSteps" and, for documents embedding a
+        template, "template", "template_skeleton" (the template without its
+        Lambda code) and "lambdas" (resource name -> minified code size).
+        """
+        base, base_sizes, artifacts = self.render_base()
+        for artifact in artifacts.values():
+            self.lambda_store.add_user(artifact, self.document_name(target))
+        # the copy shares the strings of the base, including its TemplateBody.
+        document = copy.deepcopy(base)
+
+        for step_name, params in sorted(target.get("payloads", {}).items()):
+            insert_params_to_lambda_in_document(document, step_name, json.dumps(params, sort_keys=True))
+
+        for overlay in target.get("overlays", []):
+            update_document(document, open_document(self.document_path(overlay)))
+
+        approval = target.get("approval")
+        if approval is not None:
+            document["description"] = document["description"] + approval.get("description_suffix", "")
+            if "overlay" in approval:
+                update_document(document, open_document(self.document_path(approval["overlay"])))
+            insert_approval_step(document, approval["message"], before=approval.get("before"))
+
+        report = None
+        if self.native and "template" in self.manifest:
+            report = self.replace_lambdas(document, target)
+
+        if "parameter_order" in self.manifest:
+            sort_param(document, self.manifest["parameter_order"])
+
+        content = dump_document(document) + "\n"
+        if sizes is not None:
+            sizes.update(copy.deepcopy(base_sizes))
+            if report is not None and report.kept is None:
+                for name in ("template", "template_skeleton", "lambdas"):
+                    sizes.pop(name, None)
+            sizes["document"] = len(content)
+            sizes["parameters"] = len(dump_document(document.get("parameters", {})))
+            sizes["mainSteps"] = len(dump_document(document["mainSteps"]))
+        return content
+
+    def replace_lambdas(self, document, target):
+        """Replace the Lambdas of the project's stack by native actions in the target's document.
+
+        Prints and returns the native_actions.Report.
+        """
+        # like PyYAML, the analysis it relies on is only imported by the builds that use it.
+        import native_actions
+
+        sources = {}
+        for item in self.manifest.get("lambdas", []):
+            with open(self.lambda_path(item)) as fp:
+                sources[item["resource"]] = fp.read()
+        template = open_cloud_formation_template(self.template_path(self.manifest["template"]), self.cache_dir)
+        report = native_actions.replace_lambdas(document, self.manifest["stack_step"], template, sources)
+        print(native_actions.format_report(self.document_name(target), report), file=sys.stderr)
+        return report
+
+    def load_cache(self):
+        try:
+            with open(os.path.join(self.output_dir, CACHE_FILE)) as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save_cache(self, cache):
+        write_if_changed(os.path.join(self.output_dir, CACHE_FILE),
+                         json.dumps(cache, indent=2, separators=(',', ': '), sort_keys=True) + "\n")
+
+    def target(self, output):
+        for target in self.targets():
+            if target["output"] == output:
+                return target
+        raise KeyError("{} has no target {}".format(self.name, output))
+
+    def prepare_output_dir(self):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+
+    def is_up_to_date(self, target, entry, digest):
+        output = self.output_path(target)
+        if entry is None or entry.get("inputs") != digest or not os.path.isfile(output):
+            return False
+        return file_digest(output) == entry.get("output")
+
+    def build_target(self, target, entry=None, force=False):
+        """Build one target unless its cache entry shows it is up to date.
+
+        Returns the BuildResult and the target's new cache entry; saving the
+        cache is left to the caller so targets can be built concurrently.
+        """
+        start = time.time()
+        digest = self.input_digest(target)
+        if not force and self.is_up_to_date(target, entry, digest):
+            return (BuildResult(self.name, target["output"], False, time.time() - start, entry.get("sizes"), False),
+                    entry)
+
+        sizes = {}
+        content = self.render(target, sizes)
+        written = write_if_changed(self.output_path(target), content)
+        entry = {
+            "inputs": digest,
+            "output": hashlib.sha256(content.encode('utf-8')).hexdigest(),
+            "sizes": sizes
+        }
+        return BuildResult(self.name, target["output"], True, time.time() - start, sizes, written), entry
+
+    def build(self, force=False):
+        """Build every out of date target and return a BuildResult for each."""
+        self.prepare_output_dir()
+        cache = self.load_cache()
+        results = []
+        try:
+            for target in self.targets():
+                result, cache[target["output"]] = self.build_target(target, cache.get(target["output"]), force)
+                results.append(result)
+        finally:
+            self.save_cache(cache)
+        return results
+
+
+def _build_targets(work):
+    project_dir, entries, force, template_format, native, store_dir, max_size, cache_dir = work
+    # the parent has already resolved every Lambda, so the worker's store finds
+    # them in the on-disk artifact store instead of minifying them again.
+    project = DocumentProject(project_dir, template_format, lambda_store.LambdaStore(store_dir, max_size), native,
+                              cache_dir)
+    built = []
+    for target in project.targets():
+        if target["output"] in entries:
+            built.append(project.build_target(target, entries[target["output"]], force))
+    return project_dir, built
+
+
+def build_projects(project_dirs, jobs=None, force=False, callback=None, template_format=None, store=None,
+                   native=False, cache_dir=template_loader.CACHE_DIR):
+    """Build every target of the given projects across a pool of worker processes.
+
+    Workers live for the whole build, so PyYAML is imported once per worker
+    rather than once per document, and each project is built by one worker so
+    its targets share the rendered base document (see render_base). callback,
+    if given, is called with each BuildResult as soon as its project finishes;
+    template_format overrides every manifest's "template_format" and native, if
+    True, turns on every manifest's "native_actions". Every Lambda is resolved
+    once through store (a new LambdaStore by default) before any target is
+    built, so the store records which documents share which artifacts.
+    Templates are parsed through the cache in cache_dir. Returns every
+    BuildResult.
+    """
+    store = store if store is not None else lambda_store.LambdaStore()
+    projects = dict((p.project_dir, p) for p in (DocumentProject(d, template_format, store, native, cache_dir)
+                                                 for d in project_dirs))
+    caches = {}
+    work = []
+    for project_dir in sorted(projects):
+        project = projects[project_dir]
+        project.prepare_output_dir()
+        caches[project_dir] = project.load_cache()
+        entries = {}
+        for target in project.targets():
+            project.resolve_lambdas(target)
+            entries[target["output"]] = caches[project_dir].get(target["output"])
+        work.append((project_dir, entries, force, template_format, native, store.store_dir, store.max_size,
+                     cache_dir))
+
+    jobs = jobs or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(min(jobs, len(work))) if jobs > 1 and len(work) > 1 else None
+    results = []
+    try:
+        built = pool.imap_unordered(_build_targets, work) if pool is not None else (_build_targets(w) for w in work)
+        for project_dir, project_results in built:
+            for result, entry in project_results:
+                caches[project_dir][result.output] = entry
+                results.append(result)
+                if callback is not None:
+                    callback(result)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        for project_dir, cache in caches.items():
+            projects[project_dir].save_cache(cache)
+    return results
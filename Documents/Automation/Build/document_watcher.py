@@ -0,0 +1,154 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Rebuild only the Output documents affected by a source file change.
+
+A DocumentWatcher keeps a dependency graph from every source file (manifest,
+documents, overlays, template and Lambdas, including shared ones) to the
+targets built from it, and polls those files for changes. A change rebuilds
+only the targets that read the file, in this process, so the projects and
+their manifests, the Lambda artifacts of the LambdaStore and the templates
+parsed by template_loader stay in memory between rebuilds.
+
+Changes to the build engine itself are not picked up; restart the watcher.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import traceback
+
+import document_builder
+import lambda_store
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+class DocumentWatcher(object):
+    """Watch the source files of the given projects and rebuild the targets they feed."""
+
+    def __init__(self, project_dirs, template_format=None, store=None, callback=None, native=False):
+        """callback, if given, is called with each BuildResult of a rebuild."""
+        self.template_format = template_format
+        self.native = native
+        self.lambda_store = store if store is not None else lambda_store.LambdaStore()
+        self.callback = callback
+        self.projects = {}
+        # source path -> set of (project directory, output name)
+        self.graph = {}
+        self.signatures = {}
+        for project_dir in project_dirs:
+            self.load_project(project_dir)
+
+    def load_project(self, project_dir):
+        """(Re)load a project's manifest and the dependency graph of its targets."""
+        project = document_builder.DocumentProject(project_dir, self.template_format, self.lambda_store, self.native)
+        for dependents in self.graph.values():
+            dependents.difference_update([d for d in dependents if d[0] == project.project_dir])
+        self.projects[project.project_dir] = project
+        for target in project.targets():
+            for path in project.input_files(target):
+                self.graph.setdefault(path, set()).add((project.project_dir, target["output"]))
+                if path not in self.signatures:
+                    self.signatures[path] = _signature(path)
+        return project
+
+    def targets(self):
+        """Return the (project directory, output name) of every watched target."""
+        return sorted((project_dir, target["output"])
+                      for project_dir, project in self.projects.items() for target in project.targets())
+
+    def dependents(self, path):
+        """Return the sorted (project directory, output name) of every target built from path."""
+        return sorted(self.graph.get(os.path.abspath(path), ()))
+
+    def changed_files(self):
+        """Return the watched files that changed since the last call, and remember their new state."""
+        changed = []
+        for path in sorted(self.graph):
+            if not self.graph[path]:
+                continue
+            signature = _signature(path)
+            if signature != self.signatures.get(path):
+                self.signatures[path] = signature
+                changed.append(path)
+        return changed
+
+    def rebuild(self, targets, force=False):
+        """Build the given (project directory, output name) targets and return their BuildResults.
+
+        A target that fails to build is reported on stderr and skipped, so a
+        half-edited file never stops the watcher.
+        """
+        results = []
+        for project_dir in sorted(set(t[0] for t in targets)):
+            project = self.projects[project_dir]
+            project.prepare_output_dir()
+            cache = project.load_cache()
+            try:
+                for output in sorted(t[1] for t in targets if t[0] == project_dir):
+                    try:
+                        result, cache[output] = project.build_target(project.target(output), cache.get(output), force)
+                    except Exception:  # pylint: disable=broad-except
+                        print("{}/{} failed to build:".format(project.name, output), file=sys.stderr)
+                        traceback.print_exc()
+                        continue
+                    results.append(result)
+                    if self.callback is not None:
+                        self.callback(result)
+            finally:
+                project.save_cache(cache)
+        return results
+
+    def poll(self):
+        """Rebuild the targets affected by the files changed since the last poll and return their BuildResults."""
+        changed = self.changed_files()
+        targets = set()
+        for path in changed:
+            targets.update(self.dependents(path))
+
+        for project_dir in sorted(set(t[0] for t in targets)):
+            if os.path.join(project_dir, document_builder.MANIFEST_FILE) not in changed:
+                continue
+            try:
+                project = self.load_project(project_dir)
+            except Exception:  # pylint: disable=broad-except
+                print("{} has an invalid manifest:".format(project_dir), file=sys.stderr)
+                traceback.print_exc()
+                targets = set(t for t in targets if t[0] != project_dir)
+                continue
+            # the manifest may add, remove or redefine any target.
+            targets = set(t for t in targets if t[0] != project_dir)
+            targets.update((project_dir, target["output"]) for target in project.targets())
+        return self.rebuild(targets)
+
+    def run(self, interval=0.2):
+        """Poll every interval seconds until interrupted."""
+        print("Watching {} files of {} projects; press Ctrl-C to stop".format(
+            len(self.graph), len(self.projects)), file=sys.stderr)
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,232 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Minify Lambda source before it is inlined in a CloudFormation ZipFile property.
+
+The minifier drops comments (including the license header and commented-out
+code), docstrings and any other bare string statements, blank lines and import
+statements whose names are never used. Each logical line is re-emitted on a
+single line with one space per indentation level and only the spaces needed to
+keep adjacent tokens apart.
+
+The result is checked by parsing both the original and the minified source and
+comparing their ASTs once the removed statements are discounted, so a Lambda
+whose behavior would change is rejected instead of being inlined. The Lambdas
+target the python2.7 runtime, so the build must run under the same interpreter.
+"""
+import ast
+import tokenize
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+SKIPPED_TOKENS = (tokenize.COMMENT, tokenize.NL)
+# python 3.12+ splits f-strings into several tokens; they are copied verbatim.
+FSTRING_START = getattr(tokenize, 'FSTRING_START', None)
+FSTRING_END = getattr(tokenize, 'FSTRING_END', None)
+VERBATIM = -1
+
+
+def _is_string_statement(node):
+    if not isinstance(node, ast.Expr):
+        return False
+    if hasattr(ast, 'Constant') and isinstance(node.value, ast.Constant):
+        return isinstance(node.value.value, (str, bytes))
+    return isinstance(node.value, (ast.Str, getattr(ast, 'Bytes', ast.Str)))
+
+
+def _bound_name(alias):
+    if alias.asname is not None:
+        return alias.asname
+    return alias.name.split('.')[0]
+
+
+def _used_names(tree):
+    return set(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+
+
+def _format_import(node, names):
+    aliases = ','.join(a.name if a.asname is None else '{} as {}'.format(a.name, a.asname) for a in names)
+    if isinstance(node, ast.Import):
+        return 'import ' + aliases
+    return 'from {}{} import {}'.format('.' * (node.level or 0), node.module or '', aliases)
+
+
+def _import_rewrites(tree):
+    """Return {line number: replacement statement or None} for imports binding unused names."""
+    used = _used_names(tree)
+    rewrites = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue
+        if isinstance(node, ast.ImportFrom) and node.module == '__future__':
+            continue
+        if any(a.name == '*' for a in node.names):
+            continue
+        kept = [a for a in node.names if _bound_name(a) in used]
+        if len(kept) == len(node.names):
+            continue
+        rewrites[node.lineno] = _format_import(node, kept) if kept else None
+    return rewrites
+
+
+class _Normalizer(ast.NodeTransformer):
+    """Reduce a tree to what the minifier preserves: no bare strings, no unused imports."""
+
+    def __init__(self, used_names):
+        self.used_names = used_names
+
+    def generic_visit(self, node):
+        super(_Normalizer, self).generic_visit(node)
+        for field in ('body', 'orelse', 'finalbody'):
+            statements = getattr(node, field, None)
+            if not isinstance(statements, list) or not statements or not isinstance(statements[0], ast.stmt):
+                continue
+            kept = []
+            for statement in statements:
+                if _is_string_statement(statement) or isinstance(statement, ast.Pass):
+                    continue
+                if isinstance(statement, (ast.Import, ast.ImportFrom)):
+                    is_future = isinstance(statement, ast.ImportFrom) and statement.module == '__future__'
+                    if not is_future:
+                        statement.names = [a for a in statement.names
+                                           if a.name == '*' or _bound_name(a) in self.used_names]
+                        if not statement.names:
+                            continue
+                kept.append(statement)
+            setattr(node, field, kept)
+        return node
+
+
+def _normalized_dump(tree, used_names):
+    return ast.dump(_Normalizer(used_names).visit(tree))
+
+
+def _needs_space(previous_type, previous, current):
+    if not previous or not current:
+        return False
+    if (previous[-1].isalnum() or previous[-1] == '_') and (current[0].isalnum() or current[0] == '_'):
+        return True
+    # "1 .real" must not become "1.real"
+    return previous_type == tokenize.NUMBER and current[0] == '.'
+
+
+def _logical_lines(source):
+    """Yield (indent depth, first line number, tokens) for every logical line of source."""
+    source_lines = source.splitlines(True)
+    depth = 0
+    tokens = []
+    start_line = None
+    fstring_depth = 0
+    fstring_start = None
+    for token_type, text, start, end, _ in tokenize.generate_tokens(StringIO(source).readline):
+        if token_type == FSTRING_START:
+            fstring_depth += 1
+            if fstring_depth == 1:
+                fstring_start = start
+        if fstring_depth:
+            if token_type == FSTRING_END:
+                fstring_depth -= 1
+                if fstring_depth == 0:
+                    if start_line is None:
+                        start_line = fstring_start[0]
+                    text = ''.join(source_lines[fstring_start[0] - 1:end[0]])
+                    text = text[fstring_start[1]:len(text) - len(source_lines[end[0] - 1]) + end[1]]
+                    tokens.append((VERBATIM, text))
+            continue
+        if token_type == tokenize.INDENT:
+            depth += 1
+        elif token_type == tokenize.DEDENT:
+            if tokens:
+                # python2 emits no NEWLINE for a last line without a line break.
+                yield depth, start_line, tokens
+                tokens = []
+                start_line = None
+            depth -= 1
+        elif token_type in SKIPPED_TOKENS or token_type == tokenize.ENDMARKER:
+            continue
+        elif token_type == tokenize.NEWLINE:
+            if tokens:
+                yield depth, start_line, tokens
+            tokens = []
+            start_line = None
+        else:
+            if start_line is None:
+                start_line = start[0]
+            tokens.append((token_type, text))
+    if tokens:
+        yield depth, start_line, tokens
+
+
+def _join(tokens):
+    result = ''
+    previous_type = None
+    for token_type, text in tokens:
+        if _needs_space(previous_type, result, text):
+            result += ' '
+        result += text
+        previous_type = token_type
+    return result
+
+
+def minify(source):
+    """Return the minified source, raising ValueError if it does not parse to an equivalent AST."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        raise ValueError("Unable to parse Lambda source with this interpreter ({}); "
+                         "Lambdas are built with the python version of their runtime".format(e))
+
+    rewrites = _import_rewrites(tree)
+    lines = []
+    dropped_depth = None
+    for depth, line_number, tokens in _logical_lines(source):
+        if dropped_depth is not None and depth < dropped_depth:
+            # every statement of the previous block was dropped; keep the block valid.
+            lines.append(' ' * dropped_depth + 'pass')
+        if dropped_depth is not None and depth != dropped_depth:
+            dropped_depth = None
+
+        if len(tokens) == 1 and tokens[0][0] == tokenize.STRING:
+            text = None
+        elif line_number in rewrites and tokens[0][1] in ('import', 'from') and (tokenize.OP, ';') not in tokens:
+            text = rewrites[line_number]
+        else:
+            text = _join(tokens)
+
+        if text is None:
+            if dropped_depth is None and (not lines or lines[-1].endswith(':')):
+                dropped_depth = depth
+            continue
+
+        dropped_depth = None
+        lines.append(' ' * depth + text)
+
+    if dropped_depth is not None:
+        lines.append(' ' * dropped_depth + 'pass')
+
+    minified = '\n'.join(lines) + '\n'
+
+    used_names = _used_names(tree)
+    try:
+        minified_tree = ast.parse(minified)
+    except SyntaxError as e:
+        raise ValueError("Minified Lambda source does not compile: {}".format(e))
+    if _normalized_dump(minified_tree, used_names) != _normalized_dump(tree, used_names):
+        raise ValueError("Minified Lambda source is not equivalent to the original")
+    return minified
@@ -0,0 +1,144 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Content-addressed store of the minified Lambdas inlined in CloudFormation templates.
+
+Lambdas used by several projects live once in the shared Lambdas folder and
+are referenced from a manifest as {"resource": ..., "shared": "file.py"}. Every
+Lambda, shared or not, is resolved through a LambdaStore: its source is
+minified, validated and size-checked once, and the resulting artifact is
+addressed by the sha256 of its minified code, so copies that only differ in
+comments or whitespace resolve to the same artifact. Artifacts are kept in
+STORE_DIR keyed by the source hash, the minifier version and the python
+version, so the worker processes of a build and later builds reuse them
+instead of minifying again.
+
+The store also records the documents each artifact is embedded in, which the
+build reports as the artifacts shared between documents.
+"""
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import sys
+from collections import namedtuple
+
+import lambda_minifier
+import template_loader
+
+AUTOMATION_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+SHARED_LAMBDA_DIR = os.path.join(AUTOMATION_DIR, 'Lambdas')
+STORE_DIR = os.path.join(AUTOMATION_DIR, '.lambda-store')
+
+LAMBDA_MAX_SIZE = 4096
+# the interpreter parses and checks the Lambdas, so artifacts are kept per python version.
+PYTHON_VERSION = '{}.{}'.format(*sys.version_info[:2])
+
+LambdaArtifact = namedtuple('LambdaArtifact', ['digest', 'name', 'code', 'source_size'])
+
+_MINIFIER_DIGEST = []
+
+
+def _minifier_digest():
+    # a new minifier produces new artifacts.
+    if not _MINIFIER_DIGEST:
+        with open(lambda_minifier.__file__.replace('.pyc', '.py'), 'rb') as fp:
+            _MINIFIER_DIGEST.append(hashlib.sha256(fp.read()).hexdigest())
+    return _MINIFIER_DIGEST[0]
+
+
+class LambdaStore(object):
+    """Resolve Lambda source files to minified artifacts, once per unique source."""
+
+    def __init__(self, store_dir=STORE_DIR, max_size=LAMBDA_MAX_SIZE):
+        """Set store_dir to None to keep artifacts in memory only."""
+        self.store_dir = store_dir
+        self.max_size = max_size
+        self.minified = 0
+        # source key -> artifact digest, artifact digest -> artifact
+        self._sources = {}
+        self._artifacts = {}
+        # artifact digest -> set of documents embedding it
+        self._users = {}
+
+    def resolve(self, path):
+        """Return the LambdaArtifact for the Lambda source at path.
+
+        Raises AssertionError if the minified Lambda exceeds max_size, and
+        ValueError if it cannot be minified safely.
+        """
+        with open(path, 'rb') as fp:
+            source = fp.read()
+        digest = hashlib.sha256(source)
+        digest.update(_minifier_digest().encode('utf-8'))
+        digest.update(PYTHON_VERSION.encode('utf-8'))
+        key = digest.hexdigest()
+
+        artifact = self._artifacts.get(self._sources.get(key))
+        if artifact is None:
+            artifact = self._load(key)
+        if artifact is None:
+            artifact = self._minify(path, source)
+            if self.store_dir is not None:
+                template_loader.write_cache_entry(self.store_dir, key, json.dumps(artifact._asdict()))
+        self._sources[key] = artifact.digest
+        # copies of the same function share the artifact registered first.
+        artifact = self._artifacts.setdefault(artifact.digest, artifact)
+
+        assert len(artifact.code) <= self.max_size, \
+            "Lambda function must be less then {} ({} is {})".format(self.max_size, path, len(artifact.code))
+        return artifact
+
+    def _load(self, key):
+        if self.store_dir is None:
+            return None
+        text = template_loader.read_cache_entry(self.store_dir, key)
+        if text is None:
+            return None
+        return LambdaArtifact(**json.loads(text))
+
+    def _minify(self, path, source):
+        code = lambda_minifier.minify(source if isinstance(source, str) else source.decode('utf-8'))
+        self.minified += 1
+        print("{} is {}/{} of max size ({} before minification)".format(
+            path, len(code), self.max_size, len(source)), file=sys.stderr)
+        return LambdaArtifact(hashlib.sha256(code.encode('utf-8')).hexdigest(), os.path.basename(path), code,
+                              len(source))
+
+    def add_user(self, artifact, document):
+        """Record that document embeds artifact."""
+        self._users.setdefault(artifact.digest, set()).add(document)
+
+    def artifacts(self):
+        return sorted(self._artifacts.values(), key=lambda a: (a.name, a.digest))
+
+    def users(self, artifact):
+        return sorted(self._users.get(artifact.digest, ()))
+
+    def shared(self):
+        """Return [(artifact, documents)] for every artifact embedded in more than one document."""
+        return [(a, self.users(a)) for a in self.artifacts() if len(self.users(a)) > 1]
+
+    def report(self):
+        """Return the lines describing which documents share which artifacts."""
+        lines = []
+        for artifact, documents in self.shared():
+            lines.append("{} {} ({}/{} bytes) is shared by {} documents:".format(
+                artifact.digest[:12], artifact.name, len(artifact.code), self.max_size, len(documents)))
+            lines.extend("    " + document for document in documents)
+        return lines
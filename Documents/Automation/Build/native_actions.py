@@ -0,0 +1,701 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Replace the Lambdas of a document by native Automation actions.
+
+Many documents create a CloudFormation stack only to run a Lambda making one
+API call, then delete the stack. With --native-actions, the build reads each
+Lambda the document invokes and recognizes the handlers whose body is one of:
+
+  * one call of a boto3 client whose keyword arguments come from the event
+    or are literals, becoming an aws:executeAwsApi step; the keys of a
+    returned dict of response fields become the step's outputs,
+  * calls chosen by comparing an event field with string literals
+    (if status == "Enabled": ...), becoming an aws:branch step on the payload
+    value and one aws:executeAwsApi step per call,
+  * a describe call and a call made unless a field of its response is in a
+    list of literals, becoming an aws:executeAwsApi step reading the field,
+    an aws:branch step and an aws:executeAwsApi step for the call,
+  * a loop describing a resource until a field of the response is in a list
+    given by the event, becoming an aws:waitForAwsResourceProperty step.
+
+print statements are ignored. When every Lambda the document invokes from the
+stack is replaced, and the stack holds nothing but those Lambdas and their
+roles, the aws:createStack and aws:deleteStack steps are removed too and
+transitions to them go to the step that followed them; otherwise the document
+is left unchanged and the reason is reported. The API calls then run with the
+document's assumeRole instead of the Lambda's role, and LambdaAssumeRole is
+kept, unused, so existing callers still pass a valid parameter.
+
+The time saved is estimated with Analysis/duration_analyzer.py: the expected
+durations of the stack steps and the invocations, less those of the native
+steps. A describe-until-state loop is counted as taking as long as the
+aws:waitForAwsResourceProperty step replacing it, since both wait for the
+resource.
+"""
+from __future__ import print_function
+
+import ast
+import copy
+import json
+import os
+import re
+import sys
+from collections import OrderedDict, namedtuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'Analysis'))
+import document_validator  # noqa pylint: disable=import-error,wrong-import-position
+import duration_analyzer  # noqa pylint: disable=import-error,wrong-import-position
+
+# resources a stack may hold for its steps to be removed with its Lambdas.
+STACK_RESOURCE_TYPES = ('AWS::Lambda::Function', 'AWS::IAM::Role', 'AWS::IAM::Policy')
+# words of boto3 method names that are capitalized in API names, like DescribeDBInstances.
+ACRONYMS = {'db': 'DB'}
+
+PRINT_STATEMENT = re.compile(r'^(\s*)print\b(?!\s*\().*$', re.MULTILINE)
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# arguments maps a keyword argument to an ('event', key), ('literal', value) or ('list', [values]) value.
+Call = namedtuple('Call', ['service', 'api', 'arguments'])
+# calls, in order, and for each kind:
+#   call: outputs is [(name, selector)] of the returned dict,
+#   switch: event_key is the compared field, default its `or` default, values the literal of each call,
+#   guarded: calls are the describe call and the call; selector reads the field compared with values,
+#            and outputs is [(name, selector)] of the field,
+#   wait: calls is the describe call; selector reads the field, event_key holds the desired values.
+Handler = namedtuple('Handler', ['kind', 'calls', 'outputs', 'selector', 'event_key', 'default', 'values'])
+# replaced is [(step name, kind)], removed the names of the stack steps removed, kept the reason the
+# document was left unchanged or None.
+Report = namedtuple('Report', ['replaced', 'removed', 'kept', 'seconds_saved'])
+
+
+class NotNative(ValueError):
+    """A Lambda or the steps invoking it cannot be replaced by native actions."""
+
+
+def api_name(method):
+    """Return the API name of a boto3 client method, like DescribeDBInstances for describe_db_instances."""
+    return ''.join(ACRONYMS.get(word, word.capitalize()) for word in method.split('_'))
+
+
+def output_name(variable):
+    return ''.join(word.capitalize() for word in variable.split('_') if word) or variable
+
+
+def parse_source(source):
+    """Parse a Lambda source, written for python2 or python3."""
+    try:
+        return ast.parse(source)
+    except SyntaxError:
+        pass
+    try:
+        # python2 print statements are not part of the behavior being replaced.
+        return ast.parse(PRINT_STATEMENT.sub(r'\1pass', source))
+    except SyntaxError as error:
+        raise NotNative('cannot parse the Lambda with this interpreter: {}'.format(error))
+
+
+def _literal(node):
+    try:
+        return True, ast.literal_eval(node)
+    except (ValueError, SyntaxError, TypeError):
+        return False, None
+
+
+def _subscript_key(node):
+    index = node.slice
+    if isinstance(index, getattr(ast, 'Index', ())):
+        index = index.value
+    is_literal, key = _literal(index)
+    if not is_literal:
+        raise NotNative('line {}: the subscript is not a literal'.format(node.lineno))
+    return key
+
+
+def _is_print(statement):
+    if isinstance(statement, getattr(ast, 'Print', ())):
+        return True
+    return (isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call) and
+            isinstance(statement.value.func, ast.Name) and statement.value.func.id == 'print')
+
+
+def _is_ignored(statement):
+    # docstrings, pass and print
+    return (isinstance(statement, ast.Pass) or _is_print(statement) or
+            (isinstance(statement, ast.Expr) and _literal(statement.value)[0]))
+
+
+class _HandlerReader(object):
+    """Read the handler function of a Lambda source into a Handler."""
+
+    def __init__(self, tree):
+        self.clients = {}
+        self.fields = {}
+        self.responses = {}
+        self.reads = {}
+        self.event = None
+        handler = None
+        for statement in tree.body:
+            if isinstance(statement, ast.FunctionDef) and statement.name == 'handler':
+                handler = statement
+            elif isinstance(statement, ast.Assign):
+                self._client_assignment(statement)
+        if handler is None:
+            raise NotNative('no handler function')
+        arguments = handler.args.args
+        if not arguments:
+            raise NotNative('the handler takes no event')
+        self.event = getattr(arguments[0], 'arg', None) or getattr(arguments[0], 'id', None)
+        self.body = handler.body
+
+    def _client_assignment(self, statement):
+        if len(statement.targets) != 1 or not isinstance(statement.targets[0], ast.Name):
+            return False
+        service = self._service(statement.value, named=False)
+        if service is not None:
+            self.clients[statement.targets[0].id] = service
+        return service is not None
+
+    def _service(self, node, named=True):
+        """Return the service of a boto3 client, named or created in place, or None if node is not one."""
+        if named and isinstance(node, ast.Name):
+            return self.clients.get(node.id)
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'client' and
+                isinstance(node.func.value, ast.Name) and node.func.value.id == 'boto3' and len(node.args) == 1 and
+                not node.keywords):
+            is_literal, service = _literal(node.args[0])
+            if is_literal and isinstance(service, document_validator.STRING_TYPES):
+                return service
+        return None
+
+    def _event_field(self, node):
+        """Return (key, default) if node reads an event field, else None."""
+        default = None
+        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.Or) and len(node.values) == 2:
+            is_literal, default = _literal(node.values[1])
+            if not is_literal:
+                return None
+            node = node.values[0]
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == self.event:
+            return _subscript_key(node), default
+        if isinstance(node, ast.Name) and node.id in self.fields and default is None:
+            return self.fields[node.id]
+        return None
+
+    def _value(self, node):
+        field = self._event_field(node)
+        if field is not None:
+            if field[1] is not None:
+                raise NotNative('line {}: an argument has a default'.format(node.lineno))
+            return ('event', field[0])
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return ('list', [self._value(item) for item in node.elts])
+        is_literal, value = _literal(node)
+        if is_literal:
+            return ('literal', value)
+        raise NotNative('line {}: an argument is computed'.format(node.lineno))
+
+    def _call(self, node):
+        """Return the Call of a client method call, or None if node is not one."""
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+            return None
+        service = self._service(node.func.value)
+        if service is None:
+            return None
+        if node.args or any(keyword.arg is None for keyword in node.keywords) or \
+                getattr(node, 'starargs', None) or getattr(node, 'kwargs', None):
+            raise NotNative('line {}: {} takes positional arguments'.format(node.lineno, node.func.attr))
+        arguments = OrderedDict((keyword.arg, self._value(keyword.value)) for keyword in node.keywords)
+        return Call(service, api_name(node.func.attr), arguments)
+
+    def _selector(self, node):
+        """Return (response variable, selector) if node reads a response field, else None."""
+        path = ''
+        while isinstance(node, ast.Subscript):
+            key = _subscript_key(node)
+            if isinstance(key, int) and not isinstance(key, bool):
+                path = '[{}]'.format(key) + path
+            elif isinstance(key, document_validator.STRING_TYPES) and IDENTIFIER.match(key):
+                path = '.' + key + path
+            else:
+                raise NotNative('line {}: {!r} is not a selector key'.format(node.lineno, key))
+            node = node.value
+        if path and isinstance(node, ast.Name) and node.id in self.responses:
+            return node.id, '$' + path
+        if isinstance(node, ast.Name) and node.id in self.reads and not path:
+            return self.reads[node.id][0], self.reads[node.id][1]
+        return None
+
+    def _assignment(self, statement, calls):
+        if len(statement.targets) != 1 or not isinstance(statement.targets[0], ast.Name):
+            raise NotNative('line {}: unsupported assignment'.format(statement.lineno))
+        name = statement.targets[0].id
+        if self._client_assignment(statement):
+            return
+        field = self._event_field(statement.value)
+        if field is not None:
+            self.fields[name] = field
+            return
+        call = self._call(statement.value)
+        if call is not None:
+            self.responses[name] = call
+            calls.append(call)
+            return
+        read = self._selector(statement.value)
+        if read is not None:
+            self.reads[name] = read
+            return
+        raise NotNative('line {}: {} is not an event field, a client call or a response field'.format(
+            statement.lineno, name))
+
+    def _single_call(self, body):
+        statements = [statement for statement in body if not _is_ignored(statement)]
+        call = self._call(statements[0].value) if len(statements) == 1 and isinstance(statements[0], ast.Expr) \
+            else None
+        if call is None:
+            raise NotNative('line {}: a condition does more than one call'.format(body[0].lineno))
+        return call
+
+    def _condition(self, statement, cases, guards):
+        test = statement.test
+        if statement.orelse or not isinstance(test, ast.Compare) or len(test.ops) != 1:
+            raise NotNative('line {}: unsupported condition'.format(statement.lineno))
+        operator, (right,) = test.ops[0], test.comparators
+        is_literal, value = _literal(right)
+        if isinstance(operator, ast.Eq) and is_literal and isinstance(value, document_validator.STRING_TYPES):
+            field = self._event_field(test.left)
+            if field is not None:
+                cases.append((field, value, self._single_call(statement.body)))
+                return
+        if isinstance(operator, ast.NotIn) and is_literal and isinstance(value, (list, tuple)):
+            read = self._selector(test.left)
+            if read is not None:
+                name = test.left.id if isinstance(test.left, ast.Name) else read[0]
+                guards.append((name, read, list(value), self._single_call(statement.body)))
+                return
+        raise NotNative('line {}: unsupported condition'.format(statement.lineno))
+
+    def _wait(self, statement):
+        is_literal, value = _literal(statement.test)
+        if statement.orelse or not is_literal or not value:
+            raise NotNative('line {}: only `while True` loops are supported'.format(statement.lineno))
+        body = statement.body
+        try_types = tuple(getattr(ast, name) for name in ('Try', 'TryExcept') if hasattr(ast, name))
+        if len(body) == 1 and isinstance(body[0], try_types) and not getattr(body[0], 'finalbody', None) and \
+                all(all(_is_ignored(item) for item in handler.body) for handler in body[0].handlers):
+            # errors are retried by the Lambda, but fail the waiting step.
+            body = body[0].body
+        describe = desired = None
+        for item in body:
+            if _is_ignored(item):
+                continue
+            if isinstance(item, ast.Assign) and describe is None:
+                calls = []
+                self._assignment(item, calls)
+                describe = calls[0] if calls else None
+                continue
+            if isinstance(item, ast.If) and desired is None and not item.orelse and \
+                    isinstance(item.test, ast.Compare) and len(item.test.ops) == 1 and \
+                    isinstance(item.test.ops[0], ast.In) and \
+                    all(isinstance(statement, ast.Return) and statement.value is None for statement in item.body):
+                read = self._selector(item.test.left)
+                field = self._event_field(item.test.comparators[0])
+                if read is not None and field is not None and field[1] is None:
+                    desired = read, field[0]
+                    continue
+            if isinstance(item, ast.Expr) and isinstance(item.value, ast.Call) and \
+                    isinstance(item.value.func, ast.Attribute) and item.value.func.attr == 'sleep':
+                continue
+            raise NotNative('line {}: the loop does more than describe and wait'.format(item.lineno))
+        if describe is None or desired is None or self.responses.get(desired[0][0]) != describe:
+            raise NotNative('line {}: the loop does not wait for a state'.format(statement.lineno))
+        return Handler('wait', [describe], [], desired[0][1], desired[1], None, [])
+
+    def read(self):
+        calls = []
+        cases = []
+        guards = []
+        waits = []
+        outputs = None
+        for statement in self.body:
+            if _is_ignored(statement):
+                continue
+            if isinstance(statement, ast.Assign):
+                self._assignment(statement, calls)
+            elif isinstance(statement, ast.Expr) and self._call(statement.value) is not None:
+                calls.append(self._call(statement.value))
+            elif isinstance(statement, ast.If):
+                self._condition(statement, cases, guards)
+            elif isinstance(statement, ast.While):
+                waits.append(self._wait(statement))
+            elif isinstance(statement, ast.Return):
+                outputs = self._outputs(statement)
+            else:
+                raise NotNative('line {}: unsupported statement'.format(statement.lineno))
+
+        if outputs and (cases or guards or waits):
+            raise NotNative('only a single call can return outputs')
+        if waits and not (calls or cases or guards or len(waits) > 1):
+            return waits[0]
+        if cases and not (calls or guards or waits) and len(set(field for field, _, _ in cases)) == 1:
+            (key, default), _, _ = cases[0]
+            return Handler('switch', [call for _, _, call in cases], [], None, key, default,
+                           [value for _, value, _ in cases])
+        if len(guards) == 1 and not (cases or waits) and len(calls) == 1:
+            name, (response, selector), values, call = guards[0]
+            if self.responses.get(response) == calls[0]:
+                return Handler('guarded', [calls[0], call], [(output_name(name), selector)], selector, None, None,
+                               values)
+        if len(calls) == 1 and not (cases or guards or waits):
+            return Handler('call', calls, outputs or [], None, None, None, [])
+        raise NotNative('the handler makes {} calls'.format(len(calls) + len(cases) + len(guards) + len(waits)))
+
+    def _outputs(self, statement):
+        if statement.value is None:
+            return []
+        if not isinstance(statement.value, ast.Dict):
+            raise NotNative('line {}: the handler returns something else than a dict'.format(statement.lineno))
+        outputs = []
+        for key, value in zip(statement.value.keys, statement.value.values):
+            is_literal, name = _literal(key) if key is not None else (False, None)
+            read = self._selector(value)
+            if not is_literal or read is None or not IDENTIFIER.match(str(name)):
+                raise NotNative('line {}: the handler returns computed values'.format(statement.lineno))
+            outputs.append((name, read[1]))
+        return outputs
+
+
+def read_handler(source):
+    """Return the Handler of a Lambda source, or raise NotNative."""
+    return _HandlerReader(parse_source(source)).read()
+
+
+def stack_functions(stack_step, template):
+    """Return {template resource name: function name} of the Lambdas created by an aws:createStack step."""
+    parameters = dict((item.get('ParameterKey'), item.get('ParameterValue'))
+                      for item in (stack_step.get('inputs') or {}).get('Parameters') or [])
+    functions = {}
+    for name, resource in (template.get('Resources') or {}).items():
+        if resource.get('Type') != 'AWS::Lambda::Function':
+            continue
+        function_name = (resource.get('Properties') or {}).get('FunctionName')
+        if isinstance(function_name, dict) and 'Ref' in function_name:
+            function_name = parameters.get(function_name['Ref'])
+        if isinstance(function_name, document_validator.STRING_TYPES):
+            functions[name] = function_name
+    return functions
+
+
+def _payload_value(value, payload):
+    kind, content = value
+    if kind == 'literal':
+        return content
+    if kind == 'list':
+        return [_payload_value(item, payload) for item in content]
+    if content not in payload:
+        raise NotNative('the payload has no {}'.format(content))
+    return payload[content]
+
+
+def _api_step(name, call, payload, action='aws:executeAwsApi'):
+    inputs = OrderedDict([('Service', call.service), ('Api', call.api)])
+    for argument, value in call.arguments.items():
+        inputs[argument] = _payload_value(value, payload)
+    return OrderedDict([('name', name), ('action', action), ('inputs', inputs)])
+
+
+def _outputs(outputs):
+    return [OrderedDict([('Name', name), ('Selector', selector), ('Type', 'String')]) for name, selector in outputs]
+
+
+def _condition(variable, values):
+    conditions = [OrderedDict([('Variable', variable), ('StringEquals', value)]) for value in values]
+    return conditions[0] if len(conditions) == 1 else OrderedDict([('Or', conditions)])
+
+
+def _allowed_values(value, parameters):
+    """Return the values a payload value can take, or None if they are not known."""
+    match = re.match(r'^\{\{\s*([A-Za-z0-9_.:-]+)\s*\}\}$', value) if isinstance(
+        value, document_validator.STRING_TYPES) else None
+    if match is None:
+        return [value] if isinstance(value, document_validator.STRING_TYPES) and '{{' not in value else None
+    return (parameters.get(match.group(1)) or {}).get('allowedValues') or None
+
+
+def _transition(step, after):
+    # the step goes on to after, or ends the execution.
+    step.pop('isEnd', None)
+    step.pop('nextStep', None)
+    if after is None:
+        step['isEnd'] = True
+    else:
+        step['nextStep'] = after
+    return step
+
+
+def native_steps(step, handler, after, parameters):
+    """Return the steps replacing an aws:invokeLambdaFunction step and how many of them one execution runs.
+
+    after is the name of the step the invocation goes on to, or None if it ends the execution.
+    """
+    name = step['name']
+    try:
+        payload = json.loads((step.get('inputs') or {}).get('Payload') or '{}', object_pairs_hook=OrderedDict)
+    except ValueError:
+        raise NotNative('the payload of {} is not JSON'.format(name))
+    if not isinstance(payload, dict):
+        raise NotNative('the payload of {} is not a JSON object'.format(name))
+    attributes = OrderedDict((key, value) for key, value in step.items()
+                             if key not in ('name', 'action', 'inputs', 'outputs'))
+    transitions = OrderedDict((key, attributes.pop(key)) for key in ('nextStep', 'isEnd') if key in attributes)
+
+    def finish(steps, executed):
+        for emitted in steps:
+            if emitted['action'] != 'aws:branch':
+                emitted.update(copy.deepcopy(attributes))
+        steps[-1].update(transitions)
+        return steps, executed
+
+    if handler.kind == 'call':
+        emitted = _api_step(name, handler.calls[0], payload)
+        if handler.outputs:
+            emitted['outputs'] = _outputs(handler.outputs)
+        return finish([emitted], 1)
+
+    if handler.kind == 'wait':
+        emitted = _api_step(name, handler.calls[0], payload, 'aws:waitForAwsResourceProperty')
+        desired = _payload_value(('event', handler.event_key), payload)
+        if not isinstance(desired, list) or not desired:
+            raise NotNative('{} of {} is not a list of values'.format(handler.event_key, name))
+        emitted['inputs']['PropertySelector'] = handler.selector
+        emitted['inputs']['DesiredValues'] = desired
+        return finish([emitted], 1)
+
+    if handler.kind == 'switch':
+        variable = _payload_value(('event', handler.event_key), payload)
+        allowed = _allowed_values(variable, parameters)
+        if handler.default is not None and (allowed is None or '' in allowed):
+            raise NotNative('{} of {} may be empty, which means {}'.format(handler.event_key, name, handler.default))
+        branch = OrderedDict([('name', name), ('action', 'aws:branch'), ('inputs', OrderedDict([('Choices', [])]))])
+        steps = [branch]
+        for value, call in zip(handler.values, handler.calls):
+            steps.append(_transition(_api_step(name + call.api, call, payload), after))
+        if after is not None:
+            cases = zip(handler.values, steps[1:])
+            branch['inputs']['Default'] = after
+        elif allowed is not None and set(allowed) <= set(handler.values):
+            # every value has a call, so the last call can be the default
+            cases = zip(handler.values[:-1], steps[1:-1])
+            branch['inputs']['Default'] = steps[-1]['name']
+        else:
+            raise NotNative('no step follows {} for a value without a call'.format(name))
+        for value, emitted in cases:
+            choice = _condition(variable, [value])
+            choice['NextStep'] = emitted['name']
+            branch['inputs']['Choices'].append(choice)
+        # the last call goes on like the invocation did
+        steps[-1].pop('nextStep', None)
+        steps[-1].pop('isEnd', None)
+        return finish(steps, 2)
+
+    describe, call = handler.calls
+    (output, _), = handler.outputs
+    read = _api_step(name, describe, payload)
+    read['outputs'] = _outputs(handler.outputs)
+    check = OrderedDict([('name', '{}Check{}'.format(name, output)), ('action', 'aws:branch')])
+    emitted = _api_step(name + call.api, call, payload)
+    skip = _condition('{{{{{}.{}}}}}'.format(name, output), handler.values)
+    if after is None:
+        raise NotNative('no step follows {} when the call is skipped'.format(name))
+    skip['NextStep'] = after
+    check['inputs'] = OrderedDict([('Choices', [skip]), ('Default', emitted['name'])])
+    return finish([read, check, emitted], 3)
+
+
+def _references(document, step_name):
+    # names of the outputs of step_name referenced in document
+    pattern = re.compile(r'\{\{\s*' + re.escape(step_name) + r'\.([A-Za-z0-9_]+)\s*\}\}')
+    return set(pattern.findall(json.dumps(document)))
+
+
+class _Steps(object):
+    """Where the steps of a document go on to once some of them are removed."""
+
+    def __init__(self, steps, removed):
+        self.steps = steps
+        self.names = [step.get('name') for step in steps]
+        self.by_name = dict((step.get('name'), step) for step in steps)
+        self.removed = removed
+
+    def resolve(self, name):
+        """Return the step that runs instead of the step name, which may have been removed, or None."""
+        seen = set()
+        while name in self.removed:
+            if name in seen:
+                return None
+            seen.add(name)
+            step = self.by_name[name]
+            if step.get('isEnd') is True:
+                return None
+            if 'nextStep' in step:
+                name = step['nextStep']
+                continue
+            index = self.names.index(name) + 1
+            name = self.names[index] if index < len(self.names) else None
+        return name
+
+    def after(self, index):
+        """Return the step a successful steps[index] goes on to, resolved, or None."""
+        step = self.steps[index]
+        if step.get('isEnd') is True:
+            return None
+        if 'nextStep' in step:
+            return self.resolve(step['nextStep'])
+        return self.resolve(self.names[index + 1]) if index + 1 < len(self.names) else None
+
+
+def replace_lambdas(document, stack_step_name, template, sources, analyzer=None):
+    """Replace the Lambdas a document invokes from its stack by native actions, in place.
+
+    template is the parsed template of the stack and sources maps its Lambda
+    resource names to their source. Returns a Report; a document that cannot
+    be replaced is left unchanged.
+    """
+    steps = document.get('mainSteps') or []
+    stacks = [step for step in steps if step.get('name') == stack_step_name and step.get('action') == 'aws:createStack']
+    if not stacks:
+        return Report([], [], 'no aws:createStack step named {}'.format(stack_step_name), 0)
+    stack_name = (stacks[0].get('inputs') or {}).get('StackName')
+    removed = set([stack_step_name] + [step.get('name') for step in steps if step.get('action') == 'aws:deleteStack' and
+                                       (step.get('inputs') or {}).get('StackName') == stack_name])
+    try:
+        for name, resource in sorted((template.get('Resources') or {}).items()):
+            if resource.get('Type') not in STACK_RESOURCE_TYPES:
+                raise NotNative('the stack also creates {} ({})'.format(name, resource.get('Type')))
+        if _references(document, stack_step_name):
+            raise NotNative('steps read the outputs of {}'.format(stack_step_name))
+        functions = stack_functions(stacks[0], template)
+        for name, resource in sorted((template.get('Resources') or {}).items()):
+            if resource.get('Type') == 'AWS::Lambda::Function' and (name not in functions or name not in sources):
+                raise NotNative('the function name or the source of {} is unknown'.format(name))
+        sources = dict((functions[name], source) for name, source in sources.items() if name in functions)
+
+        walk = _Steps(steps, removed)
+        for step in steps:
+            inputs = step.get('inputs') or {}
+            targets = [choice.get('NextStep') for choice in inputs.get('Choices') or []] + [inputs.get('Default')]
+            if step.get('action') == 'aws:branch' and any(target in removed and walk.resolve(target) is None
+                                                          for target in targets):
+                raise NotNative('{} branches to the end of the stack'.format(step.get('name')))
+        parameters = document.get('parameters') or {}
+        replacements = {}
+        invoked = set()
+        for index, step in enumerate(steps):
+            function_name = (step.get('inputs') or {}).get('FunctionName')
+            if step.get('action') != 'aws:invokeLambdaFunction' or function_name not in sources:
+                continue
+            try:
+                handler = read_handler(sources[function_name])
+            except NotNative as error:
+                raise NotNative('{}: {}'.format(step.get('name'), error))
+            replacements[index] = handler, native_steps(step, handler, walk.after(index), parameters)
+            invoked.add(function_name)
+        if not replacements:
+            raise NotNative('no step invokes a Lambda of the stack')
+        names = [step.get('name') for index, step in enumerate(steps)
+                 if index not in replacements and step.get('name') not in removed]
+        names += [native['name'] for _, (emitted, _) in replacements.values() for native in emitted]
+        if len(set(names)) != len(names):
+            raise NotNative('a native step would reuse the name of another step')
+        for function_name in sorted(set(sources) - invoked):
+            if function_name in json.dumps(document):
+                raise NotNative('{} is used by other steps'.format(function_name))
+
+        outputs = []
+        for item in document.get('outputs') or []:
+            step_name, _, output = item.partition('.')
+            index = walk.names.index(step_name) if step_name in walk.names else None
+            if index not in replacements:
+                outputs.append(item)
+            elif output == 'Payload' and replacements[index][0].kind == 'call':
+                outputs.extend('{}.{}'.format(step_name, name) for name, _ in replacements[index][0].outputs)
+            else:
+                raise NotNative('the document outputs {}'.format(item))
+        for index, (handler, _) in sorted(replacements.items()):
+            readable = set(output for output, _ in handler.outputs) if handler.kind == 'call' else set()
+            unknown = _references(document, steps[index]['name']) - readable
+            if unknown:
+                raise NotNative('steps read {}.{}'.format(steps[index]['name'], sorted(unknown)[0]))
+    except NotNative as error:
+        return Report([], [], str(error), 0)
+
+    analyzer = analyzer or duration_analyzer.DurationAnalyzer(paths=[])
+
+    def expected(step):
+        return analyzer.step_timing(step, parameters).expected
+
+    saved = sum(expected(step) for step in steps if step.get('name') in removed)
+    new_steps = []
+    for index, step in enumerate(steps):
+        if step.get('name') in removed:
+            continue
+        if index in replacements:
+            handler, (emitted, executed) = replacements[index]
+            if handler.kind != 'wait':
+                saved += expected(step) - sum(expected(native) for native in emitted[:executed])
+            block = emitted
+        else:
+            block = [step]
+        last = block[-1]
+        # a step that went on to a removed step without naming it goes on to what followed it
+        if last.get('isEnd') is not True and 'nextStep' not in last and last.get('action') != 'aws:branch' and \
+                index + 1 < len(steps) and steps[index + 1].get('name') in removed:
+            following = walk.after(index)
+            later = [s.get('name') for s in steps[index + 1:] if s.get('name') not in removed]
+            if following != (later[0] if later else None):
+                _transition(last, following)
+        new_steps.extend(block)
+
+    for step in new_steps:
+        if 'nextStep' in step and step['nextStep'] in removed:
+            _transition(step, walk.resolve(step['nextStep']))
+        on_failure = step.get('onFailure')
+        if isinstance(on_failure, document_validator.STRING_TYPES) and on_failure[len('step:'):] in removed and \
+                on_failure.startswith('step:'):
+            target = walk.resolve(on_failure[len('step:'):])
+            step['onFailure'] = 'Abort' if target is None else 'step:' + target
+        if step.get('action') == 'aws:branch':
+            inputs = step.get('inputs') or {}
+            for choice in inputs.get('Choices') or []:
+                if choice.get('NextStep') in removed:
+                    choice['NextStep'] = walk.resolve(choice['NextStep'])
+            if inputs.get('Default') in removed:
+                inputs['Default'] = walk.resolve(inputs['Default'])
+
+    document['mainSteps'] = new_steps
+    if 'outputs' in document:
+        document['outputs'] = outputs
+    replaced = [(steps[index]['name'], replacements[index][0].kind) for index in sorted(replacements)]
+    return Report(replaced, [step.get('name') for step in steps if step.get('name') in removed], None, saved)
+
+
+def format_report(name, report):
+    """Return the line describing a Report of the document name."""
+    if report.kept is not None:
+        return '{}: kept its Lambdas: {}'.format(name, report.kept)
+    return '{}: replaced {} by native actions and removed {}, saving ~{} per execution'.format(
+        name, ', '.join('{} ({})'.format(step, kind) for step, kind in report.replaced), ', '.join(report.removed),
+        duration_analyzer.format_duration(report.seconds_saved))
@@ -0,0 +1,134 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Size budget report of the built documents.
+
+The report records the byte size of every component of every document, as
+measured by DocumentProject.render:
+
+    {
+      "limits": {"lambda": 4096, "template": 51200},
+      "documents": {
+        "RebootRds/aws-RebootRdsInstance.json": {
+          "document": 5364, "parameters": 462, "mainSteps": 4616,
+          "template": 2991, "template_skeleton": 2090,
+          "lambdas": {"RebootRdsInstanceLambda": 364, "WaitRdsInstanceLambda": 395}
+        }
+      }
+    }
+
+Each build compares its sizes with the previous report and flags every
+component that grew by more than the allowed threshold, so size creep is
+caught long before a Lambda or template reaches its hard limit.
+"""
+import json
+import os
+from collections import namedtuple
+
+import document_builder
+
+REPORT_FILE = os.path.join(document_builder.AUTOMATION_DIR, 'size-report.json')
+
+# a component regresses when it grows by more than MAX_GROWTH (a fraction of its
+# previous size) and by more than MIN_GROWTH bytes.
+MAX_GROWTH = 0.05
+MIN_GROWTH = 100
+
+Regression = namedtuple('Regression', ['document', 'component', 'previous', 'current'])
+
+# (table heading, component) of the table columns.
+COLUMNS = [("parameters", "parameters"), ("mainSteps", "mainSteps"), ("template", "template"),
+           ("skeleton", "template_skeleton")]
+
+
+def make_report(results, previous=None):
+    """Return the report of the given BuildResults.
+
+    Documents of the previous report that were not part of this build are kept.
+    """
+    documents = dict((previous or {}).get("documents", {}))
+    for result in results:
+        if result.sizes is not None:
+            documents["{}/{}".format(result.project, result.output)] = result.sizes
+    return {
+        "limits": {"lambda": document_builder.LAMBDA_MAX_SIZE, "template": document_builder.TEMPLATE_MAX_SIZE},
+        "documents": documents
+    }
+
+
+def load_report(path=REPORT_FILE):
+    """Return the report saved at path, or None."""
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def save_report(report, path=REPORT_FILE):
+    """Save report at path; an unchanged report is not written again. Returns True if it was written."""
+    return document_builder.write_if_changed(
+        path, json.dumps(report, indent=2, separators=(',', ': '), sort_keys=True) + "\n")
+
+
+def components(sizes):
+    """Flatten a document's sizes to {component name: bytes}, one "lambda:<resource>" per Lambda."""
+    flat = dict((name, size) for name, size in sizes.items() if name != "lambdas")
+    for resource_name, size in sizes.get("lambdas", {}).items():
+        flat["lambda:" + resource_name] = size
+    return flat
+
+
+def find_regressions(previous, current, max_growth=MAX_GROWTH, min_growth=MIN_GROWTH):
+    """Return a Regression for every component of current that grew too much since previous."""
+    regressions = []
+    if previous is None:
+        return regressions
+    previous_documents = previous.get("documents", {})
+    for document, sizes in sorted(current["documents"].items()):
+        if document not in previous_documents:
+            continue
+        previous_sizes = components(previous_documents[document])
+        for component, size in sorted(components(sizes).items()):
+            old = previous_sizes.get(component)
+            if old is not None and size - old > max(min_growth, old * max_growth):
+                regressions.append(Regression(document, component, old, size))
+    return regressions
+
+
+def format_table(report):
+    """Return the report as lines of a table, with the share of each hard limit used."""
+    limits = report["limits"]
+    names = sorted(report["documents"])
+    width = max([len("document")] + [len(name) for name in names])
+    headings = [heading for heading, _ in COLUMNS] + ["lambdas", "total", "lambda %", "template %"]
+    lines = ["{:<{}}".format("document", width) + "".join("{:>12}".format(h) for h in headings)]
+    for name in names:
+        sizes = report["documents"][name]
+        lambdas = sizes.get("lambdas", {})
+        cells = [sizes.get(component, 0) for _, component in COLUMNS]
+        cells.append(sum(lambdas.values()))
+        cells.append(sizes["document"])
+        cells.append("{:.0%}".format(float(max(lambdas.values())) / limits["lambda"]) if lambdas else "-")
+        cells.append("{:.0%}".format(float(sizes["template"]) / limits["template"]) if "template" in sizes else "-")
+        lines.append("{:<{}}".format(name, width) + "".join("{:>12}".format(cell) for cell in cells))
+    return lines
+
+
+def format_regression(regression):
+    return "{} {} grew from {} to {} bytes ({:+.1%})".format(
+        regression.document, regression.component, regression.previous, regression.current,
+        float(regression.current - regression.previous) / regression.previous if regression.previous else 1)
@@ -0,0 +1,161 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Load CloudFormation templates with libyaml and cache the parsed result on disk.
+
+Templates are parsed with PyYAML's C-accelerated CSafeLoader when libyaml is
+available (falling back to the pure-Python SafeLoader) extended with the
+CloudFormation short-form tags (!Ref, !GetAtt, !Sub...), which are expanded to
+their long form.
+
+The parsed template is stored as JSON in a cache directory under a key made of
+the template's sha256 and the loader version, so a template is only parsed
+once per change no matter how many targets, builds or processes read it.
+Templates that do not survive a JSON round trip (timestamps, binary data or
+non-string keys) are simply not cached.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+AUTOMATION_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+CACHE_DIR = os.path.join(AUTOMATION_DIR, '.template-cache')
+# bump when the parsed representation changes to invalidate every cache entry.
+CACHE_VERSION = '1'
+
+# content digest -> JSON text of the parsed template, for this process.
+_MEMORY_CACHE = {}
+_LOADER = []
+
+
+def aws_tag_multi_constructor(loader, tag_suffix, node):
+    """Map CloudFormation short-form tags (!Ref, !GetAtt, !Sub...) to their long form."""
+    import yaml
+
+    if tag_suffix not in ['Ref', 'Condition']:
+        tag_suffix = "Fn::{}".format(tag_suffix)
+
+    if tag_suffix == "Fn::GetAtt":
+        result = node.value.split(".")
+    elif isinstance(node, yaml.ScalarNode):
+        result = loader.construct_scalar(node)
+    elif isinstance(node, yaml.SequenceNode):
+        result = loader.construct_sequence(node)
+    elif isinstance(node, yaml.MappingNode):
+        result = loader.construct_mapping(node)
+    else:
+        raise ValueError("Bad value for {}".format(tag_suffix))
+
+    return {tag_suffix: result}
+
+
+def loader_class():
+    """Return the YAML loader class for CloudFormation templates, preferring libyaml."""
+    if not _LOADER:
+        # PyYAML is only imported once a template actually needs parsing.
+        import yaml
+
+        class CloudFormationLoader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):  # pylint: disable=too-many-ancestors
+            pass
+
+        CloudFormationLoader.add_multi_constructor("!", aws_tag_multi_constructor)
+        _LOADER.append(CloudFormationLoader)
+    return _LOADER[0]
+
+
+def using_libyaml():
+    """Return True if templates are parsed by libyaml."""
+    import yaml
+
+    return issubclass(loader_class(), getattr(yaml, 'CSafeLoader', ()))
+
+
+def parse_template(content):
+    """Parse template content without using any cache."""
+    import yaml
+
+    return yaml.load(content, Loader=loader_class())
+
+
+def cache_key(content):
+    """Return the cache key of the given template content (bytes)."""
+    digest = hashlib.sha256(content)
+    digest.update(CACHE_VERSION.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_cache_entry(cache_dir, key):
+    """Return the text cached under key, or None."""
+    try:
+        with open(os.path.join(cache_dir, key + '.json')) as fp:
+            return fp.read()
+    except (IOError, OSError):
+        return None
+
+
+def write_cache_entry(cache_dir, key, text):
+    """Cache text under key, ignoring any error; concurrent readers never see a partial entry."""
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(text)
+        os.rename(temp_path, os.path.join(cache_dir, key + '.json'))
+    except (IOError, OSError):
+        # the cache is an optimization; a read-only tree still builds.
+        pass
+
+
+def _to_json(template):
+    try:
+        text = json.dumps(template, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    if json.loads(text) != template:
+        return None
+    return text
+
+
+def load_template(path, cache_dir=CACHE_DIR):
+    """Return the parsed template at path, using the memory and disk caches.
+
+    Every call returns a new object, so callers are free to modify it. Set
+    cache_dir to None to disable the disk cache.
+    """
+    with open(path, 'rb') as fp:
+        content = fp.read()
+    key = cache_key(content)
+
+    text = _MEMORY_CACHE.get(key)
+    if text is None and cache_dir is not None:
+        text = read_cache_entry(cache_dir, key)
+    if text is None:
+        template = parse_template(content)
+        text = _to_json(template)
+        if text is None:
+            return template
+        if cache_dir is not None:
+            write_cache_entry(cache_dir, key, text)
+    _MEMORY_CACHE[key] = text
+    return json.loads(text)
+
+
+def clear_memory_cache():
+    """Forget every template parsed by this process; the disk cache is kept."""
+    _MEMORY_CACHE.clear()
@@ -48,7 +48,8 @@ AMI_ID = CONFIG.get('windows', 'windows2016.{}'.format(REGION))
 INSTANCE_TYPE = CONFIG.get('windows', 'instance_type')
 
 SSM_DOC_NAME = PREFIX + 'automation-asg'
-CFN_STACK_NAME = PREFIX + 'automation-asg'
+STACK_POOL_PREFIX = CONFIG.get('general', 'stack_pool_prefix')
+STACK_POOL_TTL = CONFIG.getint('general', 'stack_pool_ttl')
 
 logging.basicConfig(level=CONFIG.get('general', 'log_level').upper())
 LOGGER = logging.getLogger(__name__)
@@ -80,84 +81,87 @@ class TestCase(unittest.TestCase):
             doc_type='Automation'
         )
 
-        test_cf_stack = ssm_testing.CFNTester(
-            cfn_client=cfn_client,
-            template_filename=os.path.abspath(os.path.join(
-                DOC_DIR,
-                'Tests/CloudFormationTemplates/ASG.yml')),
-            stack_name=CFN_STACK_NAME
-        )
-
         automation_role = ssm_doc.get_automation_role(
             boto3.client('sts', region_name=REGION),
             boto3.client('iam', region_name=REGION),
             SERVICE_ROLE_NAME
         )
 
-        LOGGER.info('Creating AutoScaling Group for testing')
+        LOGGER.info('Leasing AutoScaling Group for testing')
         stack_param = {
             'AMI': AMI_ID,
             'Subnets': available_subnets[0].id,
             'InstanceType': INSTANCE_TYPE
         }
-        test_cf_stack.create_stack([
-            {'ParameterKey': key, 'ParameterValue': value} for key, value in stack_param.iteritems()])
-
-        try:
-            asg_name = test_cf_stack.stack_outputs["ASGName"]
-
-            LOGGER.info("Creating automation document")
-            assert ssm_doc.create_document() == 'Active', 'Document not created successfully'
-
-            LOGGER.info("Waiting for an instance to become ready...")
-            working_instance = asg_wait_for_running_instance(asg_name, 1)[0]
-
-            LOGGER.info("Checking for AutoPatchInstanceInASG tag on instance.")
-            check_tag_exist(working_instance, 'AutoPatchInstanceInASG', False)
-
-            LOGGER.info("Executing SSM automation document to update instance on {}".format(working_instance))
-            execution = ssm_doc.execute_automation(
-                params={'InstanceId': [working_instance],
-                        'AutomationAssumeRole': [automation_role]})
-
-            # Collect tag change and asg instance lifecycle change.
-            tag_changes = [None]
-            asg_status_changes = []
-            asg_status_ignores = ["EnteringStandby", "Pending"]
-
-            # Status callback to collect any necessary data
-            def status_callback(_):
-                collect_tag_change(working_instance, "AutoPatchInstanceInASG", tag_changes),
-                collect_asg_status_change(asg_name, working_instance, asg_status_ignores, asg_status_changes)
-
-            # Wait for SSM to finish while collecting value change (callback).
-            result = ssm_doc.automation_execution_status(ssm_client, execution, status_callback=status_callback)
-
-            # Verify tag change.
-            LOGGER.info(tag_changes)
-            expected_tag_change = [
-                None,
-                "InProgress",
-                "Completed"
-            ]
-            assert tag_changes == expected_tag_change, 'Tag did not follow sequence.'
-
-            # Verify instance status change.
-            LOGGER.info(asg_status_changes)
-            expected_status_change_sequence = [
-                "InService",
-                "Standby",
-                "InService"
-            ]
-            is_status_change_expected = asg_status_changes == expected_status_change_sequence
-            assert is_status_change_expected, 'ASG instant lifecycle did not match expected.'
-
-            LOGGER.info('Verifying automation executions have concluded successfully')
-            assert result == 'Success', 'Document did not complete'
-
-        finally:
-            test_cf_stack.delete_stack()
-            ssm_doc.destroy()
+        stack_pool = ssm_testing.StackPool(cfn_client, STACK_POOL_PREFIX, STACK_POOL_TTL)
+        with stack_pool.lease(
+                os.path.abspath(os.path.join(DOC_DIR, 'Tests/CloudFormationTemplates/ASG.yml')),
+                [{'ParameterKey': key, 'ParameterValue': value} for key, value in stack_param.iteritems()],
+                reset=reset_patched_asg
+        ) as test_cf_stack:
+            try:
+                asg_name = test_cf_stack.stack_outputs["ASGName"]
+
+                LOGGER.info("Creating automation document")
+                assert ssm_doc.create_document() == 'Active', 'Document not created successfully'
+
+                LOGGER.info("Waiting for an instance to become ready...")
+                working_instance = asg_wait_for_running_instance(asg_name, 1)[0]
+
+                LOGGER.info("Checking for AutoPatchInstanceInASG tag on instance.")
+                check_tag_exist(working_instance, 'AutoPatchInstanceInASG', False)
+
+                LOGGER.info("Executing SSM automation document to update instance on {}".format(working_instance))
+                execution = ssm_doc.execute_automation(
+                    params={'InstanceId': [working_instance],
+                            'AutomationAssumeRole': [automation_role]})
+
+                # Collect tag change and asg instance lifecycle change.
+                tag_changes = [None]
+                asg_status_changes = []
+                asg_status_ignores = ["EnteringStandby", "Pending"]
+
+                # Status callback to collect any necessary data
+                def status_callback(_):
+                    collect_tag_change(working_instance, "AutoPatchInstanceInASG", tag_changes),
+                    collect_asg_status_change(asg_name, working_instance, asg_status_ignores, asg_status_changes)
+
+                # Wait for SSM to finish while collecting value change (callback).
+                result = ssm_doc.automation_execution_status(ssm_client, execution, status_callback=status_callback)
+
+                # Verify tag change.
+                LOGGER.info(tag_changes)
+                expected_tag_change = [
+                    None,
+                    "InProgress",
+                    "Completed"
+                ]
+                assert tag_changes == expected_tag_change, 'Tag did not follow sequence.'
+
+                # Verify instance status change.
+                LOGGER.info(asg_status_changes)
+                expected_status_change_sequence = [
+                    "InService",
+                    "Standby",
+                    "InService"
+                ]
+                is_status_change_expected = asg_status_changes == expected_status_change_sequence
+                assert is_status_change_expected, 'ASG instant lifecycle did not match expected.'
+
+                LOGGER.info('Verifying automation executions have concluded successfully')
+                assert result == 'Success', 'Document did not complete'
+
+            finally:
+                ssm_doc.destroy()
+
+
+def reset_patched_asg(tester):
+    """Put the pooled AutoScaling Group back in service, its instances without the AutoPatchInstanceInASG tag."""
+    ssm_testing.StackPool.instances_in_service(as_client, 'ASGName')(tester)
+    group = as_client.describe_auto_scaling_groups(
+        AutoScalingGroupNames=[tester.stack_outputs['ASGName']])['AutoScalingGroups'][0]
+    ec2_client.delete_tags(Resources=[x['InstanceId'] for x in group['Instances']],
+                           Tags=[{'Key': 'AutoPatchInstanceInASG'}])
 
 
 def asg_wait_for_running_instance(asg_name, number_of_instance, max_wait_sec=60):
@@ -49,7 +49,8 @@ AMIID = CONFIG.get('linux', 'ami')
 SERVICE_ROLE_NAME = CONFIG.get('general', 'automation_service_role_name')
 INSTANCE_TYPE = CONFIG.get('linux', 'instance_type')
 SSM_DOC_NAME = PREFIX + 'automation-restartinstance'
-INSTANCE_CFN_STACKNAME = PREFIX + 'automation-restartinstance'
+STACK_POOL_PREFIX = CONFIG.get('general', 'stack_pool_prefix')
+STACK_POOL_TTL = CONFIG.getint('general', 'stack_pool_ttl')
 
 if CONFIG.get('general', 'log_level') == 'warn':
     logging.basicConfig(level=logging.WARN)
@@ -87,64 +88,59 @@ class TestCase(unittest.TestCase):
             doc_type='Automation'
         )
 
-        test_cf_stack = ssm_testing.CFNTester(
-            cfn_client=cfn_client,
-            template_filename=os.path.join(DOC_DIR,
-                                           'Tests',
-                                           'CloudFormationTemplates',
-                                           'TwoInstances.yml'),
-            stack_name=INSTANCE_CFN_STACKNAME
-        )
-
         automation_role = ssm_doc.get_automation_role(
             boto3.client('sts', region_name=REGION),
             boto3.client('iam', region_name=REGION),
             SERVICE_ROLE_NAME
         )
 
-        LOGGER.info('Starting instances for testing')
-        test_cf_stack.create_stack([
-            {
-                'ParameterKey': 'AMI',
-                'ParameterValue': AMIID
-            },
-            {
-                'ParameterKey': 'INSTANCETYPE',
-                'ParameterValue': INSTANCE_TYPE
-            }
-        ])
-        try:
-            LOGGER.info('Creating automation document')
-            assert ssm_doc.create_document() == 'Active', ('Document not '
-                                                           'created '
-                                                           'successfully')
-
-            LOGGER.info('Running automation to restart multiple instances '
-                        '(using defined role)')
-            instances_1_2 = [test_cf_stack.stack_outputs['Instance0Id'],
-                             test_cf_stack.stack_outputs['Instance1Id']]
-            execution = ssm_doc.execute_automation(
-                params={'InstanceId': instances_1_2,
-                        'AutomationAssumeRole': [automation_role]})
-
-            LOGGER.info('Verifying automation executions have concluded successfully')
-
-            assert ssm_doc.automation_execution_status(
-                ssm_client,
-                execution
-            ) == 'Success', 'Instances not restarted successfully'
-
-            LOGGER.info('Verifying all instances are running')
-            describe_res = ec2_client.describe_instance_status(
-                InstanceIds=instances_1_2,
-                IncludeAllInstances=True
-            )
-            assert all(d['InstanceState']['Name'] == 'running' for d in describe_res['InstanceStatuses']) is True, (  # noqa pylint: disable=line-too-long
-                'Instances not started')
-
-        finally:
-            test_cf_stack.delete_stack()
-            ssm_doc.destroy()
+        stack_pool = ssm_testing.StackPool(cfn_client, STACK_POOL_PREFIX, STACK_POOL_TTL)
+        LOGGER.info('Leasing instances for testing')
+        with stack_pool.lease(
+                os.path.join(DOC_DIR, 'Tests', 'CloudFormationTemplates', 'TwoInstances.yml'),
+                [
+                    {
+                        'ParameterKey': 'AMI',
+                        'ParameterValue': AMIID
+                    },
+                    {
+                        'ParameterKey': 'INSTANCETYPE',
+                        'ParameterValue': INSTANCE_TYPE
+                    }
+                ],
+                reset=ssm_testing.StackPool.instances_running(ec2_client, 'Instance0Id', 'Instance1Id')
+        ) as test_cf_stack:
+            try:
+                LOGGER.info('Creating automation document')
+                assert ssm_doc.create_document() == 'Active', ('Document not '
+                                                               'created '
+                                                               'successfully')
+
+                LOGGER.info('Running automation to restart multiple instances '
+                            '(using defined role)')
+                instances_1_2 = [test_cf_stack.stack_outputs['Instance0Id'],
+                                 test_cf_stack.stack_outputs['Instance1Id']]
+                execution = ssm_doc.execute_automation(
+                    params={'InstanceId': instances_1_2,
+                            'AutomationAssumeRole': [automation_role]})
+
+                LOGGER.info('Verifying automation executions have concluded successfully')
+
+                assert ssm_doc.automation_execution_status(
+                    ssm_client,
+                    execution
+                ) == 'Success', 'Instances not restarted successfully'
+
+                LOGGER.info('Verifying all instances are running')
+                describe_res = ec2_client.describe_instance_status(
+                    InstanceIds=instances_1_2,
+                    IncludeAllInstances=True
+                )
+                assert all(d['InstanceState']['Name'] == 'running' for d in describe_res['InstanceStatuses']) is True, (  # noqa pylint: disable=line-too-long
+                    'Instances not started')
+
+            finally:
+                ssm_doc.destroy()
 
 
 if __name__ == '__main__':
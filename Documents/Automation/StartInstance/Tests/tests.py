@@ -49,7 +49,8 @@ AMIID = CONFIG.get('linux', 'ami')
 SERVICE_ROLE_NAME = CONFIG.get('general', 'automation_service_role_name')
 INSTANCETYPE = CONFIG.get('linux', 'instance_type')
 SSM_DOC_NAME = PREFIX + 'automation-startinstance'
-INSTANCE_CFN_STACK_NAME = PREFIX + 'automation-startinstance'
+STACK_POOL_PREFIX = CONFIG.get('general', 'stack_pool_prefix')
+STACK_POOL_TTL = CONFIG.getint('general', 'stack_pool_ttl')
 
 if CONFIG.get('general', 'log_level') == 'warn':
     logging.basicConfig(level=logging.WARN)
@@ -84,86 +85,81 @@ class TestCase(unittest.TestCase):
             doc_type='Automation'
         )
 
-        test_cf_stack = ssm_testing.CFNTester(
-            cfn_client=cfn_client,
-            template_filename=os.path.join(DOC_DIR,
-                                           'Tests',
-                                           'CloudFormationTemplates',
-                                           'ThreeInstances.yml'),
-            stack_name=INSTANCE_CFN_STACK_NAME
-        )
-
         automation_role = ssm_doc.get_automation_role(
             boto3.client('sts', region_name=REGION),
             boto3.client('iam', region_name=REGION),
             SERVICE_ROLE_NAME
         )
 
-        LOGGER.info('Starting 3 instances for testing')
-        test_cf_stack.create_stack([
-            {
-                'ParameterKey': 'AMI',
-                'ParameterValue': AMIID
-            },
-            {
-                'ParameterKey': 'INSTANCETYPE',
-                'ParameterValue': INSTANCETYPE
-            }
-        ])
-        try:
-            LOGGER.info('Creating automation document')
-            assert ssm_doc.create_document() == 'Active', ('Document not '
-                                                           'created '
-                                                           'successfully')
-
-            LOGGER.info('Stopping instances')
-            ec2_client.stop_instances(
-                InstanceIds=[
-                    x for x in test_cf_stack.stack_outputs.itervalues()
-                ]
-            )
-
-            LOGGER.info('Ensuring instances have stopped')
-            ssm_doc.ensure_no_instance_in_state(
-                ec2_client,
-                'stopping',
-                [x for x in test_cf_stack.stack_outputs.itervalues()])
-
-            LOGGER.info('Running automation to start single instance')
-            instance_0 = test_cf_stack.stack_outputs['Instance0Id']
-            execution_0 = ssm_doc.execute_automation(
-                params={'InstanceId': [instance_0]}
-            )
-
-            LOGGER.info('Running automation to start multiple instances '
-                        '(using defined role)')
-            instances_1_2 = [test_cf_stack.stack_outputs['Instance1Id'],
-                             test_cf_stack.stack_outputs['Instance2Id']]
-            execution_1 = ssm_doc.execute_automation(
-                params={'InstanceId': instances_1_2,
-                        'AutomationAssumeRole': [automation_role]})
-
-            LOGGER.info('Verifying automation executions have concluded '
-                        'successfully')
-            for i in [execution_0, execution_1]:
-                assert ssm_doc.automation_execution_status(
-                    ssm_client,
-                    i
-                ) == 'Success', 'Instance not started'
-
-            LOGGER.info('Verifying all instances are running')
-            describe_res = ec2_client.describe_instance_status(
-                InstanceIds=[
-                    x for x in test_cf_stack.stack_outputs.itervalues()
+        stack_pool = ssm_testing.StackPool(cfn_client, STACK_POOL_PREFIX, STACK_POOL_TTL)
+        LOGGER.info('Leasing 3 instances for testing')
+        with stack_pool.lease(
+                os.path.join(DOC_DIR, 'Tests', 'CloudFormationTemplates', 'ThreeInstances.yml'),
+                [
+                    {
+                        'ParameterKey': 'AMI',
+                        'ParameterValue': AMIID
+                    },
+                    {
+                        'ParameterKey': 'INSTANCETYPE',
+                        'ParameterValue': INSTANCETYPE
+                    }
                 ],
-                IncludeAllInstances=True
-            )
-            assert all(d['InstanceState']['Name'] == 'running' for d in describe_res['InstanceStatuses']) is True, (  # noqa pylint: disable=line-too-long
-                'Instances not started')
-
-        finally:
-            test_cf_stack.delete_stack()
-            ssm_doc.destroy()
+                reset=ssm_testing.StackPool.instances_running(ec2_client, 'Instance0Id', 'Instance1Id', 'Instance2Id')
+        ) as test_cf_stack:
+            try:
+                LOGGER.info('Creating automation document')
+                assert ssm_doc.create_document() == 'Active', ('Document not '
+                                                               'created '
+                                                               'successfully')
+
+                LOGGER.info('Stopping instances')
+                ec2_client.stop_instances(
+                    InstanceIds=[
+                        x for x in test_cf_stack.stack_outputs.itervalues()
+                    ]
+                )
+
+                LOGGER.info('Ensuring instances have stopped')
+                ssm_doc.ensure_no_instance_in_state(
+                    ec2_client,
+                    'stopping',
+                    [x for x in test_cf_stack.stack_outputs.itervalues()])
+
+                LOGGER.info('Running automation to start single instance')
+                instance_0 = test_cf_stack.stack_outputs['Instance0Id']
+                execution_0 = ssm_doc.execute_automation(
+                    params={'InstanceId': [instance_0]}
+                )
+
+                LOGGER.info('Running automation to start multiple instances '
+                            '(using defined role)')
+                instances_1_2 = [test_cf_stack.stack_outputs['Instance1Id'],
+                                 test_cf_stack.stack_outputs['Instance2Id']]
+                execution_1 = ssm_doc.execute_automation(
+                    params={'InstanceId': instances_1_2,
+                            'AutomationAssumeRole': [automation_role]})
+
+                LOGGER.info('Verifying automation executions have concluded '
+                            'successfully')
+                for i in [execution_0, execution_1]:
+                    assert ssm_doc.automation_execution_status(
+                        ssm_client,
+                        i
+                    ) == 'Success', 'Instance not started'
+
+                LOGGER.info('Verifying all instances are running')
+                describe_res = ec2_client.describe_instance_status(
+                    InstanceIds=[
+                        x for x in test_cf_stack.stack_outputs.itervalues()
+                    ],
+                    IncludeAllInstances=True
+                )
+                assert all(d['InstanceState']['Name'] == 'running' for d in describe_res['InstanceStatuses']) is True, (  # noqa pylint: disable=line-too-long
+                    'Instances not started')
+
+            finally:
+                ssm_doc.destroy()
 
 
 if __name__ == '__main__':
@@ -49,7 +49,8 @@ AMIID = CONFIG.get('linux', 'ami')
 SERVICE_ROLE_NAME = CONFIG.get('general', 'automation_service_role_name')
 INSTANCE_TYPE = CONFIG.get('linux', 'instance_type')
 SSM_DOC_NAME = PREFIX + 'automation-stopinstance-with-approval'
-INSTANCE_CFN_STACK_NAME = PREFIX + 'automation-stopinstance-with-approval'
+STACK_POOL_PREFIX = CONFIG.get('general', 'stack_pool_prefix')
+STACK_POOL_TTL = CONFIG.getint('general', 'stack_pool_ttl')
 
 if CONFIG.get('general', 'log_level') == 'warn':
     logging.basicConfig(level=logging.WARN)
@@ -84,94 +85,90 @@ class TestCase(unittest.TestCase):
             doc_type='Automation'
         )
 
-        test_cf_stack = ssm_testing.CFNTester(
-            cfn_client=cfn_client,
-            template_filename=os.path.join(DOC_DIR,
-                                           'Tests',
-                                           'CloudFormationTemplates',
-                                           'TwoInstancesWithSNS.yml'),
-            stack_name=INSTANCE_CFN_STACK_NAME
-        )
-
         automation_role = ssm_doc.get_automation_role(
             boto3.client('sts', region_name=REGION),
             boto3.client('iam', region_name=REGION),
             SERVICE_ROLE_NAME
         )
 
-        LOGGER.info('Starting 2 instances for testing')
-        test_cf_stack.create_stack([
-            {
-                'ParameterKey': 'AMI',
-                'ParameterValue': AMIID
-            },
-            {
-                'ParameterKey': 'INSTANCETYPE',
-                'ParameterValue': INSTANCE_TYPE
-            }
-        ])
-        try:
-            LOGGER.info('Creating automation document')
-            assert ssm_doc.create_document() == 'Active', ('Document not '
-                                                           'created '
-                                                           'successfully')
-
-            ec2_instance_ids = [
-                test_cf_stack.stack_outputs['Instance0Id'],
-                test_cf_stack.stack_outputs['Instance1Id']
-            ]
-            user_arn = boto3.client('sts', region_name=REGION).get_caller_identity().get('Arn')
-            sns_topic_arn = test_cf_stack.stack_outputs['SNSTopicArn']
-
-            LOGGER.info("User ARN for approval: " + user_arn)
-            LOGGER.info("SNS Topic ARN for approval: " + sns_topic_arn)
-
-            LOGGER.info('Verifying all instances are running')
-            describe_res = ec2_client.describe_instance_status(
-                InstanceIds=ec2_instance_ids,
-                IncludeAllInstances=True
-            )
-            assert all(d['InstanceState']['Name'] == 'running' for d in describe_res['InstanceStatuses']) is True, (  # noqa pylint: disable=line-too-long
-                'Instances not started')
-
-            LOGGER.info('Running automation to stop multiple instances '
-                        '(using defined role)')
-
-            ssm_doc_params = {'InstanceId': ec2_instance_ids,
-                              'AutomationAssumeRole': [automation_role],
-                              'Approvers': [user_arn],
-                              'SNSTopicArn': [sns_topic_arn]}
-
-            execution = ssm_doc.execute_automation(params=ssm_doc_params)
-
-            LOGGER.info('Verifying automation executions have concluded '
-                        'successfully')
-
-            # since this automation requires approval to continue, the correct status at this point should be 'Waiting'
-            assert ssm_doc.automation_execution_status(ssm_client, execution, False) == 'Waiting', \
-                'Automation not waiting for approval'
-
-            LOGGER.info('Approving continuation of execution')
-            ssm_client.send_automation_signal(
-                AutomationExecutionId=execution,
-                SignalType='Approve'
-            )
-
-            # this will block until the automation is back in a running state
-            assert ssm_doc.automation_execution_status(ssm_client, execution) == 'Success', \
-                'Automation step unsuccessful'
-
-            LOGGER.info('Verifying all instances are stopped')
-            describe_res = ec2_client.describe_instance_status(
-                InstanceIds=ec2_instance_ids,
-                IncludeAllInstances=True
-            )
-            assert all(d['InstanceState']['Name'] == 'stopped' for d in describe_res['InstanceStatuses']) is True, (  # noqa pylint: disable=line-too-long
-                'Instances not stopped')
-
-        finally:
-            test_cf_stack.delete_stack()
-            ssm_doc.destroy()
+        stack_pool = ssm_testing.StackPool(cfn_client, STACK_POOL_PREFIX, STACK_POOL_TTL)
+        LOGGER.info('Leasing 2 instances for testing')
+        with stack_pool.lease(
+                os.path.join(DOC_DIR, 'Tests', 'CloudFormationTemplates', 'TwoInstancesWithSNS.yml'),
+                [
+                    {
+                        'ParameterKey': 'AMI',
+                        'ParameterValue': AMIID
+                    },
+                    {
+                        'ParameterKey': 'INSTANCETYPE',
+                        'ParameterValue': INSTANCE_TYPE
+                    }
+                ],
+                reset=ssm_testing.StackPool.instances_running(ec2_client, 'Instance0Id', 'Instance1Id')
+        ) as test_cf_stack:
+            try:
+                LOGGER.info('Creating automation document')
+                assert ssm_doc.create_document() == 'Active', ('Document not '
+                                                               'created '
+                                                               'successfully')
+
+                ec2_instance_ids = [
+                    test_cf_stack.stack_outputs['Instance0Id'],
+                    test_cf_stack.stack_outputs['Instance1Id']
+                ]
+                user_arn = boto3.client('sts', region_name=REGION).get_caller_identity().get('Arn')
+                sns_topic_arn = test_cf_stack.stack_outputs['SNSTopicArn']
+
+                LOGGER.info("User ARN for approval: " + user_arn)
+                LOGGER.info("SNS Topic ARN for approval: " + sns_topic_arn)
+
+                LOGGER.info('Verifying all instances are running')
+                describe_res = ec2_client.describe_instance_status(
+                    InstanceIds=ec2_instance_ids,
+                    IncludeAllInstances=True
+                )
+                assert all(d['InstanceState']['Name'] == 'running' for d in describe_res['InstanceStatuses']) is True, (  # noqa pylint: disable=line-too-long
+                    'Instances not started')
+
+                LOGGER.info('Running automation to stop multiple instances '
+                            '(using defined role)')
+
+                ssm_doc_params = {'InstanceId': ec2_instance_ids,
+                                  'AutomationAssumeRole': [automation_role],
+                                  'Approvers': [user_arn],
+                                  'SNSTopicArn': [sns_topic_arn]}
+
+                execution = ssm_doc.execute_automation(params=ssm_doc_params)
+
+                LOGGER.info('Verifying automation executions have concluded '
+                            'successfully')
+
+                # since this automation requires approval to continue, the correct status at this point should be
+                # 'Waiting'
+                assert ssm_doc.automation_execution_status(ssm_client, execution, False) == 'Waiting', \
+                    'Automation not waiting for approval'
+
+                LOGGER.info('Approving continuation of execution')
+                ssm_client.send_automation_signal(
+                    AutomationExecutionId=execution,
+                    SignalType='Approve'
+                )
+
+                # this will block until the automation is back in a running state
+                assert ssm_doc.automation_execution_status(ssm_client, execution) == 'Success', \
+                    'Automation step unsuccessful'
+
+                LOGGER.info('Verifying all instances are stopped')
+                describe_res = ec2_client.describe_instance_status(
+                    InstanceIds=ec2_instance_ids,
+                    IncludeAllInstances=True
+                )
+                assert all(d['InstanceState']['Name'] == 'stopped' for d in describe_res['InstanceStatuses']) is True, (  # noqa pylint: disable=line-too-long
+                    'Instances not stopped')
+
+            finally:
+                ssm_doc.destroy()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,255 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import os
+import sys
+import time
+import unittest
+
+TESTING_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+AUTOMATION_DIR = os.path.dirname(TESTING_DIR)
+
+sys.path.append(TESTING_DIR)
+import automation_runtime  # noqa pylint: disable=import-error,wrong-import-position
+
+
+class ScriptedBackend(object):
+    """Answer calls with the handler registered for their operation, and log them."""
+
+    region = 'us-east-1'
+    account_id = '123456789012'
+
+    def __init__(self, **handlers):
+        self.handlers = handlers
+        self.calls = []
+
+    def call(self, service, operation, params):
+        self.calls.append((service.lower(), operation, params))
+        return self.handlers[operation](params)
+
+    def operations(self):
+        return [operation for _, operation, _ in self.calls]
+
+
+class InstanceBackend(ScriptedBackend):
+    """EC2 instances that reach the requested state 30 seconds after the request."""
+
+    def __init__(self, clock, states):
+        super(InstanceBackend, self).__init__(
+            DescribeInstances=self.describe, StopInstances=self.change('stopped'),
+            StartInstances=self.change('running'))
+        self.clock = clock
+        self.states = dict((instance_id, (state, 0)) for instance_id, state in states.items())
+
+    def describe(self, params):
+        instances = []
+        for instance_id in params['InstanceIds']:
+            state, ready = self.states[instance_id]
+            name = state if self.clock.time() >= ready else 'pending'
+            instances.append({'InstanceId': instance_id, 'State': {'Name': name}})
+        return {'Reservations': [{'Instances': instances}]}
+
+    def change(self, state):
+        def handler(params):
+            for instance_id in params['InstanceIds']:
+                self.states[instance_id] = (state, self.clock.time() + 30)
+            return {}
+        return handler
+
+
+def document(*steps, **extra):
+    result = {'schemaVersion': '0.3', 'parameters': {'Value': {'type': 'String', 'default': 'a'}},
+              'mainSteps': list(steps)}
+    result.update(extra)
+    return result
+
+
+def api_step(name, api='Describe', **extra):
+    step = {'name': name, 'action': 'aws:executeAwsApi', 'inputs': {'Service': 'ec2', 'Api': api}}
+    step.update(extra)
+    return step
+
+
+class AutomationRuntimeTest(unittest.TestCase):
+    def test_restart_instance_document(self):
+        clock = automation_runtime.VirtualClock()
+        backend = InstanceBackend(clock, {'i-1': 'running', 'i-2': 'running'})
+        runtime = automation_runtime.AutomationRuntime(backend)
+        self.assertIs(runtime.clock, clock)
+
+        start = time.time()
+        execution = runtime.run_file(os.path.join(AUTOMATION_DIR, 'RestartInstance', 'Documents',
+                                                  'aws-RestartEC2Instance.json'), {'InstanceId': ['i-1', 'i-2']})
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(execution.status, 'Success', execution.failure)
+        self.assertEqual(execution.step_names(), ['stopInstances', 'startInstances'])
+        self.assertEqual(execution.step('stopInstances').inputs['InstanceIds'], ['i-1', 'i-2'])
+        self.assertEqual(backend.operations().count('StopInstances'), 1)
+        self.assertEqual(backend.operations().count('StartInstances'), 1)
+        # each state change takes 30 virtual seconds, polled every 5 seconds.
+        self.assertEqual(execution.elapsed, 60)
+        self.assertEqual(backend.states['i-1'][0], 'running')
+
+    def test_branch_and_assert(self):
+        attributes = {}
+
+        def set_attributes(params):
+            # SQS returns booleans in lower case, whatever case they were set in.
+            attributes.update((name, value.lower() if value in ('True', 'False') else value)
+                              for name, value in params['Attributes'].items())
+            return {}
+        backend = ScriptedBackend(SetQueueAttributes=set_attributes,
+                                  GetQueueAttributes=lambda params: {'Attributes': dict(attributes)})
+        runtime = automation_runtime.AutomationRuntime(backend)
+        path = os.path.join(AUTOMATION_DIR, 'EnableSQSEncryption', 'Documents', 'aws-EnableSQSEncryption.yml')
+
+        execution = runtime.run_file(path, {'QueueUrl': 'https://sqs.us-east-1.amazonaws.com/1/q'})
+        self.assertEqual(execution.status, 'Success', execution.failure)
+        self.assertEqual(execution.step_names(),
+                         ['SelectKeyType', 'PutAttributeSseSqs', 'VerifySqsEncryptionDefault'])
+        self.assertEqual(attributes, {'SqsManagedSseEnabled': 'true'})
+
+        # the queue ignores the key: the assertion fails the execution.
+        backend.handlers['SetQueueAttributes'] = lambda params: {}
+        attributes.clear()
+        execution = runtime.run_file(path, {'QueueUrl': 'https://sqs.us-east-1.amazonaws.com/1/q', 'KmsKeyId': 'k'})
+        self.assertEqual(execution.status, 'Failed')
+        self.assertEqual(execution.step_names(), ['SelectKeyType', 'PutAttributeSseKms', 'VerifySqsEncryptionKms'])
+        self.assertIn('Selector $.Attributes.KmsMasterKeyId matched nothing', execution.failure)
+
+    def test_references_and_outputs(self):
+        backend = ScriptedBackend(Describe=lambda params: {'Items': [{'Id': 'x-1'}, {'Id': 'x-2'}], 'Echo': params})
+        runtime = automation_runtime.AutomationRuntime(backend)
+        execution = runtime.run(document(
+            api_step('first', outputs=[{'Name': 'Ids', 'Selector': '$.Items[*].Id', 'Type': 'StringList'},
+                                       {'Name': 'First', 'Selector': '$.Items[0].Id', 'Type': 'String'}]),
+            api_step('second', inputs={
+                'Service': 'ec2', 'Api': 'Describe', 'Ids': '{{ first.Ids }}',
+                'Name': '{{Value}}-{{first.First}}-{{ automation:EXECUTION_ID }}',
+                'Where': '{{global:REGION}}/{{global:ACCOUNT_ID}}/{{global:DATE}}'}),
+            outputs=['first.Ids', 'first.First']), {'Value': ['b']})
+        self.assertEqual(execution.status, 'Success', execution.failure)
+        self.assertEqual(backend.calls[-1][2], {
+            'Ids': ['x-1', 'x-2'], 'Name': 'b-x-1-' + execution.execution_id,
+            'Where': 'us-east-1/123456789012/2018-01-01'})
+        self.assertEqual(execution.outputs, {'first.Ids': ['x-1', 'x-2'], 'first.First': 'x-1'})
+
+        execution = runtime.run(document(api_step('first', inputs={'Service': 'ec2', 'Api': 'Describe',
+                                                                   'Name': '{{ Missing }}'})))
+        self.assertEqual(execution.status, 'Failed')
+        self.assertIn('Unresolved reference {{Missing}}', execution.failure)
+
+    def test_parameters(self):
+        definition = document(parameters={'Ids': {'type': 'StringList'}, 'Count': {'type': 'Integer', 'default': 2},
+                                          'Force': {'type': 'Boolean', 'default': False}})
+        resolve = automation_runtime.AutomationRuntime.resolve_parameters
+        self.assertEqual(resolve(definition, {'Ids': 'i-1', 'Force': ['true']}),
+                         {'Ids': ['i-1'], 'Count': 2, 'Force': True})
+        self.assertEqual(resolve(definition, {'Ids': ['i-1', 'i-2'], 'Count': ['3']}),
+                         {'Ids': ['i-1', 'i-2'], 'Count': 3, 'Force': False})
+        runtime = automation_runtime.AutomationRuntime(ScriptedBackend())
+        self.assertIn('Missing required parameter Ids', runtime.run(definition).failure)
+        self.assertIn('Unknown parameter Other', runtime.run(definition, {'Ids': 'i', 'Other': 'x'}).failure)
+
+    def test_retries_and_failure_paths(self):
+        results = [ValueError('throttled'), {}]
+
+        def flaky(params):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        backend = ScriptedBackend(Describe=lambda params: {}, Flaky=flaky, Broken=self.fail_call)
+        runtime = automation_runtime.AutomationRuntime(backend)
+        execution = runtime.run(document(
+            api_step('flaky', 'Flaky', maxAttempts=2),
+            api_step('broken', 'Broken', onFailure='step:cleanup'),
+            api_step('skipped'),
+            api_step('cleanup', onFailure='Abort', isEnd=True)))
+        self.assertEqual(execution.step('flaky').attempts, 2)
+        self.assertEqual(execution.step('flaky').status, 'Success')
+        self.assertEqual(execution.step_names(), ['flaky', 'broken', 'cleanup'])
+        # broken is critical, so the execution fails even though cleanup ran.
+        self.assertEqual(execution.status, 'Failed')
+        self.assertIn('Step broken failed: RuntimeError: no such API', execution.failure)
+
+        execution = runtime.run(document(api_step('broken', 'Broken', onFailure='Continue', isCritical=False),
+                                         api_step('next')))
+        self.assertEqual(execution.status, 'Success')
+        self.assertEqual([s.status for s in execution.steps], ['Failed', 'Success'])
+
+    @staticmethod
+    def fail_call(params):
+        raise RuntimeError('no such API')
+
+    def test_timeouts_use_the_virtual_clock(self):
+        backend = ScriptedBackend(Describe=lambda params: {'State': 'pending'})
+        runtime = automation_runtime.AutomationRuntime(backend)
+        start = time.time()
+        execution = runtime.run(document(
+            {'name': 'sleep', 'action': 'aws:sleep', 'inputs': {'Duration': 'PT1H'}},
+            {'name': 'wait', 'action': 'aws:waitForAwsResourceProperty', 'timeoutSeconds': 60, 'maxAttempts': 2,
+             'inputs': {'Service': 'ec2', 'Api': 'Describe', 'PropertySelector': '$.State',
+                        'DesiredValues': ['available']}}))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(execution.status, 'TimedOut')
+        self.assertEqual(execution.step('wait').attempts, 2)
+        self.assertEqual(execution.step('sleep').end - execution.step('sleep').start, 3600)
+        self.assertLessEqual(execution.elapsed, 3600 + 120)
+
+        execution = runtime.run(document({'name': 'sleep', 'action': 'aws:sleep', 'timeoutSeconds': 10,
+                                          'inputs': {'Duration': 'PT1M'}}))
+        self.assertEqual(execution.status, 'TimedOut')
+        self.assertEqual(execution.elapsed, 10)
+
+    def test_nested_automation(self):
+        child = document({'name': 'describe', 'action': 'aws:executeAwsApi', 'inputs': {
+            'Service': 'ec2', 'Api': 'Describe', 'Value': '{{ Value }}'},
+            'outputs': [{'Name': 'Echo', 'Selector': '$.Echo.Value', 'Type': 'String'}]},
+            outputs=['describe.Echo'])
+        backend = ScriptedBackend(Describe=lambda params: {'Echo': params})
+        runtime = automation_runtime.AutomationRuntime(backend, documents={'AWS-Child': child})
+        execution = runtime.run(document(
+            {'name': 'child', 'action': 'aws:executeAutomation',
+             'inputs': {'DocumentName': 'AWS-Child', 'RuntimeParameters': {'Value': ['{{ Value }}']}}},
+            api_step('use', inputs={'Service': 'ec2', 'Api': 'Describe', 'Ids': '{{ child.Output }}'})))
+        self.assertEqual(execution.status, 'Success', execution.failure)
+        self.assertEqual(execution.step('child').outputs['Output'], ['a'])
+        self.assertEqual(backend.calls[-1][2], {'Ids': ['a']})
+
+        runtime.documents = {}
+        backend.handlers.update(
+            StartAutomationExecution=lambda params: {'AutomationExecutionId': 'e-1'},
+            GetAutomationExecution=lambda params: {'AutomationExecution': {
+                'AutomationExecutionStatus': 'Success', 'Outputs': {'x.Id': ['b']}}})
+        execution = runtime.run(document(
+            {'name': 'child', 'action': 'aws:executeAutomation',
+             'inputs': {'DocumentName': 'AWS-Child', 'RuntimeParameters': {'Value': 'c'}}}))
+        self.assertEqual(execution.step('child').outputs, {'ExecutionId': 'e-1', 'Status': 'Success', 'Output': ['b']})
+        self.assertEqual(backend.calls[-2][2], {'DocumentName': 'AWS-Child', 'Parameters': {'Value': ['c']}})
+
+    def test_select(self):
+        data = {'A': [{'B': 1, 'C': {'D': True}}, {'B': 2}], 'E F': 'x'}
+        select = automation_runtime.select
+        self.assertEqual(select(data, '$'), data)
+        self.assertEqual(select(data, '$.A[1].B'), 2)
+        self.assertEqual(select(data, '$.A[0].C.D'), True)
+        self.assertEqual(select(data, '$.A[*].B'), [1, 2])
+        self.assertEqual(select(data, "$['E F']"), 'x')
+        self.assertRaises(automation_runtime.StepFailed, select, data, '$.A[2]')
+        self.assertRaises(automation_runtime.StepFailed, select, data, 'A.B')
+        self.assertEqual(select(data, '$.A[*].B', 'StringList'), ['1', '2'])
+        self.assertRaises(automation_runtime.StepFailed, select, data, '$.E F', 'Integer')
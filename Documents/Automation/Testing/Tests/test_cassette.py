@@ -0,0 +1,179 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import datetime
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+TESTING_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(TESTING_DIR)
+import cassette  # noqa pylint: disable=import-error,wrong-import-position
+import fake_aws  # noqa pylint: disable=import-error,wrong-import-position
+import ssm_testing  # noqa pylint: disable=import-error,wrong-import-position
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+
+def status(name):
+    return {'Stacks': [{'StackStatus': name}]}
+
+
+class EncodingTest(unittest.TestCase):
+    def test_round_trip(self):
+        value = {'When': datetime.datetime(2018, 1, 1, 12, 30, 15, 250000, fake_aws.UTC), 'Data': b'\xff\x00',
+                 'List': [1, 'a', None], 'Payload': io.BytesIO(b'{"a": 1}')}
+        decoded = cassette.decode(cassette.encode(value))
+        self.assertEqual(decoded['When'], value['When'])
+        self.assertEqual(decoded['Data'], b'\xff\x00')
+        self.assertEqual(decoded['List'], [1, 'a', None])
+        self.assertEqual(decoded['Payload'].read(), b'{"a": 1}')
+
+    def test_request_key(self):
+        self.assertEqual(cassette.request_key('ec2', 'RunInstances', {'MinCount': 1, 'ImageId': 'ami-1'}),
+                         cassette.request_key('ec2', 'RunInstances', {'ImageId': 'ami-1', 'MinCount': 1}))
+        self.assertEqual(cassette.request_key('cloudformation', 'CreateStack', {'StackName': 's'}),
+                         cassette.request_key('cloudformation', 'CreateStack', {'StackName': 's',
+                                                                                'ClientRequestToken': 'x'}))
+        self.assertNotEqual(cassette.request_key('ec2', 'StopInstances', {'InstanceIds': ['i-1']}),
+                            cassette.request_key('ec2', 'StopInstances', {'InstanceIds': ['i-2']}))
+
+
+class CassetteTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'Cassettes', 'test_document.json.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def recorded(self, calls):
+        recording = cassette.Cassette(self.path, 'record')
+        for key, response in calls:
+            recording.record(key, response)
+        return recording
+
+    def served(self, recording, keys):
+        return [recording.find(key)[0].get('Stacks', [{}])[0].get('StackStatus') for key in keys]
+
+    def test_polls_are_collapsed(self):
+        recording = self.recorded([('create', {})] + [('describe', status('CREATE_IN_PROGRESS'))] * 30 +
+                                  [('describe', status('CREATE_COMPLETE'))] * 2)
+        # the first poll stands for the 30 polls that saw the stack in progress; the two reads after it remain
+        self.assertEqual(self.served(recording, ['create', 'describe', 'describe', 'describe', 'describe']),
+                         [None, 'CREATE_IN_PROGRESS', 'CREATE_COMPLETE', 'CREATE_COMPLETE', 'CREATE_COMPLETE'])
+        self.assertEqual(recording._cursor, 32)  # pylint: disable=protected-access
+
+    def test_changes_between_polls_are_kept(self):
+        # a status callback reads the instance between the polls of the execution
+        calls = []
+        for execution, instance in (('InProgress', 'InService'), ('InProgress', 'InService'),
+                                    ('InProgress', 'Standby'), ('Success', 'Standby')):
+            calls += [('execution', status(execution)), ('instance', status(instance))]
+        recording = self.recorded(calls)
+        # the second read of the instance saw nothing new and is skipped, but the instance is seen in Standby
+        # before the execution succeeds, as when recording
+        self.assertEqual(self.served(recording, ['execution', 'instance'] * 3), [
+            'InProgress', 'InService', 'InProgress', 'Standby', 'Success', 'Standby'])
+
+    def test_identical_reads_are_not_skipped(self):
+        recording = self.recorded([('describe', status('CREATE_COMPLETE'))] * 2 + [('delete', {})] +
+                                  [('describe', status('DELETE_IN_PROGRESS'))])
+        self.assertEqual(self.served(recording, ['describe', 'describe', 'delete', 'describe']),
+                         ['CREATE_COMPLETE', 'CREATE_COMPLETE', None, 'DELETE_IN_PROGRESS'])
+
+    def test_extra_polls_get_the_latest_answer(self):
+        recording = self.recorded([('describe', status('CREATE_COMPLETE'))])
+        self.assertEqual(self.served(recording, ['describe'] * 3), ['CREATE_COMPLETE'] * 3)
+        self.assertIsNone(recording.find('other'))
+
+    def test_save_and_load(self):
+        recording = self.recorded([('describe', status('CREATE_IN_PROGRESS'))] * 50 +
+                                  [('describe', status('CREATE_COMPLETE'))])
+        self.assertTrue(recording.save())
+        self.assertFalse(recording.save())
+        # each response is stored once
+        self.assertEqual(len(recording.responses), 2)
+        self.assertLess(os.path.getsize(self.path), 400)
+        again = self.recorded([('describe', status('CREATE_IN_PROGRESS'))] * 50 +
+                              [('describe', status('CREATE_COMPLETE'))])
+        again.start = recording.start
+        self.assertEqual(again.dump(), recording.dump())
+
+        replay = cassette.Cassette(self.path, 'strict')
+        self.assertEqual(len(replay.interactions), 51)
+        self.assertEqual(self.served(replay, ['describe'] * 2), ['CREATE_IN_PROGRESS', 'CREATE_COMPLETE'])
+        with self.assertRaises(ValueError):
+            cassette.Cassette(self.path, 'rewind')
+
+
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class BotocoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'test_document.json.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def scenario(self):
+        ec2 = boto3.client('ec2', region_name=fake_aws.REGION)
+        instance_id = ec2.run_instances(ImageId='ami-12345678', MinCount=1, MaxCount=1)['Instances'][0]['InstanceId']
+        states = []
+        while not states or states[-1] != 'running':
+            time.sleep(5)
+            states.append(ec2.describe_instances(InstanceIds=[instance_id])[
+                'Reservations'][0]['Instances'][0]['State']['Name'])
+        try:
+            ec2.describe_instances(InstanceIds=['i-0123456789abcdef0'])
+        except ec2.exceptions.ClientError as error:
+            states.append(error.response['Error']['Code'])
+        return instance_id, states
+
+    def test_record_and_replay(self):
+        fake = fake_aws.FakeAWS(latencies={'ec2.pending': 60})
+        recording = cassette.Cassette(self.path, 'record')
+        with fake.patch(), recording.use():
+            recorded = self.scenario()
+        recording.save()
+        self.assertEqual(recorded[1], ['pending'] * 11 + ['running', 'InvalidInstanceID.NotFound'])
+
+        replay = cassette.Cassette(self.path, 'strict')
+        sleep = time.sleep
+        with replay.use():
+            self.assertIsNot(time.sleep, sleep)
+            replayed = self.scenario()
+            with self.assertRaises(cassette.UnrecordedCall):
+                boto3.client('ec2', region_name=fake_aws.REGION).describe_instances(InstanceIds=['i-00000000'])
+        self.assertIs(time.sleep, sleep)
+        self.assertEqual(replayed, (recorded[0], ['pending', 'running', 'InvalidInstanceID.NotFound']))
+        self.assertEqual(len(replay.unrecorded), 1)
+
+    def test_each_cassette_starts_from_a_fresh_process_state(self):
+        # a status cached by an earlier test file would skip the DescribeStacks call a replay expects
+        ssm_testing.CFNTester.STATUS_CACHE[(fake_aws.REGION, 'test-stack')] = (time.time() + 60, 'DELETE_COMPLETE')
+        ssm_testing.SSMTester.ROLE_CACHE[(None, None, 'role')] = 'arn:aws:iam::123456789012:role/role'
+        with cassette.Cassette(self.path, 'record').use():
+            self.assertEqual(ssm_testing.CFNTester.STATUS_CACHE, {})
+            self.assertEqual(ssm_testing.SSMTester.ROLE_CACHE, {})
@@ -0,0 +1,389 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+TESTING_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(TESTING_DIR)
+import fake_aws  # noqa pylint: disable=import-error,wrong-import-position
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+TRUST = json.dumps({'Version': '2012-10-17', 'Statement': [{
+    'Effect': 'Allow', 'Principal': {'Service': ['ec2.amazonaws.com', 'lambda.amazonaws.com']},
+    'Action': 'sts:AssumeRole'}]})
+
+TEMPLATE = json.dumps({
+    'Parameters': {'AMI': {'Type': 'String'}, 'RoleArn': {'Type': 'String', 'Default': ''}},
+    'Conditions': {'CreateRole': {'Fn::Equals': [{'Ref': 'RoleArn'}, '']}},
+    'Resources': {
+        'Role': {'Type': 'AWS::IAM::Role', 'Condition': 'CreateRole',
+                 'Properties': {'AssumeRolePolicyDocument': json.loads(TRUST)}},
+        'Profile': {'Type': 'AWS::IAM::InstanceProfile',
+                    'Properties': {'Roles': [{'Ref': 'Role'}]}, 'Condition': 'CreateRole'},
+        'Instance': {'Type': 'AWS::EC2::Instance',
+                     'Properties': {'ImageId': {'Ref': 'AMI'}, 'InstanceType': 't2.micro',
+                                    'IamInstanceProfile': {'Ref': 'Profile'}}}},
+    'Outputs': {'InstanceId': {'Value': {'Ref': 'Instance'}}}})
+
+HANDLER = '\n'.join([
+    'import time',
+    'def handler(event, context):',
+    '    time.sleep(event.get("sleep", 0))',
+    '    print("slept")',
+    '    return {"left": context.get_remaining_time_in_millis()}',
+])
+
+
+class FakeClockTest(unittest.TestCase):
+    def test_lifecycle(self):
+        clock = fake_aws.FakeClock(start=100)
+        lifecycle = fake_aws.Lifecycle(clock, 'pending')
+        self.assertEqual(lifecycle.schedule([('running', 10), ('stopping', 5)]), 115)
+        self.assertEqual([lifecycle.state_at(at) for at in (99, 100, 110, 115)], [None, 'pending', 'running',
+                                                                                  'stopping'])
+        self.assertFalse(lifecycle.settled)
+        # rescheduling drops the changes after the given time
+        lifecycle.schedule([('stopped', 1)], at=112)
+        self.assertEqual(lifecycle.final, 'stopped')
+        self.assertEqual(lifecycle.changes[-1], (113, 'stopped'))
+
+    def test_spawned_threads_take_turns(self):
+        clock = fake_aws.FakeClock(start=0)
+        order = []
+
+        def worker(name, delay):
+            def run():
+                for _ in range(2):
+                    clock.sleep(delay)
+                    order.append((name, clock.time()))
+            return run
+
+        clock.spawn(worker('a', 3), 'a')
+        clock.spawn(worker('b', 2), 'b')
+        clock.sleep(10)
+        self.assertEqual(order, [('b', 2), ('a', 3), ('b', 4), ('a', 6)])
+        self.assertEqual(clock.time(), 10)
+
+
+class FakeAWSTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = fake_aws.FakeAWS(seed=1, latencies={'api': 0})
+
+    def wait(self, predicate, timeout=3600, interval=5):
+        deadline = self.fake.time() + timeout
+        while not predicate():
+            self.assertLess(self.fake.time(), deadline, 'condition not met in time')
+            self.fake.sleep(interval)
+
+    def launch(self, **params):
+        params.setdefault('ImageId', 'ami-12345678')
+        params.setdefault('MaxCount', 1)
+        return self.fake.call('ec2', 'RunInstances', params)['Instances'][0]['InstanceId']
+
+    def state(self, instance_id):
+        reservations = self.fake.call('ec2', 'DescribeInstances', {'InstanceIds': [instance_id]})['Reservations']
+        return reservations[0]['Instances'][0]['State']['Name']
+
+    def role(self, name):
+        return self.fake.call('iam', 'CreateRole', {'RoleName': name, 'AssumeRolePolicyDocument': TRUST})['Role']
+
+    def test_instance_lifecycle(self):
+        fake = fake_aws.FakeAWS(latencies={'api': 0, 'ec2.pending': 20, 'ec2.stopping': 30})
+        instance_id = fake.call('ec2', 'RunInstances', {'ImageId': 'ami-12345678', 'MaxCount': 1})[
+            'Instances'][0]['InstanceId']
+        self.assertEqual(fake.ec2.instance(instance_id).lifecycle.state, 'pending')
+        fake.sleep(20)
+        self.assertEqual(fake.ec2.instance(instance_id).lifecycle.state, 'running')
+        changes = fake.call('ec2', 'StopInstances', {'InstanceIds': [instance_id]})['StoppingInstances']
+        self.assertEqual((changes[0]['PreviousState']['Name'], changes[0]['CurrentState']['Name']),
+                         ('running', 'stopping'))
+        fake.sleep(30)
+        self.assertEqual(fake.ec2.instance(instance_id).lifecycle.state, 'stopped')
+
+    def test_errors(self):
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('ec2', 'StartInstances', {'InstanceIds': ['i-0123456789abcdef0']})
+        self.assertEqual(context.exception.code, 'InvalidInstanceID.NotFound')
+        self.assertEqual(context.exception.operation, 'StartInstances')
+        self.assertEqual(context.exception.response['Error']['Code'], 'InvalidInstanceID.NotFound')
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('ec2', 'DescribeInstances', {'InstanceIds': ['nope']})
+        self.assertEqual(context.exception.code, 'InvalidInstanceID.Malformed')
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('ec2', 'DescribeInstances', {'DryRun': True})
+        self.assertEqual(context.exception.code, 'DryRunOperation')
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('s3', 'CreateBucket', {'Bucket': 'b'})
+        self.assertEqual(context.exception.code, 'InvalidAction')
+
+    def test_register_operation(self):
+        self.fake.register_operation('s3', 'CreateBucket', lambda params: {'Location': '/' + params['Bucket']})
+        self.assertEqual(self.fake.call('s3', 'CreateBucket', {'Bucket': 'b'}), {'Location': '/b'})
+        self.assertEqual(self.fake.calls[-1], (self.fake.time(), 's3', 'CreateBucket'))
+
+    def test_same_seed_same_run(self):
+        runs = []
+        for _ in range(2):
+            self.fake = fake_aws.FakeAWS(seed=7)
+            instance_id = self.launch()
+            self.wait(lambda: self.state(instance_id) == 'running')
+            runs.append((instance_id, self.fake.time()))
+        self.assertEqual(runs[0], runs[1])
+
+    def test_rds_reboot(self):
+        self.fake.latencies.update({'rds.creating': 300, 'rds.backing-up': 60, 'rds.rebooting': 45})
+        self.fake.call('rds', 'CreateDBInstance', {'DBInstanceIdentifier': 'db', 'DBInstanceClass': 'db.t2.micro',
+                                                   'Engine': 'mysql', 'AllocatedStorage': 5})
+
+        def status():
+            return self.fake.call('rds', 'DescribeDBInstances', {'DBInstanceIdentifier': 'db'})[
+                'DBInstances'][0]['DBInstanceStatus']
+
+        self.assertEqual(status(), 'creating')
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('rds', 'RebootDBInstance', {'DBInstanceIdentifier': 'db'})
+        self.assertEqual(context.exception.code, 'InvalidDBInstanceState')
+        self.fake.sleep(360)
+        self.assertEqual(status(), 'available')
+        self.fake.call('rds', 'RebootDBInstance', {'DBInstanceIdentifier': 'db'})
+        self.assertEqual(status(), 'rebooting')
+        self.fake.sleep(45)
+        self.assertEqual(status(), 'available')
+
+    def test_autoscaling_standby(self):
+        self.fake.call('autoscaling', 'CreateLaunchConfiguration', {
+            'LaunchConfigurationName': 'lc', 'ImageId': 'ami-12345678', 'InstanceType': 't2.micro'})
+        self.fake.call('autoscaling', 'CreateAutoScalingGroup', {
+            'AutoScalingGroupName': 'asg', 'LaunchConfigurationName': 'lc', 'MinSize': 1, 'MaxSize': 2,
+            'DesiredCapacity': 2, 'AvailabilityZones': ['us-east-1a']})
+        group = self.fake.autoscaling.group('asg')
+        self.wait(lambda: all(member.lifecycle.state == 'InService' for member in group.members.values()))
+        instance_id = sorted(group.members)[0]
+        self.fake.call('autoscaling', 'EnterStandby', {'AutoScalingGroupName': 'asg', 'InstanceIds': [instance_id],
+                                                       'ShouldDecrementDesiredCapacity': True})
+        self.wait(lambda: group.members[instance_id].lifecycle.state == 'Standby')
+        self.assertEqual(len(self.fake.autoscaling.capacity(group)), 1)
+        with self.assertRaises(fake_aws.FakeError):
+            self.fake.call('autoscaling', 'EnterStandby', {'AutoScalingGroupName': 'asg',
+                                                           'InstanceIds': [instance_id],
+                                                           'ShouldDecrementDesiredCapacity': True})
+        self.fake.call('autoscaling', 'ExitStandby', {'AutoScalingGroupName': 'asg', 'InstanceIds': [instance_id]})
+        self.wait(lambda: group.members[instance_id].lifecycle.state == 'InService')
+        self.assertEqual(len(self.fake.autoscaling.capacity(group)), 2)
+        self.assertEqual(len(group.members), 2)
+
+    def test_role_propagation(self):
+        self.fake.latencies['iam.propagation'] = 8
+        arn = self.role('slow')['Arn']
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('sts', 'AssumeRole', {'RoleArn': arn, 'RoleSessionName': 's'})
+        self.assertEqual(context.exception.code, 'AccessDenied')
+        self.fake.sleep(8)
+        response = self.fake.call('sts', 'AssumeRole', {'RoleArn': arn, 'RoleSessionName': 's'})
+        self.assertTrue(response['AssumedRoleUser']['Arn'].endswith('assumed-role/slow/s'))
+
+    def test_stack(self):
+        self.fake.latencies.update({'iam.propagation': 10, 'cloudformation.resource': 5})
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('cloudformation', 'CreateStack', {'StackName': 's', 'TemplateBody': TEMPLATE, 'Parameters': [
+                {'ParameterKey': 'AMI', 'ParameterValue': 'ami-12345678'}]})
+        self.assertEqual(context.exception.code, 'InsufficientCapabilitiesException')
+        self.fake.call('cloudformation', 'CreateStack', {'StackName': 's', 'TemplateBody': TEMPLATE, 'Parameters': [
+            {'ParameterKey': 'AMI', 'ParameterValue': 'ami-12345678'}], 'Capabilities': ['CAPABILITY_IAM']})
+
+        def stack():
+            return self.fake.call('cloudformation', 'DescribeStacks', {'StackName': 's'})['Stacks'][0]
+
+        self.assertEqual(stack()['StackStatus'], 'CREATE_IN_PROGRESS')
+        self.wait(lambda: stack()['StackStatus'] != 'CREATE_IN_PROGRESS')
+        self.assertEqual(stack()['StackStatus'], 'CREATE_COMPLETE')
+        instance_id = stack()['Outputs'][0]['OutputValue']
+        # the instance waited for its instance profile to propagate
+        instance = self.fake.ec2.instance(instance_id)
+        profile = self.fake.ec2._association_of(instance).profile  # pylint: disable=protected-access
+        self.assertGreaterEqual(instance.launched, profile.visible_at)
+        events = self.fake.call('cloudformation', 'DescribeStackEvents', {'StackName': 's'})['StackEvents']
+        self.assertEqual(events[0]['ResourceStatus'], 'CREATE_COMPLETE')
+        self.assertEqual(events[0]['LogicalResourceId'], 's')
+
+        self.fake.call('cloudformation', 'DeleteStack', {'StackName': 's'})
+        self.wait(lambda: not self.fake.call('cloudformation', 'ListStacks', {
+            'StackStatusFilter': ['DELETE_IN_PROGRESS']})['StackSummaries'])
+        self.assertEqual(instance.lifecycle.state, 'terminated')
+        with self.assertRaises(fake_aws.FakeError) as context:
+            stack()
+        self.assertEqual(str(context.exception), 'An error occurred (ValidationError) when calling the '
+                                                 'DescribeStacks operation: Stack with id s does not exist')
+
+    def test_stack_conditions(self):
+        # with a role given no IAM resource is created, so no capability is needed
+        arn = self.role('given')['Arn']
+        self.fake.call('cloudformation', 'CreateStack', {'StackName': 's', 'TemplateBody': TEMPLATE.replace(
+            '"IamInstanceProfile": {"Ref": "Profile"}', '"Monitoring": true'), 'Parameters': [
+                {'ParameterKey': 'AMI', 'ParameterValue': 'ami-12345678'},
+                {'ParameterKey': 'RoleArn', 'ParameterValue': arn}]})
+        self.wait(lambda: self.fake.cloudformation.stack('s').status.settled)
+        resources = self.fake.call('cloudformation', 'ListStackResources', {'StackName': 's'})[
+            'StackResourceSummaries']
+        self.assertEqual([resource['LogicalResourceId'] for resource in resources], ['Instance'])
+
+    def test_lambda(self):
+        self.fake.latencies.update({'iam.propagation': 0, 'lambda.invoke': 0})
+        arn = self.role('lambda')['Arn']
+        self.fake.call('lambda', 'CreateFunction', {'FunctionName': 'f', 'Runtime': 'python2.7', 'Role': arn,
+                                                    'Handler': 'index.handler', 'Code': {'ZipFile': HANDLER},
+                                                    'Timeout': 60})
+        response = self.fake.call('lambda', 'Invoke', {'FunctionName': 'f', 'Payload': '{"sleep": 20}',
+                                                       'LogType': 'Tail'})
+        self.assertEqual(json.loads(response['Payload'].read().decode('utf-8')), {'left': 40000})
+        self.assertIn(b'slept', base64.b64decode(response['LogResult']))
+        self.assertNotIn('FunctionError', response)
+
+        response = self.fake.call('lambda', 'Invoke', {'FunctionName': 'f', 'Payload': '{"sleep": 90}'})
+        self.assertEqual(response['FunctionError'], 'Unhandled')
+        self.assertIn('Task timed out after 60.00 seconds', response['Payload'].read().decode('utf-8'))
+
+    def test_automation(self):
+        self.fake.latencies.update({'iam.propagation': 0, 'ec2.pending': 10, 'ec2.stopping': 10})
+        instance_id = self.launch()
+        document = {'schemaVersion': '0.3', 'parameters': {'InstanceId': {'type': 'String'}}, 'mainSteps': [
+            {'name': 'approve', 'action': 'aws:approve', 'inputs': {'Approvers': ['arn:aws:iam::1:user/a']}},
+            {'name': 'stop', 'action': 'aws:changeInstanceState',
+             'inputs': {'InstanceIds': ['{{ InstanceId }}'], 'DesiredState': 'stopped'}}]}
+        self.fake.call('ssm', 'CreateDocument', {'Name': 'doc', 'Content': json.dumps(document),
+                                                 'DocumentType': 'Automation'})
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('ssm', 'StartAutomationExecution', {'DocumentName': 'doc'})
+        self.assertEqual(context.exception.code, 'InvalidAutomationExecutionParametersException')
+        self.fake.sleep(5)
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('ssm', 'StartAutomationExecution', {'DocumentName': 'doc'})
+        self.assertEqual(context.exception.code, 'InvalidAutomationExecutionParametersException')
+        execution_id = self.fake.call('ssm', 'StartAutomationExecution', {
+            'DocumentName': 'doc', 'Parameters': {'InstanceId': [instance_id]}})['AutomationExecutionId']
+
+        def status():
+            return self.fake.call('ssm', 'GetAutomationExecution', {'AutomationExecutionId': execution_id})[
+                'AutomationExecution']['AutomationExecutionStatus']
+
+        self.wait(lambda: status() == 'Waiting')
+        self.fake.call('ssm', 'SendAutomationSignal', {'AutomationExecutionId': execution_id,
+                                                       'SignalType': 'Approve'})
+        self.wait(lambda: status() not in ('Waiting', 'InProgress'))
+        self.assertEqual(status(), 'Success')
+        self.assertEqual(self.state(instance_id), 'stopped')
+
+    def test_send_command(self):
+        self.fake.latencies.update({'iam.propagation': 0})
+        self.role('managed')
+        self.fake.call('iam', 'CreateInstanceProfile', {'InstanceProfileName': 'managed'})
+        self.fake.call('iam', 'AddRoleToInstanceProfile', {'InstanceProfileName': 'managed', 'RoleName': 'managed'})
+        instance_id = self.launch(IamInstanceProfile={'Name': 'managed'})
+        command = {'DocumentName': 'AWS-RunShellScript', 'InstanceIds': [instance_id],
+                   'Parameters': {'commands': ['uptime']}}
+        with self.assertRaises(fake_aws.FakeError) as context:
+            self.fake.call('ssm', 'SendCommand', command)
+        self.assertEqual(context.exception.code, 'InvalidInstanceId')
+        self.wait(lambda: self.fake.ssm.managed(self.fake.ec2.instance(instance_id)))
+
+        self.fake.ssm.command_handler = lambda fake, document, instance, parameters: (
+            'Success', ' '.join(parameters['commands']))
+        command_id = self.fake.call('ssm', 'SendCommand', command)['Command']['CommandId']
+
+        def invocation():
+            return self.fake.call('ssm', 'GetCommandInvocation', {'CommandId': command_id,
+                                                                  'InstanceId': instance_id})
+
+        self.wait(lambda: invocation()['Status'] not in ('Pending', 'InProgress'))
+        self.assertEqual((invocation()['Status'], invocation()['StandardOutputContent']), ('Success', 'uptime'))
+
+    def test_detach_mounted_volume(self):
+        self.fake.latencies.update({'iam.propagation': 0, 'ec2.volume': 5})
+        self.role('managed')
+        self.fake.call('iam', 'CreateInstanceProfile', {'InstanceProfileName': 'managed'})
+        self.fake.call('iam', 'AddRoleToInstanceProfile', {'InstanceProfileName': 'managed', 'RoleName': 'managed'})
+        instance_id = self.launch(IamInstanceProfile={'Name': 'managed'})
+        self.wait(lambda: self.fake.ssm.managed(self.fake.ec2.instance(instance_id)))
+        zone = self.fake.ec2.instance(instance_id).zone
+        volume_id = self.fake.call('ec2', 'CreateVolume', {'AvailabilityZone': zone, 'Size': 1})['VolumeId']
+        self.wait(lambda: self.fake.ec2.volume(volume_id).lifecycle.state == 'available')
+        self.fake.call('ec2', 'AttachVolume', {'VolumeId': volume_id, 'InstanceId': instance_id, 'Device': '/dev/sdf'})
+        self.fake.sleep(5)
+
+        def shell(*commands):
+            self.fake.call('ssm', 'SendCommand', {'DocumentName': 'AWS-RunShellScript', 'InstanceIds': [instance_id],
+                                                  'Parameters': {'commands': list(commands)}})
+
+        def attachments():
+            return self.fake.call('ec2', 'DescribeVolumes', {'VolumeIds': [volume_id]})['Volumes'][0]['Attachments']
+
+        shell('sudo mkdir data', 'sudo mount /dev/xvdf data')
+        self.fake.call('ec2', 'DetachVolume', {'VolumeId': volume_id})
+        self.fake.sleep(60)
+        self.assertEqual([attachment['State'] for attachment in attachments()], ['busy'])
+        shell('sudo umount /dev/xvdf')
+        self.fake.sleep(5)
+        self.assertEqual(attachments(), [])
+
+
+class LoaderTest(unittest.TestCase):
+    def test_load_module_imports_its_neighbours(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'fake_aws_neighbour.py'), 'w') as handle:
+            handle.write('VALUE = 42\n')
+        with open(os.path.join(directory, 'test_neighbour.py'), 'w') as handle:
+            handle.write('import fake_aws_neighbour\nVALUE = fake_aws_neighbour.VALUE\n')
+        self.addCleanup(sys.modules.pop, 'fake_aws_neighbour', None)
+        self.assertEqual(fake_aws.load_module(os.path.join(directory, 'test_neighbour.py'), 'neighbour').VALUE, 42)
+
+    def test_unsupported_suites(self):
+        paths = [os.path.join(fake_aws.AUTOMATION_DIR, name, 'Tests', 'test_document.py')
+                 for name in ('RestartInstance', 'ManagedInstance')]
+        self.assertEqual([name for name, _ in fake_aws.unsupported_suites(paths)], ['ManagedInstance'])
+
+
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class PatchTest(unittest.TestCase):
+    def test_boto3_calls_reach_the_fake(self):
+        fake = fake_aws.FakeAWS(latencies={'ec2.pending': 30})
+        sleep = time.sleep
+        with fake.patch():
+            self.assertIsNot(time.sleep, sleep)
+            ec2 = boto3.client('ec2', region_name=fake_aws.REGION)
+            instance_id = ec2.run_instances(ImageId='ami-12345678', MinCount=1, MaxCount=1)[
+                'Instances'][0]['InstanceId']
+            ec2.get_waiter('instance_running').wait(InstanceIds=[instance_id])
+            self.assertGreaterEqual(time.time() - fake_aws.automation_runtime.VIRTUAL_EPOCH, 30)
+            with self.assertRaises(ec2.exceptions.ClientError) as context:
+                ec2.describe_instances(InstanceIds=['i-0123456789abcdef0'])
+            self.assertEqual(context.exception.response['Error']['Code'], 'InvalidInstanceID.NotFound')
+            with self.assertRaises(Exception) as context:
+                ec2.run_instances(ImageId='ami-12345678', MinCount='one', MaxCount=1)
+            self.assertIn('Invalid type for parameter MinCount', str(context.exception))
+        self.assertIs(time.sleep, sleep)
@@ -0,0 +1,153 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTING_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(TESTING_DIR)
+import fake_aws  # noqa pylint: disable=import-error,wrong-import-position
+import run_tests  # noqa pylint: disable=import-error,wrong-import-position
+import ssm_testing  # noqa pylint: disable=import-error,wrong-import-position
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+# a document test module: reads its prefix like the document tests and waits on a resource
+MODULE = '''
+import os
+import sys
+import time
+import unittest
+try:
+    import ConfigParser as configparser
+except ImportError:
+    import configparser
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read([{config!r}])
+PREFIX = CONFIG.get('general', 'resource_prefix')
+
+
+class Test(unittest.TestCase):
+    def test_wait(self):
+        sys.stderr.write('stack name: ' + PREFIX + 'stack\\n')
+        time.sleep(0.5)
+        self.assertEqual(os.path.basename(os.getcwd()), 'Project{number}')
+
+    @unittest.skipIf({number} == 0, 'first module')
+    def test_fails_in_the_last_module(self):
+        self.assertNotEqual({number}, 3)
+'''
+
+
+class ResourcePrefixTest(unittest.TestCase):
+    def test_prefix(self):
+        self.assertEqual(run_tests.configured_prefix(), 'testing-')
+        with run_tests.resource_prefix('testing-ab12-3-'):
+            self.assertEqual(run_tests.configured_prefix(), 'testing-ab12-3-')
+            config = run_tests.configparser.RawConfigParser()
+            config.read([run_tests.CONFIG_FILE])
+            self.assertEqual(config.get('general', 'region'), 'us-east-1')
+        self.assertEqual(run_tests.configured_prefix(), 'testing-')
+
+
+class ParallelRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.paths = []
+        for number in range(4):
+            tests = os.path.join(self.root, 'Project{}'.format(number), 'Tests')
+            os.makedirs(tests)
+            self.paths.append(os.path.join(tests, 'test_document.py'))
+            with open(self.paths[-1], 'w') as module:
+                module.write(MODULE.format(config=run_tests.CONFIG_FILE, number=number))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_run(self):
+        printed = []
+        runner = run_tests.ParallelRunner(workers=2, callback=printed.append)
+        self.assertEqual(run_tests.find_modules([self.root]), self.paths)
+        results = runner.run(self.paths)
+        self.assertEqual([result.path for result in results], self.paths)
+        self.assertEqual(sorted(printed, key=results.index), results)
+        self.assertEqual([(result.tests, result.failures, result.skipped) for result in results],
+                         [(2, 0, 1), (2, 0, 0), (2, 0, 0), (2, 1, 0)])
+        self.assertEqual([result.returncode == 0 for result in results], [True, True, True, False])
+        self.assertIn('FAILED, 2 tests, 1 failed', run_tests.format_result(results[3]))
+
+        # each worker has its own prefix, which its modules read as their resource_prefix
+        prefixes = dict((result.worker, result.prefix) for result in results)
+        self.assertEqual(sorted(prefixes), [1, 2])
+        self.assertNotEqual(prefixes[1], prefixes[2])
+        for result in results:
+            self.assertTrue(result.prefix.startswith('testing-') and result.prefix.endswith(
+                '-{}-'.format(result.worker)), result.prefix)
+            self.assertIn('stack name: {}stack'.format(result.prefix), result.output)
+        # two modules at a time
+        self.assertLess(max(result.seconds for result in results), sum(result.seconds for result in results) / 2 + 1)
+
+    def test_module_imports_its_helpers(self):
+        tests = os.path.dirname(self.paths[0])
+        with open(os.path.join(tests, 'documentutil.py'), 'w') as helper:
+            helper.write('NAME = "helper"\n')
+        with open(self.paths[0], 'a') as module:
+            module.write('\nimport documentutil\n')
+        result = run_tests.ParallelRunner(workers=1).run(self.paths[:1])[0]
+        self.assertEqual(result.returncode, 0, result.output)
+
+    def test_module_that_does_not_load(self):
+        with open(self.paths[0], 'w') as module:
+            module.write('import not_a_module\n')
+        result = run_tests.ParallelRunner(workers=1).run(self.paths[:1])[0]
+        self.assertIsNone(result.tests)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('not_a_module', result.output)
+        self.assertIn('did not run', run_tests.format_result(result))
+
+
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class ReclaimTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.template = os.path.join(self.root, 'template.json')
+        with open(self.template, 'w') as template_file:
+            template_file.write('{"Resources": {"Topic": {"Type": "AWS::SNS::Topic"}}}')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        ssm_testing.CFNTester.STATUS_CACHE.clear()
+
+    def test_reclaim_pool_stacks(self):
+        fake = fake_aws.FakeAWS()
+        with fake.patch():
+            cfn_client = boto3.client('cloudformation', region_name=fake_aws.REGION)
+            names = []
+            for prefix in ('testing-pool-', 'other-pool-'):
+                pool = ssm_testing.StackPool(cfn_client, prefix, ttl=60, lease_dir=os.path.join(self.root, 'leases'))
+                with pool.lease(self.template) as tester:
+                    names.append(tester.stack_name)
+            self.assertEqual(run_tests.reclaim_pool_stacks(cfn_client), [])
+            fake.sleep(3600)
+            self.assertEqual(run_tests.reclaim_pool_stacks(cfn_client), names[:1])
@@ -0,0 +1,269 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TESTING_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(TESTING_DIR)
+import benchmark_stack_presence  # noqa pylint: disable=import-error,wrong-import-position
+import fake_aws  # noqa pylint: disable=import-error,wrong-import-position
+import ssm_testing  # noqa pylint: disable=import-error,wrong-import-position
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+TRUST = json.dumps({'Version': '2012-10-17', 'Statement': [{
+    'Effect': 'Allow', 'Principal': {'Service': 'ssm.amazonaws.com'}, 'Action': 'sts:AssumeRole'}]})
+
+
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class CFNTesterTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'template.json')
+        with open(self.path, 'w') as template_file:
+            template_file.write(benchmark_stack_presence.TEMPLATE)
+        ssm_testing.CFNTester.STATUS_CACHE.clear()
+        self.fake = benchmark_stack_presence.fake_account(250)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        ssm_testing.CFNTester.STATUS_CACHE.clear()
+
+    def operations(self, since):
+        return [operation for _, _, operation in self.fake.calls[since:]]
+
+    def test_presence_does_not_list_stacks(self):
+        with self.fake.patch():
+            client = boto3.client('cloudformation', region_name=fake_aws.REGION)
+            since = len(self.fake.calls)
+            self.assertTrue(benchmark_stack_presence.list_stacks_present(client, benchmark_stack_presence.STACK_NAME))
+            self.assertEqual(self.operations(since), ['ListStacks'] * 3)
+
+            since = len(self.fake.calls)
+            tester = ssm_testing.CFNTester(client, self.path, benchmark_stack_presence.STACK_NAME)
+            self.assertTrue(tester.is_stack_present())
+            self.assertTrue(tester.is_stack_in_status('CREATE_COMPLETE'))
+            self.assertFalse(tester.can_create_stack())
+            # the status is read once and cached for STATUS_TTL seconds
+            self.assertEqual(self.operations(since), ['DescribeStacks'])
+            self.fake.sleep(ssm_testing.CFNTester.STATUS_TTL)
+            self.assertTrue(tester.is_stack_present())
+            self.assertEqual(self.operations(since), ['DescribeStacks'] * 2)
+
+            # a deleted stack or a stack never created is absent
+            for name in ('deleted-7', 'never-created'):
+                self.assertIsNone(ssm_testing.CFNTester(client, self.path, name).stack_status())
+
+    def test_create_and_delete_update_the_cache(self):
+        with self.fake.patch():
+            client = boto3.client('cloudformation', region_name=fake_aws.REGION)
+            tester = ssm_testing.CFNTester(client, self.path, 'new-stack')
+            tester.create_stack()
+            since = len(self.fake.calls)
+            self.assertTrue(tester.is_stack_in_status('CREATE_COMPLETE'))
+            tester.delete_stack()
+            self.assertEqual(self.operations(since)[0], 'DeleteStack')
+            since = len(self.fake.calls)
+            self.assertTrue(tester.can_create_stack())
+            self.assertEqual(self.operations(since), [])
+
+
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class RoleLookupTest(unittest.TestCase):
+    def setUp(self):
+        ssm_testing.SSMTester.ROLE_CACHE.clear()
+        self.fake = fake_aws.FakeAWS()
+        for number in range(250):
+            self.fake.call('iam', 'CreateRole', {'RoleName': 'role-{}'.format(number),
+                                                 'AssumeRolePolicyDocument': TRUST})
+
+    def tearDown(self):
+        ssm_testing.SSMTester.ROLE_CACHE.clear()
+
+    def operations(self, since):
+        return [operation for _, _, operation in self.fake.calls[since:]]
+
+    def test_automation_role(self):
+        with self.fake.patch():
+            iam_client = boto3.client('iam', region_name=fake_aws.REGION)
+            sts_client = boto3.client('sts', region_name=fake_aws.REGION)
+            since = len(self.fake.calls)
+            for _ in range(3):
+                self.assertEqual(ssm_testing.SSMTester.get_automation_role(sts_client, iam_client, 'role-7'),
+                                 'arn:aws:iam::{}:role/role-7'.format(fake_aws.ACCOUNT_ID))
+            self.assertEqual(self.operations(since), ['GetRole'])
+
+            # a role missing from one account or region is not missing from another
+            other_client = boto3.client('iam', region_name=fake_aws.REGION, aws_access_key_id='other',
+                                        aws_secret_access_key='other')
+            since = len(self.fake.calls)
+            self.assertTrue(ssm_testing.SSMTester.role_exists(other_client, 'role-7'))
+            self.assertEqual(self.operations(since), ['GetRole'])
+
+            # a missing role is looked up every time, so a role created later is found
+            since = len(self.fake.calls)
+            with self.assertRaises(ValueError):
+                ssm_testing.SSMTester.get_automation_role(sts_client, iam_client, 'automation')
+            self.assertFalse(ssm_testing.SSMTester.role_exists(iam_client, 'automation'))
+            self.assertEqual(self.operations(since), ['GetRole', 'GetRole'])
+            iam_client.create_role(RoleName='automation', AssumeRolePolicyDocument=TRUST)
+            self.assertTrue(ssm_testing.SSMTester.role_exists(iam_client, 'automation'))
+
+            # the lookups of a deleted role are dropped for every client
+            self.assertTrue(ssm_testing.SSMTester.role_exists(other_client, 'automation'))
+            iam_client.delete_role(RoleName='automation')
+            ssm_testing.SSMTester.forget_role('automation')
+            self.assertFalse(ssm_testing.SSMTester.role_exists(iam_client, 'automation'))
+            self.assertFalse(ssm_testing.SSMTester.role_exists(other_client, 'automation'))
+
+
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class StackPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'template.json')
+        with open(self.path, 'w') as template_file:
+            json.dump({
+                'Parameters': {'AMI': {'Type': 'String'}},
+                'Resources': dict(('Instance{}'.format(number), {'Type': 'AWS::EC2::Instance', 'Properties': {
+                    'ImageId': {'Ref': 'AMI'}, 'InstanceType': 't2.micro'}}) for number in range(2)),
+                'Outputs': dict(('Instance{}Id'.format(number), {'Value': {'Ref': 'Instance{}'.format(number)}})
+                                for number in range(2))}, template_file)
+        self.params = [{'ParameterKey': 'AMI', 'ParameterValue': 'ami-12345678'}]
+        ssm_testing.CFNTester.STATUS_CACHE.clear()
+        self.fake = fake_aws.FakeAWS()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        ssm_testing.CFNTester.STATUS_CACHE.clear()
+
+    def creates(self, since=0):
+        return [operation for _, _, operation in self.fake.calls[since:]].count('CreateStack')
+
+    def pool(self, cfn_client, **options):
+        return ssm_testing.StackPool(cfn_client, 'testing-pool-', ttl=3600, lease_dir=os.path.join(
+            self.root, 'leases'), **options)
+
+    def test_lease(self):
+        with self.fake.patch():
+            cfn_client = boto3.client('cloudformation', region_name=fake_aws.REGION)
+            ec2_client = boto3.client('ec2', region_name=fake_aws.REGION)
+            pool = self.pool(cfn_client)
+            reset = ssm_testing.StackPool.instances_running(ec2_client, 'Instance0Id', 'Instance1Id')
+            with pool.lease(self.path, self.params, reset) as first:
+                instance_id = first.stack_outputs['Instance0Id']
+                # a test stops an instance
+                ec2_client.stop_instances(InstanceIds=[instance_id])
+                # a test running at the same time gets another stack
+                with pool.lease(self.path, self.params, reset) as second:
+                    self.assertNotEqual(second.stack_name, first.stack_name)
+            self.assertEqual(self.creates(), 2)
+            self.assertEqual(first.stack_name, 'testing-pool-{}-0'.format(ssm_testing.StackPool.pool_key(
+                self.path, self.params)))
+
+            # the next test gets the warm stack, its instance started again
+            since = len(self.fake.calls)
+            with pool.lease(self.path, self.params, reset) as tester:
+                self.assertEqual(tester.stack_name, first.stack_name)
+                self.assertEqual(tester.stack_outputs, first.stack_outputs)
+                self.assertEqual(self.fake.ec2.instance(instance_id).lifecycle.state, 'running')
+            self.assertEqual(self.creates(since), 0)
+
+            # other parameters are another key
+            other = [{'ParameterKey': 'AMI', 'ParameterValue': 'ami-87654321'}]
+            self.assertNotEqual(pool.pool_key(self.path, other), pool.pool_key(self.path, self.params))
+
+            # a terminated instance cannot be reset, so its stack is created again
+            ec2_client.terminate_instances(InstanceIds=[instance_id])
+            since = len(self.fake.calls)
+            with pool.lease(self.path, self.params, reset) as tester:
+                self.assertNotEqual(tester.stack_outputs['Instance0Id'], instance_id)
+            self.assertEqual(self.creates(since), 1)
+
+            # a failing test deletes its stack
+            with self.assertRaises(AssertionError):
+                with pool.lease(self.path, self.params, reset) as tester:
+                    raise AssertionError('the test failed')
+            self.assertFalse(tester.is_stack_present())
+
+    def test_ttl(self):
+        with self.fake.patch():
+            cfn_client = boto3.client('cloudformation', region_name=fake_aws.REGION)
+            pool = self.pool(cfn_client, slots=1)
+            with pool.lease(self.path, self.params) as tester:
+                created = tester.stack_outputs
+            self.fake.sleep(3600)
+            with pool.lease(self.path, self.params) as tester:
+                self.assertNotEqual(tester.stack_outputs, created)
+            self.assertEqual(self.creates(), 2)
+
+            self.assertEqual(pool.reclaim(), [])
+            self.fake.sleep(3600)
+            # a leased stack is not reclaimed
+            with open(os.path.join(pool.lease_dir, tester.stack_name + '.lease'), 'w') as lease:
+                lease.write(str(os.getpid()))
+            self.assertEqual(pool.reclaim(), [])
+            # unless the process holding the lease ended, and only by a pool of its prefix
+            with open(os.path.join(pool.lease_dir, tester.stack_name + '.lease'), 'w') as lease:
+                lease.write(str(self.ended_pid()))
+            self.assertEqual(ssm_testing.StackPool(cfn_client, 'other-pool-', lease_dir=pool.lease_dir).reclaim(), [])
+            with open(os.path.join(pool.lease_dir, tester.stack_name + '.lease'), 'w') as lease:
+                lease.write(str(self.ended_pid()))
+            self.assertEqual(pool.reclaim(), [tester.stack_name])
+            ssm_testing.CFNTester.STATUS_CACHE.clear()
+            self.assertFalse(tester.is_stack_present())
+            self.assertEqual(os.listdir(pool.lease_dir), [])
+
+    def test_instances_in_service(self):
+        with self.fake.patch():
+            autoscaling_client = boto3.client('autoscaling', region_name=fake_aws.REGION)
+            autoscaling_client.create_launch_configuration(
+                LaunchConfigurationName='lc', ImageId='ami-12345678', InstanceType='t2.micro')
+            autoscaling_client.create_auto_scaling_group(
+                AutoScalingGroupName='asg', LaunchConfigurationName='lc', MinSize=1, MaxSize=2, DesiredCapacity=2,
+                AvailabilityZones=['us-east-1a'])
+            tester = ssm_testing.CFNTester(boto3.client('cloudformation', region_name=fake_aws.REGION), self.path,
+                                           'testing-pool-asg')
+            tester.stack_outputs['ASGName'] = 'asg'
+            reset = ssm_testing.StackPool.instances_in_service(autoscaling_client, 'ASGName')
+            reset(tester)
+            group = self.fake.autoscaling.group('asg')
+            self.assertEqual([member.lifecycle.state for member in group.members.values()], ['InService'] * 2)
+
+            # a test left an instance in standby
+            instance_id = sorted(group.members)[0]
+            autoscaling_client.enter_standby(AutoScalingGroupName='asg', InstanceIds=[instance_id],
+                                             ShouldDecrementDesiredCapacity=True)
+            self.fake.sleep(60)
+            reset(tester)
+            self.assertEqual(group.members[instance_id].lifecycle.state, 'InService')
+            self.assertEqual(len(self.fake.autoscaling.capacity(group)), 2)
+
+    @staticmethod
+    def ended_pid():
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        return process.pid
@@ -0,0 +1,182 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+TESTING_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.append(TESTING_DIR)
+import fake_aws  # noqa pylint: disable=import-error,wrong-import-position
+import ssm_testing  # noqa pylint: disable=import-error,wrong-import-position
+import stack_waiter  # noqa pylint: disable=import-error,wrong-import-position
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+TEMPLATE = {
+    'Resources': {
+        'Slow': {'Type': 'Custom::Slow'},
+        'Quick': {'Type': 'Custom::Quick', 'DependsOn': 'Slow'}},
+    'Outputs': {'Name': {'Value': {'Ref': 'Quick'}}}}
+
+
+class BackoffTest(unittest.TestCase):
+    def test_delays(self):
+        backoff = stack_waiter.Backoff(120, min_delay=2, max_delay=30, jitter=0)
+        # the delays halve the time left until the expected end, then grow once it is past
+        self.assertEqual([backoff.delay(elapsed) for elapsed in (0, 90, 110, 119, 121, 125, 135, 200, 300)],
+                         [30, 15, 5, 2, 4, 8, 16, 30, 30])
+
+    def test_jitter(self):
+        delays = set()
+        for seed in range(20):
+            backoff = stack_waiter.Backoff(60, min_delay=2, max_delay=30, jitter=0.2, rng=random.Random(seed))
+            delay = backoff.delay(40)
+            self.assertTrue(8 <= delay <= 12, delay)
+            delays.add(delay)
+        self.assertGreater(len(delays), 10)
+
+
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class StackWaiterTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.fake = fake_aws.FakeAWS()
+        self.fake.cloudformation.register_resource_type(
+            'Custom::Slow', lambda stack, logical_id, properties, at: ('slow', {}, at + 300), lambda resource, at: at)
+        stack_waiter.StackWaiter.HISTORY.clear()
+        ssm_testing.CFNTester.STATUS_CACHE.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        stack_waiter.StackWaiter.HISTORY.clear()
+        ssm_testing.CFNTester.STATUS_CACHE.clear()
+
+    def stack_tester(self, template):
+        path = os.path.join(self.root, 'template.json')
+        with open(path, 'w') as template_file:
+            json.dump(template, template_file)
+        return ssm_testing.CFNTester(boto3.client('cloudformation', region_name=fake_aws.REGION), path, 'test-stack')
+
+    def describes(self, since=0):
+        return sum(1 for _, service, operation in self.fake.calls[since:]
+                   if (service, operation) == ('cloudformation', 'DescribeStacks'))
+
+    def test_create_and_delete(self):
+        polls = []
+        with self.fake.patch():
+            tester = self.stack_tester(TEMPLATE)
+            for _ in range(2):
+                since = len(self.fake.calls)
+                start = time.time()
+                tester.create_stack()
+                created = time.time() - start
+                # one DescribeStacks call per poll, none for the Outputs; a fixed 10 second poll made 66 calls
+                polls.append(self.describes(since))
+                self.assertLess(created, 340)
+                self.assertTrue(tester.stack_outputs['Name'].startswith('test-stack-Quick-'))
+                tester.delete_stack()
+                self.assertTrue(tester.can_create_stack())
+        # the second stack is expected to take as long as the first one, which saves polls
+        self.assertLess(polls[0], 20)
+        self.assertLess(polls[1], polls[0])
+        self.assertEqual(len(stack_waiter.StackWaiter.HISTORY[('create', tester.template_key)]), 2)
+
+    def test_events(self):
+        events = []
+        with self.fake.patch():
+            tester = self.stack_tester(TEMPLATE)
+            tester.create_stack()
+            waiter = stack_waiter.StackWaiter(tester.cfn_client, callback=events.append)
+            tester.cfn_client.delete_stack(StackName='test-stack')
+            result = waiter.wait('test-stack', 'delete')
+        self.assertEqual(result.status, 'DELETE_COMPLETE')
+        # each event is passed once, in order, from the start of the deletion
+        self.assertEqual([(event['LogicalResourceId'], event['ResourceStatus']) for event in events], [
+            ('test-stack', 'DELETE_IN_PROGRESS'), ('Quick', 'DELETE_IN_PROGRESS'), ('Quick', 'DELETE_COMPLETE'),
+            ('Slow', 'DELETE_IN_PROGRESS'), ('Slow', 'DELETE_COMPLETE'), ('test-stack', 'DELETE_COMPLETE')])
+        self.assertEqual(result.events, events)
+
+    def test_first_failed_resource_fails_the_wait(self):
+        def fail(stack, logical_id, properties, at):
+            raise fake_aws.FakeError('InvalidRequest', 'Quick is broken')
+
+        self.fake.cloudformation.register_resource_type('Custom::Quick', fail, lambda resource, at: at)
+        self.fake.cloudformation.register_resource_type(
+            'Custom::Slow', lambda stack, logical_id, properties, at: ('slow', {}, at + 30),
+            lambda resource, at: at + 600)
+        with self.fake.patch():
+            tester = self.stack_tester(TEMPLATE)
+            start = time.time()
+            with self.assertRaises(stack_waiter.StackFailed) as context:
+                tester.create_stack(poll_interval=10)
+            # the failure is reported without waiting for the rollback
+            self.assertLess(time.time() - start, 60)
+        self.assertEqual(context.exception.event['LogicalResourceId'], 'Quick')
+        self.assertIn('Quick is broken', str(context.exception))
+        self.assertIsInstance(context.exception, ValueError)
+
+
+class ScriptedClient(object):
+    """A CloudFormation client whose stack goes through a list of statuses, one per DescribeStacks call."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.events = [stack_event(0, 'CREATE_IN_PROGRESS'), stack_event(1, 'CREATE_COMPLETE')]
+
+    def describe_stacks(self, StackName):  # noqa pylint: disable=invalid-name
+        status = self.statuses.pop(0)
+        if status.startswith('DELETE_'):
+            self.events.append(stack_event(len(self.events), status))
+        return {'Stacks': [{'StackId': 'arn:stack/test-stack/1', 'StackName': 'test-stack', 'StackStatus': status}]}
+
+    def describe_stack_events(self, StackName):  # noqa pylint: disable=invalid-name,unused-argument
+        return {'StackEvents': list(reversed(self.events))}
+
+
+def stack_event(number, status):
+    return {'EventId': str(number), 'LogicalResourceId': 'test-stack', 'ResourceType': stack_waiter.STACK_TYPE,
+            'ResourceStatus': status}
+
+
+class PendingOperationTest(unittest.TestCase):
+    def wait(self, statuses, operation):
+        events = []
+        waiter = stack_waiter.StackWaiter(ScriptedClient(statuses), callback=events.append, min_delay=0,
+                                          max_delay=0)
+        return waiter.wait('test-stack', operation), events
+
+    def test_delete_waits_for_the_deletion_to_show_up(self):
+        for status in ('CREATE_COMPLETE', 'UPDATE_COMPLETE'):
+            result, events = self.wait([status, status, 'DELETE_IN_PROGRESS', 'DELETE_COMPLETE'], 'delete')
+            self.assertEqual((result.status, result.polls), ('DELETE_COMPLETE', 4))
+            # the events of the previous operation are not passed on
+            self.assertEqual([event['ResourceStatus'] for event in events], ['DELETE_IN_PROGRESS', 'DELETE_COMPLETE'])
+
+    def test_failure_status_of_the_operation_fails_the_wait(self):
+        with self.assertRaises(stack_waiter.StackFailed):
+            self.wait(['CREATE_COMPLETE', 'DELETE_IN_PROGRESS', 'DELETE_FAILED'], 'delete')
+        with self.assertRaises(stack_waiter.StackFailed):
+            self.wait(['CREATE_IN_PROGRESS', 'ROLLBACK_COMPLETE'], 'create')
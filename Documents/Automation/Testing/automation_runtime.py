@@ -0,0 +1,720 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""In-process runtime for schemaVersion 0.3 Automation documents.
+
+AutomationRuntime interprets the mainSteps of a document the way the
+Automation service does: it resolves {{ }} references to parameters, step
+outputs and the automation: and global: variables, follows nextStep, isEnd,
+aws:branch and onFailure, retries a step up to maxAttempts and fails it when
+it runs past timeoutSeconds. Every AWS call is made through a backend:
+
+    runtime = AutomationRuntime(Boto3Backend(region_name='us-east-1'))
+    execution = runtime.run_file('aws-RestartEC2Instance.json', {'InstanceId': ['i-1234']})
+    assert execution.status == 'Success', execution.failure
+
+A backend only has to implement call(service, operation, params), with the
+API names used by the documents (Service "ec2", Api "DescribeInstances"), and
+may provide region and account_id. Waiting is done on a clock: the default
+VirtualClock makes aws:sleep, aws:waitForAwsResourceProperty and the polling of
+stacks, instances and images take no real time, so a document runs in
+milliseconds against a fake or recorded backend. Pass RealClock() to run
+against live AWS.
+
+The execution role of assumeRole is not assumed; the backend's credentials
+are used for every step.
+"""
+from __future__ import print_function
+
+import calendar
+import copy
+import datetime
+import json
+import os
+import sys
+import time
+import uuid
+from collections import namedtuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'Analysis'))
+import duration_analyzer  # noqa pylint: disable=import-error,wrong-import-position
+import interpolation  # noqa pylint: disable=import-error,wrong-import-position
+import selector_engine  # noqa pylint: disable=import-error,wrong-import-position
+
+try:
+    STRING_TYPES = (str, unicode)  # noqa pylint: disable=undefined-variable
+except NameError:
+    STRING_TYPES = (str,)
+
+# seconds between two checks of a resource the runtime is waiting for.
+POLL_INTERVAL = 5
+# steps of one execution after which a looping document is failed.
+MAX_STEP_EXECUTIONS = 1000
+# compiled step inputs kept by a runtime, which runs the documents of a test suite.
+MAX_TEMPLATES = 10000
+# 2018-01-01T00:00:00Z, the start of every VirtualClock unless given.
+VIRTUAL_EPOCH = 1514764800
+
+BUILTIN_OUTPUTS = {
+    'aws:approve': ('ApprovalStatus', 'ApproverDecisions'),
+    'aws:copyImage': ('ImageId', 'ImageState'),
+    'aws:createImage': ('ImageId', 'ImageState'),
+    'aws:createStack': ('StackId', 'StackStatus', 'StackStatusReason'),
+    'aws:executeAutomation': ('Output', 'ExecutionId', 'Status'),
+    'aws:invokeLambdaFunction': ('StatusCode', 'FunctionError', 'LogResult', 'ExecutedVersion', 'Payload'),
+    'aws:runCommand': ('CommandId', 'Status', 'ResponseCode', 'Output'),
+    'aws:runInstances': ('InstanceIds',),
+}
+
+COMMAND_PENDING_STATUSES = ('Pending', 'InProgress', 'Delayed', 'Cancelling')
+
+StepExecution = namedtuple('StepExecution', ['name', 'action', 'status', 'attempts', 'start', 'end',
+                                             'inputs', 'outputs', 'failure'])
+
+
+class StepFailed(Exception):
+    """A step did not complete; status is Failed or TimedOut."""
+
+    def __init__(self, message, status='Failed'):
+        super(StepFailed, self).__init__(message)
+        self.status = status
+
+
+class VirtualClock(object):
+    """A clock that only moves when something sleeps on it."""
+
+    def __init__(self, start=VIRTUAL_EPOCH):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0, seconds)
+
+
+class RealClock(object):
+    """The wall clock, for runs against live AWS."""
+
+    @staticmethod
+    def time():
+        return time.time()
+
+    @staticmethod
+    def sleep(seconds):
+        time.sleep(max(0, seconds))
+
+
+class Boto3Backend(object):
+    """Send every call to AWS through boto3 clients."""
+
+    def __init__(self, session=None, region_name=None):
+        import boto3
+        self.session = session or boto3.session.Session(region_name=region_name)
+        self.region = self.session.region_name
+        self._clients = {}
+        self._account_id = None
+
+    @property
+    def account_id(self):
+        if self._account_id is None:
+            self._account_id = self.call('sts', 'GetCallerIdentity', {})['Account']
+        return self._account_id
+
+    def client(self, service):
+        service = service.lower()
+        if service not in self._clients:
+            self._clients[service] = self.session.client(service)
+        return self._clients[service]
+
+    def call(self, service, operation, params):
+        from botocore import xform_name
+        response = getattr(self.client(service), xform_name(operation))(**params)
+        response.pop('ResponseMetadata', None)
+        return response
+
+
+def parse_duration(value):
+    """Return the seconds of an ISO 8601 duration like PT5M."""
+    seconds = duration_analyzer.parse_duration(value)
+    if seconds is None:
+        raise StepFailed("Invalid duration {}".format(json.dumps(value)))
+    return seconds
+
+
+def parse_timestamp(value):
+    """Return the epoch seconds of an ISO 8601 UTC timestamp like 2018-01-01T10:00:00Z."""
+    try:
+        moment = datetime.datetime.strptime(value.rstrip('Z'), '%Y-%m-%dT%H:%M:%S')
+    except (AttributeError, ValueError):
+        raise StepFailed("Invalid timestamp {}".format(json.dumps(value)))
+    return calendar.timegm(moment.timetuple())
+
+
+def select(data, selector, output_type=None):
+    """Return the value of a JSONPath selector like $.Reservations[0].Instances[*].State.Name."""
+    try:
+        return selector_engine.select(data, selector, output_type)
+    except selector_engine.SelectorError as e:
+        raise StepFailed(str(e))
+
+
+_text = interpolation.text
+
+
+def _matches(value, desired_values):
+    """Return True if value is one of desired_values, comparing booleans case-insensitively."""
+    for desired in desired_values:
+        if value == desired or _text(value) == desired:
+            return True
+        if isinstance(value, bool) and isinstance(desired, STRING_TYPES) and _text(value) == desired.lower():
+            return True
+    return False
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise StepFailed("{} is not a number".format(json.dumps(value)))
+
+
+class AutomationExecution(object):
+    """The record of one run of a document."""
+
+    def __init__(self, execution_id, document_name, parameters, start):
+        self.execution_id = execution_id
+        self.document_name = document_name
+        self.parameters = parameters
+        self.status = 'InProgress'
+        self.failure = None
+        self.steps = []
+        self.outputs = {}
+        # reference -> value of the parameters, variables and step outputs
+        self.values = {}
+        self.start = start
+        self.end = None
+
+    @property
+    def elapsed(self):
+        return (self.end if self.end is not None else self.start) - self.start
+
+    def step(self, name):
+        """Return the last StepExecution of the named step, or None."""
+        for step in reversed(self.steps):
+            if step.name == name:
+                return step
+        return None
+
+    def step_names(self):
+        return [step.name for step in self.steps]
+
+
+class AutomationRuntime(object):
+    """Execute Automation documents step by step against a backend."""
+
+    def __init__(self, backend, clock=None, documents=None, approver=None, poll_interval=POLL_INTERVAL):
+        """documents resolves the DocumentName of aws:executeAutomation steps to a document to run
+        in process: a dict of name -> document or a callable returning a document or None.
+        Documents it does not resolve are started through the backend. approver is called
+        with (execution, step inputs) for aws:approve and aws:pause steps and returns
+        whether the step is approved; by default every step is."""
+        self.backend = backend
+        self.clock = clock or getattr(backend, 'clock', None) or VirtualClock()
+        self.documents = documents
+        self.approver = approver
+        self.poll_interval = poll_interval
+        # id(step inputs) -> their compiled Template, which keeps the inputs alive while cached
+        self._templates = {}
+        self.actions = {
+            'aws:approve': self.approve,
+            'aws:assertAwsResourceProperty': self.assert_resource_property,
+            'aws:branch': self.branch,
+            'aws:changeInstanceState': self.change_instance_state,
+            'aws:copyImage': self.copy_image,
+            'aws:createImage': self.create_image,
+            'aws:createStack': self.create_stack,
+            'aws:createTags': self.create_tags,
+            'aws:deleteImage': self.delete_image,
+            'aws:deleteStack': self.delete_stack,
+            'aws:executeAutomation': self.execute_automation,
+            'aws:executeAwsApi': self.execute_aws_api,
+            'aws:executeScript': self.execute_script,
+            'aws:invokeLambdaFunction': self.invoke_lambda_function,
+            'aws:pause': self.approve,
+            'aws:runCommand': self.run_command,
+            'aws:runInstances': self.run_instances,
+            'aws:sleep': self.sleep,
+            'aws:waitForAwsResourceProperty': self.wait_for_resource_property,
+        }
+
+    def register_action(self, action, handler):
+        """Run steps of action with handler(execution, inputs, deadline), which returns the step response."""
+        self.actions[action] = handler
+
+    # document execution
+
+    def run_file(self, path, parameters=None):
+        with open(path) as fp:
+            content = fp.read()
+        if path.endswith('.json'):
+            document = json.loads(content)
+        else:
+            import yaml
+            document = yaml.safe_load(content)
+        name = path.replace('\\', '/').split('/')[-1].rsplit('.', 1)[0]
+        return self.run(document, parameters, name)
+
+    def run(self, document, parameters=None, document_name=None, execution=None):
+        """Execute a loaded document and return its AutomationExecution.
+
+        Pass a new AutomationExecution as execution to follow its steps while it runs."""
+        if execution is None:
+            execution = AutomationExecution(str(uuid.uuid4()), document_name, parameters or {}, self.clock.time())
+        try:
+            values = self.resolve_parameters(document, parameters or {})
+        except StepFailed as e:
+            return self._finish(execution, 'Failed', str(e))
+        values['automation:EXECUTION_ID'] = execution.execution_id
+        execution.values = values
+
+        steps = document.get('mainSteps') or []
+        names = dict((step['name'], index) for index, step in enumerate(steps))
+        position = 0 if steps else None
+        failed = None
+        while position is not None:
+            if len(execution.steps) >= MAX_STEP_EXECUTIONS:
+                return self._finish(execution, 'Failed', "More than {} steps executed".format(MAX_STEP_EXECUTIONS))
+            step = steps[position]
+            result, response = self.execute_step(execution, step)
+            execution.steps.append(result)
+
+            if result.status == 'Success':
+                if step['action'] == 'aws:branch':
+                    target = response['NextStep']
+                else:
+                    target = self._following(step, position, steps)
+            else:
+                on_failure = step.get('onFailure', 'Abort')
+                if on_failure == 'Abort':
+                    return self._finish(execution, result.status, "Step {} failed: {}".format(
+                        step['name'], result.failure))
+                if step.get('isCritical', True) and failed is None:
+                    failed = "Step {} failed: {}".format(step['name'], result.failure)
+                if on_failure == 'Continue':
+                    target = self._following(step, position, steps)
+                else:
+                    target = on_failure[len('step:'):]
+            if target is not None and target not in names:
+                return self._finish(execution, 'Failed', "Step {} goes to unknown step {}".format(
+                    step['name'], target))
+            position = names.get(target)
+
+        for output in document.get('outputs') or []:
+            if output in values:
+                execution.outputs[output] = values[output]
+        return self._finish(execution, 'Failed' if failed else 'Success', failed)
+
+    def _finish(self, execution, status, failure=None):
+        execution.status = status
+        execution.failure = failure
+        execution.end = self.clock.time()
+        return execution
+
+    @staticmethod
+    def _following(step, position, steps):
+        """Return the name of the step that follows a step, or None at the end of the document."""
+        if step.get('isEnd') is True:
+            return None
+        if 'nextStep' in step:
+            return step['nextStep']
+        return steps[position + 1]['name'] if position + 1 < len(steps) else None
+
+    @staticmethod
+    def resolve_parameters(document, parameters):
+        """Return {name: value} of the document parameters, with defaults applied and values
+        given as lists, as StartAutomationExecution takes them, converted to their type."""
+        values = {}
+        declared = document.get('parameters') or {}
+        for name in parameters:
+            if name not in declared:
+                raise StepFailed("Unknown parameter {}".format(name))
+        for name, definition in declared.items():
+            if name in parameters:
+                value = parameters[name]
+            elif 'default' in definition:
+                value = copy.deepcopy(definition['default'])
+            else:
+                raise StepFailed("Missing required parameter {}".format(name))
+            kind = definition.get('type', 'String')
+            if kind == 'StringList':
+                value = [value] if isinstance(value, STRING_TYPES) else list(value)
+            elif kind in ('String', 'Integer', 'Boolean') or kind.startswith('AWS::'):
+                if isinstance(value, list):
+                    if len(value) != 1:
+                        raise StepFailed("Parameter {} takes a single value".format(name))
+                    value = value[0]
+                if kind == 'Integer' and isinstance(value, STRING_TYPES):
+                    value = int(value)
+                elif kind == 'Boolean' and isinstance(value, STRING_TYPES):
+                    value = value.lower() == 'true'
+            values[name] = value
+        return values
+
+    # steps
+
+    def execute_step(self, execution, step):
+        """Run one step with its retries; return (StepExecution, response of the last attempt)."""
+        action = step.get('action')
+        attempts = step.get('maxAttempts', 1)
+        timeout = step.get('timeoutSeconds')
+        start = self.clock.time()
+        inputs = response = None
+        outputs = {}
+        status, failure = 'Failed', None
+        attempt = 0
+        while attempt < attempts:
+            attempt += 1
+            deadline = self.clock.time() + timeout if timeout else None
+            try:
+                if action not in self.actions:
+                    raise StepFailed("Unsupported action {}".format(action))
+                inputs = self.interpolate(execution, step.get('inputs') or {})
+                response = self.actions[action](execution, inputs, deadline)
+                if deadline is not None and self.clock.time() > deadline:
+                    raise StepFailed("Step timed out after {} seconds".format(timeout), 'TimedOut')
+                outputs = self.step_outputs(step, response or {})
+                status, failure = 'Success', None
+                break
+            except StepFailed as e:
+                status, failure = e.status, str(e)
+            except Exception as e:  # pylint: disable=broad-except
+                # any error of the backend fails the attempt, as a failed API call does.
+                status, failure = 'Failed', '{}: {}'.format(type(e).__name__, e)
+
+        for name, value in outputs.items():
+            execution.values['{}.{}'.format(step['name'], name)] = value
+        return StepExecution(step['name'], action, status, attempt, start, self.clock.time(),
+                             inputs, outputs, failure), response
+
+    @staticmethod
+    def step_outputs(step, response):
+        outputs = {}
+        for name in BUILTIN_OUTPUTS.get(step['action'], ()):
+            if name in response:
+                outputs[name] = response[name]
+        for output in step.get('outputs') or []:
+            outputs[output['Name']] = select(response, output['Selector'], output.get('Type'))
+        return outputs
+
+    # references
+
+    def resolve(self, execution, reference):
+        values = execution.values
+        if reference in values:
+            return values[reference]
+        namespace, _, name = reference.partition(':')
+        if namespace in ('ssm', 'ssm-secure') and name:
+            return self.backend.call('ssm', 'GetParameter', dict(
+                Name=name, WithDecryption=namespace == 'ssm-secure'))['Parameter']['Value']
+        if namespace == 'global':
+            now = datetime.datetime.utcfromtimestamp(self.clock.time())
+            variables = {
+                'ACCOUNT_ID': lambda: self.backend.account_id,
+                'REGION': lambda: self.backend.region,
+                'AWS_PARTITION': lambda: 'aws',
+                'URL_SUFFIX': lambda: 'amazonaws.com',
+                'DATE': lambda: now.strftime('%Y-%m-%d'),
+                'DATE_TIME': lambda: now.strftime('%Y-%m-%d_%H.%M.%S'),
+            }
+            if name in variables:
+                return variables[name]()
+        raise StepFailed("Unresolved reference {{{{{}}}}}".format(reference))
+
+    def interpolate(self, execution, value):
+        """Return value with its {{ }} references substituted; a string that is a single reference
+        takes the type of the referenced value."""
+        key = id(value)
+        if key not in self._templates:
+            if len(self._templates) >= MAX_TEMPLATES:
+                self._templates.clear()
+            self._templates[key] = interpolation.compile_template(value)
+        return self._templates[key].fill(execution.values, lambda reference: self.resolve(execution, reference))
+
+    # waiting
+
+    def wait_until(self, check, deadline, description):
+        """Call check until it returns something other than None, sleeping between calls."""
+        while True:
+            result = check()
+            if result is not None:
+                return result
+            if deadline is not None and self.clock.time() + self.poll_interval > deadline:
+                raise StepFailed("Timed out waiting for {}".format(description), 'TimedOut')
+            self.clock.sleep(self.poll_interval)
+
+    # actions
+
+    def approve(self, execution, inputs, deadline):
+        approved = True if self.approver is None else self.approver(execution, inputs)
+        if not approved:
+            raise StepFailed("Step was rejected")
+        return {'ApprovalStatus': 'Approved', 'ApproverDecisions': []}
+
+    def _api_call(self, inputs, *excluded):
+        params = dict((key, value) for key, value in inputs.items()
+                      if key not in ('Service', 'Api') + excluded)
+        return self.backend.call(inputs['Service'], inputs['Api'], params)
+
+    def execute_aws_api(self, execution, inputs, deadline):
+        return self._api_call(inputs)
+
+    def assert_resource_property(self, execution, inputs, deadline):
+        response = self._api_call(inputs, 'PropertySelector', 'DesiredValues')
+        value = select(response, inputs['PropertySelector'])
+        if not _matches(value, inputs['DesiredValues']):
+            raise StepFailed("{} is {}, expected one of {}".format(
+                inputs['PropertySelector'], json.dumps(value), json.dumps(inputs['DesiredValues'])))
+        return response
+
+    def wait_for_resource_property(self, execution, inputs, deadline):
+        def check():
+            response = self._api_call(inputs, 'PropertySelector', 'DesiredValues')
+            return response if _matches(select(response, inputs['PropertySelector']),
+                                        inputs['DesiredValues']) else None
+        return self.wait_until(check, deadline, inputs['PropertySelector'])
+
+    def branch(self, execution, inputs, deadline):
+        for choice in inputs.get('Choices') or []:
+            if self.evaluate_choice(choice):
+                return {'NextStep': choice['NextStep']}
+        if 'Default' in inputs:
+            return {'NextStep': inputs['Default']}
+        raise StepFailed("No choice matched and no Default is set")
+
+    def evaluate_choice(self, condition):
+        if 'And' in condition:
+            return all(self.evaluate_choice(item) for item in condition['And'])
+        if 'Or' in condition:
+            return any(self.evaluate_choice(item) for item in condition['Or'])
+        if 'Not' in condition:
+            return not self.evaluate_choice(condition['Not'])
+        variable = condition.get('Variable')
+        operators = {
+            'StringEquals': lambda expected: _text(variable) == expected,
+            'EqualsIgnoreCase': lambda expected: _text(variable).lower() == expected.lower(),
+            'StartsWith': lambda expected: _text(variable).startswith(expected),
+            'EndsWith': lambda expected: _text(variable).endswith(expected),
+            'Contains': lambda expected: (expected in variable if isinstance(variable, list)
+                                          else expected in _text(variable)),
+            'NumericEquals': lambda expected: _number(variable) == _number(expected),
+            'NumericGreater': lambda expected: _number(variable) > _number(expected),
+            'NumericLesser': lambda expected: _number(variable) < _number(expected),
+            'NumericGreaterOrEquals': lambda expected: _number(variable) >= _number(expected),
+            'NumericLesserOrEquals': lambda expected: _number(variable) <= _number(expected),
+            'BooleanEquals': lambda expected: _text(variable) == _text(expected),
+        }
+        for operator, evaluate in operators.items():
+            if operator in condition:
+                return evaluate(condition[operator])
+        raise StepFailed("Choice has no operator")
+
+    def _instance_states(self, instance_ids):
+        response = self.backend.call('ec2', 'DescribeInstances', {'InstanceIds': instance_ids})
+        return dict((instance['InstanceId'], instance['State']['Name'])
+                    for reservation in response.get('Reservations', [])
+                    for instance in reservation.get('Instances', []))
+
+    def _wait_for_instances(self, instance_ids, desired_state, deadline):
+        def check():
+            states = self._instance_states(instance_ids)
+            return states if all(states.get(i) == desired_state for i in instance_ids) else None
+        return self.wait_until(check, deadline, "instances to be {}".format(desired_state))
+
+    def change_instance_state(self, execution, inputs, deadline):
+        instance_ids = inputs['InstanceIds']
+        instance_ids = [instance_ids] if isinstance(instance_ids, STRING_TYPES) else instance_ids
+        desired_state = inputs['DesiredState']
+        if not inputs.get('CheckStateOnly'):
+            states = self._instance_states(instance_ids)
+            pending = [i for i in instance_ids if states.get(i) != desired_state]
+            if pending and desired_state == 'running':
+                self.backend.call('ec2', 'StartInstances', {'InstanceIds': pending})
+            elif pending and desired_state == 'stopped':
+                self.backend.call('ec2', 'StopInstances', {'InstanceIds': pending, 'Force': bool(inputs.get('Force'))})
+            elif pending and desired_state == 'terminated':
+                self.backend.call('ec2', 'TerminateInstances', {'InstanceIds': pending})
+        self._wait_for_instances(instance_ids, desired_state, deadline)
+        return {}
+
+    def _wait_for_image(self, image_id, deadline):
+        def check():
+            state = self.backend.call('ec2', 'DescribeImages', {'ImageIds': [image_id]})['Images'][0]['State']
+            if state == 'failed':
+                raise StepFailed("Image {} failed".format(image_id))
+            return state if state == 'available' else None
+        return {'ImageId': image_id, 'ImageState': self.wait_until(check, deadline, "image " + image_id)}
+
+    def create_image(self, execution, inputs, deadline):
+        params = {'InstanceId': inputs['InstanceId'], 'Name': inputs['ImageName']}
+        for key, target in (('ImageDescription', 'Description'), ('NoReboot', 'NoReboot'),
+                            ('BlockDeviceMappings', 'BlockDeviceMappings')):
+            if key in inputs:
+                params[target] = inputs[key]
+        image_id = self.backend.call('ec2', 'CreateImage', params)['ImageId']
+        return self._wait_for_image(image_id, deadline)
+
+    def copy_image(self, execution, inputs, deadline):
+        params = {'SourceImageId': inputs['SourceImageId'], 'SourceRegion': inputs['SourceRegion'],
+                  'Name': inputs['ImageName']}
+        for key, target in (('ImageDescription', 'Description'), ('Encrypted', 'Encrypted'),
+                            ('KmsKeyId', 'KmsKeyId'), ('ClientToken', 'ClientToken')):
+            if key in inputs:
+                params[target] = inputs[key]
+        image_id = self.backend.call('ec2', 'CopyImage', params)['ImageId']
+        return self._wait_for_image(image_id, deadline)
+
+    def delete_image(self, execution, inputs, deadline):
+        image = self.backend.call('ec2', 'DescribeImages', {'ImageIds': [inputs['ImageId']]})['Images'][0]
+        self.backend.call('ec2', 'DeregisterImage', {'ImageId': inputs['ImageId']})
+        for mapping in image.get('BlockDeviceMappings', []):
+            if 'SnapshotId' in mapping.get('Ebs', {}):
+                self.backend.call('ec2', 'DeleteSnapshot', {'SnapshotId': mapping['Ebs']['SnapshotId']})
+        return {}
+
+    def run_instances(self, execution, inputs, deadline):
+        params = dict((key, value) for key, value in inputs.items()
+                      if key not in ('MinInstanceCount', 'MaxInstanceCount'))
+        params['MinCount'] = inputs.get('MinInstanceCount', 1)
+        params['MaxCount'] = inputs.get('MaxInstanceCount', params['MinCount'])
+        instance_ids = [i['InstanceId'] for i in self.backend.call('ec2', 'RunInstances', params)['Instances']]
+        self._wait_for_instances(instance_ids, 'running', deadline)
+        return {'InstanceIds': instance_ids}
+
+    def create_tags(self, execution, inputs, deadline):
+        resource_type = inputs.get('ResourceType', 'EC2')
+        if resource_type == 'EC2':
+            self.backend.call('ec2', 'CreateTags', {'Resources': inputs['ResourceIds'], 'Tags': inputs['Tags']})
+        else:
+            for resource_id in inputs['ResourceIds']:
+                self.backend.call('ssm', 'AddTagsToResource', {
+                    'ResourceType': resource_type, 'ResourceId': resource_id, 'Tags': inputs['Tags']})
+        return {}
+
+    def _describe_stack(self, stack_name):
+        return self.backend.call('cloudformation', 'DescribeStacks', {'StackName': stack_name})['Stacks'][0]
+
+    def create_stack(self, execution, inputs, deadline):
+        stack_id = self.backend.call('cloudformation', 'CreateStack', inputs)['StackId']
+
+        def check():
+            stack = self._describe_stack(stack_id)
+            return None if stack['StackStatus'].endswith('_IN_PROGRESS') else stack
+        stack = self.wait_until(check, deadline, "stack " + inputs['StackName'])
+        if stack['StackStatus'] != 'CREATE_COMPLETE':
+            raise StepFailed("Stack {} is {}: {}".format(inputs['StackName'], stack['StackStatus'],
+                                                          stack.get('StackStatusReason', '')))
+        return {'StackId': stack_id, 'StackStatus': stack['StackStatus'],
+                'StackStatusReason': stack.get('StackStatusReason', '')}
+
+    def delete_stack(self, execution, inputs, deadline):
+        try:
+            stack_id = self._describe_stack(inputs['StackName'])['StackId']
+        except Exception:  # pylint: disable=broad-except
+            # deleting a stack that does not exist succeeds.
+            stack_id = None
+        self.backend.call('cloudformation', 'DeleteStack', inputs)
+        if stack_id is not None:
+            def check():
+                status = self._describe_stack(stack_id)['StackStatus']
+                if status == 'DELETE_FAILED':
+                    raise StepFailed("Stack {} is DELETE_FAILED".format(inputs['StackName']))
+                return status if status == 'DELETE_COMPLETE' else None
+            self.wait_until(check, deadline, "deletion of stack " + inputs['StackName'])
+        return {}
+
+    def invoke_lambda_function(self, execution, inputs, deadline):
+        response = self.backend.call('lambda', 'Invoke', inputs)
+        payload = response.get('Payload')
+        if hasattr(payload, 'read'):
+            payload = payload.read()
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        result = {'StatusCode': response.get('StatusCode'), 'Payload': payload}
+        for name in ('FunctionError', 'LogResult', 'ExecutedVersion'):
+            if name in response:
+                result[name] = response[name]
+        if 'FunctionError' in response:
+            raise StepFailed("Lambda {} failed ({}): {}".format(inputs['FunctionName'], response['FunctionError'],
+                                                                 payload))
+        return result
+
+    def run_command(self, execution, inputs, deadline):
+        command_id = self.backend.call('ssm', 'SendCommand', inputs)['Command']['CommandId']
+
+        def check():
+            command = self.backend.call('ssm', 'ListCommands', {'CommandId': command_id})['Commands'][0]
+            return None if command['Status'] in COMMAND_PENDING_STATUSES else command['Status']
+        status = self.wait_until(check, deadline, "command " + command_id)
+        if status != 'Success':
+            raise StepFailed("Command {} is {}".format(command_id, status))
+        return {'CommandId': command_id, 'Status': status}
+
+    def execute_automation(self, execution, inputs, deadline):
+        name = inputs['DocumentName']
+        parameters = inputs.get('RuntimeParameters') or {}
+        documents = self.documents
+        document = documents(name) if callable(documents) else (documents or {}).get(name)
+        if document is not None:
+            child = self.run(document, parameters, name)
+            outputs = []
+            for value in child.outputs.values():
+                outputs.extend(value if isinstance(value, list) else [value])
+            if child.status != 'Success':
+                raise StepFailed("Automation {} is {}: {}".format(name, child.status, child.failure))
+            return {'ExecutionId': child.execution_id, 'Status': child.status, 'Output': outputs}
+
+        params = {'DocumentName': name, 'Parameters': dict(
+            (key, value if isinstance(value, list) else [value]) for key, value in parameters.items())}
+        execution_id = self.backend.call('ssm', 'StartAutomationExecution', params)['AutomationExecutionId']
+
+        def check():
+            child = self.backend.call('ssm', 'GetAutomationExecution',
+                                      {'AutomationExecutionId': execution_id})['AutomationExecution']
+            return None if child['AutomationExecutionStatus'] in ('Pending', 'InProgress', 'Waiting') else child
+        child = self.wait_until(check, deadline, "automation " + execution_id)
+        outputs = []
+        for value in (child.get('Outputs') or {}).values():
+            outputs.extend(value)
+        if child['AutomationExecutionStatus'] != 'Success':
+            raise StepFailed("Automation {} is {}".format(name, child['AutomationExecutionStatus']))
+        return {'ExecutionId': execution_id, 'Status': child['AutomationExecutionStatus'], 'Output': outputs}
+
+    def execute_script(self, execution, inputs, deadline):
+        namespace = {}
+        exec(compile(inputs['Script'], inputs['Handler'], 'exec'), namespace)  # pylint: disable=exec-used
+        return {'Payload': namespace[inputs['Handler'].split('.')[-1]](inputs.get('InputPayload') or {}, None)}
+
+    def sleep(self, execution, inputs, deadline):
+        if 'Duration' in inputs:
+            seconds = parse_duration(inputs['Duration'])
+        else:
+            seconds = parse_timestamp(inputs['Timestamp']) - self.clock.time()
+        if deadline is not None and self.clock.time() + seconds > deadline:
+            self.clock.sleep(deadline - self.clock.time())
+            raise StepFailed("Step timed out while sleeping", 'TimedOut')
+        self.clock.sleep(seconds)
+        return {}
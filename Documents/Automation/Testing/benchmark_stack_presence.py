@@ -0,0 +1,131 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Compare how stack presence checks scale with the stack history of an account.
+
+    python Testing/benchmark_stack_presence.py [--history N ...] [--checks N]
+
+CloudFormation lists deleted stacks for 90 days, so ListStacks returns every
+stack created in that time. For each history size, fake_aws holds that many
+deleted stacks besides the tested stack, and a stack is checked by
+paginating ListStacks like CFNTester used to, and by CFNTester.stack_status,
+a DescribeStacks call by name cached for STATUS_TTL seconds. The API calls
+of one check and of a delete_stack that polls the stack, and the milliseconds
+of one check, are reported per history size.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import fake_aws
+import ssm_testing
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+STACK_NAME = 'benchmark-stack'
+TEMPLATE = json.dumps({'Resources': {'Topic': {'Type': 'Custom::Resource'}}})
+
+
+def list_stacks_present(cfn_client, stack_name):
+    """Determine if a stack exists by paginating ListStacks, as CFNTester did."""
+    stacks = []
+    for page in cfn_client.get_paginator('list_stacks').paginate():
+        stacks.extend(page['StackSummaries'])
+    return any(i['StackName'] == stack_name and i['StackStatus'] != 'DELETE_COMPLETE' for i in stacks)
+
+
+def fake_account(history):
+    """Return a FakeAWS holding history deleted stacks and the tested stack."""
+    fake = fake_aws.FakeAWS()
+    for number in range(history):
+        name = 'deleted-{}'.format(number)
+        fake.call('cloudformation', 'CreateStack', {'StackName': name, 'TemplateBody': TEMPLATE})
+        fake.call('cloudformation', 'DeleteStack', {'StackName': name})
+    fake.call('cloudformation', 'CreateStack', {'StackName': STACK_NAME, 'TemplateBody': TEMPLATE})
+    fake.sleep(3600)
+    return fake
+
+
+def calls(fake, function):
+    since = len(fake.calls)
+    function()
+    return len(fake.calls) - since
+
+
+def benchmark(histories, checks, template_path):
+    """Return [(history, {measure: value})]."""
+    results = []
+    for history in histories:
+        fake = fake_account(history)
+        with fake.patch():
+            client = boto3.client('cloudformation', region_name=fake_aws.REGION)
+            tester = ssm_testing.CFNTester(client, template_path, STACK_NAME)
+            # the status cached for the previous account is not valid in this one
+            tester.forget_status()
+            if not list_stacks_present(client, STACK_NAME) or not tester.is_stack_present():
+                raise AssertionError('{} is not found with {} deleted stacks'.format(STACK_NAME, history))
+            tester.forget_status()
+            measures = {
+                'list calls': calls(fake, lambda: list_stacks_present(client, STACK_NAME)),
+                'describe calls': calls(fake, tester.forget_status) + calls(fake, tester.stack_status),
+                'list ms': min(timeit.repeat(lambda: list_stacks_present(client, STACK_NAME), number=checks,
+                                             repeat=3)) * 1000 / checks,
+            }
+            tester.forget_status()
+            measures['describe ms'] = min(timeit.repeat(lambda: (tester.forget_status(), tester.stack_status()),
+                                                        number=checks, repeat=3)) * 1000 / checks
+            measures['delete calls'] = calls(fake, tester.delete_stack)
+            results.append((history, measures))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, nargs='+', default=[0, 100, 1000, 5000],
+                        help='deleted stacks in the account (default: 0 100 1000 5000)')
+    parser.add_argument('--checks', type=int, default=20, help='checks per timing (default: 20)')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if boto3 is None:
+        print('boto3 is not installed', file=sys.stderr)
+        return 1
+
+    root = tempfile.mkdtemp()
+    try:
+        template_path = os.path.join(root, 'template.json')
+        with open(template_path, 'w') as template_file:
+            template_file.write(TEMPLATE)
+        results = benchmark(args.history, args.checks, template_path)
+    finally:
+        shutil.rmtree(root)
+    columns = ['list calls', 'describe calls', 'list ms', 'describe ms', 'delete calls']
+    print("{:<16}".format("deleted stacks") + "".join("{:>16}".format(c) for c in columns))
+    for history, measures in results:
+        print("{:<16}".format(history) + "".join("{:>16}".format(measures[c]) if isinstance(measures[c], int)
+                                                 else "{:>16.3f}".format(measures[c]) for c in columns))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,380 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Record the AWS traffic of document tests into cassettes and replay it offline.
+
+A cassette holds every botocore call made while it is in use, whoever makes it:
+ssm_testing.CFNTester and SSMTester, the test itself, or a Lambda handler the
+test imports and calls. Responses, parameters and errors are stored once each
+and the file is gzipped, so a test that polls a stack for ten minutes leaves a
+cassette of a few kilobytes.
+
+Calls are matched on (service, operation, parameters). When a test polls, the
+recorded responses of the call are served in order, and a run of polls during
+which nothing in the recording changed is collapsed into one: the next poll
+sees the next change. time.sleep and time.time run on a virtual clock while
+replaying, so a replayed test does not wait between polls.
+
+    python Testing/cassette.py record AttachIAMToInstance/Tests    # live run, writes Tests/Cassettes/*.json.gz
+    python Testing/cassette.py replay AttachIAMToInstance/Tests    # offline; unrecorded calls go live
+    python Testing/cassette.py strict AttachIAMToInstance/Tests    # offline; an unrecorded call fails
+    python Testing/cassette.py record --fake RestartInstance/Tests # record against fake_aws
+
+There is one cassette per test file, named after it, in a Cassettes folder next
+to it.
+"""
+from __future__ import print_function
+
+import argparse
+import base64
+import bisect
+import calendar
+import contextlib
+import datetime
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import unittest
+
+import automation_runtime
+import fake_aws
+import ssm_testing
+import stack_waiter
+
+sys.path.append(os.path.join(fake_aws.AUTOMATION_DIR, 'Build'))
+import document_builder  # noqa pylint: disable=import-error,wrong-import-position
+
+LOGGER = logging.getLogger(__name__)
+
+MODES = ('record', 'replay', 'strict')
+CASSETTE_VERSION = 1
+CASSETTE_DIR = 'Cassettes'
+# parameters that differ on every run without changing the request
+IGNORED_PARAMETERS = ('ClientToken', 'ClientRequestToken', 'IdempotencyToken')
+
+
+def reset_process_state():
+    """Drop what the test harness remembers across the test files of a process.
+
+    Cached stack statuses and roles, and observed stack durations, would let a
+    test file skip or add calls depending on the files run before it, so its
+    cassette would only replay after the same files.
+    """
+    ssm_testing.CFNTester.STATUS_CACHE.clear()
+    ssm_testing.SSMTester.ROLE_CACHE.clear()
+    stack_waiter.StackWaiter.HISTORY.clear()
+
+
+class UnrecordedCall(Exception):
+    """A strict cassette was asked for a call it did not record."""
+
+
+def encode(value):
+    """Return value as JSON data; datetimes, bytes and streams become tagged objects."""
+    if isinstance(value, dict):
+        return dict((key, encode(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, datetime.datetime):
+        offset = value.utcoffset() or datetime.timedelta(0)
+        return {'__datetime__': calendar.timegm((value - offset).timetuple()) + value.microsecond / 1e6}
+    if hasattr(value, 'read'):
+        return {'__stream__': base64.b64encode(value.read()).decode('ascii')}
+    if isinstance(value, bytes):
+        try:
+            if not isinstance(value, str):
+                raise UnicodeError()
+            return value.decode('utf-8')  # a python2 str
+        except UnicodeError:
+            return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, bytearray):
+        return {'__bytes__': base64.b64encode(bytes(value)).decode('ascii')}
+    return value
+
+
+def decode(value):
+    """Return the value encode() was given, with streams as botocore StreamingBody objects."""
+    if isinstance(value, dict):
+        if len(value) == 1:
+            (tag, data), = value.items()
+            if tag == '__datetime__':
+                return datetime.datetime.fromtimestamp(data, fake_aws.UTC)
+            if tag == '__bytes__':
+                return base64.b64decode(data)
+            if tag == '__stream__':
+                return streaming_body(base64.b64decode(data))
+        return dict((key, decode(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def streaming_body(data):
+    try:
+        from botocore.response import StreamingBody
+    except ImportError:
+        return io.BytesIO(data)
+    return StreamingBody(io.BytesIO(data), len(data))
+
+
+def canonical(value):
+    """Return the JSON text identifying an encoded value, whatever its key order."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def request_key(service, operation_name, params):
+    params = dict((key, value) for key, value in (params or {}).items() if key not in IGNORED_PARAMETERS)
+    return '{}.{} {}'.format(service, operation_name, canonical(encode(params)))
+
+
+class Cassette(object):
+    """The recorded calls of one test file.
+
+    interactions lists (request, response, error) indexes into the requests and
+    responses tables in call order; error is the error code of a failed call, or
+    None."""
+
+    def __init__(self, path, mode='replay'):
+        if mode not in MODES:
+            raise ValueError('mode must be one of {}'.format(', '.join(MODES)))
+        self.path = path
+        self.mode = mode
+        self.start = None
+        self.requests = []
+        self.responses = []
+        self.interactions = []
+        self.unrecorded = []
+        self._lock = threading.RLock()
+        self._request_ids = {}
+        self._response_ids = {}
+        self._positions = {}
+        self._changes = []
+        self._cursor = -1
+        self._dirty = False
+        if mode != 'record' and os.path.exists(path):
+            self.load()
+
+    # storage
+
+    def load(self):
+        with gzip.open(self.path, 'rb') as fp:
+            data = json.loads(fp.read().decode('utf-8'))
+        if data.get('version') != CASSETTE_VERSION:
+            raise ValueError('{}: unsupported cassette version {}'.format(self.path, data.get('version')))
+        self.start = data['start']
+        self.requests = data['requests']
+        self.responses = [canonical(response) for response in data['responses']]
+        self._request_ids = dict((request, index) for index, request in enumerate(self.requests))
+        self._response_ids = dict((response, index) for index, response in enumerate(self.responses))
+        self.interactions = []
+        self._positions = {}
+        self._changes = []
+        for request, response, error in data['interactions']:
+            self._append(request, response, error)
+
+    def dump(self):
+        """Return the gzipped cassette; the same calls always give the same bytes."""
+        data = {'version': CASSETTE_VERSION, 'start': self.start, 'requests': self.requests,
+                'responses': [json.loads(response) for response in self.responses],
+                'interactions': [list(interaction) for interaction in self.interactions]}
+        buffer = io.BytesIO()
+        with gzip.GzipFile(filename='', mode='wb', fileobj=buffer, mtime=0) as fp:
+            fp.write(json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+        return buffer.getvalue()
+
+    def save(self):
+        """Write the cassette if it recorded anything new, and return whether it did."""
+        if not self._dirty:
+            return False
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._dirty = False
+        return document_builder.write_if_changed(self.path, self.dump())
+
+    # recording
+
+    def _append(self, request, response, error):
+        position = len(self.interactions)
+        positions = self._positions.setdefault(request, [])
+        # a change is a call whose response differs from the previous response to the same request
+        changed = not positions or self.interactions[positions[-1]][1:] != (response, error)
+        self._changes.append((self._changes[-1] if self._changes else 0) + int(changed))
+        positions.append(position)
+        self.interactions.append((request, response, error))
+
+    def record(self, key, response, error=None):
+        """Add one call: response is the parsed response, or the error response of a failed call."""
+        response = dict(response)
+        metadata = response.pop('ResponseMetadata', None) or {}
+        response['ResponseMetadata'] = {'HTTPStatusCode': metadata.get('HTTPStatusCode', 200)}
+        text = canonical(encode(response))
+        with self._lock:
+            if self.start is None:
+                self.start = time.time()
+            if key not in self._request_ids:
+                self._request_ids[key] = len(self.requests)
+                self.requests.append(key)
+            if text not in self._response_ids:
+                self._response_ids[text] = len(self.responses)
+                self.responses.append(text)
+            self._append(self._request_ids[key], self._response_ids[text], error)
+            self._dirty = True
+
+    # replaying
+
+    def find(self, key):
+        """Return (response, error code) of the recorded answer to the next call for key, or None."""
+        with self._lock:
+            request = self._request_ids.get(key)
+            positions = self._positions.get(request)
+            if not positions:
+                return None
+            index = bisect.bisect_right(positions, self._cursor)
+            if index == len(positions):
+                # polled more often than when recording: the state stays the latest recorded one
+                position = positions[-1]
+            else:
+                position = positions[index]
+                # a poll: skip the calls that got the same answer while nothing else changed, when the next
+                # change in the recording is this call's own answer changing. Identical calls followed by
+                # anything else may be separate reads the test still makes, so they are kept.
+                end = index
+                while end + 1 < len(positions) and self._changes[positions[end + 1]] == self._changes[position]:
+                    end += 1
+                if end > index and end + 1 < len(positions) and \
+                        self._changes[positions[end + 1]] == self._changes[position] + 1 and \
+                        self.interactions[positions[end + 1]][1:] != self.interactions[position][1:]:
+                    index, position = end, positions[end]
+                self._cursor = max(self._cursor, position)
+            _, response, error = self.interactions[position]
+            return decode(json.loads(self.responses[response])), error
+
+    def rewind(self):
+        self._cursor = -1
+
+    # use
+
+    @contextlib.contextmanager
+    def use(self, live_call=None):
+        """Serve or record the botocore calls made while the context is active.
+
+        Replaying also runs time.sleep and time.time on a virtual clock that starts when the recording did.
+        Recording and replaying both start from a fresh reset_process_state()."""
+        from botocore.client import BaseClient
+        original = BaseClient.__dict__['_make_api_call']
+        live_call = live_call or original
+        saved_time = (time.sleep, time.time)
+        replaying = self.mode != 'record' and self.interactions
+        if replaying:
+            clock = automation_runtime.VirtualClock(self.start)
+            time.sleep, time.time = clock.sleep, clock.time
+        BaseClient._make_api_call = self._make_api_call(live_call)  # pylint: disable=protected-access
+        reset_process_state()
+        self.rewind()
+        try:
+            yield self
+        finally:
+            BaseClient._make_api_call = original  # pylint: disable=protected-access
+            time.sleep, time.time = saved_time
+
+    def _make_api_call(self, live_call):
+        from botocore.exceptions import ClientError
+        from botocore.validate import validate_parameters
+        cassette = self
+
+        def make_api_call(client, operation_name, api_params):
+            service = client.meta.service_model.service_name
+            key = request_key(service, operation_name, api_params)
+            if cassette.mode != 'record':
+                model = client.meta.service_model.operation_model(operation_name)
+                if model.input_shape is not None:
+                    validate_parameters(api_params, model.input_shape)
+                found = cassette.find(key)
+                if found is not None:
+                    response, error = found
+                    if error is not None:
+                        raise client.exceptions.from_code(error)(response, operation_name)
+                    return response
+                cassette.unrecorded.append(key)
+                if cassette.mode == 'strict':
+                    raise UnrecordedCall('{} has no recorded response to {}'.format(
+                        os.path.relpath(cassette.path), key))
+            try:
+                response = live_call(client, operation_name, api_params)
+            except ClientError as error:
+                cassette.record(key, error.response, error.response.get('Error', {}).get('Code', 'Unknown'))
+                raise
+            # the streams of the response can only be read once: read them for the cassette and hand a copy back
+            response = decode(encode(response))
+            cassette.record(key, response)
+            return response
+
+        return make_api_call
+
+
+def cassette_path(test_file):
+    directory, filename = os.path.split(os.path.realpath(test_file))
+    return os.path.join(directory, CASSETTE_DIR, os.path.splitext(filename)[0] + '.json.gz')
+
+
+@contextlib.contextmanager
+def _no_fake():
+    yield
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Record or replay the AWS calls of document tests.')
+    parser.add_argument('mode', choices=MODES, help='record live calls, replay them, or replay strictly')
+    parser.add_argument('paths', nargs='+', help='test files or directories holding test*.py files')
+    parser.add_argument('--fake', action='store_true', help='make the live calls to fake_aws instead of AWS')
+    parser.add_argument('-v', '--verbose', action='store_true', help='list every test')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    fake = None
+    if args.fake:
+        fake = fake_aws.FakeAWS()
+        fake_aws.provision(fake)
+    result = unittest.TestResult()
+    unrecorded = 0
+    started = time.time()
+    with fake.patch() if fake is not None else _no_fake():
+        for index, path in enumerate(fake_aws.find_tests(args.paths)):
+            cassette = Cassette(cassette_path(path), args.mode)
+            with cassette.use():
+                module = fake_aws.load_module(os.path.realpath(path), 'cassette_suite_{}'.format(index))
+                suite = unittest.defaultTestLoader.loadTestsFromModule(module)
+                outcome = unittest.TextTestRunner(verbosity=2 if args.verbose else 1).run(suite)
+            for name in ('failures', 'errors', 'skipped'):
+                getattr(result, name).extend(getattr(outcome, name))
+            result.testsRun += outcome.testsRun
+            unrecorded += len(cassette.unrecorded)
+            if cassette.save():
+                print('wrote {} ({} calls)'.format(os.path.relpath(cassette.path), len(cassette.interactions)))
+    print('{} tests, {} unrecorded calls in {:.1f}s'.format(result.testsRun, unrecorded, time.time() - started))
+    return 0 if result.wasSuccessful() and not (args.mode == 'strict' and unrecorded) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Run the tests of every document in parallel, each worker with its own resource prefix.
+
+    python Testing/run_tests.py                           # every */Tests folder
+    python Testing/run_tests.py RestartInstance StopInstance
+    python Testing/run_tests.py --workers 8 --fake        # 8 at a time, against fake_aws
+
+Each test module runs in a process of its own, so the configuration it reads
+and the default boto3 session it sets up at import are not shared. A worker
+runs one module at a time, and the modules it runs read resource_prefix as
+<resource_prefix><run>-<worker>-, where <run> tells concurrent runs apart, so
+the SSM documents, CloudFormation stacks and IAM roles they name after the
+prefix do not collide with those of other workers or runs.
+
+The tests spend their time waiting on AWS in time.sleep and the runner waits
+for its processes without polling, so a worker costs next to no CPU and the
+default is WORKERS_PER_CPU workers per CPU. The result and duration of each
+module are printed as it ends, then the wall-clock time of the run against
+its serial-equivalent time, the sum of the module durations. Once every
+module ran, the expired stacks of the stack pool (see ssm_testing.StackPool)
+are deleted.
+"""
+from __future__ import print_function
+
+import argparse
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from collections import namedtuple
+
+import fake_aws
+
+try:
+    import ConfigParser as configparser
+except ImportError:
+    import configparser
+
+WORKERS_PER_CPU = 4
+CONFIG_FILE = os.path.join(fake_aws.AUTOMATION_DIR, 'Testing', 'defaults.cfg')
+LOCAL_CONFIG_FILE = os.path.join(fake_aws.AUTOMATION_DIR, 'Testing', 'local.cfg')
+
+# returncode is the exit status of the module's process; tests and the counts are None if it did not report them.
+ModuleResult = namedtuple('ModuleResult', ['path', 'worker', 'prefix', 'returncode', 'tests', 'failures', 'errors',
+                                           'skipped', 'seconds', 'output'])
+
+
+def find_modules(paths=None):
+    """Return the test modules under the given paths, by default under every */Tests folder."""
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(fake_aws.AUTOMATION_DIR, '*', 'Tests')))
+    return [os.path.realpath(path) for path in fake_aws.find_tests(paths)]
+
+
+def configured_prefix():
+    config = configparser.ConfigParser()
+    config.read([CONFIG_FILE, LOCAL_CONFIG_FILE])
+    return config.get('general', 'resource_prefix')
+
+
+def reclaim_pool_stacks(cfn_client=None):
+    """Delete the expired stacks of the stack pool the modules lease from; return their names."""
+    import ssm_testing
+    config = configparser.ConfigParser()
+    config.read([CONFIG_FILE, LOCAL_CONFIG_FILE])
+    if cfn_client is None:
+        import boto3
+        cfn_client = boto3.client('cloudformation', region_name=config.get('general', 'region'))
+    return ssm_testing.StackPool(cfn_client, config.get('general', 'stack_pool_prefix'),
+                                 config.getint('general', 'stack_pool_ttl')).reclaim()
+
+
+def worker_prefix(base, run, worker):
+    return '{}{}-{}-'.format(base, run, worker)
+
+
+@contextlib.contextmanager
+def resource_prefix(prefix):
+    """Make every ConfigParser return prefix as the resource_prefix of its general section."""
+    patched = []
+    for parser in (configparser.RawConfigParser, configparser.ConfigParser):
+        if 'get' in vars(parser):
+            patched.append((parser, vars(parser)['get']))
+
+    def patch(original):
+        def get(self, section, option, *args, **kwargs):
+            if (section, option) == ('general', 'resource_prefix'):
+                return prefix
+            return original(self, section, option, *args, **kwargs)
+        return get
+
+    for parser, original in patched:
+        setattr(parser, 'get', patch(original))
+    try:
+        yield
+    finally:
+        for parser, original in patched:
+            setattr(parser, 'get', original)
+
+
+@contextlib.contextmanager
+def _no_fake():
+    yield
+
+
+def run_module(path, prefix, fake=False, seed=0):
+    """Run the tests of one module in this process and return its unittest result."""
+    backend = None
+    if fake:
+        backend = fake_aws.FakeAWS(seed=seed)
+        fake_aws.provision(backend)
+    # like unittest discovery, so the module imports the helpers next to it
+    sys.path.insert(0, os.path.dirname(os.path.realpath(path)))
+    with resource_prefix(prefix), backend.patch() if backend is not None else _no_fake():
+        module = fake_aws.load_module(path, 'run_tests_module')
+        suite = unittest.defaultTestLoader.loadTestsFromModule(module)
+        return unittest.TextTestRunner(stream=sys.stderr, verbosity=2).run(suite)
+
+
+class ParallelRunner(object):
+    """Run test modules in worker processes, each worker with its own resource prefix."""
+
+    def __init__(self, workers=None, prefix=None, fake=False, seed=0, callback=None):
+        self.workers = workers or multiprocessing.cpu_count() * WORKERS_PER_CPU
+        self.prefix = configured_prefix() if prefix is None else prefix
+        # tells the workers of this run from those of other runs sharing the account
+        self.run_id = '{:04x}'.format(random.SystemRandom().getrandbits(16))
+        self.fake = fake
+        self.seed = seed
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def run(self, paths):
+        """Run every module and return their ModuleResults, in the order of paths."""
+        pending = list(enumerate(paths))
+        results = [None] * len(paths)
+
+        def work(worker):
+            prefix = worker_prefix(self.prefix, self.run_id, worker)
+            while True:
+                with self._lock:
+                    if not pending:
+                        return
+                    index, path = pending.pop(0)
+                result = self.run_process(path, worker, prefix)
+                with self._lock:
+                    results[index] = result
+                    if self.callback is not None:
+                        self.callback(result)
+
+        threads = [threading.Thread(target=work, args=(worker,)) for worker in range(1, min(self.workers,
+                                                                                              len(paths)) + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def run_process(self, path, worker, prefix):
+        """Run one module in a new process and return its ModuleResult."""
+        handle, report = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        command = [sys.executable, os.path.realpath(__file__), '--module', path, '--prefix', prefix,
+                   '--report', report, '--seed', str(self.seed)] + (['--fake'] if self.fake else [])
+        start = time.time()
+        try:
+            process = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(path)), stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT)
+            output = process.communicate()[0].decode('utf-8', 'replace')
+            seconds = time.time() - start
+            with open(report) as report_file:
+                counts = json.loads(report_file.read() or '{}')
+        finally:
+            os.remove(report)
+        return ModuleResult(path, worker, prefix, process.returncode, counts.get('tests'), counts.get('failures'),
+                            counts.get('errors'), counts.get('skipped'), seconds, output)
+
+
+def format_result(result):
+    """Return the line describing a ModuleResult."""
+    name = os.path.relpath(result.path, fake_aws.AUTOMATION_DIR)
+    if result.tests is None:
+        status = 'did not run (exit status {})'.format(result.returncode)
+    else:
+        problems = ['{} {}'.format(count, label) for count, label in (
+            (result.failures, 'failed'), (result.errors, 'errors'), (result.skipped, 'skipped')) if count]
+        status = '{} tests{}'.format(result.tests, ', ' + ', '.join(problems) if problems else '')
+        status = ('ok, ' if result.returncode == 0 else 'FAILED, ') + status
+    return '{}: {} (worker {}, {:.1f}s)'.format(name, status, result.worker, result.seconds)
+
+
+def print_result(result):
+    print(format_result(result))
+    if result.returncode != 0:
+        print(result.output.rstrip())
+    sys.stdout.flush()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='test files or directories (default: every */Tests folder)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='modules run at a time (default: {} per CPU)'.format(WORKERS_PER_CPU))
+    parser.add_argument('--prefix', default=None,
+                        help='base of the worker prefixes (default: resource_prefix of Testing/defaults.cfg)')
+    parser.add_argument('--fake', action='store_true', help='run every module against its own fake_aws')
+    parser.add_argument('--seed', type=int, default=0, help='seed of fake_aws (default: 0)')
+    # run one module in this process; used by the workers
+    parser.add_argument('--module', help=argparse.SUPPRESS)
+    parser.add_argument('--report', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.module:
+        outcome = run_module(args.module, args.prefix, args.fake, args.seed)
+        with open(args.report, 'w') as report:
+            json.dump({'tests': outcome.testsRun, 'failures': len(outcome.failures), 'errors': len(outcome.errors),
+                       'skipped': len(outcome.skipped)}, report)
+        return 0 if outcome.wasSuccessful() else 1
+
+    modules = find_modules(args.paths)
+    if args.fake:
+        for name, reason in fake_aws.unsupported_suites(modules):
+            print('{}: not supported by the fake ({}); expect failures'.format(name, reason))
+    runner = ParallelRunner(args.workers, args.prefix, args.fake, args.seed, print_result)
+    start = time.time()
+    results = runner.run(modules)
+    passed = [result for result in results if result.returncode == 0]
+    print('{} of {} test modules passed in {:.1f}s wall time ({:.1f}s serial, {} workers)'.format(
+        len(passed), len(results), time.time() - start, sum(result.seconds for result in results),
+        min(runner.workers, len(results))))
+    if not args.fake:
+        reclaimed = reclaim_pool_stacks()
+        if reclaimed:
+            print('Deleted {} expired pooled stacks: {}'.format(len(reclaimed), ', '.join(reclaimed)))
+    return 0 if len(passed) == len(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
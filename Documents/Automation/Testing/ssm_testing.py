@@ -17,28 +17,55 @@
 #!/usr/bin/env python
 """Testing support module for SSM documents."""
 
+import contextlib
+import errno
+import hashlib
+import json
 import logging
+import os
+import tempfile
 import time
 
+import stack_waiter
+
 LOGGER = logging.getLogger(__name__)
 PENDING_AUTOMATION_STATUS = ('Pending', 'InProgress')
 PENDING_AUTOMATION_STATUS_WITH_WAITING = ('Pending', 'InProgress', 'Waiting')
 PENDING_DOC_STATUS = ('Creating', 'Updating')
+POOL_KEY_TAG = 'ssm-testing:pool-key'
+POOL_EXPIRES_TAG = 'ssm-testing:expires'
+WARM_STACK_STATUS = ('CREATE_COMPLETE', 'UPDATE_COMPLETE')
 
 
 class CFNTester(object):
     """CloudFormation stack test class."""
 
+    # (region, stack name) -> (expiry time, status or None), shared by the testers of the process.
+    STATUS_CACHE = {}
+    STATUS_TTL = 5
+
     def __init__(self, cfn_client, template_filename, stack_name):
         """Create object variables."""
         self.cfn_client = cfn_client
         with open(template_filename, 'r') as jsonfile:
             self.template_body = jsonfile.read()
+        body = self.template_body if isinstance(self.template_body, bytes) else self.template_body.encode('utf-8')
+        # stacks of the same template are expected to take as long as the last ones
+        self.template_key = hashlib.sha256(body).hexdigest()
         self.stack_name = stack_name
         self.stack_outputs = {}
 
-    def create_stack(self, params=None, poll_interval=10):
-        """Create stack and wait for its deployment to complete."""
+    def waiter(self, poll_interval=None):
+        """Return a StackWaiter of the stack, polling at most every poll_interval seconds."""
+        options = {} if poll_interval is None else {'max_delay': poll_interval}
+        return stack_waiter.StackWaiter(self.cfn_client, key=self.template_key, callback=stack_waiter.log_event,
+                                        **options)
+
+    def create_stack(self, params=None, poll_interval=None, tags=None):
+        """Create stack and wait for its deployment to complete.
+
+        Raises stack_waiter.StackFailed, a ValueError, at the first resource that fails to create.
+        """
         if params is None:
             params = []
 
@@ -48,57 +75,294 @@ class CFNTester(object):
             StackName=self.stack_name,
             TemplateBody=self.template_body,
             Parameters=params,
-            Capabilities=['CAPABILITY_IAM']
+            Capabilities=['CAPABILITY_IAM'],
+            Tags=tags or []
         )
-        while self.is_stack_in_status('CREATE_IN_PROGRESS') is True:
-            LOGGER.info('Waiting %d seconds before checking again for successful stack creation' % poll_interval)
-            time.sleep(poll_interval)
-        if self.is_stack_in_status('CREATE_COMPLETE') is True:
-            for i in self.cfn_client.describe_stacks(
-                    StackName=self.stack_name
-            )['Stacks'][0]['Outputs']:
-                self.stack_outputs[i['OutputKey']] = i['OutputValue']
-            return stack
-        else:
-            raise ValueError('CFN stack did not create successfully')
+        self.forget_status()
+        # the last poll describes the stack with its Outputs
+        result = self.waiter(poll_interval).wait(stack['StackId'], 'create')
+        self.remember_status(result.status)
+        for i in result.stack.get('Outputs', []):
+            self.stack_outputs[i['OutputKey']] = i['OutputValue']
+        return stack
 
     def is_stack_in_status(self, status):
         """Determine if the stack is currently in a matching status."""
-        response = self.cfn_client.describe_stacks(StackName=self.stack_name)
-        return response['Stacks'][0]['StackStatus'] == status
+        return self.stack_status() == status
 
     def is_stack_present(self):
         """Determine if the stack exists."""
-        stacks = []
-        paginator = self.cfn_client.get_paginator('list_stacks')
-        page_iterator = paginator.paginate()
-        for page in page_iterator:
-            stacks.extend(page['StackSummaries'])
-        return any(i['StackName'] == self.stack_name and i['StackStatus'] != 'DELETE_COMPLETE' for i in stacks)  # noqa pylint: disable=line-too-long
+        return self.stack_status() not in (None, 'DELETE_COMPLETE')
+
+    def stack_status(self):
+        """Return the status of the stack, or None if there is none, from a DescribeStacks call by name.
+
+        A status read less than STATUS_TTL seconds ago by any CFNTester of the process is reused.
+        """
+        key = self.status_key()
+        cached = self.STATUS_CACHE.get(key)
+        if cached is not None and time.time() < cached[0]:
+            return cached[1]
+        try:
+            status = self.cfn_client.describe_stacks(StackName=self.stack_name)['Stacks'][0]['StackStatus']
+        except Exception as error:  # pylint: disable=broad-except
+            if not stack_waiter.is_missing_stack(error):
+                raise
+            status = None
+        self.remember_status(status)
+        return status
+
+    def status_key(self):
+        meta = getattr(self.cfn_client, 'meta', None)
+        return getattr(meta, 'region_name', None), self.stack_name
+
+    def remember_status(self, status):
+        self.STATUS_CACHE[self.status_key()] = (time.time() + self.STATUS_TTL, status)
+
+    def forget_status(self):
+        """Drop the cached status of the stack, after changing it."""
+        self.STATUS_CACHE.pop(self.status_key(), None)
 
     def can_create_stack(self):
-        if self.is_stack_present():
-            return self.is_stack_in_status('DELETE_COMPLETE')
-        else:
-            return True
+        return not self.is_stack_present()
 
-    def delete_stack(self, poll_interval=10):
+    def delete_stack(self, poll_interval=None):
         """Delete stack if it is present."""
         if self.can_create_stack():
             # Nothing to do here
             return True
         else:
             LOGGER.info('Deleting existing stack %s' % self.stack_name)
+            self.forget_status()
             self.cfn_client.delete_stack(StackName=self.stack_name)
-            while self.is_stack_present() is True:
-                LOGGER.info('Waiting %d seconds before checking again for successful stack deletion' % poll_interval)
-                time.sleep(poll_interval)
+            self.waiter(poll_interval).wait(self.stack_name, 'delete')
+            self.remember_status(None)
             return True
 
 
+class StackPool(object):
+    """Warm CloudFormation stacks shared by tests, keyed by template content and parameters.
+
+    lease() lends a test a CFNTester of a stack created from a template with a
+    set of parameters, and leaves the stack in place for the next test instead
+    of deleting it. Stacks are named <prefix><key>-<slot> and tagged with
+    their key and expiry time: an expired stack is created again on its next
+    lease, and reclaim() deletes the expired stacks nobody leases. A stack is
+    leased to one test at a time through a lease file in lease_dir, which is
+    shared by the processes of the machine; machines sharing an account need
+    their own prefixes.
+    """
+
+    def __init__(self, cfn_client, prefix, ttl=3600, slots=4, lease_dir=None, poll_interval=10):
+        """slots is the number of stacks kept per key, leased by as many tests at once."""
+        self.cfn_client = cfn_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.slots = slots
+        self.lease_dir = lease_dir or os.path.join(tempfile.gettempdir(), 'ssm-testing-stack-pool')
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def pool_key(template_filename, params=None):
+        """Return the key of the stacks of a template with a list of CloudFormation parameters."""
+        with open(template_filename, 'rb') as template_file:
+            digest = hashlib.sha256(template_file.read())
+        values = sorted((i['ParameterKey'], i.get('ParameterValue')) for i in params or [])
+        digest.update(json.dumps(values).encode('utf-8'))
+        return digest.hexdigest()[:12]
+
+    def stack_name(self, key, slot):
+        return '%s%s-%d' % (self.prefix, key, slot)
+
+    @contextlib.contextmanager
+    def lease(self, template_filename, params=None, reset=None):
+        """Lend a CFNTester of a warm stack of the template with params, creating the stack if needed.
+
+        reset(tester), if given, is called when the stack was used before, to put it back in the state
+        the test expects (see instances_running); if it raises, the stack is created again. The stack
+        is deleted if the test raises.
+        """
+        key = self.pool_key(template_filename, params)
+        name, lease_path = self._acquire(key)
+        try:
+            tester = CFNTester(self.cfn_client, template_filename, name)
+            if not self._reuse(tester, key, reset):
+                tester.create_stack(params, tags=[{'Key': POOL_KEY_TAG, 'Value': key}, {
+                    'Key': POOL_EXPIRES_TAG, 'Value': str(int(time.time() + self.ttl))}])
+            try:
+                yield tester
+            except Exception:
+                LOGGER.info('Deleting pooled stack %s after a failed test' % name)
+                tester.delete_stack()
+                raise
+        finally:
+            os.remove(lease_path)
+
+    def _reuse(self, tester, key, reset):
+        """Return true if the stack of tester is warm, after resetting it."""
+        try:
+            stack = self.cfn_client.describe_stacks(StackName=tester.stack_name)['Stacks'][0]
+        except Exception as error:  # pylint: disable=broad-except
+            if not stack_waiter.is_missing_stack(error):
+                raise
+            tester.remember_status(None)
+            return False
+        tester.remember_status(stack['StackStatus'])
+        tags = dict((i['Key'], i['Value']) for i in stack.get('Tags') or [])
+        if stack['StackStatus'] not in WARM_STACK_STATUS or tags.get(POOL_KEY_TAG) != key or \
+                float(tags.get(POOL_EXPIRES_TAG, 0)) <= time.time():
+            return False
+        for i in stack.get('Outputs', []):
+            tester.stack_outputs[i['OutputKey']] = i['OutputValue']
+        if reset is not None:
+            try:
+                reset(tester)
+            except Exception as error:  # pylint: disable=broad-except
+                LOGGER.info('Pooled stack %s could not be reset, creating it again: %s' % (tester.stack_name, error))
+                return False
+        LOGGER.info('Reusing pooled stack %s' % tester.stack_name)
+        return True
+
+    def _try_acquire(self, name):
+        """Return the path of the new lease file of a stack, or None if the stack is leased."""
+        if not os.path.isdir(self.lease_dir):
+            try:
+                os.makedirs(self.lease_dir)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+        path = os.path.join(self.lease_dir, name + '.lease')
+        for _ in range(2):
+            try:
+                handle = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+                if not self._stale(path):
+                    return None
+                LOGGER.info('Breaking the lease of stack %s, whose process ended' % name)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            os.write(handle, str(os.getpid()).encode('ascii'))
+            os.close(handle)
+            return path
+        return None
+
+    @staticmethod
+    def _stale(path):
+        """Return true if the process holding a lease file has ended."""
+        try:
+            with open(path) as lease_file:
+                pid = int(lease_file.read() or 0)
+        except (IOError, OSError, ValueError):
+            return False
+        if not pid:
+            # being written by its process
+            return False
+        try:
+            os.kill(pid, 0)
+        except OSError as error:
+            return error.errno == errno.ESRCH
+        return False
+
+    def _acquire(self, key):
+        """Lease a stack of key, waiting while every slot is leased, and return (stack name, lease path)."""
+        while True:
+            for slot in range(self.slots):
+                name = self.stack_name(key, slot)
+                path = self._try_acquire(name)
+                if path is not None:
+                    return name, path
+            LOGGER.info('All %d pooled stacks of %s are leased; waiting %d seconds' % (self.slots, key,
+                                                                                       self.poll_interval))
+            time.sleep(self.poll_interval)
+
+    def reclaim(self):
+        """Delete the pooled stacks of the prefix that are past their TTL and not leased; return their names."""
+        expired = []
+        for page in self.cfn_client.get_paginator('describe_stacks').paginate():
+            for stack in page['Stacks']:
+                if not stack['StackName'].startswith(self.prefix):
+                    continue
+                tags = dict((i['Key'], i['Value']) for i in stack.get('Tags') or [])
+                if POOL_EXPIRES_TAG in tags and float(tags[POOL_EXPIRES_TAG]) <= time.time() and \
+                        stack['StackStatus'] not in ('DELETE_IN_PROGRESS', 'DELETE_COMPLETE'):
+                    expired.append(stack['StackName'])
+        reclaimed = []
+        for name in expired:
+            path = self._try_acquire(name)
+            if path is None:
+                continue
+            try:
+                LOGGER.info('Deleting expired pooled stack %s' % name)
+                self.cfn_client.delete_stack(StackName=name)
+                stack_waiter.StackWaiter(self.cfn_client, callback=stack_waiter.log_event).wait(name, 'delete')
+                reclaimed.append(name)
+            finally:
+                os.remove(path)
+        return reclaimed
+
+    @staticmethod
+    def instances_running(ec2_client, *output_keys):
+        """Return a reset hook starting the stopped instances named by stack outputs and waiting until they run.
+
+        The hook raises ValueError if an instance was terminated, so the stack is created again.
+        """
+        def reset(tester):
+            instance_ids = [tester.stack_outputs[key] for key in output_keys]
+            states = {}
+            for reservation in ec2_client.describe_instances(InstanceIds=instance_ids)['Reservations']:
+                for instance in reservation['Instances']:
+                    states[instance['InstanceId']] = instance['State']['Name']
+            if any(states.get(i) in (None, 'shutting-down', 'terminated') for i in instance_ids):
+                raise ValueError('Instances of stack %s were terminated' % tester.stack_name)
+            stopping = [i for i in instance_ids if states[i] == 'stopping']
+            if stopping:
+                ec2_client.get_waiter('instance_stopped').wait(InstanceIds=stopping)
+            stopped = [i for i in instance_ids if states[i] in ('stopping', 'stopped')]
+            if stopped:
+                LOGGER.info('Starting stopped instances %s' % ', '.join(stopped))
+                ec2_client.start_instances(InstanceIds=stopped)
+            ec2_client.get_waiter('instance_running').wait(InstanceIds=instance_ids)
+        return reset
+
+    @staticmethod
+    def instances_in_service(autoscaling_client, output_key, timeout=900, poll_interval=10):
+        """Return a reset hook taking the instances of the Auto Scaling group named by a stack output out of
+        standby and waiting until the group has its desired capacity in service.
+
+        The hook raises ValueError if the group is not back in service within timeout seconds, so the stack
+        is created again.
+        """
+        def reset(tester):
+            name = tester.stack_outputs[output_key]
+            deadline = time.time() + timeout
+            while True:
+                group = autoscaling_client.describe_auto_scaling_groups(
+                    AutoScalingGroupNames=[name])['AutoScalingGroups'][0]
+                standby = [i['InstanceId'] for i in group['Instances'] if i['LifecycleState'] == 'Standby']
+                if standby:
+                    LOGGER.info('Taking instances %s out of standby' % ', '.join(standby))
+                    autoscaling_client.exit_standby(InstanceIds=standby, AutoScalingGroupName=name)
+                in_service = [i for i in group['Instances'] if i['LifecycleState'] == 'InService']
+                if not standby and len(in_service) == len(group['Instances']) >= group['DesiredCapacity']:
+                    return
+                if time.time() >= deadline:
+                    raise ValueError('Auto Scaling group %s of stack %s is not back in service' % (
+                        name, tester.stack_name))
+                time.sleep(poll_interval)
+        return reset
+
+
 class SSMTester(object):
     """SSM document test class."""
 
+    # (access key, region, role name) -> ARN of the roles found, shared by the testers of the process.
+    ROLE_CACHE = {}
+
     def __init__(self, ssm_client, doc_filename, doc_name, doc_type):
         """Create object variables."""
         self.ssm_client = ssm_client
@@ -109,6 +373,9 @@ class SSMTester(object):
 
     def create_document(self, poll_interval=5):
         """Upload document and wait for its deployment to complete."""
+        if self.document_is_current():
+            LOGGER.info('Deployed document is identical, skipping upload')
+            return 'Active'
         if self.document_exists() is True:
             LOGGER.info('Deleting previously deployed document')
             self.destroy()
@@ -133,6 +400,19 @@ class SSMTester(object):
             DocumentFilterList=[{'key': 'Name', 'value': self.doc_name}]
         )['DocumentIdentifiers']) == 1
 
+    def document_hash(self):
+        """Return the sha256 of the document content, as reported by DescribeDocument."""
+        content = self.doc_content if isinstance(self.doc_content, bytes) else self.doc_content.encode('utf-8')
+        return hashlib.sha256(content).hexdigest()
+
+    def document_is_current(self):
+        """Return true if the deployed document is active and has the same content."""
+        if not self.document_exists():
+            return False
+        document = self.ssm_client.describe_document(Name=self.doc_name)['Document']
+        return (document['Status'] == 'Active' and document.get('HashType') == 'Sha256' and
+                document.get('Hash') == self.document_hash() and document.get('DocumentType') == self.doc_type)
+
     def execute_automation(self, params=None):
         """Execute SSM document."""
         if params is None:
@@ -185,21 +465,46 @@ class SSMTester(object):
     @staticmethod
     def role_exists(iam_client, role_name):
         """Return true if IAM role exists."""
-        roles = []
-        paginator = iam_client.get_paginator('list_roles')
-        page_iterator = paginator.paginate()
-        for page in page_iterator:
-            roles.extend(page['Roles'])
-        return any(i['RoleName'] == role_name for i in roles)
+        return SSMTester.role_arn(iam_client, role_name) is not None
 
     @staticmethod
-    def get_automation_role(sts_client, iam_client, role_name):
-        """Determine automation role ARN."""
-        account_num = sts_client.get_caller_identity()['Account']
-        if SSMTester.role_exists(iam_client, role_name):
-            return "arn:aws:iam::%s:role/%s" % (account_num, role_name)
-        else:
+    def role_key(iam_client, role_name):
+        """Return the ROLE_CACHE key of a role, told apart by the credentials and region of iam_client."""
+        signer = getattr(iam_client, '_request_signer', None)
+        credentials = getattr(signer, '_credentials', None)
+        meta = getattr(iam_client, 'meta', None)
+        return getattr(credentials, 'access_key', None), getattr(meta, 'region_name', None), role_name
+
+    @staticmethod
+    def role_arn(iam_client, role_name):
+        """Return the ARN of an IAM role, or None if it does not exist, from a GetRole call.
+
+        The ARN of a role found is cached per process; a missing role is looked
+        up again every time, so a role created later in the process is found.
+        """
+        key = SSMTester.role_key(iam_client, role_name)
+        if key not in SSMTester.ROLE_CACHE:
+            try:
+                SSMTester.ROLE_CACHE[key] = iam_client.get_role(RoleName=role_name)['Role']['Arn']
+            except Exception as error:  # pylint: disable=broad-except
+                if (getattr(error, 'response', None) or {}).get('Error', {}).get('Code') != 'NoSuchEntity':
+                    raise
+                return None
+        return SSMTester.ROLE_CACHE[key]
+
+    @staticmethod
+    def forget_role(role_name):
+        """Drop the cached lookups of an IAM role, for every client, after deleting it."""
+        for key in [key for key in SSMTester.ROLE_CACHE if key[-1] == role_name]:
+            del SSMTester.ROLE_CACHE[key]
+
+    @staticmethod
+    def get_automation_role(sts_client, iam_client, role_name):  # pylint: disable=unused-argument
+        """Determine automation role ARN; sts_client is kept for the callers."""
+        arn = SSMTester.role_arn(iam_client, role_name)
+        if arn is None:
             raise ValueError('Automation role %s does not exist' % role_name)
+        return arn
 
 
 class VPCTester(object):
@@ -0,0 +1,221 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""Wait for CloudFormation stack operations with one DescribeStacks call per poll.
+
+StackWaiter.wait polls a stack until its create or delete operation ends:
+
+  * each poll makes one DescribeStacks call, and the response of the last
+    poll, with the stack's Outputs, is returned, so reading them costs no
+    extra call,
+  * each poll also reads the stack events published since the previous one
+    (DescribeStackEvents pages are read until an event already seen) and
+    passes them to the callback in order; the first CREATE_FAILED or
+    DELETE_FAILED event of a resource raises StackFailed at once instead of
+    after the rollback,
+  * the delay between polls follows Backoff: it halves the time left until
+    the expected end of the operation, then grows exponentially once the
+    stack takes longer than expected, with jitter so waiters started
+    together do not poll together. The expected duration is the median of
+    the last durations observed in this process for the same operation and
+    key (CFNTester uses a digest of its template), or DEFAULT_EXPECTED.
+
+A stack is polled by its StackId as soon as it is known, so a deleted stack
+reports DELETE_COMPLETE; a stack that no longer exists under its name is
+deleted. Only the SUCCESS and FAILURE statuses of the operation end the
+wait: right after DeleteStack, a stack may still report the status its last
+operation ended in, like CREATE_COMPLETE, and is polled again, without
+reading the events of that operation, until the deletion shows up.
+"""
+import logging
+import random
+import time
+from collections import namedtuple
+
+LOGGER = logging.getLogger(__name__)
+
+# operation -> seconds an operation of a stack never seen before is expected to take.
+DEFAULT_EXPECTED = {'create': 60, 'delete': 30}
+SUCCESS = {'create': ('CREATE_COMPLETE',), 'delete': ('DELETE_COMPLETE',)}
+FAILURE = {'create': ('CREATE_FAILED', 'ROLLBACK_IN_PROGRESS', 'ROLLBACK_FAILED', 'ROLLBACK_COMPLETE',
+                      'DELETE_IN_PROGRESS', 'DELETE_FAILED', 'DELETE_COMPLETE'),
+           'delete': ('DELETE_FAILED',)}
+# the stack event starting each operation, which ends the first read of the events.
+START = {'create': 'CREATE_IN_PROGRESS', 'delete': 'DELETE_IN_PROGRESS'}
+RESOURCE_FAILURE = {'create': 'CREATE_FAILED', 'delete': 'DELETE_FAILED'}
+STACK_TYPE = 'AWS::CloudFormation::Stack'
+# durations kept per (operation, key).
+HISTORY_SIZE = 5
+
+# stack is the last DescribeStacks description, or None for a stack that no longer exists.
+WaitResult = namedtuple('WaitResult', ['stack', 'status', 'events', 'polls', 'seconds'])
+
+
+class StackFailed(ValueError):
+    """A stack operation failed; event is the first failed resource event, if any."""
+
+    def __init__(self, message, stack=None, event=None):
+        super(StackFailed, self).__init__(message)
+        self.stack = stack
+        self.event = event
+
+
+def _error_code(error):
+    return (getattr(error, 'response', None) or {}).get('Error', {}).get('Code')
+
+
+def is_missing_stack(error):
+    """Return true if a botocore ClientError says the stack does not exist."""
+    return _error_code(error) == 'ValidationError' and 'does not exist' in str(error)
+
+
+class Backoff(object):
+    """Delays between the polls of an operation expected to take a number of seconds."""
+
+    def __init__(self, expected, min_delay=2.0, max_delay=30.0, jitter=0.2, rng=None):
+        self.expected = expected
+        self.min_delay = min_delay
+        self.max_delay = max(min_delay, max_delay)
+        self.jitter = jitter
+        self.rng = rng or random.Random(0)
+        self._late_polls = 0
+
+    def delay(self, elapsed):
+        """Return the seconds to wait before the next poll, elapsed seconds after the operation started."""
+        remaining = self.expected - elapsed
+        if remaining > self.min_delay:
+            base = remaining / 2.0
+        else:
+            base = self.min_delay * 2 ** self._late_polls
+            self._late_polls += 1
+        base *= 1 + self.rng.uniform(-self.jitter, self.jitter)
+        return min(self.max_delay, max(self.min_delay, base))
+
+
+class StackWaiter(object):
+    """Wait for the create and delete operations of CloudFormation stacks."""
+
+    # (operation, key) -> the last durations observed, shared by the waiters of the process.
+    HISTORY = {}
+
+    def __init__(self, cfn_client, key=None, callback=None, min_delay=2.0, max_delay=30.0, jitter=0.2, rng=None):
+        """callback, if given, is called with each new stack event; key groups the stacks whose durations
+        are alike, like the digest of their template. rng defaults to a random.Random seeded with the stack
+        name, so a run is reproducible while waiters of different stacks are spread."""
+        self.cfn_client = cfn_client
+        self.key = key
+        self.callback = callback
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.rng = rng
+
+    def expected(self, operation):
+        """Return the seconds an operation is expected to take."""
+        durations = sorted(self.HISTORY.get((operation, self.key)) or [])
+        if not durations:
+            return DEFAULT_EXPECTED[operation]
+        return durations[len(durations) // 2]
+
+    def observe(self, operation, seconds):
+        durations = self.HISTORY.setdefault((operation, self.key), [])
+        durations.append(seconds)
+        del durations[:-HISTORY_SIZE]
+
+    def describe(self, name_or_id):
+        """Return the description of a stack, or None if it does not exist."""
+        try:
+            return self.cfn_client.describe_stacks(StackName=name_or_id)['Stacks'][0]
+        except Exception as error:  # pylint: disable=broad-except
+            if is_missing_stack(error):
+                return None
+            raise
+
+    def new_events(self, stack_id, operation, seen):
+        """Return the events of a stack published since the last event in seen, oldest first.
+
+        seen is the list of the events already returned, which is extended;
+        when it is empty, the events start at the last event starting the operation.
+        """
+        last = seen[-1]['EventId'] if seen else None
+        events = []
+        kwargs = {'StackName': stack_id}
+        while True:
+            page = self.cfn_client.describe_stack_events(**kwargs)
+            for event in page.get('StackEvents') or []:
+                if event['EventId'] == last:
+                    return self._seen(events, seen)
+                events.append(event)
+                if last is None and event.get('ResourceType') == STACK_TYPE and \
+                        event.get('ResourceStatus') == START[operation]:
+                    return self._seen(events, seen)
+            if not page.get('NextToken'):
+                return self._seen(events, seen)
+            kwargs['NextToken'] = page['NextToken']
+
+    @staticmethod
+    def _seen(events, seen):
+        events.reverse()
+        seen.extend(events)
+        return events
+
+    def wait(self, name_or_id, operation):
+        """Wait until the create or delete operation of a stack ends and return its WaitResult.
+
+        Raises StackFailed when a resource fails or the stack ends in a FAILURE status of the operation.
+        """
+        start = time.time()
+        backoff = Backoff(self.expected(operation), self.min_delay, self.max_delay, self.jitter,
+                          self.rng or random.Random(name_or_id.split('/')[-2] if '/' in name_or_id else name_or_id))
+        seen = []
+        polls = 0
+        while True:
+            polls += 1
+            stack = self.describe(name_or_id)
+            if stack is None:
+                if operation == 'delete':
+                    return self._done(operation, start, WaitResult(None, 'DELETE_COMPLETE', seen, polls,
+                                                                   time.time() - start))
+                raise StackFailed('CFN stack {} does not exist'.format(name_or_id))
+            name_or_id = stack['StackId']
+            status = stack['StackStatus']
+            pending = not status.endswith('_IN_PROGRESS') and status not in SUCCESS[operation] + FAILURE[operation]
+            for event in [] if pending else self.new_events(name_or_id, operation, seen):
+                if self.callback is not None:
+                    self.callback(event)
+                if event.get('ResourceType') != STACK_TYPE and event.get('ResourceStatus') == \
+                        RESOURCE_FAILURE[operation]:
+                    raise StackFailed('CFN stack {} did not {} successfully: {} {}: {}'.format(
+                        stack['StackName'], operation, event.get('LogicalResourceId'), event['ResourceStatus'],
+                        event.get('ResourceStatusReason', '')), stack, event)
+            if status in SUCCESS[operation]:
+                return self._done(operation, start, WaitResult(stack, status, seen, polls, time.time() - start))
+            if status in FAILURE[operation]:
+                raise StackFailed('CFN stack {} did not {} successfully: {} {}'.format(
+                    stack['StackName'], operation, status, stack.get('StackStatusReason', '')).rstrip(), stack)
+            delay = backoff.delay(time.time() - start)
+            LOGGER.info('Stack %s is %s; checking again in %.1f seconds', stack['StackName'], status, delay)
+            time.sleep(delay)
+
+    def _done(self, operation, start, result):
+        self.observe(operation, result.seconds)
+        return result
+
+
+def log_event(event):
+    """Log a stack event, as a StackWaiter callback."""
+    LOGGER.info('%s %s %s %s', event.get('LogicalResourceId'), event.get('ResourceType'), event.get('ResourceStatus'),
+                event.get('ResourceStatusReason', ''))